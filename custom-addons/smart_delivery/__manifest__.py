@@ -38,9 +38,9 @@
     """,
     'author': 'Smart Delivery Team',
     'website': 'https://www.odoo.com',
-    'depends': ['base', 'web', 'mail', 'contacts', 'account', 'sale'],
+    'depends': ['base', 'web', 'bus', 'mail', 'contacts', 'account', 'sale'],
     'external_dependencies': {
-        'python': ['PyJWT', 'cryptography'],
+        'python': ['PyJWT', 'cryptography', 'numpy'],
     },
     'data': [
         # Security - groups first, then access rules, then record rules
@@ -64,6 +64,7 @@
         'views/billing_views.xml',
         'views/account_move_views.xml',
         'views/api_log_views.xml',
+        'views/notification_views.xml',
         'views/res_users_views.xml',
         'views/menu.xml',
     ],
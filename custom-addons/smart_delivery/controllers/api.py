@@ -2,14 +2,88 @@
 
 import json
 import logging
-import base64
-from datetime import datetime, timedelta
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from psycopg2 import errors as pg_errors
+
 from odoo import http, fields
 from odoo.http import request
-from odoo.exceptions import AccessDenied, ValidationError
+from odoo.exceptions import AccessDenied, UserError, ValidationError
+
+from ..utils.auth_cache import AuthInfo, auth_cache
+from ..utils.order_feed import NOTIFICATION_TYPE, enterprise_channel, livreur_channel
+from ..utils.geo import haversine_pairwise
+from ..utils.pagination import InvalidCursor, InvalidPageParameter, parse_page_parameters, search_page
+from ..utils.pricing import REQUIREMENT_FIELDS, compute_prices
+from ..utils.uploads import prepare_upload, read_upload
 
 _logger = logging.getLogger(__name__)
 
+# Maximum number of GPS fixes accepted by one location update
+LOCATION_MAX_POINTS = 500
+
+# Maximum number of shipments priced by one quote request
+QUOTE_MAX_SHIPMENTS = 1000
+
+# Attempts of an accept whose order was changed by a transaction committed meanwhile
+ACCEPT_MAX_TRIES = 3
+
+# Odoo websocket endpoint the live order feed is subscribed on
+FEED_WEBSOCKET_PATH = '/websocket'
+
+# Delivery proofs served by the validation-proof file endpoint -> (field, thumbnail field)
+PROOF_FIELDS = {
+    'photo': ('photo', 'photo_thumbnail'),
+    'signature': ('signature_file', None),
+}
+
+# Sort orders of the paginated list endpoints, ending with a unique key for keyset pagination
+ORDER_LIST_ORDER = [('create_date', 'desc'), ('id', 'desc')]
+BILLING_LIST_ORDER = [('id', 'desc')]
+LIVREUR_LIST_ORDER = [('rating', 'desc'), ('name', 'asc'), ('id', 'asc')]
+
+# Response keys of the list endpoints (selectable with ?fields=) -> model fields they read
+ORDER_LIST_FIELDS = {
+    'id': [],
+    'reference': ['name'],
+    'external_reference': ['reference'],
+    'status': ['status'],
+    'sector_type': ['sector_type'],
+    'sender': ['sender_id'],
+    'receiver': ['receiver_name', 'receiver_phone'],
+    'pickup': ['pickup_lat', 'pickup_long'],
+    'drop': ['drop_lat', 'drop_long'],
+    'distance_km': ['distance_km'],
+    'livreur': ['assigned_livreur_id'],
+    'conditions': ['otp_required', 'signature_required', 'photo_required', 'biometric_required'],
+    'created_at': ['create_date'],
+    'billing': ['billing_id'],
+    'validation': ['condition_ids', 'otp_required'],
+}
+BILLING_LIST_FIELDS = {
+    'id': [],
+    'order': ['order_id'],
+    'distance_km': ['distance_km'],
+    'base_tariff': ['base_tariff'],
+    'extra_fee': ['extra_fee'],
+    'total_amount': ['total_amount'],
+    'state': ['state'],
+    'notes': ['notes'],
+}
+LIVREUR_LIST_FIELDS = {
+    'id': [],
+    'name': ['name'],
+    'phone': ['phone'],
+    'vehicle_type': ['vehicle_type'],
+    'availability': ['availability'],
+    'verified': ['verified'],
+    'rating': ['rating'],
+    'sectors': ['sector_ids'],
+    'current_location': ['current_lat', 'current_long'],
+}
+
 # Try to import JWT auth, but make it optional
 try:
     from ..utils.jwt_auth import JWTAuth
@@ -40,17 +114,24 @@ class SmartDeliveryAPI(http.Controller):
             auth_header = request.httprequest.headers.get('Authorization', '')
             if auth_header.startswith('Bearer '):
                 token = auth_header.replace('Bearer ', '')
-                payload = JWTAuth.verify_token(token)
-                if payload:
-                    user_id = payload.get('user_id')
-                    # Set the user in the environment
-                    user = request.env['res.users'].sudo().browse(user_id)
-                    if user.exists():
-                        # Store user_id for later use (don't change request.env to avoid permission issues)
-                        request._jwt_user_id = user_id
-                        request._jwt_user = user
-                        # NOTE: Do NOT set request.session.uid - it causes session token validation errors
-                        return True
+                dbname = request.env.cr.dbname
+                # Known token: no decoding and no query
+                info = auth_cache.get(dbname, token)
+                if info is None:
+                    payload = JWTAuth.verify_token(token)
+                    if not payload:
+                        return False
+                    user = request.env['res.users'].sudo().browse(payload.get('user_id'))
+                    if not user.exists():
+                        return False
+                    info = self._compute_auth_info(user)
+                    auth_cache.set(dbname, token, info, payload.get('exp'))
+                # Store user_id for later use (don't change request.env to avoid permission issues)
+                request._jwt_user_id = info.user_id
+                request._jwt_user = request.env['res.users'].sudo().browse(info.user_id)
+                request._jwt_auth_info = info
+                # NOTE: Do NOT set request.session.uid - it causes session token validation errors
+                return True
         except Exception as e:
             _logger.error(f"JWT authentication error: {e}")
         return False
@@ -118,11 +199,46 @@ class SmartDeliveryAPI(http.Controller):
         return [
             ('Access-Control-Allow-Origin', cors_origin),
             ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
-            ('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Client-ID'),
+            ('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Client-ID, Range, If-None-Match'),
+            ('Access-Control-Expose-Headers', 'ETag, Content-Range, Accept-Ranges, Content-Disposition'),
             ('Access-Control-Allow-Credentials', 'true'),
             ('Access-Control-Max-Age', '3600'),
         ]
     
+    def _read_request_data(self):
+        """Body of a JSON request, or form fields of a multipart/form-data one"""
+        httprequest = request.httprequest
+        if httprequest.content_type and 'application/json' in httprequest.content_type:
+            return json.loads(httprequest.data.decode('utf-8')) if httprequest.data else {}
+        if httprequest.form or httprequest.files:
+            return dict(httprequest.form)
+        # Historical clients post JSON without a content type
+        return json.loads(httprequest.data.decode('utf-8')) if httprequest.data else {}
+    
+    def _read_document_uploads(self, documents_input):
+        """Files of the dynamic documents of a registration.
+
+        Each document gives its file either as the name of a multipart part
+        ({"name": ..., "file": "part_name"}) or as base64 ({"name": ..., "photo": ...}).
+
+        :return: list of (document, raw bytes or None, filename)
+        :raise ValueError: on an invalid base64 file
+        """
+        files = request.httprequest.files
+        uploads = []
+        for doc in documents_input:
+            if not isinstance(doc, dict):
+                continue
+            doc_name = (doc.get('name') or '').strip()
+            default_filename = doc.get('filename') or doc.get('photo_filename') or f'{doc_name}.jpg'
+            part = doc.get('file')
+            if part and files.get(part) and files[part].filename:
+                raw, filename = files[part].read(), doc.get('filename') or files[part].filename
+            else:
+                raw, filename = read_upload({}, doc, 'photo', default_filename)
+            uploads.append((doc, raw, filename or default_filename))
+        return uploads
+    
     def _json_response(self, data, status_code=200):
         """Retourne une réponse JSON avec les en-têtes CORS"""
         headers = [('Content-Type', 'application/json')]
@@ -134,11 +250,170 @@ class SmartDeliveryAPI(http.Controller):
         response.status_code = status_code
         return response
     
+    def _get_list_keys(self, kwargs, available):
+        """Response keys asked with ?fields=a,b,c (all the available ones by default).
+
+        :raise ValueError: on an unknown key
+        """
+        requested = [name.strip() for name in (kwargs.get('fields') or '').split(',') if name.strip()]
+        if not requested:
+            return list(available)
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            raise ValueError(f"Champs inconnus: {', '.join(unknown)}. Champs disponibles: {', '.join(available)}")
+        return [name for name in available if name in requested]
+
+    def _search_list_page(self, model, domain, order_spec, keys, available, kwargs):
+        """Read one page of a list endpoint with keyset pagination.
+
+        The total is only counted for the first page (no cursor), clients are
+        expected to follow `next_cursor` afterwards.
+
+        :return: tuple (rows read with load=None, pagination dict)
+        :raise InvalidCursor: on a malformed cursor
+        :raise InvalidPageParameter: on an invalid ?limit= or ?offset=
+        """
+        limit, offset = parse_page_parameters(kwargs.get('limit', 50), kwargs.get('offset', 0))
+        cursor = kwargs.get('cursor')
+        field_names = [field_name for key in keys for field_name in available[key]]
+        rows, next_cursor = search_page(model, domain, order_spec, limit, cursor=cursor, offset=offset, field_names=field_names)
+        pagination = {
+            'total': None if cursor else model.search_count(domain),
+            'limit': limit,
+            'offset': 0 if cursor else offset,
+            'next_cursor': next_cursor,
+        }
+        return rows, pagination
+
+    def _list_error_response(self, error):
+        """400 response for an invalid ?fields=, ?cursor=, ?limit= or ?offset= parameter"""
+        if isinstance(error, InvalidCursor):
+            return self._json_response({'error': 'Curseur de pagination invalide', 'code': 'INVALID_CURSOR'}, 400)
+        if isinstance(error, InvalidPageParameter):
+            return self._json_response({'error': str(error), 'code': 'INVALID_PARAMETER'}, 400)
+        return self._json_response({'error': str(error), 'code': 'INVALID_FIELDS'}, 400)
+
+    def _read_by_id(self, model_name, ids, field_names):
+        """Batch read of related records: {id: values}"""
+        ids = list({record_id for record_id in ids if record_id})
+        if not ids:
+            return {}
+        records = request.env[model_name].sudo().with_context(bin_size=True).browse(ids)
+        return {values['id']: values for values in records.read(field_names, load=None)}
+
+    def _serialize_order_rows(self, rows, keys, for_livreur=False):
+        """Build the order list items from search_read rows.
+
+        Related records (sender, livreur, billing, conditions) are read in one
+        query per model, whatever the number of orders.
+        """
+        senders = livreurs = billings = conditions = {}
+        if 'sender' in keys:
+            senders = self._read_by_id('res.partner', [row['sender_id'] for row in rows], ['name', 'phone'])
+        if 'livreur' in keys:
+            livreurs = self._read_by_id('delivery.livreur', [row['assigned_livreur_id'] for row in rows], ['name', 'phone'])
+        if 'billing' in keys:
+            billings = self._read_by_id('delivery.billing', [row['billing_id'][0] for row in rows if row['billing_id']],
+                                        ['base_tariff', 'extra_fee', 'total_amount', 'state'])
+        if 'validation' in keys:
+            conditions = self._read_by_id('delivery.condition', [row['condition_ids'][0] for row in rows if row['condition_ids']],
+                                          ['otp_verified', 'otp_value', 'signature_file', 'photo', 'biometric_score', 'validated'])
+
+        orders_data = []
+        for row in rows:
+            item = {}
+            for key in keys:
+                if key == 'id':
+                    item['id'] = row['id']
+                elif key == 'reference':
+                    item['reference'] = row['name']
+                elif key == 'external_reference':
+                    item['external_reference'] = row['reference']
+                elif key in ('status', 'sector_type', 'distance_km'):
+                    item[key] = row[key]
+                elif key == 'sender':
+                    sender = senders.get(row['sender_id'], {})
+                    item['sender'] = {'id': row['sender_id'], 'name': sender.get('name')}
+                    if for_livreur:
+                        item['sender']['phone'] = sender.get('phone') or ''
+                elif key == 'receiver':
+                    item['receiver'] = {'name': row['receiver_name'], 'phone': row['receiver_phone']}
+                elif key == 'pickup':
+                    item['pickup'] = {'lat': row['pickup_lat'], 'long': row['pickup_long']}
+                elif key == 'drop':
+                    item['drop'] = {'lat': row['drop_lat'], 'long': row['drop_long']}
+                elif key == 'livreur':
+                    livreur = livreurs.get(row['assigned_livreur_id'])
+                    item['livreur'] = {
+                        'id': livreur['id'],
+                        'name': livreur['name'],
+                        'phone': livreur['phone'],
+                    } if livreur else None
+                elif key == 'conditions':
+                    item['conditions'] = {
+                        'otp_required': row['otp_required'],
+                        'signature_required': row['signature_required'],
+                        'photo_required': row['photo_required'],
+                        'biometric_required': row['biometric_required'],
+                    }
+                elif key == 'created_at':
+                    item['created_at'] = row['create_date'].isoformat() if row['create_date'] else None
+                elif key == 'billing':
+                    billing = billings.get(row['billing_id'][0]) if row['billing_id'] else None
+                    item['billing'] = {
+                        'base_tariff': billing['base_tariff'],
+                        'extra_fee': billing['extra_fee'],
+                        'total_amount': billing['total_amount'],
+                        'state': billing['state'],
+                    } if billing else None
+                elif key == 'validation':
+                    condition = conditions.get(row['condition_ids'][0]) if row['condition_ids'] else None
+                    validation = None
+                    if condition:
+                        validation = {'otp_verified': condition['otp_verified']}
+                        if for_livreur:
+                            validation['otp_value'] = condition['otp_value'] if row['otp_required'] else None
+                        validation.update({
+                            'signature_provided': bool(condition['signature_file']),
+                            'photo_provided': bool(condition['photo']),
+                            'biometric_score': condition['biometric_score'],
+                            'validated': condition['validated'],
+                        })
+                    item['validation'] = validation
+            orders_data.append(item)
+        return orders_data
+
+    def _compute_auth_info(self, user):
+        """Resolve the type, livreur and company of a user (uncached)"""
+        livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
+        partner = user.partner_id
+        return AuthInfo(
+            user_id=user.id,
+            user_type=self._compute_user_type(user, livreur),
+            livreur_id=livreur.id,
+            partner_id=(partner.commercial_partner_id or partner).id,
+        )
+
+    def _get_auth_info(self, user):
+        """AuthInfo of a user, from the JWT cache when it is the caller of the request"""
+        info = getattr(request, '_jwt_auth_info', None)
+        if info and info.user_id == user.id:
+            return info
+        return self._compute_auth_info(user)
+
+    def _get_livreur_for_user(self, user):
+        """Livreur linked to a user (empty recordset if none)"""
+        livreur_id = self._get_auth_info(user).livreur_id
+        return request.env['delivery.livreur'].sudo().browse(livreur_id or [])
+
     def _get_user_type(self, user):
         """Get user type: 'admin', 'enterprise', 'livreur', or 'other'"""
         if not user:
             return 'other'
-        
+        return self._get_auth_info(user).user_type
+
+    def _compute_user_type(self, user, livreur):
+        """User type from the groups of the user, or from its livreur record"""
         # Check groups
         admin_group = request.env.ref('smart_delivery.group_admin', raise_if_not_found=False)
         enterprise_group = request.env.ref('smart_delivery.group_enterprise', raise_if_not_found=False)
@@ -152,7 +427,6 @@ class SmartDeliveryAPI(http.Controller):
             return 'livreur'
         
         # Fallback: check if user has a livreur record
-        livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
         return 'livreur' if livreur else 'other'
     
     def _require_enterprise_or_admin(self):
@@ -207,8 +481,7 @@ class SmartDeliveryAPI(http.Controller):
         user = self._get_current_user()
         if not user:
             return None
-        livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
-        return livreur if livreur.exists() else None
+        return self._get_livreur_for_user(user) or None
     
     def _require_livreur(self):
         """Require that the authenticated user is a livreur, return error response or livreur"""
@@ -226,7 +499,7 @@ class SmartDeliveryAPI(http.Controller):
             return None, error_response
         
         # Find livreur linked to this user
-        livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
+        livreur = self._get_livreur_for_user(user)
         if not livreur:
             error_response = self._json_response({
                 'error': 'Accès refusé. Vous devez être un livreur pour accéder à cette ressource.',
@@ -537,12 +810,16 @@ class SmartDeliveryAPI(http.Controller):
                 },
                 {
                     "name": "Carte Grise",
-                    "photo": "base64..."
+                    "file": "carte_grise"       # Multipart: name of the file part (instead of "photo")
                 }
             ],
             "sector_types": ["standard", "premium"]  # Optional: List of sector types or IDs
         }
         
+        In multipart/form-data, "documents" is a JSON string and the files are
+        sent as separate parts (preferred: no base64 overhead). Photos are
+        downscaled to 1920px before being stored.
+        
         Response (success):
         {
             "success": true,
@@ -570,11 +847,7 @@ class SmartDeliveryAPI(http.Controller):
 
         try:
             # Get data from request - support both JSON and multipart form data
-            if request.httprequest.content_type and 'application/json' in request.httprequest.content_type:
-                data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
-            else:
-                # Multipart form data
-                data = dict(request.httprequest.form)
+            data = self._read_request_data()
             
             # Required fields validation
             required_fields = ['name', 'phone', 'email', 'password', 'vehicle_type', 'nni']
@@ -639,6 +912,14 @@ class SmartDeliveryAPI(http.Controller):
                     'code': 'NNI_EXISTS'
                 }, 400)
             
+            # Check if phone already exists (whatever its formatting)
+            if request.env['delivery.livreur'].sudo()._phone_in_use(data.get('phone', '').strip()):
+                return self._json_response({
+                    'success': False,
+                    'error': 'Ce numéro de téléphone est déjà utilisé par un autre livreur',
+                    'code': 'PHONE_EXISTS'
+                }, 400)
+            
             # Check if user with this email/login already exists (including archived users)
             existing_user = request.env['res.users'].sudo().with_context(active_test=False).search([
                 '|', ('login', '=', email), ('email', '=', email)
@@ -670,12 +951,17 @@ class SmartDeliveryAPI(http.Controller):
                     documents_input = []
             
             if documents_input and isinstance(documents_input, list):
-                # New dynamic documents format
-                for idx, doc in enumerate(documents_input):
-                    if not isinstance(doc, dict):
-                        continue
-                    
-                    doc_name = doc.get('name', '').strip()
+                # New dynamic documents format (multipart parts or base64)
+                try:
+                    document_uploads = self._read_document_uploads(documents_input)
+                except ValueError as e:
+                    return self._json_response({
+                        'success': False,
+                        'error': str(e),
+                        'code': 'INVALID_FILE'
+                    }, 400)
+                for idx, (doc, raw, filename) in enumerate(document_uploads):
+                    doc_name = (doc.get('name') or '').strip()
                     if not doc_name:
                         return self._json_response({
                             'success': False,
@@ -683,8 +969,7 @@ class SmartDeliveryAPI(http.Controller):
                             'code': 'MISSING_DOCUMENT_NAME'
                         }, 400)
                     
-                    photo_data = doc.get('photo', '')
-                    if not photo_data:
+                    if not raw:
                         return self._json_response({
                             'success': False,
                             'error': f'Photo requise pour le document: {doc_name}',
@@ -692,15 +977,9 @@ class SmartDeliveryAPI(http.Controller):
                             'document_name': doc_name
                         }, 400)
                     
-                    # Clean base64 data
-                    if isinstance(photo_data, str) and 'base64,' in photo_data:
-                        photo_data = photo_data.split('base64,')[1]
-                    
-                    filename = doc.get('filename') or doc.get('photo_filename') or f'{doc_name}.jpg'
-                    
                     documents_data.append({
                         'name': doc_name,
-                        'photo': photo_data,
+                        'photo': prepare_upload(raw),
                         'photo_filename': filename,
                     })
                 
@@ -720,29 +999,21 @@ class SmartDeliveryAPI(http.Controller):
                 ]
                 
                 for field, doc_name in legacy_photo_fields:
-                    photo_data = None
-                    filename = None
-                    
-                    # Check for file upload in multipart form
-                    if field in request.httprequest.files:
-                        file = request.httprequest.files[field]
-                        if file and file.filename:
-                            photo_data = base64.b64encode(file.read()).decode('utf-8')
-                            filename = file.filename
-                    
-                    # Check for base64 data in JSON/form data
-                    elif data.get(field):
-                        photo_data = data.get(field)
-                        # If it already contains data: prefix, extract base64 part
-                        if isinstance(photo_data, str) and 'base64,' in photo_data:
-                            photo_data = photo_data.split('base64,')[1]
-                        filename = data.get(f'{field}_filename', f'{doc_name}.jpg')
+                    # Multipart file upload, or base64 data in JSON/form data
+                    try:
+                        raw, filename = read_upload(request.httprequest.files, data, field, f'{doc_name}.jpg')
+                    except ValueError as e:
+                        return self._json_response({
+                            'success': False,
+                            'error': str(e),
+                            'code': 'INVALID_FILE'
+                        }, 400)
                     
-                    if photo_data:
+                    if raw:
                         documents_data.append({
                             'name': doc_name,
-                            'photo': photo_data,
-                            'photo_filename': filename or f'{doc_name}.jpg',
+                            'photo': prepare_upload(raw),
+                            'photo_filename': filename,
                         })
                 
                 # If no documents at all, require at least one
@@ -881,7 +1152,7 @@ class SmartDeliveryAPI(http.Controller):
                 },
                 {
                     "name": "NIF",
-                    "photo": "base64..."
+                    "file": "nif"                 # Multipart: name of the file part
                 }
             ],
             "address": "Adresse complète",       # Optional
@@ -910,11 +1181,7 @@ class SmartDeliveryAPI(http.Controller):
 
         try:
             # Get data from request - support both JSON and multipart form data
-            if request.httprequest.content_type and 'application/json' in request.httprequest.content_type:
-                data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
-            else:
-                # Multipart form data
-                data = dict(request.httprequest.form)
+            data = self._read_request_data()
             
             # Required fields validation
             required_fields = ['name', 'email', 'phone', 'password']
@@ -957,6 +1224,14 @@ class SmartDeliveryAPI(http.Controller):
                     'code': 'EMAIL_EXISTS'
                 }, 400)
             
+            # Check if phone already exists (whatever its formatting)
+            if request.env['delivery.enterprise'].sudo()._phone_in_use(data.get('phone', '').strip()):
+                return self._json_response({
+                    'success': False,
+                    'error': 'Ce numéro de téléphone est déjà utilisé par une autre entreprise',
+                    'code': 'PHONE_EXISTS'
+                }, 400)
+            
             # Check if user with this email/login already exists (including archived users)
             existing_user = request.env['res.users'].sudo().with_context(active_test=False).search([
                 '|', ('login', '=', email), ('email', '=', email)
@@ -974,25 +1249,6 @@ class SmartDeliveryAPI(http.Controller):
                     'code': 'USER_EXISTS'
                 }, 400)
             
-            # Process logo if provided
-            logo_data = None
-            logo_filename = None
-            
-            # Check for file upload in multipart form
-            if 'logo' in request.httprequest.files:
-                file = request.httprequest.files['logo']
-                if file and file.filename:
-                    logo_data = base64.b64encode(file.read()).decode('utf-8')
-                    logo_filename = file.filename
-            
-            # Check for base64 data in JSON/form data
-            elif data.get('logo'):
-                logo_data = data.get('logo')
-                # If it already contains data: prefix, extract base64 part
-                if isinstance(logo_data, str) and 'base64,' in logo_data:
-                    logo_data = logo_data.split('base64,')[1]
-                logo_filename = data.get('logo_filename', 'logo.png')
-            
             # Process dynamic documents
             documents_data = []
             documents_input = data.get('documents', [])
@@ -1004,30 +1260,30 @@ class SmartDeliveryAPI(http.Controller):
                 except json.JSONDecodeError:
                     documents_input = []
             
-            if documents_input and isinstance(documents_input, list):
-                for idx, doc in enumerate(documents_input):
-                    if not isinstance(doc, dict):
-                        continue
-                    
-                    doc_name = doc.get('name', '').strip()
-                    if not doc_name:
-                        continue  # Skip documents without name (optional for enterprise)
-                    
-                    photo_data = doc.get('photo', '')
-                    if not photo_data:
-                        continue  # Skip documents without photo
-                    
-                    # Clean base64 data
-                    if isinstance(photo_data, str) and 'base64,' in photo_data:
-                        photo_data = photo_data.split('base64,')[1]
-                    
-                    filename = doc.get('filename') or doc.get('photo_filename') or f'{doc_name}.jpg'
-                    
-                    documents_data.append({
-                        'name': doc_name,
-                        'photo': photo_data,
-                        'photo_filename': filename,
-                    })
+            try:
+                # Logo (optional): multipart file upload, or base64 data in JSON/form data
+                logo_raw, logo_filename = read_upload(request.httprequest.files, data, 'logo', 'logo.png')
+                document_uploads = []
+                if documents_input and isinstance(documents_input, list):
+                    document_uploads = self._read_document_uploads(documents_input)
+            except ValueError as e:
+                return self._json_response({
+                    'success': False,
+                    'error': str(e),
+                    'code': 'INVALID_FILE'
+                }, 400)
+            logo_data = prepare_upload(logo_raw) or None
+            
+            for doc, raw, filename in document_uploads:
+                doc_name = (doc.get('name') or '').strip()
+                if not doc_name or not raw:
+                    continue  # Skip documents without name or photo (optional for enterprise)
+                
+                documents_data.append({
+                    'name': doc_name,
+                    'photo': prepare_upload(raw),
+                    'photo_filename': filename,
+                })
             
             # Create enterprise record
             enterprise_vals = {
@@ -1220,6 +1476,7 @@ Authorization: Bearer <token>
                 {"name": "7. Driver - Profile", "description": "Profil et localisation du livreur"},
                 {"name": "8. Driver - Billing", "description": "Facturation et paiement pour les livreurs"},
                 {"name": "9. Driver - Notifications", "description": "Gestion des notifications et dispatching"},
+                {"name": "10. Live Feed", "description": "Flux temps réel des commandes (bus Odoo / websocket)"},
             ],
             "components": {
                 "securitySchemes": {
@@ -1460,7 +1717,7 @@ Utilisez GET /api/sectors pour obtenir la liste des secteurs disponibles.""",
                                             "properties": {
                                                 "success": {"type": "boolean", "example": False},
                                                 "error": {"type": "string"},
-                                                "code": {"type": "string", "enum": ["MISSING_FIELDS", "INVALID_EMAIL", "PASSWORD_TOO_SHORT", "INVALID_VEHICLE_TYPE", "EMAIL_EXISTS", "NNI_EXISTS", "USER_EXISTS", "USER_ARCHIVED", "NO_DOCUMENTS", "MISSING_DOCUMENT_NAME", "MISSING_DOCUMENT_PHOTO"]}
+                                                "code": {"type": "string", "enum": ["MISSING_FIELDS", "INVALID_EMAIL", "PASSWORD_TOO_SHORT", "INVALID_VEHICLE_TYPE", "EMAIL_EXISTS", "NNI_EXISTS", "PHONE_EXISTS", "USER_EXISTS", "USER_ARCHIVED", "NO_DOCUMENTS", "MISSING_DOCUMENT_NAME", "MISSING_DOCUMENT_PHOTO"]}
                                             }
                                         }
                                     }
@@ -1556,7 +1813,7 @@ Le compte sera créé avec le statut 'pending' (en attente) et nécessite une ap
                                             "properties": {
                                                 "success": {"type": "boolean", "example": False},
                                                 "error": {"type": "string"},
-                                                "code": {"type": "string", "enum": ["MISSING_FIELDS", "INVALID_EMAIL", "PASSWORD_TOO_SHORT", "EMAIL_EXISTS", "USER_EXISTS", "USER_ARCHIVED"]}
+                                                "code": {"type": "string", "enum": ["MISSING_FIELDS", "INVALID_EMAIL", "PASSWORD_TOO_SHORT", "EMAIL_EXISTS", "PHONE_EXISTS", "USER_EXISTS", "USER_ARCHIVED"]}
                                             }
                                         }
                                     }
@@ -1648,6 +1905,83 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                         }
                     }
                 },
+                "/smart_delivery/api/delivery/quote": {
+                    "post": {
+                        "tags": ["2. Enterprise - Orders"],
+                        "summary": "Devis de livraisons en masse",
+                        "description": "Calcule le prix de nombreuses livraisons (jusqu'à 1000) en une requête, à partir des tarifs des secteurs. Une ligne invalide reçoit une erreur (`error`, `code`) au lieu d'un prix, sans faire échouer les autres.",
+                        "security": [{"bearerAuth": []}],
+                        "requestBody": {
+                            "required": True,
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "type": "object",
+                                        "required": ["shipments"],
+                                        "properties": {
+                                            "sector_type": {"type": "string", "description": "Secteur par défaut des envois", "example": "standard"},
+                                            "shipments": {
+                                                "type": "array",
+                                                "maxItems": 1000,
+                                                "items": {
+                                                    "type": "object",
+                                                    "required": ["pickup_lat", "pickup_long", "drop_lat", "drop_long"],
+                                                    "properties": {
+                                                        "pickup_lat": {"type": "number"},
+                                                        "pickup_long": {"type": "number"},
+                                                        "drop_lat": {"type": "number"},
+                                                        "drop_long": {"type": "number"},
+                                                        "sector_type": {"type": "string"},
+                                                        "reference": {"type": "string", "description": "Renvoyée telle quelle"}
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
+                            }
+                        },
+                        "responses": {
+                            "200": {
+                                "description": "Prix de chaque envoi, dans l'ordre de la requête",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "type": "object",
+                                            "properties": {
+                                                "success": {"type": "boolean"},
+                                                "count": {"type": "integer"},
+                                                "priced": {"type": "integer"},
+                                                "currency": {"type": "string", "example": "MRU"},
+                                                "total_amount": {"type": "number"},
+                                                "quotes": {
+                                                    "type": "array",
+                                                    "items": {
+                                                        "type": "object",
+                                                        "properties": {
+                                                            "index": {"type": "integer"},
+                                                            "reference": {"type": "string"},
+                                                            "sector_type": {"type": "string"},
+                                                            "distance_km": {"type": "number"},
+                                                            "base_tariff": {"type": "number"},
+                                                            "extra_fee": {"type": "number"},
+                                                            "total_amount": {"type": "number"},
+                                                            "conditions": {"type": "object"},
+                                                            "error": {"type": "string"},
+                                                            "code": {"type": "string", "enum": ["INVALID_SHIPMENT", "INVALID_SECTOR", "INVALID_COORDINATES"]}
+                                                        }
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
+                            },
+                            "400": {"description": "Liste d'envois absente, vide ou trop longue"},
+                            "401": {"$ref": "#/components/responses/Unauthorized"}
+                        }
+                    }
+                },
                 "/smart_delivery/api/enterprise/my-orders": {
                     "get": {
                         "tags": ["2. Enterprise - Orders"],
@@ -1836,6 +2170,17 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                                                             }
                                                         },
                                                         "created_at": {"type": "string", "format": "date-time"},
+                                                        "eta": {
+                                                            "type": "object",
+                                                            "nullable": True,
+                                                            "description": "Heures d'arrivée prévues, pour les commandes assignées ou en cours de livraison. Elles suivent la tournée planifiée du livreur et sa vitesse mesurée.",
+                                                            "properties": {
+                                                                "pickup_minutes": {"type": "number", "nullable": True, "description": "Minutes avant l'enlèvement (null une fois enlevée)"},
+                                                                "pickup_at": {"type": "string", "format": "date-time", "nullable": True},
+                                                                "delivery_minutes": {"type": "number", "description": "Minutes avant la livraison"},
+                                                                "delivery_at": {"type": "string", "format": "date-time"}
+                                                            }
+                                                        },
                                                         "billing": {
                                                             "type": "object",
                                                             "nullable": True,
@@ -1863,8 +2208,8 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                         "tags": ["2. Enterprise - Orders", "3. Livreur - Orders"],
                         "summary": "Obtenir les preuves de validation d'une commande",
                         "description": """Retourne les données de validation complètes d'une commande livrée, incluant:
-- Signature (image base64)
-- Photo de livraison (image base64)
+- Signature (URL du fichier)
+- Photo de livraison (URL du fichier et de sa miniature)
 - Statut OTP vérifié
 - Score biométrique
 
@@ -1874,7 +2219,8 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
 - Admin: Toutes les commandes""",
                         "security": [{"bearerAuth": []}],
                         "parameters": [
-                            {"name": "order_id", "in": "path", "required": True, "schema": {"type": "integer"}, "description": "ID de la commande"}
+                            {"name": "order_id", "in": "path", "required": True, "schema": {"type": "integer"}, "description": "ID de la commande"},
+                            {"name": "include_data", "in": "query", "required": False, "schema": {"type": "boolean", "default": False}, "description": "Inclure aussi le contenu base64 des fichiers (déconseillé)"}
                         ],
                         "responses": {
                             "200": {
@@ -1916,7 +2262,9 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                                                             "description": "Données signature (null si non requise)",
                                                             "properties": {
                                                                 "provided": {"type": "boolean"},
-                                                                "data": {"type": "string", "description": "Image en base64"},
+                                                                "url": {"type": "string", "description": "URL du fichier"},
+                                                                "size": {"type": "string", "description": "Taille du fichier"},
+                                                                "data": {"type": "string", "description": "Image en base64 (uniquement avec include_data)"},
                                                                 "filename": {"type": "string"}
                                                             }
                                                         },
@@ -1926,7 +2274,10 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                                                             "description": "Données photo (null si non requise)",
                                                             "properties": {
                                                                 "provided": {"type": "boolean"},
-                                                                "data": {"type": "string", "description": "Image en base64"},
+                                                                "url": {"type": "string", "description": "URL du fichier"},
+                                                                "thumbnail_url": {"type": "string", "description": "URL de la miniature (256px)"},
+                                                                "size": {"type": "string", "description": "Taille du fichier"},
+                                                                "data": {"type": "string", "description": "Image en base64 (uniquement avec include_data)"},
                                                                 "filename": {"type": "string"}
                                                             }
                                                         },
@@ -1980,6 +2331,30 @@ Vous pouvez **personnaliser** ces conditions en fournissant explicitement les ch
                         }
                     }
                 },
+                "/smart_delivery/api/delivery/{order_id}/validation-proof/{proof}": {
+                    "get": {
+                        "tags": ["2. Enterprise - Orders", "3. Livreur - Orders"],
+                        "summary": "Télécharger le fichier d'une preuve de validation",
+                        "description": """Sert la signature ou la photo de livraison depuis le filestore.
+
+La réponse porte un ETag (checksum du fichier) et gère les en-têtes If-None-Match (304) et Range (206).
+Mêmes règles d'accès que /validation-proof.""",
+                        "security": [{"bearerAuth": []}],
+                        "parameters": [
+                            {"name": "order_id", "in": "path", "required": True, "schema": {"type": "integer"}, "description": "ID de la commande"},
+                            {"name": "proof", "in": "path", "required": True, "schema": {"type": "string", "enum": ["photo", "signature"]}},
+                            {"name": "thumbnail", "in": "query", "required": False, "schema": {"type": "boolean", "default": False}, "description": "Miniature 256px (photo uniquement)"}
+                        ],
+                        "responses": {
+                            "200": {"description": "Contenu du fichier", "content": {"image/*": {"schema": {"type": "string", "format": "binary"}}}},
+                            "206": {"description": "Partie du fichier (requête Range)"},
+                            "304": {"description": "Non modifié (If-None-Match)"},
+                            "401": {"$ref": "#/components/responses/Unauthorized"},
+                            "403": {"$ref": "#/components/responses/Forbidden"},
+                            "404": {"$ref": "#/components/responses/NotFound"}
+                        }
+                    }
+                },
                 "/smart_delivery/api/delivery/assign": {
                     "post": {
                         "tags": ["2. Enterprise - Orders"],
@@ -2355,10 +2730,26 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                                 "application/json": {
                                     "schema": {
                                         "type": "object",
-                                        "required": ["lat", "long"],
+                                        "description": "Une position (lat/long) ou un lot de positions (points)",
                                         "properties": {
                                             "lat": {"type": "number", "example": 33.5731},
-                                            "long": {"type": "number", "example": -7.5898}
+                                            "long": {"type": "number", "example": -7.5898},
+                                            "points": {
+                                                "type": "array",
+                                                "maxItems": 500,
+                                                "items": {
+                                                    "type": "object",
+                                                    "required": ["lat", "long"],
+                                                    "properties": {
+                                                        "lat": {"type": "number", "example": 33.5731},
+                                                        "long": {"type": "number", "example": -7.5898},
+                                                        "timestamp": {"type": "number", "description": "Date du relevé (epoch en secondes ou millisecondes, ou ISO 8601)"},
+                                                        "speed": {"type": "number", "description": "Vitesse en m/s"},
+                                                        "heading": {"type": "number", "description": "Cap en degrés"},
+                                                        "accuracy": {"type": "number", "description": "Précision en mètres"}
+                                                    }
+                                                }
+                                            }
                                         }
                                     }
                                 }
@@ -2681,7 +3072,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     "get": {
                         "tags": ["8. Driver - Billing", "9. Enterprise - Billing"],
                         "summary": "Télécharger le PDF de la facture",
-                        "description": "Télécharge la facture au format PDF avec le branding de l'entreprise. Accessible au livreur assigné, à l'entreprise propriétaire de la commande et aux administrateurs.",
+                        "description": "Télécharge la facture au format PDF avec le branding de l'entreprise. Accessible au livreur assigné, à l'entreprise propriétaire de la commande et aux administrateurs.\n\nLe PDF est généré une fois par version de la facture. La réponse porte un ETag et gère l'en-tête If-None-Match (304).",
                         "security": [{"bearerAuth": []}],
                         "parameters": [
                             {"name": "order_id", "in": "path", "required": True, "schema": {"type": "integer"}, "description": "ID de la commande"}
@@ -2695,6 +3086,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                                     }
                                 }
                             },
+                            "304": {"description": "Non modifié (If-None-Match)"},
                             "403": {"$ref": "#/components/responses/Forbidden"},
                             "404": {"$ref": "#/components/responses/NotFound"}
                         }
@@ -2786,7 +3178,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     "post": {
                         "tags": ["9. Driver - Notifications"],
                         "summary": "Accepter une commande dispatchée",
-                        "description": "Le livreur accepte une commande qui lui a été proposée via notification.",
+                        "description": "Le livreur accepte une commande qui lui a été proposée via notification. Le premier livreur à accepter obtient la commande ; les autres reçoivent immédiatement une réponse 409.",
                         "security": [{"bearerAuth": []}],
                         "requestBody": {
                             "required": True,
@@ -2818,16 +3210,145 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                                 }
                             },
                             "400": {
-                                "description": "Erreur (ex: commande déjà prise)",
+                                "description": "Erreur (livreur non autorisé, non disponible ou non vérifié)",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {"$ref": "#/components/schemas/Error"}
+                                    }
+                                }
+                            },
+                            "401": {"$ref": "#/components/responses/Unauthorized"},
+                            "409": {
+                                "description": "Commande déjà acceptée par un autre livreur ou plus en dispatch (code ORDER_NOT_AVAILABLE)",
                                 "content": {
                                     "application/json": {
                                         "schema": {"$ref": "#/components/schemas/Error"}
                                     }
                                 }
+                            }
+                        }
+                    }
+                },
+                "/smart_delivery/api/livreur/tour": {
+                    "get": {
+                        "tags": ["5. Driver - Orders"],
+                        "summary": "Tournée optimisée du livreur",
+                        "description": "Séquence des arrêts (enlèvements et livraisons) des commandes assignées et en route du livreur. Chaque enlèvement précède sa livraison. La tournée est recalculée à chaque commande acceptée, enlevée ou terminée.",
+                        "security": [{"bearerAuth": []}],
+                        "responses": {
+                            "200": {
+                                "description": "Arrêts dans l'ordre de passage",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "type": "object",
+                                            "properties": {
+                                                "success": {"type": "boolean"},
+                                                "count": {"type": "integer"},
+                                                "total_distance_km": {"type": "number"},
+                                                "stops": {
+                                                    "type": "array",
+                                                    "items": {
+                                                        "type": "object",
+                                                        "properties": {
+                                                            "sequence": {"type": "integer"},
+                                                            "type": {"type": "string", "enum": ["pickup", "drop"]},
+                                                            "order_id": {"type": "integer"},
+                                                            "order_name": {"type": "string"},
+                                                            "lat": {"type": "number"},
+                                                            "long": {"type": "number"},
+                                                            "leg_distance_km": {"type": "number", "description": "Distance depuis l'arrêt précédent (ou la position du livreur)"}
+                                                        }
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
                             },
                             "401": {"$ref": "#/components/responses/Unauthorized"}
                         }
                     }
+                },
+                "/smart_delivery/api/feed/channels": {
+                    "get": {
+                        "tags": ["10. Live Feed"],
+                        "summary": "Canaux du flux temps réel",
+                        "description": """Retourne les canaux du bus Odoo de l'appelant : un canal par livreur et un canal par entreprise.
+
+Le client ouvre le websocket Odoo (`websocket_url`) et s'abonne avec :
+`{"event_name": "subscribe", "data": {"channels": [...], "last": <last>}}`
+
+Les notifications ont le type `smart_delivery/order` et un payload :
+- `offer` : nouvelle commande proposée au livreur (mêmes données que /orders/available, plus `deadline`)
+- `offer_closed` : la commande n'est plus proposée (acceptée par un autre livreur, annulée...)
+- `status` : changement de statut (`status`, `previous_status`, `assigned_livreur_id`)
+
+Les noms de canaux sont signés : ne les partagez pas.""",
+                        "security": [{"bearerAuth": []}],
+                        "responses": {
+                            "200": {
+                                "description": "Canaux et dernier identifiant du bus",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "type": "object",
+                                            "properties": {
+                                                "success": {"type": "boolean"},
+                                                "channels": {"type": "array", "items": {"type": "string"}},
+                                                "notification_type": {"type": "string", "example": "smart_delivery/order"},
+                                                "last": {"type": "integer"},
+                                                "websocket_url": {"type": "string", "example": "/websocket"}
+                                            }
+                                        }
+                                    }
+                                }
+                            },
+                            "401": {"$ref": "#/components/responses/Unauthorized"},
+                            "403": {"description": "Ni livreur ni entreprise (code NO_FEED)"}
+                        }
+                    }
+                },
+                "/smart_delivery/api/feed": {
+                    "get": {
+                        "tags": ["10. Live Feed"],
+                        "summary": "Notifications du flux depuis un identifiant",
+                        "description": "Alternative au websocket : retourne les notifications du flux postérieures à `last`. Rappeler avec le `last` retourné.",
+                        "security": [{"bearerAuth": []}],
+                        "parameters": [
+                            {"name": "last", "in": "query", "schema": {"type": "integer"}, "description": "Dernier identifiant reçu (0 : notifications récentes)"}
+                        ],
+                        "responses": {
+                            "200": {
+                                "description": "Notifications",
+                                "content": {
+                                    "application/json": {
+                                        "schema": {
+                                            "type": "object",
+                                            "properties": {
+                                                "success": {"type": "boolean"},
+                                                "last": {"type": "integer"},
+                                                "notifications": {
+                                                    "type": "array",
+                                                    "items": {
+                                                        "type": "object",
+                                                        "properties": {
+                                                            "id": {"type": "integer"},
+                                                            "type": {"type": "string"},
+                                                            "payload": {"type": "object"}
+                                                        }
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
+                            },
+                            "400": {"description": "Paramètre last invalide"},
+                            "401": {"$ref": "#/components/responses/Unauthorized"},
+                            "403": {"description": "Ni livreur ni entreprise (code NO_FEED)"}
+                        }
+                    }
                 }
             }
         }
@@ -2909,7 +3430,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             # Get livreur info if user is a livreur
             livreur_info = None
             if user_type == 'livreur':
-                livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
+                livreur = self._get_livreur_for_user(user)
                 if livreur:
                     livreur_info = {
                         'id': livreur.id,
@@ -3030,18 +3551,114 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             self._log_api_call('/smart_delivery/api/delivery/create', kwargs, error_response, 500, e)
             return self._json_response(error_response, 500)
     
-    @http.route('/smart_delivery/api/delivery/status/<int:order_id>', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
-    def get_delivery_status(self, order_id, **kwargs):
-        """GET /smart_delivery/api/delivery/status/<id> - Retourne le statut complet
-        
-        Enterprise users can only see their own company's orders.
-        Admin users can see all orders.
-        Livreurs can see orders assigned to them.
-        """
-        # Handle CORS preflight requests
-        if request.httprequest.method == 'OPTIONS':
-            headers = self._get_cors_headers()
-            return request.make_response('', headers=headers, status=200)
+    @http.route('/smart_delivery/api/delivery/quote', type='http', auth='public', methods=['POST', 'OPTIONS'], csrf=False)
+    def quote_deliveries(self, **kwargs):
+        """POST /smart_delivery/api/delivery/quote - Prix de nombreuses livraisons en une requête
+
+        Request Body:
+        {
+            "sector_type": "standard",      // secteur par défaut des envois
+            "shipments": [
+                {"pickup_lat": 18.08, "pickup_long": -15.97, "drop_lat": 18.1, "drop_long": -15.95,
+                 "sector_type": "express", "reference": "CMD-1"},
+                ...
+            ]
+        }
+
+        The tariffs come from the sector.rule cache and the distances are
+        computed in one vectorized pass: pricing a file of orders costs no query
+        per line. A line in error gets an error instead of a price.
+        """
+        if request.httprequest.method == 'OPTIONS':
+            return request.make_response('', headers=self._get_cors_headers(), status=200)
+
+        auth_error = self._require_auth()
+        if auth_error:
+            return auth_error
+
+        try:
+            data = self._read_request_data()
+        except ValueError:
+            return self._json_response({'error': 'JSON invalide', 'code': 'INVALID_JSON'}, 400)
+        shipments = data.get('shipments')
+        if not isinstance(shipments, list) or not shipments:
+            return self._json_response({'error': 'Le champ "shipments" doit être une liste non vide', 'code': 'MISSING_SHIPMENTS'}, 400)
+        if len(shipments) > QUOTE_MAX_SHIPMENTS:
+            return self._json_response({
+                'error': f'Au plus {QUOTE_MAX_SHIPMENTS} envois par requête',
+                'code': 'TOO_MANY_SHIPMENTS',
+            }, 400)
+
+        try:
+            tariffs = request.env['sector.rule']._get_tariffs()
+            default_sector = data.get('sector_type')
+            quotes = []
+            valid = []  # (quote, tariff, coordinates)
+            for index, shipment in enumerate(shipments):
+                quote = {'index': index}
+                quotes.append(quote)
+                if not isinstance(shipment, dict):
+                    quote.update(error='Envoi invalide', code='INVALID_SHIPMENT')
+                    continue
+                if shipment.get('reference') is not None:
+                    quote['reference'] = shipment['reference']
+                sector_type = shipment.get('sector_type') or default_sector
+                quote['sector_type'] = sector_type
+                if not isinstance(sector_type, str) or sector_type not in tariffs:
+                    quote.update(error=f'Secteur invalide: {sector_type}', code='INVALID_SECTOR')
+                    continue
+                try:
+                    coordinates = tuple(float(shipment[key]) for key in ('pickup_lat', 'pickup_long', 'drop_lat', 'drop_long'))
+                except (KeyError, TypeError, ValueError):
+                    coordinates = None
+                # The range checks also reject nan and inf, which float() accepts
+                if coordinates is None or not all(
+                    -90 <= lat <= 90 and -180 <= long <= 180
+                    for lat, long in (coordinates[:2], coordinates[2:])
+                ):
+                    quote.update(error='Coordonnées pickup/drop manquantes ou invalides', code='INVALID_COORDINATES')
+                    continue
+                valid.append((quote, tariffs[sector_type], coordinates))
+
+            if valid:
+                pickup_lats, pickup_longs, drop_lats, drop_longs = zip(*(coordinates for _quote, _tariff, coordinates in valid))
+                distances = haversine_pairwise(pickup_lats, pickup_longs, drop_lats, drop_longs)
+                base_tariffs, extra_fees = compute_prices([tariff for _quote, tariff, _coordinates in valid], distances)
+                for (quote, tariff, _coordinates), distance, base_tariff, extra_fee in zip(valid, distances, base_tariffs, extra_fees):
+                    quote.update(
+                        distance_km=round(distance, 2),
+                        base_tariff=round(base_tariff, 2),
+                        extra_fee=round(extra_fee, 2),
+                        total_amount=round(base_tariff + extra_fee, 2),
+                        conditions={requirement: getattr(tariff, requirement) for requirement in REQUIREMENT_FIELDS},
+                    )
+
+            return self._json_response({
+                'success': True,
+                'count': len(quotes),
+                'priced': len(valid),
+                'currency': 'MRU',
+                'total_amount': round(sum(quote.get('total_amount', 0.0) for quote in quotes), 2),
+                'quotes': quotes,
+            })
+        except Exception as e:
+            _logger.error(f"Erreur devis livraison: {e}")
+            error_response = {'error': str(e)}
+            self._log_api_call('/smart_delivery/api/delivery/quote', {'count': len(shipments)}, error_response, 500, e)
+            return self._json_response(error_response, 500)
+
+    @http.route('/smart_delivery/api/delivery/status/<int:order_id>', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
+    def get_delivery_status(self, order_id, **kwargs):
+        """GET /smart_delivery/api/delivery/status/<id> - Retourne le statut complet
+        
+        Enterprise users can only see their own company's orders.
+        Admin users can see all orders.
+        Livreurs can see orders assigned to them.
+        """
+        # Handle CORS preflight requests
+        if request.httprequest.method == 'OPTIONS':
+            headers = self._get_cors_headers()
+            return request.make_response('', headers=headers, status=200)
 
         auth_error = self._require_auth()
         if auth_error:
@@ -3070,7 +3687,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             elif user_type == 'livreur':
                 # Livreurs can only see orders assigned to them
-                livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
+                livreur = self._get_livreur_for_user(user)
                 if not livreur or order.assigned_livreur_id.id != livreur.id:
                     return self._json_response({
                         'error': 'Accès refusé. Cette commande ne vous est pas assignée.',
@@ -3109,6 +3726,20 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 'created_at': order.create_date.isoformat() if order.create_date else None,
             }
             
+            # Predicted arrival times while the order is being delivered
+            etas = order._get_etas().get(order.id)
+            if etas:
+                now = fields.Datetime.now()
+                pickup_minutes, delivery_minutes = etas
+                order_data['eta'] = {
+                    'pickup_minutes': round(pickup_minutes, 1) if pickup_minutes is not None else None,
+                    'pickup_at': (now + timedelta(minutes=pickup_minutes)).isoformat() if pickup_minutes is not None else None,
+                    'delivery_minutes': round(delivery_minutes, 1),
+                    'delivery_at': (now + timedelta(minutes=delivery_minutes)).isoformat(),
+                }
+            else:
+                order_data['eta'] = None
+            
             # Add billing info if exists
             if order.billing_id:
                 billing = order.billing_id[0]
@@ -3131,7 +3762,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             # Add validation status if conditions exist
             if order.condition_ids:
-                condition = order.condition_ids[0]
+                condition = order.condition_ids[0].with_context(bin_size=True)
                 order_data['validation'] = {
                     'otp_verified': condition.otp_verified,
                     'signature_provided': bool(condition.signature_file),
@@ -3206,7 +3837,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         Query Parameters:
             - status (optional): Filter by status (draft, assigned, on_way, delivered, failed)
             - limit (optional): Maximum number of orders to return (default: 50)
-            - offset (optional): Number of orders to skip (default: 0)
+            - cursor (optional): Opaque cursor of the next page (pagination.next_cursor of the previous page)
+            - offset (optional): Number of orders to skip when no cursor is given (default: 0)
+            - fields (optional): Comma-separated order keys to return (e.g. "id,reference,status")
         
         Response:
         {
@@ -3216,6 +3849,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 "name": "John Doe",
                 "phone": "+1234567890"
             },
+            "pagination": {"total": 10, "limit": 50, "offset": 0, "next_cursor": "..."},
             "orders_count": 10,
             "orders": [...]
         }
@@ -3236,86 +3870,22 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         try:
             # Get query parameters
             status_filter = kwargs.get('status')
-            limit = int(kwargs.get('limit', 50))
-            offset = int(kwargs.get('offset', 0))
+            available = {key: value for key, value in ORDER_LIST_FIELDS.items() if key != 'livreur'}
             
             # Build domain - only orders assigned to THIS livreur
             domain = [('assigned_livreur_id', '=', livreur.id)]
             if status_filter:
                 domain.append(('status', '=', status_filter))
             
-            # Get orders
-            orders = request.env['delivery.order'].sudo().search(
-                domain,
-                limit=limit,
-                offset=offset,
-                order='create_date desc'
-            )
-            total_count = request.env['delivery.order'].sudo().search_count(domain)
-            
-            # Build orders list with details
-            orders_data = []
-            for order in orders:
-                order_data = {
-                    'id': order.id,
-                    'reference': order.name,
-                    'external_reference': order.reference,
-                    'status': order.status,
-                    'sector_type': order.sector_type,
-                    'sender': {
-                        'id': order.sender_id.id,
-                        'name': order.sender_id.name,
-                        'phone': order.sender_id.phone or '',
-                    },
-                    'receiver': {
-                        'name': order.receiver_name,
-                        'phone': order.receiver_phone,
-                    },
-                    'pickup': {
-                        'lat': order.pickup_lat,
-                        'long': order.pickup_long,
-                    },
-                    'drop': {
-                        'lat': order.drop_lat,
-                        'long': order.drop_long,
-                    },
-                    'distance_km': order.distance_km,
-                    'conditions': {
-                        'otp_required': order.otp_required,
-                        'signature_required': order.signature_required,
-                        'photo_required': order.photo_required,
-                        'biometric_required': order.biometric_required,
-                    },
-                    'created_at': order.create_date.isoformat() if order.create_date else None,
-                }
-                
-                # Add validation status if conditions exist
-                if order.condition_ids:
-                    condition = order.condition_ids[0]
-                    order_data['validation'] = {
-                        'otp_verified': condition.otp_verified,
-                        'otp_value': condition.otp_value if order.otp_required else None,
-                        'signature_provided': bool(condition.signature_file),
-                        'photo_provided': bool(condition.photo),
-                        'biometric_score': condition.biometric_score,
-                        'validated': condition.validated,
-                    }
-                else:
-                    order_data['validation'] = None
-                
-                # Add billing info if exists
-                if order.billing_id:
-                    billing = order.billing_id[0]
-                    order_data['billing'] = {
-                        'base_tariff': billing.base_tariff,
-                        'extra_fee': billing.extra_fee,
-                        'total_amount': billing.total_amount,
-                        'state': billing.state,
-                    }
-                else:
-                    order_data['billing'] = None
-                
-                orders_data.append(order_data)
+            # Get one page of orders and serialize them in batch
+            try:
+                keys = self._get_list_keys(kwargs, available)
+                rows, pagination = self._search_list_page(
+                    request.env['delivery.order'].sudo(), domain, ORDER_LIST_ORDER, keys, available, kwargs,
+                )
+            except ValueError as e:
+                return self._list_error_response(e)
+            orders_data = self._serialize_order_rows(rows, keys, for_livreur=True)
             
             response_data = {
                 'success': True,
@@ -3327,11 +3897,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'availability': livreur.availability,
                     'rating': livreur.rating,
                 },
-                'pagination': {
-                    'total': total_count,
-                    'limit': limit,
-                    'offset': offset,
-                },
+                'pagination': pagination,
                 'orders_count': len(orders_data),
                 'orders': orders_data,
             }
@@ -3421,7 +3987,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         The livreur is automatically detected from JWT token.
         Only orders assigned to the authenticated livreur can be delivered.
         
-        Request Body (depending on order requirements):
+        Request Body (depending on order requirements), JSON or multipart/form-data:
         {
             "otp_value": "123456",           // Required if otp_required is true
             "signature": "base64_data...",   // Required if signature_required is true
@@ -3431,6 +3997,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             "biometric_score": 0.85          // Required if biometric_required is true (min 0.7)
         }
         
+        In multipart/form-data, "signature" and "photo" are file parts
+        (preferred: no base64 overhead). Photos are downscaled to 1920px.
+        
         Response:
         {
             "success": true,
@@ -3447,8 +4016,8 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             return error
         
         try:
-            # Get JSON data from request body
-            data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
+            # Get data from request - support both JSON and multipart form data
+            data = self._read_request_data()
             
             # Validate order exists
             order = request.env['delivery.order'].sudo().browse(order_id)
@@ -3502,28 +4071,36 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             # Validate signature if required
             if order.signature_required:
-                signature = data.get('signature')
-                if not signature:
-                    validation_errors.append('Signature requise mais non fournie')
+                try:
+                    signature, signature_filename = read_upload(
+                        request.httprequest.files, data, 'signature', 'signature.png')
+                except ValueError as e:
+                    signature = None
+                    validation_errors.append(f'Signature: {e}')
                 else:
+                    if not signature:
+                        validation_errors.append('Signature requise mais non fournie')
+                if signature:
                     condition.sudo().write({
-                        'signature_file': signature,
-                        'signature_filename': data.get('signature_filename', 'signature.png'),
+                        'signature_file': prepare_upload(signature),
+                        'signature_filename': signature_filename,
                     })
             
             # Validate photo if required
             if order.photo_required:
-                photo_data = data.get('photo')
-                if not photo_data:
-                    validation_errors.append('Photo requise mais non fournie')
+                try:
+                    photo, photo_filename = read_upload(
+                        request.httprequest.files, data, 'photo', 'delivery_photo.jpg')
+                except ValueError as e:
+                    photo = None
+                    validation_errors.append(f'Photo: {e}')
                 else:
-                    # Handle base64 data with prefix
-                    if isinstance(photo_data, str) and 'base64,' in photo_data:
-                        photo_data = photo_data.split('base64,')[1]
-                    photo_filename = data.get('photo_filename', 'delivery_photo.jpg')
+                    if not photo:
+                        validation_errors.append('Photo requise mais non fournie')
+                if photo:
                     condition.sudo().write({
-                        'photo': photo_data,
-                        'photo_filename': photo_filename
+                        'photo': prepare_upload(photo),
+                        'photo_filename': photo_filename,
                     })
             
             # Validate biometric if required
@@ -3576,8 +4153,8 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 'message': 'Livraison validée avec succès',
                 'validation': {
                     'otp_verified': condition.otp_verified if order.otp_required else None,
-                    'signature_provided': bool(condition.signature_file) if order.signature_required else None,
-                    'photo_provided': bool(condition.photo) if order.photo_required else None,
+                    'signature_provided': bool(condition.with_context(bin_size=True).signature_file) if order.signature_required else None,
+                    'photo_provided': bool(condition.with_context(bin_size=True).photo) if order.photo_required else None,
                     'biometric_score': condition.biometric_score if order.biometric_required else None,
                     'validated': condition.validated,
                 },
@@ -3721,7 +4298,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         - Livreurs: Only for orders assigned to them
         - Admin: All orders
         
-        Response includes base64 encoded images for signature and photo.
+        Signature and photo are returned as URLs of the validation-proof file
+        endpoint (with ETag/Range support); their base64 content is only
+        included with ?include_data=true.
         """
         auth_error = self._require_auth()
         if auth_error:
@@ -3739,30 +4318,12 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'code': 'ORDER_NOT_FOUND'
                 }, 404)
             
-            # Access control based on user type
-            if user_type == 'enterprise':
-                partner = user.partner_id
-                company_partner_id = partner.commercial_partner_id.id if partner.commercial_partner_id else partner.id
-                sender_company_id = order.sender_id.commercial_partner_id.id if order.sender_id.commercial_partner_id else order.sender_id.id
-                
-                if sender_company_id != company_partner_id and order.sender_id.parent_id.id != company_partner_id:
-                    return self._json_response({
-                        'success': False,
-                        'error': 'Accès refusé. Cette commande ne vous appartient pas.',
-                        'code': 'ACCESS_DENIED'
-                    }, 403)
-            
-            elif user_type == 'livreur':
-                livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
-                if not livreur or order.assigned_livreur_id.id != livreur.id:
-                    return self._json_response({
-                        'success': False,
-                        'error': 'Accès refusé. Cette commande ne vous est pas assignée.',
-                        'code': 'ORDER_NOT_ASSIGNED_TO_YOU'
-                    }, 403)
+            access_error = self._check_proof_access(order, user, user_type)
+            if access_error:
+                return access_error
             
             # Get the condition record
-            condition = order.condition_ids[0] if order.condition_ids else None
+            condition = order.condition_ids[:1]
             
             if not condition:
                 return self._json_response({
@@ -3771,6 +4332,10 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'code': 'NO_VALIDATION_DATA'
                 }, 404)
             
+            include_data = str(kwargs.get('include_data', '')).lower() in ('1', 'true', 'yes')
+            sizes = condition.with_context(bin_size=True)
+            proof_url = f'/smart_delivery/api/delivery/{order.id}/validation-proof'
+            
             # Build response with full validation data
             validation_data = {
                 'order_id': order.id,
@@ -3787,13 +4352,16 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'verified': condition.otp_verified,
                 } if order.otp_required else None,
                 'signature': {
-                    'provided': bool(condition.signature_file),
-                    'data': condition.signature_file.decode('utf-8') if condition.signature_file else None,
+                    'provided': bool(sizes.signature_file),
+                    'url': f'{proof_url}/signature' if sizes.signature_file else None,
+                    'size': sizes.signature_file or None,
                     'filename': condition.signature_filename,
                 } if order.signature_required else None,
                 'photo': {
-                    'provided': bool(condition.photo),
-                    'data': condition.photo.decode('utf-8') if condition.photo else None,
+                    'provided': bool(sizes.photo),
+                    'url': f'{proof_url}/photo' if sizes.photo else None,
+                    'thumbnail_url': f'{proof_url}/photo?thumbnail=1' if sizes.photo_thumbnail else None,
+                    'size': sizes.photo or None,
                     'filename': condition.photo_filename,
                 } if order.photo_required else None,
                 'biometric': {
@@ -3801,6 +4369,11 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'score': condition.biometric_score,
                 } if order.biometric_required else None,
             }
+            if include_data:
+                if validation_data['signature']:
+                    validation_data['signature']['data'] = condition.signature_file.decode('utf-8') if condition.signature_file else None
+                if validation_data['photo']:
+                    validation_data['photo']['data'] = condition.photo.decode('utf-8') if condition.photo else None
             
             response_data = {
                 'success': True,
@@ -3816,18 +4389,176 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             self._log_api_call(f'/smart_delivery/api/delivery/{order_id}/validation-proof', {}, error_response, 500, e)
             return self._json_response(error_response, 500)
     
+    @http.route('/smart_delivery/api/delivery/<int:order_id>/validation-proof/<string:proof>', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
+    def get_validation_proof_file(self, order_id, proof, **kwargs):
+        """
+        GET /smart_delivery/api/delivery/<order_id>/validation-proof/<photo|signature>
+        
+        Streams the file of a delivery proof from the filestore, same access
+        rules as the validation-proof endpoint. Responses carry an ETag (the
+        attachment checksum) and support If-None-Match and Range requests.
+        
+        Query: thumbnail=1 for the 256px thumbnail of the photo.
+        """
+        if request.httprequest.method == 'OPTIONS':
+            headers = self._get_cors_headers()
+            return request.make_response('', headers=headers, status=200)
+        
+        auth_error = self._require_auth()
+        if auth_error:
+            return auth_error
+        
+        try:
+            if proof not in PROOF_FIELDS:
+                return self._json_response({
+                    'success': False,
+                    'error': f'Preuve inconnue: {proof}',
+                    'code': 'INVALID_PROOF'
+                }, 404)
+            
+            user = self._get_current_user()
+            order = request.env['delivery.order'].sudo().browse(order_id)
+            if not order.exists():
+                return self._json_response({
+                    'success': False,
+                    'error': 'Commande non trouvée',
+                    'code': 'ORDER_NOT_FOUND'
+                }, 404)
+            
+            access_error = self._check_proof_access(order, user, self._get_user_type(user))
+            if access_error:
+                return access_error
+            
+            field_name, thumbnail_field = PROOF_FIELDS[proof]
+            if str(kwargs.get('thumbnail', '')).lower() in ('1', 'true', 'yes') and thumbnail_field:
+                field_name = thumbnail_field
+            
+            condition = order.condition_ids[:1]
+            if not condition or not condition.with_context(bin_size=True)[field_name]:
+                return self._json_response({
+                    'success': False,
+                    'error': 'Aucun fichier pour cette preuve',
+                    'code': 'NO_VALIDATION_DATA'
+                }, 404)
+            
+            stream = request.env['ir.binary']._get_stream_from(
+                condition, field_name,
+                filename=condition.signature_filename if proof == 'signature' else condition.photo_filename,
+            )
+            response = stream.get_response(as_attachment=False)
+            for header, value in self._get_cors_headers():
+                response.headers[header] = value
+            return response
+            
+        except Exception as e:
+            _logger.error(f"Error streaming validation proof {proof} for order {order_id}: {e}")
+            error_response = {'success': False, 'error': str(e), 'code': 'VALIDATION_PROOF_ERROR'}
+            self._log_api_call(f'/smart_delivery/api/delivery/{order_id}/validation-proof/{proof}', {}, error_response, 500, e)
+            return self._json_response(error_response, 500)
+    
+    def _check_proof_access(self, order, user, user_type):
+        """Error response if the user may not see the validation proof of the order, None otherwise"""
+        if user_type == 'enterprise':
+            partner = user.partner_id
+            company_partner_id = partner.commercial_partner_id.id if partner.commercial_partner_id else partner.id
+            sender_company_id = order.sender_id.commercial_partner_id.id if order.sender_id.commercial_partner_id else order.sender_id.id
+            
+            if sender_company_id != company_partner_id and order.sender_id.parent_id.id != company_partner_id:
+                return self._json_response({
+                    'success': False,
+                    'error': 'Accès refusé. Cette commande ne vous appartient pas.',
+                    'code': 'ACCESS_DENIED'
+                }, 403)
+        
+        elif user_type == 'livreur':
+            livreur = self._get_livreur_for_user(user)
+            if not livreur or order.assigned_livreur_id.id != livreur.id:
+                return self._json_response({
+                    'success': False,
+                    'error': 'Accès refusé. Cette commande ne vous est pas assignée.',
+                    'code': 'ORDER_NOT_ASSIGNED_TO_YOU'
+                }, 403)
+        return None
+    
+    def _parse_location_points(self, data, livreur_id):
+        """Validate the GPS fixes of a location update.
+
+        Accepts a single fix ({"lat", "long"}) or a batch ({"points": [...]}).
+        Each fix may carry a "timestamp" (epoch seconds or milliseconds, or ISO
+        8601), defaulting to the reception time; fixes from the future are
+        clamped to now.
+
+        :return: list of points for delivery.livreur._ingest_positions
+        :raise ValueError: on missing or invalid coordinates
+        """
+        raw_points = data.get('points')
+        if raw_points is None:
+            raw_points = [data]
+        if not isinstance(raw_points, list) or not raw_points:
+            raise ValueError('points doit être une liste non vide')
+        if len(raw_points) > LOCATION_MAX_POINTS:
+            raise ValueError(f'{LOCATION_MAX_POINTS} points maximum par requête')
+
+        now = fields.Datetime.now()
+        points = []
+        for raw in raw_points:
+            lat = raw.get('lat')
+            long = raw.get('long')
+            if lat is None or long is None:
+                raise ValueError('lat et long requis')
+            lat, long = float(lat), float(long)
+            if not (-90 <= lat <= 90 and -180 <= long <= 180):
+                raise ValueError(f'Coordonnées invalides: {lat}, {long}')
+
+            timestamp = raw.get('timestamp')
+            if timestamp is None:
+                recorded_at = now
+            elif isinstance(timestamp, (int, float)):
+                if timestamp > 1e11:  # milliseconds
+                    timestamp /= 1000.0
+                try:
+                    recorded_at = datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+                except (ValueError, OverflowError, OSError):
+                    raise ValueError(f'Timestamp invalide: {raw["timestamp"]}')
+            else:
+                recorded_at = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+                if recorded_at.tzinfo:
+                    recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+            points.append({
+                'livreur_id': livreur_id,
+                'lat': lat,
+                'long': long,
+                'recorded_at': min(recorded_at, now),
+                'speed': raw.get('speed') and float(raw['speed']),
+                'heading': raw.get('heading') and float(raw['heading']),
+                'accuracy': raw.get('accuracy') and float(raw['accuracy']),
+            })
+        return points
+
     @http.route('/smart_delivery/api/livreur/location', type='http', auth='public', methods=['POST', 'OPTIONS'], csrf=False)
     def update_livreur_location(self, **kwargs):
         """
         POST /smart_delivery/api/livreur/location - Update GPS location for the authenticated livreur
         
         The livreur is automatically detected from JWT token.
+        Several fixes recorded offline or at a high frequency can be sent at
+        once; the most recent one becomes the current position and all of them
+        are kept in the position history. Successful calls are not written to
+        the API logs.
         
         Request Body:
         {
             "lat": 33.5731,
             "long": -7.5898
         }
+        or
+        {
+            "points": [
+                {"lat": 33.5731, "long": -7.5898, "timestamp": 1717171717, "speed": 8.2, "heading": 90, "accuracy": 5},
+                ...
+            ]
+        }
         """
         # Check auth and get livreur
         livreur, error = self._require_livreur()
@@ -3837,29 +4568,25 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         try:
             # Get JSON data from request body
             data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
-            lat = data.get('lat')
-            long = data.get('long')
-            
-            if lat is None or long is None:
+            try:
+                points = self._parse_location_points(data, livreur.id)
+            except (TypeError, ValueError, AttributeError) as e:
                 return self._json_response({
-                    'error': 'lat et long requis',
-                    'code': 'MISSING_COORDINATES'
+                    'error': str(e),
+                    'code': 'MISSING_COORDINATES' if 'requis' in str(e) else 'INVALID_COORDINATES'
                 }, 400)
             
-            livreur.sudo().write({
-                'current_lat': float(lat),
-                'current_long': float(long),
-            })
+            Livreur = request.env['delivery.livreur'].sudo()
+            Livreur._ingest_positions(points)
+            livreur = Livreur.browse(livreur.id)
             
-            response_data = {
+            return self._json_response({
                 'success': True,
                 'livreur_id': livreur.id,
                 'lat': livreur.current_lat,
                 'long': livreur.current_long,
-            }
-            
-            self._log_api_call('/smart_delivery/api/livreur/location', data, response_data)
-            return self._json_response(response_data)
+                'points_count': len(points),
+            })
             
         except Exception as e:
             _logger.error(f"Erreur mise à jour position livreur: {e}")
@@ -3897,31 +4624,16 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         try:
             DeliveryOrder = request.env['delivery.order'].sudo()
             
-            # Base domain: orders assigned to this livreur
-            base_domain = [('assigned_livreur_id', '=', livreur.id)]
-            
-            # Today's date range (start and end of today)
+            # Today's date range (start of today)
             today_start = fields.Datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            
-            # Count today's deliveries (created or assigned today)
-            today_domain = base_domain + [
-                ('create_date', '>=', today_start),
-                ('create_date', '<', today_end)
-            ]
-            today_count = DeliveryOrder.search_count(today_domain)
             
-            # Count in progress (assigned + on_way)
-            in_progress_domain = base_domain + [('status', 'in', ['assigned', 'on_way'])]
-            in_progress_count = DeliveryOrder.search_count(in_progress_domain)
-            
-            # Count delivered (all time)
-            delivered_domain = base_domain + [('status', '=', 'delivered')]
-            delivered_count = DeliveryOrder.search_count(delivered_domain)
-            
-            # Count failed (all time)
-            failed_domain = base_domain + [('status', '=', 'failed')]
-            failed_count = DeliveryOrder.search_count(failed_domain)
+            # All counters in one grouped query over the orders assigned to this livreur
+            counts, today_count = DeliveryOrder._get_status_counts(
+                [('assigned_livreur_id', '=', livreur.id)], since=today_start,
+            )
+            in_progress_count = counts['assigned'] + counts['on_way']
+            delivered_count = counts['delivered']
+            failed_count = counts['failed']
             
             response_data = {
                 'success': True,
@@ -4064,6 +4776,10 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         Creates the invoice if it doesn't exist, then posts it.
         Returns invoice information and PDF download URL.
         
+        The deliveries of enterprises invoiced daily or weekly are not invoiced
+        one by one: until the consolidated invoice of their period is created,
+        the endpoint answers 409 INVOICE_CONSOLIDATED with that period.
+        
         Response:
         {
             "success": true,
@@ -4124,10 +4840,26 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'code': 'BILLING_NOT_FOUND'
                 }, 404)
             
-            # Create invoice if it doesn't exist
+            # Deliveries of enterprises invoiced daily or weekly wait for the consolidated invoice of their period
+            invoicing_mode = billing.enterprise_id.invoicing_mode
+            if not billing.invoice_id and invoicing_mode in ('daily', 'weekly'):
+                period_start, period_label = billing._get_invoicing_period(invoicing_mode)
+                return self._json_response({
+                    'error': 'Cette livraison sera facturée à l\'entreprise sur sa facture consolidée',
+                    'code': 'INVOICE_CONSOLIDATED',
+                    'invoicing_period': {
+                        'mode': invoicing_mode,
+                        'start': str(period_start),
+                        'label': period_label,
+                    },
+                }, 409)
+            
+            # Create invoice if the invoicing queue has not done it yet
             if not billing.invoice_id:
                 try:
-                    billing.action_create_invoice()
+                    billing._lock_uninvoiced()._create_invoices()
+                    if not billing.invoice_id:
+                        raise UserError(billing.invoice_error or 'Facture non créée')
                 except Exception as e:
                     return self._json_response({
                         'error': f'Erreur lors de la création de la facture: {str(e)}',
@@ -4301,6 +5033,11 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             # Register payment using quick pay cash method
             try:
                 billing.action_quick_pay_cash()
+            except UserError as e:
+                return self._json_response({
+                    'error': str(e),
+                    'code': 'PAYMENT_REFUSED'
+                }, 400)
             except Exception as e:
                 return self._json_response({
                     'error': f'Erreur lors de l\'enregistrement du paiement: {str(e)}',
@@ -4354,7 +5091,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         
         The assigned livreur, the enterprise that owns the order, or an admin
         can download the invoice PDF.
-        Returns the PDF file for the enterprise invoice report.
+        Returns the PDF file for the enterprise invoice report. The PDF is
+        cached as an attachment of the invoice until the invoice changes;
+        responses carry an ETag and support If-None-Match (304).
         
         Response: PDF file download
         """
@@ -4383,7 +5122,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             # Access control
             if user_type == 'livreur':
                 # Only the assigned livreur can download the invoice PDF
-                livreur = request.env['delivery.livreur'].sudo().search([('user_id', '=', user.id)], limit=1)
+                livreur = self._get_livreur_for_user(user)
                 if not livreur or order.assigned_livreur_id.id != livreur.id:
                     return self._json_response({
                         'error': 'Vous n\'êtes pas assigné à cette commande',
@@ -4416,23 +5155,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'code': 'NO_INVOICE'
                 }, 404)
             
-            # Generate PDF using the custom report (use sudo to bypass portal user restrictions)
-            report = request.env(user=1).ref('smart_delivery.action_report_delivery_invoice', raise_if_not_found=False)
-            if not report:
-                # Fallback to standard invoice report
-                report = request.env(user=1).ref('account.account_invoices', raise_if_not_found=False)
-            
-            if not report:
-                return self._json_response({
-                    'error': 'Rapport de facture non trouvé',
-                    'code': 'REPORT_NOT_FOUND'
-                }, 500)
-            
+            # The PDF is rendered once per version of the invoice, then served from its attachment
             try:
-                pdf_content, content_type = report.sudo()._render_qweb_pdf(
-                    report.report_name,
-                    [billing.invoice_id.id]
-                )
+                attachment = billing.invoice_id.sudo()._get_delivery_pdf()
             except Exception as e:
                 _logger.error(f"Erreur génération PDF: {e}")
                 return self._json_response({
@@ -4440,19 +5165,13 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'code': 'PDF_GENERATION_ERROR'
                 }, 500)
             
-            # Create response with PDF (include CORS headers)
+            # Create response with PDF (include CORS headers); the ETag is the checksum of the PDF
             invoice_name = billing.invoice_id.name or f"Invoice_{billing.invoice_id.id}"
             filename = f"Facture_{str(invoice_name).replace('/', '_')}.pdf"
-            headers = self._get_cors_headers()
-            headers.extend([
-                ('Content-Type', 'application/pdf'),
-                ('Content-Disposition', f'attachment; filename="{filename}"'),
-                ('Content-Length', len(pdf_content)),
-            ])
-            response = request.make_response(
-                pdf_content,
-                headers=headers,
-            )
+            stream = request.env['ir.binary']._get_stream_from(attachment, filename=filename)
+            response = stream.get_response(as_attachment=True)
+            for header, value in self._get_cors_headers():
+                response.headers[header] = value
             
             self._log_api_call(f'/smart_delivery/api/livreur/orders/{order_id}/invoice-pdf', {}, {'success': True, 'filename': filename})
             return response
@@ -4586,32 +5305,20 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         
         try:
             # Get data from request - support both JSON and multipart form data
-            if request.httprequest.content_type and 'application/json' in request.httprequest.content_type:
-                data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
-            else:
-                # Multipart form data
-                data = dict(request.httprequest.form)
+            data = self._read_request_data()
             
             # Check if at least one field is provided
             name = data.get('name', '').strip() if data.get('name') else None
-            photo_data = None
-            photo_filename = None
-            
-            # Check for file upload in multipart form
-            if 'livreur_photo' in request.httprequest.files:
-                file = request.httprequest.files['livreur_photo']
-                if file and file.filename:
-                    import base64
-                    photo_data = base64.b64encode(file.read()).decode('utf-8')
-                    photo_filename = file.filename
-            
-            # Check for base64 data in JSON/form data
-            elif data.get('livreur_photo'):
-                photo_data = data.get('livreur_photo')
-                # If it already contains data: prefix, extract base64 part
-                if isinstance(photo_data, str) and 'base64,' in photo_data:
-                    photo_data = photo_data.split('base64,')[1]
-                photo_filename = data.get('livreur_photo_filename', 'photo.jpg')
+            # Multipart file upload, or base64 data in JSON/form data
+            try:
+                photo_raw, photo_filename = read_upload(request.httprequest.files, data, 'livreur_photo', 'photo.jpg')
+            except ValueError as e:
+                return self._json_response({
+                    'success': False,
+                    'error': str(e),
+                    'code': 'INVALID_FILE'
+                }, 400)
+            photo_data = prepare_upload(photo_raw)
             
             if not name and not photo_data:
                 return self._json_response({
@@ -4638,7 +5345,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 'livreur': {
                     'id': livreur.id,
                     'name': livreur.name,
-                    'has_photo': bool(livreur.livreur_photo),
+                    'has_photo': bool(livreur.with_context(bin_size=True).livreur_photo),
                 }
             }
             
@@ -4780,7 +5487,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 }, 403)
             
             # Get the condition record
-            condition = request.env['delivery.condition'].sudo().search([
+            condition = request.env['delivery.condition'].sudo().with_context(bin_size=True).search([
                 ('order_id', '=', order.id)
             ], limit=1)
             
@@ -4846,7 +5553,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         Query Parameters:
             - status (optional): Filter by status (draft, assigned, on_way, delivered, failed)
             - limit (optional): Maximum number of orders to return (default: 50)
-            - offset (optional): Number of orders to skip (default: 0)
+            - cursor (optional): Opaque cursor of the next page (pagination.next_cursor of the previous page)
+            - offset (optional): Number of orders to skip when no cursor is given (default: 0)
+            - fields (optional): Comma-separated order keys to return (e.g. "id,reference,status")
         
         Response:
         {
@@ -4855,6 +5564,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 "id": 1,
                 "name": "Company Name"
             },
+            "pagination": {"total": 10, "limit": 50, "offset": 0, "next_cursor": "..."},
             "orders_count": 10,
             "orders": [...]
         }
@@ -4874,8 +5584,6 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             # Get query parameters
             status_filter = kwargs.get('status')
-            limit = int(kwargs.get('limit', 50))
-            offset = int(kwargs.get('offset', 0))
             
             # Build domain based on user type
             domain = []
@@ -4894,83 +5602,15 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             if status_filter:
                 domain.append(('status', '=', status_filter))
             
-            # Get orders
-            orders = request.env['delivery.order'].sudo().search(
-                domain,
-                limit=limit,
-                offset=offset,
-                order='create_date desc'
-            )
-            total_count = request.env['delivery.order'].sudo().search_count(domain)
-            
-            # Build orders list with details
-            orders_data = []
-            for order in orders:
-                order_data = {
-                    'id': order.id,
-                    'reference': order.name,
-                    'external_reference': order.reference,
-                    'status': order.status,
-                    'sector_type': order.sector_type,
-                    'sender': {
-                        'id': order.sender_id.id,
-                        'name': order.sender_id.name,
-                    },
-                    'receiver': {
-                        'name': order.receiver_name,
-                        'phone': order.receiver_phone,
-                    },
-                    'pickup': {
-                        'lat': order.pickup_lat,
-                        'long': order.pickup_long,
-                    },
-                    'drop': {
-                        'lat': order.drop_lat,
-                        'long': order.drop_long,
-                    },
-                    'distance_km': order.distance_km,
-                    'livreur': {
-                        'id': order.assigned_livreur_id.id,
-                        'name': order.assigned_livreur_id.name,
-                        'phone': order.assigned_livreur_id.phone,
-                    } if order.assigned_livreur_id else None,
-                    'created_at': order.create_date.isoformat() if order.create_date else None,
-                }
-                
-                # Add billing info if exists
-                if order.billing_id:
-                    billing = order.billing_id[0]
-                    order_data['billing'] = {
-                        'base_tariff': billing.base_tariff,
-                        'extra_fee': billing.extra_fee,
-                        'total_amount': billing.total_amount,
-                        'state': billing.state,
-                    }
-                else:
-                    order_data['billing'] = None
-                
-                # Add validation conditions
-                order_data['conditions'] = {
-                    'otp_required': order.otp_required,
-                    'signature_required': order.signature_required,
-                    'photo_required': order.photo_required,
-                    'biometric_required': order.biometric_required,
-                }
-                
-                # Add validation status if conditions exist
-                if order.condition_ids:
-                    condition = order.condition_ids[0]
-                    order_data['validation'] = {
-                        'otp_verified': condition.otp_verified,
-                        'signature_provided': bool(condition.signature_file),
-                        'photo_provided': bool(condition.photo),
-                        'biometric_score': condition.biometric_score,
-                        'validated': condition.validated,
-                    }
-                else:
-                    order_data['validation'] = None
-                
-                orders_data.append(order_data)
+            # Get one page of orders and serialize them in batch
+            try:
+                keys = self._get_list_keys(kwargs, ORDER_LIST_FIELDS)
+                rows, pagination = self._search_list_page(
+                    request.env['delivery.order'].sudo(), domain, ORDER_LIST_ORDER, keys, ORDER_LIST_FIELDS, kwargs,
+                )
+            except ValueError as e:
+                return self._list_error_response(e)
+            orders_data = self._serialize_order_rows(rows, keys)
             
             # Enterprise info
             enterprise_info = None
@@ -4985,11 +5625,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 'success': True,
                 'user_type': user_type,
                 'enterprise': enterprise_info,
-                'pagination': {
-                    'total': total_count,
-                    'limit': limit,
-                    'offset': offset,
-                },
+                'pagination': pagination,
                 'orders_count': len(orders_data),
                 'orders': orders_data,
             }
@@ -5138,7 +5774,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         Query Parameters:
             - state (optional): Filter by state (draft, confirmed, paid, cancelled)
             - limit (optional): Maximum number of billings to return (default: 50)
-            - offset (optional): Number of billings to skip (default: 0)
+            - cursor (optional): Opaque cursor of the next page (pagination.next_cursor of the previous page)
+            - offset (optional): Number of billings to skip when no cursor is given (default: 0)
+            - fields (optional): Comma-separated billing keys to return (e.g. "id,total_amount,state")
         
         Response:
         {
@@ -5158,8 +5796,6 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             # Get query parameters
             state_filter = kwargs.get('state')
-            limit = int(kwargs.get('limit', 50))
-            offset = int(kwargs.get('offset', 0))
             
             # Build domain based on user type
             domain = []
@@ -5178,32 +5814,32 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             if state_filter:
                 domain.append(('state', '=', state_filter))
             
-            # Get billings
-            billings = request.env['delivery.billing'].sudo().search(
-                domain,
-                limit=limit,
-                offset=offset,
-                order='id desc'
-            )
-            total_count = request.env['delivery.billing'].sudo().search_count(domain)
+            # Get one page of billings and serialize them in batch
+            try:
+                keys = self._get_list_keys(kwargs, BILLING_LIST_FIELDS)
+                rows, pagination = self._search_list_page(
+                    request.env['delivery.billing'].sudo(), domain, BILLING_LIST_ORDER, keys, BILLING_LIST_FIELDS, kwargs,
+                )
+            except ValueError as e:
+                return self._list_error_response(e)
+            
+            orders = {}
+            if 'order' in keys:
+                orders = self._read_by_id('delivery.order', [row['order_id'] for row in rows], ['name', 'status'])
             
-            # Build billings list with details
             billings_data = []
-            for billing in billings:
-                billing_data = {
-                    'id': billing.id,
-                    'order': {
-                        'id': billing.order_id.id,
-                        'reference': billing.order_id.name,
-                        'status': billing.order_id.status,
-                    },
-                    'distance_km': billing.distance_km,
-                    'base_tariff': billing.base_tariff,
-                    'extra_fee': billing.extra_fee,
-                    'total_amount': billing.total_amount,
-                    'state': billing.state,
-                    'notes': billing.notes,
-                }
+            for row in rows:
+                billing_data = {}
+                for key in keys:
+                    if key == 'order':
+                        order = orders.get(row['order_id'], {})
+                        billing_data['order'] = {
+                            'id': row['order_id'],
+                            'reference': order.get('name'),
+                            'status': order.get('status'),
+                        }
+                    else:
+                        billing_data[key] = row[key]
                 billings_data.append(billing_data)
             
             # Enterprise info
@@ -5219,11 +5855,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 'success': True,
                 'user_type': user_type,
                 'enterprise': enterprise_info,
-                'pagination': {
-                    'total': total_count,
-                    'limit': limit,
-                    'offset': offset,
-                },
+                'pagination': pagination,
                 'billings_count': len(billings_data),
                 'billings': billings_data,
             }
@@ -5279,14 +5911,15 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     ('sender_id.parent_id', '=', company_partner_id)
                 ]
             
-            # Count statistics
-            total_orders = DeliveryOrder.search_count(base_domain)
-            delivered_count = DeliveryOrder.search_count(base_domain + [('status', '=', 'delivered')])
-            in_progress_count = DeliveryOrder.search_count(base_domain + [('status', 'in', ['assigned', 'on_way'])])
-            failed_count = DeliveryOrder.search_count(base_domain + [('status', '=', 'failed')])
-            draft_count = DeliveryOrder.search_count(base_domain + [('status', '=', 'draft')])
+            # Count statistics (one grouped query)
+            counts, _today_count = DeliveryOrder._get_status_counts(base_domain)
+            total_orders = sum(counts.values())
+            delivered_count = counts['delivered']
+            in_progress_count = counts['assigned'] + counts['on_way']
+            failed_count = counts['failed']
+            draft_count = counts['draft']
             
-            # Calculate total spent
+            # Calculate total spent (SQL sums per billing state)
             billing_domain = []
             if user_type == 'enterprise':
                 billing_domain = [
@@ -5295,9 +5928,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     ('order_id.sender_id.parent_id', '=', company_partner_id)
                 ]
             
-            billings = DeliveryBilling.search(billing_domain)
-            total_spent = sum(b.total_amount for b in billings)
-            total_paid = sum(b.total_amount for b in billings if b.state == 'paid')
+            amounts = DeliveryBilling._get_amount_stats(billing_domain)
+            total_spent = sum(amounts.values())
+            total_paid = amounts.get('paid', 0.0)
             
             # Enterprise info
             enterprise_info = None
@@ -5344,7 +5977,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             - available_only (optional): If true, only return available livreurs (default: true)
             - verified_only (optional): If true, only return verified livreurs (default: false)
             - limit (optional): Maximum number of livreurs to return (default: 50)
-            - offset (optional): Number of livreurs to skip (default: 0)
+            - cursor (optional): Opaque cursor of the next page (pagination.next_cursor of the previous page)
+            - offset (optional): Number of livreurs to skip when no cursor is given (default: 0)
+            - fields (optional): Comma-separated livreur keys to return (e.g. "id,name,current_location")
         
         Response:
         {
@@ -5367,8 +6002,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             sector_code = (kwargs.get('sector') or '').strip()
             # Build dynamic list of valid sector codes from sector.rule
             sector_model = request.env['sector.rule'].sudo()
-            sector_rules = sector_model.search([])
-            valid_sectors = [r.sector_type for r in sector_rules if r.sector_type]
+            valid_sectors = list(sector_model._get_tariffs())
 
             if not sector_code:
                 return self._json_response({
@@ -5387,11 +6021,9 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             
             available_only = kwargs.get('available_only', 'true').lower() == 'true'
             verified_only = kwargs.get('verified_only', 'false').lower() == 'true'
-            limit = int(kwargs.get('limit', 50))
-            offset = int(kwargs.get('offset', 0))
             
             # Find the sector rule
-            sector_rule = request.env['sector.rule'].sudo().search([('sector_type', '=', sector_code)], limit=1)
+            sector_rule = sector_model._get_rule(sector_code)
             if not sector_rule:
                 return self._json_response({
                     'error': f'Règle de secteur non trouvée: {sector_code}',
@@ -5407,32 +6039,37 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             if verified_only:
                 domain.append(('verified', '=', True))
             
-            # Search livreurs
-            livreurs = request.env['delivery.livreur'].sudo().search(
-                domain,
-                limit=limit,
-                offset=offset,
-                order='rating desc, name asc'
-            )
-            total_count = request.env['delivery.livreur'].sudo().search_count(domain)
+            # Get one page of livreurs and serialize them in batch
+            try:
+                keys = self._get_list_keys(kwargs, LIVREUR_LIST_FIELDS)
+                rows, pagination = self._search_list_page(
+                    request.env['delivery.livreur'].sudo(), domain, LIVREUR_LIST_ORDER, keys, LIVREUR_LIST_FIELDS, kwargs,
+                )
+            except ValueError as e:
+                return self._list_error_response(e)
+            
+            sector_types = {}
+            if 'sectors' in keys:
+                sector_types = {
+                    rule_id: values['sector_type']
+                    for rule_id, values in self._read_by_id(
+                        'sector.rule', [rule_id for row in rows for rule_id in row['sector_ids']], ['sector_type'],
+                    ).items()
+                }
             
-            # Build livreurs list
             livreurs_data = []
-            for livreur in livreurs:
-                livreur_data = {
-                    'id': livreur.id,
-                    'name': livreur.name,
-                    'phone': livreur.phone,
-                    'vehicle_type': livreur.vehicle_type,
-                    'availability': livreur.availability,
-                    'verified': livreur.verified,
-                    'rating': livreur.rating,
-                    'sectors': [s.sector_type for s in livreur.sector_ids],
-                    'current_location': {
-                        'lat': livreur.current_lat,
-                        'long': livreur.current_long,
-                    } if livreur.current_lat and livreur.current_long else None,
-                }
+            for row in rows:
+                livreur_data = {}
+                for key in keys:
+                    if key == 'sectors':
+                        livreur_data['sectors'] = [sector_types[rule_id] for rule_id in row['sector_ids'] if rule_id in sector_types]
+                    elif key == 'current_location':
+                        livreur_data['current_location'] = {
+                            'lat': row['current_lat'],
+                            'long': row['current_long'],
+                        } if row['current_lat'] and row['current_long'] else None
+                    else:
+                        livreur_data[key] = row[key]
                 livreurs_data.append(livreur_data)
             
             response_data = {
@@ -5452,11 +6089,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'available_only': available_only,
                     'verified_only': verified_only,
                 },
-                'pagination': {
-                    'total': total_count,
-                    'limit': limit,
-                    'offset': offset,
-                },
+                'pagination': pagination,
                 'livreurs_count': len(livreurs_data),
                 'livreurs': livreurs_data,
             }
@@ -5613,10 +6246,22 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
             if not order.exists():
                 return self._json_response({'error': 'Order not found', 'code': 'ORDER_NOT_FOUND'}, 404)
                 
-            result = order.action_accept_delivery(livreur.id)
+            for attempt in range(ACCEPT_MAX_TRIES):
+                try:
+                    result = order.action_accept_delivery(livreur.id)
+                    break
+                except pg_errors.SerializationFailure:
+                    # The order was changed meanwhile (next batch, accepted...):
+                    # retry in a new transaction, which sees its current status
+                    if attempt == ACCEPT_MAX_TRIES - 1:
+                        raise
+                    request.env.cr.rollback()
+                    time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
             
             if result.get('error'):
-                return self._json_response({'success': False, 'error': result['error'], 'code': result.get('code')}, 400)
+                # Order taken by another livreur (or no longer dispatched): conflict
+                status = 409 if result.get('code') == 'ORDER_NOT_AVAILABLE' else 400
+                return self._json_response({'success': False, 'error': result['error'], 'code': result.get('code')}, status)
                 
             return self._json_response({'success': True, 'message': 'Order accepted'})
             
@@ -5644,8 +6289,11 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                 ('dispatched_livreur_ids', 'in', [livreur.id])
             ])
             
+            deadlines = orders._get_dispatch_deadline_datetimes()
+            now = fields.Datetime.now()
             orders_data = []
             for order in orders:
+                batch_deadline = deadlines.get(order.id, (None, None))[0]
                 orders_data.append({
                     'id': order.id,
                     'name': order.name,
@@ -5657,7 +6305,7 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
                     'sender': order.sender_id.name,
                     'created_at': order.create_date,
                     'dispatch_start_time': order.dispatch_start_time,
-                    'time_remaining': max(0, 30 - (fields.Datetime.now() - order.dispatch_start_time).total_seconds()) if order.dispatch_start_time else 0
+                    'time_remaining': max(0, (batch_deadline - now).total_seconds()) if batch_deadline else 0
                 })
                 
             return self._json_response({'success': True, 'count': len(orders_data), 'orders': orders_data})
@@ -5665,3 +6313,119 @@ Seul le livreur assigné peut marquer sa commande comme échouée.""",
         except Exception as e:
             _logger.error(f"Get Available Orders Error: {e}")
             return self._json_response({'error': str(e)}, 500)
+
+    @http.route('/smart_delivery/api/livreur/tour', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
+    def get_livreur_tour(self, **kwargs):
+        """
+        GET /smart_delivery/api/livreur/tour - Optimized sequence of the stops of the livreur
+
+        Pickups and drops of the assigned and on way orders, every pickup before
+        its drop, re-planned each time an order is accepted, picked up or closed.
+        """
+        if request.httprequest.method == 'OPTIONS':
+            return request.make_response('', headers=self._get_cors_headers(), status=200)
+
+        livreur, error = self._require_livreur()
+        if error:
+            return error
+
+        try:
+            stops = request.env['delivery.route'].sudo().search_fetch(
+                [('livreur_id', '=', livreur.id), ('stop_type', '!=', False)],
+                ['sequence', 'stop_type', 'order_id', 'waypoint_lat', 'waypoint_long', 'leg_distance_km'],
+            )
+            stops_data = [{
+                'sequence': stop.sequence,
+                'type': stop.stop_type,
+                'order_id': stop.order_id.id,
+                'order_name': stop.order_id.name,
+                'lat': stop.waypoint_lat,
+                'long': stop.waypoint_long,
+                'leg_distance_km': stop.leg_distance_km,
+            } for stop in stops]
+            return self._json_response({
+                'success': True,
+                'count': len(stops_data),
+                'total_distance_km': sum(stop['leg_distance_km'] for stop in stops_data),
+                'stops': stops_data,
+            })
+        except Exception as e:
+            _logger.error(f"Get Livreur Tour Error: {e}")
+            return self._json_response({'error': str(e)}, 500)
+
+    # ==================== LIVE ORDER FEED ====================
+
+    def _get_feed_channels(self, user):
+        """Bus channels of the live feed a user may listen to"""
+        info = self._get_auth_info(user)
+        channels = []
+        if info.livreur_id:
+            channels.append(livreur_channel(request.env, info.livreur_id))
+        if info.user_type == 'enterprise' and info.partner_id:
+            channels.append(enterprise_channel(request.env, info.partner_id))
+        return channels
+
+    def _require_feed_channels(self):
+        """Channels of the authenticated caller, return (channels, error response)"""
+        auth_error = self._require_auth()
+        if auth_error:
+            return None, auth_error
+        user = self._get_current_user()
+        channels = self._get_feed_channels(user) if user else []
+        if not channels:
+            return None, self._json_response({
+                'error': 'Aucun flux disponible pour cet utilisateur',
+                'code': 'NO_FEED',
+            }, 403)
+        return channels, None
+
+    @http.route('/smart_delivery/api/feed/channels', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
+    def get_feed_channels(self, **kwargs):
+        """
+        GET /smart_delivery/api/feed/channels - Channels of the live order feed of the caller
+
+        The client subscribes to them on the Odoo websocket, starting after `last`:
+        {"event_name": "subscribe", "data": {"channels": [...], "last": <last>}}
+        """
+        if request.httprequest.method == 'OPTIONS':
+            return request.make_response('', headers=self._get_cors_headers(), status=200)
+
+        channels, error = self._require_feed_channels()
+        if error:
+            return error
+        return self._json_response({
+            'success': True,
+            'channels': channels,
+            'notification_type': NOTIFICATION_TYPE,
+            'last': request.env['bus.bus'].sudo()._bus_last_id(),
+            'websocket_url': FEED_WEBSOCKET_PATH,
+        })
+
+    @http.route('/smart_delivery/api/feed', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
+    def get_feed(self, **kwargs):
+        """
+        GET /smart_delivery/api/feed?last=<id> - Live feed notifications after `last`
+
+        Fallback of the websocket for the clients that cannot keep one open:
+        a single query on the bus table, to call with the `last` it returned.
+        """
+        if request.httprequest.method == 'OPTIONS':
+            return request.make_response('', headers=self._get_cors_headers(), status=200)
+
+        channels, error = self._require_feed_channels()
+        if error:
+            return error
+        try:
+            last = int(kwargs.get('last') or 0)
+        except ValueError:
+            return self._json_response({'error': 'Paramètre last invalide', 'code': 'INVALID_PARAMETER'}, 400)
+
+        polled = request.env['bus.bus'].sudo()._poll(channels, last)
+        return self._json_response({
+            'success': True,
+            'last': max([notif['id'] for notif in polled], default=last),
+            'notifications': [
+                {'id': notif['id'], 'type': notif['message']['type'], 'payload': notif['message']['payload']}
+                for notif in polled
+            ],
+        })
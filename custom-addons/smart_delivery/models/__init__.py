@@ -2,6 +2,7 @@
 
 from . import delivery_order
 from . import livreur
+from . import livreur_position
 from . import livreur_document
 from . import livreur_wizard
 from . import enterprise
@@ -12,6 +13,7 @@ from . import billing
 from . import account_move
 from . import delivery_route
 from . import api_log
+from . import delivery_notification
 from . import res_users
 from . import res_partner
 from . import ir_http
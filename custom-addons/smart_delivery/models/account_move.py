@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import logging
+
 from odoo import api, fields, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# Cached invoice PDFs are attachments named <prefix><invoice id>_<write date>.pdf
+DELIVERY_PDF_PREFIX = 'smart_delivery_invoice_'
+# Invoices rendered by one wkhtmltopdf run when pre-rendering
+PDF_RENDER_BATCH_SIZE = 50
 
 
 class AccountMove(models.Model):
@@ -124,6 +134,81 @@ class AccountMove(models.Model):
             action['res_id'] = self.delivery_billing_ids.id
         return action
 
+    # ==================== INVOICE PDF CACHE ====================
+
+    def _get_delivery_pdf_name(self):
+        """Name of the cached PDF of the invoice; it changes with every write of the invoice"""
+        self.ensure_one()
+        return f"{DELIVERY_PDF_PREFIX}{self.id}_{self.write_date:%Y%m%d%H%M%S%f}.pdf"
+
+    def _get_delivery_pdf_attachments(self):
+        """dict {invoice id: attachment} of the invoices whose current PDF is cached"""
+        names = {invoice._get_delivery_pdf_name(): invoice.id for invoice in self}
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('name', 'in', list(names)),
+        ])
+        return {names[attachment.name]: attachment for attachment in attachments}
+
+    def _get_delivery_pdf(self):
+        """Attachment holding the delivery invoice PDF, rendered when not cached"""
+        self.ensure_one()
+        attachment = self._get_delivery_pdf_attachments().get(self.id)
+        return attachment or self._render_delivery_pdfs()[self.id]
+
+    def _render_delivery_pdfs(self):
+        """Render the delivery invoice PDF of the invoices and cache them.
+
+        Several invoices are rendered with a single wkhtmltopdf run when the
+        report can be split per invoice. The PDFs of previous versions of the
+        invoices are removed.
+
+        :return: dict {invoice id: attachment}
+        """
+        report = self.env.ref('smart_delivery.action_report_delivery_invoice', raise_if_not_found=False)
+        if not report:
+            report = self.env.ref('account.account_invoices')
+        report = report.sudo()
+
+        contents = {}
+        if len(self) > 1:
+            streams = report._render_qweb_pdf_prepare_streams(report.report_name, {}, res_ids=self.ids)
+            contents = {res_id: data['stream'].getvalue() for res_id, data in streams.items() if res_id and data['stream']}
+        for invoice in self:
+            if invoice.id not in contents:
+                contents[invoice.id], _content_type = report._render_qweb_pdf(report.report_name, invoice.ids)
+
+        Attachment = self.env['ir.attachment'].sudo()
+        Attachment.search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('name', '=like', f'{DELIVERY_PDF_PREFIX}%'),
+        ]).unlink()
+        attachments = Attachment.create([{
+            'name': invoice._get_delivery_pdf_name(),
+            'raw': contents[invoice.id],
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': invoice.id,
+        } for invoice in self])
+        return dict(zip(self.ids, attachments))
+
+    def _prerender_delivery_pdfs(self):
+        """Render the PDFs of the posted invoices that are not cached yet, by batches.
+
+        A batch that cannot be rendered is only logged: the PDFs are rendered
+        again on download.
+        """
+        invoices = self.filtered(lambda invoice: invoice.state == 'posted')
+        cached = invoices._get_delivery_pdf_attachments()
+        for batch_ids in split_every(PDF_RENDER_BATCH_SIZE, [id_ for id_ in invoices.ids if id_ not in cached]):
+            try:
+                with self.env.cr.savepoint():
+                    self.browse(batch_ids)._render_delivery_pdfs()
+            except Exception as e:
+                _logger.warning("Could not pre-render the PDF of invoices %s: %s", batch_ids, e)
+
 
 class AccountPayment(models.Model):
     _inherit = 'account.payment'
@@ -1,7 +1,49 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from fnmatch import fnmatchcase
+from datetime import timedelta
 import json
+import random
+
+from odoo import models, fields, api, tools
+from odoo.tools import config
+
+from ..utils.api_log_buffer import api_log_buffer
+
+# Request/response keys whose value is never stored
+SECRET_KEYS = {
+    'password', 'current_password', 'new_password', 'old_password',
+    'token', 'access_token', 'refresh_token', 'fcm_token', 'otp', 'otp_code', 'otp_value',
+}
+# Keys holding files (base64): only their size is stored
+BINARY_KEYS = {'photo', 'signature', 'logo', 'image', 'document', 'file', 'datas', 'attachment', 'pdf'}
+# Any other string longer than this is cut
+MAX_STRING_LENGTH = 512
+# Default values of the settings (ir.config_parameter smart_delivery.api_log_*)
+DEFAULT_MAX_PAYLOAD_SIZE = 4096
+DEFAULT_RETENTION_DAYS = 30
+# Old logs are deleted by chunks to keep the autovacuum transactions short
+GC_BATCH_SIZE = 10000
+
+
+def _is_binary_key(key):
+    key = key.lower()
+    return key in BINARY_KEYS or key.endswith(('_base64', '_b64', '_photo', '_image', '_file', '_signature'))
+
+
+def _sanitize(value, key=None):
+    """Copy of a request/response payload without secrets nor files."""
+    if key is not None and key.lower() in SECRET_KEYS:
+        return '***'
+    if isinstance(value, dict):
+        return {k: _sanitize(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_sanitize(v, key) for v in value]
+    if isinstance(value, (bytes, str)) and key is not None and _is_binary_key(key) and value:
+        return f'<{len(value)} octets>'
+    if isinstance(value, str) and len(value) > MAX_STRING_LENGTH:
+        return f'{value[:MAX_STRING_LENGTH]}… <{len(value)} caractères>'
+    return value
 
 
 class ApiLog(models.Model):
@@ -13,19 +55,110 @@ class ApiLog(models.Model):
     endpoint = fields.Char(string='Endpoint', required=True)
     payload = fields.Text(string='Payload')
     response = fields.Text(string='Réponse')
-    created_at = fields.Datetime(string='Date de Création', default=fields.Datetime.now, readonly=True)
-    
+    created_at = fields.Datetime(string='Date de Création', default=fields.Datetime.now, readonly=True, index=True)
+
     status_code = fields.Integer(string='Code de Statut')
     error_message = fields.Text(string='Message d\'Erreur')
-    
+
+    @api.model
+    def _get_sample_rates(self):
+        """Sampling rate of each endpoint pattern (fnmatch), from the
+        smart_delivery.api_log_sample_rates parameter, e.g.
+        {"/smart_delivery/api/delivery/status/*": 0.1, "/smart_delivery/api/orders/available": 0}
+        """
+        return self._parse_sample_rates(
+            self.env['ir.config_parameter'].sudo().get_param('smart_delivery.api_log_sample_rates', '{}')
+        )
+
+    @tools.ormcache('raw')
+    def _parse_sample_rates(self, raw):
+        try:
+            rates = json.loads(raw)
+        except ValueError:
+            return ()
+        if not isinstance(rates, dict):
+            return ()
+        sample_rates = []
+        for pattern, rate in rates.items():
+            try:
+                sample_rates.append((str(pattern), float(rate)))
+            except (TypeError, ValueError):
+                continue
+        # Most specific patterns first
+        return tuple(sorted(sample_rates, key=lambda item: -len(item[0])))
+
+    @api.model
+    def _get_number_param(self, key, default, cast=float):
+        """Value of a numeric setting, or its default when it is missing or malformed"""
+        try:
+            return cast(self.env['ir.config_parameter'].sudo().get_param(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    @api.model
+    def _should_log(self, endpoint, status_code):
+        """Errors are always logged, successful calls according to the endpoint sampling rate."""
+        if status_code >= 400:
+            return True
+        rate = self._get_number_param('smart_delivery.api_log_default_sample_rate', 1.0)
+        for pattern, pattern_rate in self._get_sample_rates():
+            if fnmatchcase(endpoint, pattern):
+                rate = pattern_rate
+                break
+        return rate >= 1 or random.random() < rate
+
+    @api.model
+    def _serialize(self, data):
+        max_size = self._get_number_param('smart_delivery.api_log_max_payload_size', DEFAULT_MAX_PAYLOAD_SIZE, int)
+        text = json.dumps(_sanitize(data), default=str) if isinstance(data, (dict, list)) else str(data)
+        if len(text) > max_size:
+            text = f'{text[:max_size]}… <tronqué, {len(text)} caractères>'
+        return text
+
     def log_request(self, client_id, endpoint, payload, response, status_code=200, error_message=None):
-        """Enregistre une requête API"""
-        self.create({
+        """Enregistre une requête API.
+
+        Les appels réussis sont échantillonnés par endpoint, les fichiers et
+        secrets sont retirés, et l'écriture se fait en différé par lots.
+        """
+        if not self._should_log(endpoint, status_code):
+            return
+        vals = {
             'client_id': client_id,
             'endpoint': endpoint,
-            'payload': json.dumps(payload) if isinstance(payload, dict) else str(payload),
-            'response': json.dumps(response) if isinstance(response, dict) else str(response),
+            'payload': self._serialize(payload),
+            'response': self._serialize(response),
             'status_code': status_code,
-            'error_message': error_message,
-        })
+            'error_message': error_message and error_message[:DEFAULT_MAX_PAYLOAD_SIZE],
+            'created_at': fields.Datetime.now(),
+        }
+        if config['test_enable']:
+            # The buffer thread would commit outside of the test transaction
+            self.sudo().create(vals)
+        else:
+            api_log_buffer.add(self.env.cr.dbname, vals)
+
+    @api.model
+    def _flush_buffer(self):
+        """Create the logs of the database waiting in the buffer, in bulk."""
+        vals_list = api_log_buffer.pop(self.env.cr.dbname)
+        if vals_list:
+            self.sudo().create(vals_list)
 
+    @api.autovacuum
+    def _gc_api_logs(self):
+        """Delete the logs older than smart_delivery.api_log_retention_days"""
+        retention_days = self._get_number_param('smart_delivery.api_log_retention_days', DEFAULT_RETENTION_DAYS, int)
+        if retention_days <= 0:
+            return
+        limit_date = fields.Datetime.now() - timedelta(days=retention_days)
+        while True:
+            self.env.cr.execute(f"""
+                DELETE FROM {self._table} WHERE id IN (
+                    SELECT id FROM {self._table} WHERE created_at < %s LIMIT %s
+                )
+            """, [limit_date, GC_BATCH_SIZE])
+            if self.env.cr.rowcount < GC_BATCH_SIZE:
+                break
+            if not config['test_enable']:
+                self.env.cr.commit()
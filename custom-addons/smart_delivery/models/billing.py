@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
-from odoo.exceptions import UserError
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
 import logging
 
+from ..utils.phone import normalize_phone
+
 _logger = logging.getLogger(__name__)
 
+# Billings of per-delivery enterprises invoiced by one run of the invoicing cron
+INVOICE_BATCH_SIZE = 500
+
 
 class DeliveryBilling(models.Model):
     _name = 'delivery.billing'
@@ -93,26 +101,16 @@ class DeliveryBilling(models.Model):
     @api.depends('order_id.receiver_phone', 'order_id.receiver_name')
     def _compute_receiver_partner(self):
         """Get or create partner for receiver (the one who pays - COD)"""
+        names_by_phone = {}
         for record in self:
-            if not record.order_id:
-                record.receiver_partner_id = False
-                continue
-            
             phone = record.order_id.receiver_phone
-            if not phone:
-                record.receiver_partner_id = False
-                continue
-            
-            # Search for existing partner
-            partner = self.env['res.partner'].search([('phone', '=', phone)], limit=1)
-            if not partner:
-                # Create new partner for receiver
-                partner = self.env['res.partner'].create({
-                    'name': record.order_id.receiver_name or phone,
-                    'phone': phone,
-                    'customer_rank': 1,
-                })
-            record.receiver_partner_id = partner.id
+            if phone:
+                names_by_phone.setdefault(phone, record.order_id.receiver_name)
+        partners = self.env['res.partner']._resolve_phones(names_by_phone) if names_by_phone else {}
+        
+        for record in self:
+            partner = partners.get(normalize_phone(record.order_id.receiver_phone))
+            record.receiver_partner_id = partner.id if partner else False
 
     # ==================== INVOICE INTEGRATION (ODOO ACCOUNTING) ====================
     invoice_id = fields.Many2one(
@@ -123,6 +121,13 @@ class DeliveryBilling(models.Model):
         tracking=True,
         domain="[('move_type', '=', 'out_invoice')]",
     )
+    invoice_error = fields.Char(
+        string='Erreur de Facturation',
+        readonly=True,
+        copy=False,
+        help='Raison pour laquelle la facturation automatique a échoué. '
+             'La facturation est retirée de la file jusqu\'à une création manuelle de la facture.',
+    )
     
     # Related invoice fields for easy access
     invoice_name = fields.Char(related='invoice_id.name', string='N° Facture')
@@ -191,6 +196,14 @@ class DeliveryBilling(models.Model):
 
     # ==================== MODEL METHODS ====================
     
+    def init(self):
+        super().init()
+        # Invoicing queue: billings still waiting for their invoice
+        tools.create_index(
+            self.env.cr, 'delivery_billing_uninvoiced_index', self._table,
+            ['create_date', 'id'], where='invoice_id IS NULL',
+        )
+    
     @api.model
     def default_get(self, fields_list):
         """Handle default values from context"""
@@ -214,12 +227,44 @@ class DeliveryBilling(models.Model):
                     record.action_create_invoice()
         return records
 
+    @api.model
+    def _get_amount_stats(self, domain):
+        """Total billed amount of `domain` per state, in one grouped query.
+
+        :return: dict {state: total_amount}
+        """
+        return {
+            state: total or 0.0
+            for state, total in self._read_group(domain, ['state'], ['total_amount:sum'])
+        }
+
     def _get_sector_rule(self):
         """Get sector rule for the order"""
         self.ensure_one()
-        return self.env['sector.rule'].search([
-            ('sector_type', '=', self.order_id.sector_type)
+        return self.env['sector.rule']._get_rule(self.order_id.sector_type)
+
+    def _get_sale_journal(self):
+        journal = self.env['account.journal'].search([
+            ('type', '=', 'sale'),
+            ('company_id', '=', self.env.company.id),
+        ], limit=1)
+        if not journal:
+            raise UserError(_('Aucun journal de vente trouvé. Configurez la comptabilité.'))
+        return journal
+
+    def _get_cash_journal(self):
+        cash_journal = self.env['account.journal'].search([
+            ('type', '=', 'cash'),
+            ('company_id', '=', self.env.company.id),
         ], limit=1)
+        if not cash_journal:
+            cash_journal = self.env['account.journal'].search([
+                ('type', '=', 'bank'),
+                ('company_id', '=', self.env.company.id),
+            ], limit=1)
+        if not cash_journal:
+            raise UserError(_('Aucun journal de caisse ou banque trouvé.'))
+        return cash_journal
 
     def _get_delivery_product(self):
         """Get appropriate delivery product based on sector type"""
@@ -239,12 +284,16 @@ class DeliveryBilling(models.Model):
         """Get distance fee product"""
         return self.env.ref('smart_delivery.product_distance_fee', raise_if_not_found=False)
 
-    def _prepare_invoice_line_vals(self):
-        """Prepare invoice line values"""
+    def _prepare_invoice_line_vals(self, sector_rule=None):
+        """Prepare invoice line values
+
+        :param sector_rule: sector rule of the order, searched when not given
+        """
         self.ensure_one()
         lines = []
         
-        sector_rule = self._get_sector_rule()
+        if sector_rule is None:
+            sector_rule = self._get_sector_rule()
         delivery_product = self._get_delivery_product()
         distance_product = self._get_distance_product()
         
@@ -282,21 +331,14 @@ class DeliveryBilling(models.Model):
         
         return lines
 
-    def _prepare_invoice_vals(self):
+    def _prepare_invoice_vals(self, journal=None, sector_rule=None):
         """Prepare invoice values for Odoo accounting"""
         self.ensure_one()
         
         if not self.receiver_partner_id:
             raise UserError(_('Aucun destinataire défini. Vérifiez les informations de la commande.'))
         
-        # Get sale journal
-        journal = self.env['account.journal'].search([
-            ('type', '=', 'sale'),
-            ('company_id', '=', self.env.company.id),
-        ], limit=1)
-        
-        if not journal:
-            raise UserError(_('Aucun journal de vente trouvé. Configurez la comptabilité.'))
+        journal = journal or self._get_sale_journal()
         
         enterprise_name = self.enterprise_id.name if self.enterprise_id else 'Smart Delivery'
         
@@ -314,8 +356,329 @@ Type: {self.order_id.sector_type}
 Distance: {self.distance_km:.2f} km
 Mode de paiement: Espèces à la livraison (COD)
 {self.notes or ''}""",
-            'invoice_line_ids': self._prepare_invoice_line_vals(),
+            'invoice_line_ids': self._prepare_invoice_line_vals(sector_rule=sector_rule),
+        }
+
+    def _prepare_consolidated_invoice_vals(self, journal, sector_rules, period_label):
+        """Values of a single invoice to the enterprise for all the billings of self"""
+        enterprise = self.enterprise_id
+        enterprise.ensure_one()
+        if not enterprise.partner_id:
+            raise UserError(_("L'entreprise %s n'a pas de partenaire.", enterprise.name))
+        return {
+            'move_type': 'out_invoice',
+            'partner_id': enterprise.partner_id.id,
+            'journal_id': journal.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_origin': ', '.join(self.order_id.mapped('name'))[:1000],
+            'ref': f"{enterprise.name} - {period_label}",
+            'narration': f"""Facture consolidée de livraisons
+Entreprise: {enterprise.name}
+Période: {period_label}
+Nombre de livraisons: {len(self)}""",
+            'invoice_line_ids': [
+                line
+                for billing in self
+                for line in billing._prepare_invoice_line_vals(
+                    sector_rule=sector_rules.get(billing.order_id.sector_type, self.env['sector.rule']))
+            ],
+        }
+
+    # ==================== BATCHED INVOICING ====================
+    
+    def _lock_uninvoiced(self, skip_locked=False):
+        """Lock the billings of self that have no invoice yet.
+
+        :param skip_locked: skip the billings locked by another transaction
+                            instead of waiting for it
+        :return: the locked billings, without those invoiced in the meantime
+        """
+        if not self:
+            return self
+        self.flush_recordset(['invoice_id'])
+        self.env.cr.execute(f"""
+            SELECT id FROM {self._table}
+             WHERE id IN %s AND invoice_id IS NULL
+             ORDER BY id
+               FOR UPDATE{' SKIP LOCKED' if skip_locked else ''}
+        """, [tuple(self.ids)])
+        billings = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.invalidate_recordset(['invoice_id'])
+        return billings
+
+    @api.model
+    def _get_invoicing_period_start(self, mode, now=None):
+        """Start of the current period of a consolidated invoicing mode;
+        billings created before it belong to closed periods."""
+        day = (now or fields.Datetime.now()).date()
+        if mode == 'weekly':
+            day -= timedelta(days=day.weekday())
+        return datetime.combine(day, time.min)
+
+    def _get_invoicing_period(self, mode):
+        """(first day, label) of the consolidated invoicing period of the billing"""
+        self.ensure_one()
+        day = self.create_date.date()
+        if mode == 'weekly':
+            day -= timedelta(days=day.weekday())
+            return day, f"Semaine du {day:%d/%m/%Y}"
+        return day, f"{day:%d/%m/%Y}"
+
+    @api.model
+    def _cron_invoice_pending(self, limit=INVOICE_BATCH_SIZE):
+        """Invoice the delivered billings waiting in the invoicing queue.
+
+        Billings of per-delivery enterprises (and of senders without
+        enterprise) get one invoice each, `limit` at a time. Billings of
+        enterprises invoiced daily or weekly wait for the end of their period,
+        then get a single invoice per enterprise and period: whole periods are
+        taken, oldest first, until they hold `limit` billings. The cron runs
+        again right away while billings remain.
+        """
+        now = fields.Datetime.now()
+        per_delivery_where = """
+             WHERE b.invoice_id IS NULL AND b.invoice_error IS NULL
+               AND COALESCE(e.invoicing_mode, 'per_delivery') = 'per_delivery'
+        """
+        self.env.cr.execute(f"""
+            SELECT b.id
+              FROM delivery_billing b
+         LEFT JOIN delivery_enterprise e ON e.id = b.enterprise_id
+            {per_delivery_where}
+          ORDER BY b.create_date, b.id
+             LIMIT %s
+               FOR UPDATE OF b SKIP LOCKED
+        """, [limit])
+        billing_ids = [row[0] for row in self.env.cr.fetchall()]
+        remaining = 0
+        if len(billing_ids) == limit:
+            self.env.cr.execute(f"""
+                SELECT COUNT(*)
+                  FROM delivery_billing b
+             LEFT JOIN delivery_enterprise e ON e.id = b.enterprise_id
+                {per_delivery_where}
+                   AND b.id != ALL(%s)
+            """, [billing_ids])
+            remaining += self.env.cr.fetchone()[0]
+
+        # Closed periods are invoiced whole, so that each gets a single invoice
+        # (see _get_invoicing_period for the periods)
+        self.env.cr.execute("""
+            WITH period_billing AS (
+                SELECT b.id, b.enterprise_id, b.create_date,
+                       DATE_TRUNC(CASE e.invoicing_mode WHEN 'weekly' THEN 'week' ELSE 'day' END, b.create_date) AS period
+                  FROM delivery_billing b
+                  JOIN delivery_enterprise e ON e.id = b.enterprise_id
+                 WHERE b.invoice_id IS NULL AND b.invoice_error IS NULL
+                   AND ((e.invoicing_mode = 'daily' AND b.create_date < %s)
+                     OR (e.invoicing_mode = 'weekly' AND b.create_date < %s))
+            ), closed_period AS (
+                SELECT enterprise_id, period, COUNT(*) AS billing_count,
+                       SUM(COUNT(*)) OVER (ORDER BY MIN(create_date), enterprise_id, period) - COUNT(*) AS billings_before
+                  FROM period_billing
+              GROUP BY enterprise_id, period
+            )
+            SELECT b.id,
+                   (SELECT COALESCE(SUM(billing_count), 0) FROM closed_period WHERE billings_before >= %s)
+              FROM delivery_billing b
+              JOIN period_billing pb ON pb.id = b.id
+              JOIN closed_period cp ON cp.enterprise_id = pb.enterprise_id AND cp.period = pb.period
+             WHERE cp.billings_before < %s
+          ORDER BY b.create_date, b.id
+               FOR UPDATE OF b SKIP LOCKED
+        """, [
+            self._get_invoicing_period_start('daily', now), self._get_invoicing_period_start('weekly', now),
+            limit, limit,
+        ])
+        rows = self.env.cr.fetchall()
+        billing_ids += [billing_id for billing_id, _remaining in rows]
+        remaining += rows[0][1] if rows else 0
+
+        billings = self.browse(billing_ids)
+        billings.invalidate_recordset(['invoice_id'])
+        invoices = billings._create_invoices(post=True, consolidate=True)
+        if invoices:
+            _logger.info("Invoiced %s billings with %s invoices", len(billings), len(invoices))
+            # Livreurs download the invoices right after the delivery
+            invoices._prerender_delivery_pdfs()
+        self.env['ir.cron']._notify_progress(done=len(billings), remaining=remaining)
+
+    def _create_invoices(self, post=False, consolidate=False):
+        """Create the invoices of the billings with a single create.
+
+        The billings must be locked with _lock_uninvoiced. With `consolidate`,
+        the billings of enterprises invoiced daily or weekly are grouped in one
+        invoice to the enterprise per period; the others get one invoice each,
+        to the receiver. If the single create fails, the invoices are created
+        one at a time. Billings whose invoice cannot be prepared, created or
+        posted leave the queue with their error.
+
+        :param post: post the invoices
+        :return: the created invoices
+        """
+        Move = self.env['account.move']
+        if not self:
+            return Move
+        journal = self._get_sale_journal()
+        SectorRule = self.env['sector.rule']
+        sector_rules = {
+            sector_type: SectorRule._get_rule(sector_type)
+            for sector_type in set(self.order_id.mapped('sector_type'))
         }
+        no_rule = SectorRule
+
+        to_invoice = []  # (billings, invoice values)
+        errors = defaultdict(list)  # error message -> billing ids
+        consolidated = defaultdict(list)  # (enterprise, period, label) -> billing ids
+        for billing in self:
+            mode = billing.enterprise_id.invoicing_mode if consolidate else False
+            if mode in ('daily', 'weekly'):
+                consolidated[(billing.enterprise_id, *billing._get_invoicing_period(mode))].append(billing.id)
+                continue
+            try:
+                vals = billing._prepare_invoice_vals(
+                    journal=journal, sector_rule=sector_rules.get(billing.order_id.sector_type, no_rule))
+            except UserError as e:
+                errors[str(e)].append(billing.id)
+                continue
+            to_invoice.append((billing, vals))
+        for (enterprise, _period, label), ids in consolidated.items():
+            billings = self.browse(ids)
+            try:
+                vals = billings._prepare_consolidated_invoice_vals(journal, sector_rules, label)
+            except UserError as e:
+                errors[str(e)].extend(ids)
+                continue
+            to_invoice.append((billings, vals))
+
+        invoiced = []  # (billings, invoice)
+        try:
+            with self.env.cr.savepoint():
+                invoices = Move.create([vals for _billings, vals in to_invoice])
+            invoiced = list(zip((billings for billings, _vals in to_invoice), invoices))
+        except Exception:
+            # Create one invoice at a time so that a faulty billing does not hold back the queue
+            for billings, vals in to_invoice:
+                try:
+                    with self.env.cr.savepoint():
+                        invoiced.append((billings, Move.create(vals)))
+                except Exception as e:
+                    errors[str(e)].extend(billings.ids)
+        invoices = Move.concat(*(invoice for _billings, invoice in invoiced))
+        for billings, invoice in invoiced:
+            billings.with_context(tracking_disable=True).write({'invoice_id': invoice.id, 'invoice_error': False})
+
+        if post and invoices:
+            try:
+                with self.env.cr.savepoint():
+                    invoices.action_post()
+            except (UserError, ValidationError):
+                # Post one by one so that a faulty invoice does not hold back the others
+                for billings, invoice in invoiced:
+                    try:
+                        with self.env.cr.savepoint():
+                            invoice.action_post()
+                    except (UserError, ValidationError) as e:
+                        # The draft invoice is kept: the billings leave the queue with the error
+                        errors[str(e)].extend(billings.ids)
+
+        for message, ids in errors.items():
+            _logger.warning("Could not invoice billings %s: %s", ids, message)
+            self.browse(ids).write({'invoice_error': message})
+        return invoices
+
+    def _filter_cash_on_delivery(self):
+        """Billings of self invoiced to their receiver, who pays the delivery in cash.
+
+        Consolidated invoices are addressed to the enterprise and cover other
+        deliveries: they are paid by the enterprise, never collected in cash.
+        """
+        return self.filtered(
+            lambda billing: billing.invoice_id and billing.invoice_id.partner_id == billing.receiver_partner_id
+        )
+
+    def _pay_cash(self):
+        """Settle the posted invoices of the billings with one cash journal entry.
+
+        Only the cash-on-delivery invoices are settled (see _filter_cash_on_delivery).
+        The entry debits the cash journal with the collected total and credits
+        the receivable of each invoice, which is then reconciled with its
+        counterpart; all reconciliations are done in a single plan.
+
+        :return: the posted payment entry, empty if nothing was due
+        """
+        Move = self.env['account.move']
+        invoices = self._filter_cash_on_delivery().invoice_id.filtered(
+            lambda invoice: invoice.state == 'posted' and invoice.payment_state in ('not_paid', 'partial')
+        )
+        receivable_lines = []
+        credit_lines = []
+        for invoice in invoices:
+            lines = invoice.line_ids.filtered(
+                lambda l: l.account_id.account_type == 'asset_receivable' and not l.reconciled
+            )
+            if not lines or invoice.currency_id.is_zero(invoice.amount_residual):
+                continue
+            receivable_lines.append(lines)
+            credit_lines.append((0, 0, {
+                'account_id': lines[0].account_id.id,
+                'partner_id': invoice.partner_id.id,
+                'name': f"Paiement client - {invoice.name}",
+                'debit': 0,
+                'credit': invoice.amount_residual,
+            }))
+        if not credit_lines:
+            return Move
+
+        cash_journal = self._get_cash_journal()
+        total = sum(vals['credit'] for _command, _id, vals in credit_lines)
+        if len(credit_lines) == 1:
+            ref = f"Paiement {receivable_lines[0].move_id.name}"
+            partner_id = credit_lines[0][2]['partner_id']
+        else:
+            ref = f"Encaissement espèces - {len(credit_lines)} factures"
+            partner_id = False
+        payment_move = Move.create({
+            'move_type': 'entry',
+            'journal_id': cash_journal.id,
+            'date': fields.Date.today(),
+            'ref': ref,
+            'line_ids': [
+                # Debit: Cash account (increases cash)
+                (0, 0, {
+                    'account_id': cash_journal.default_account_id.id,
+                    'partner_id': partner_id,
+                    'name': ref,
+                    'debit': total,
+                    'credit': 0,
+                }),
+                # Credit: Receivable account of each invoice (decreases receivable)
+                *credit_lines,
+            ],
+        })
+        payment_move.action_post()
+        _logger.info("Payment move created: %s (id=%s) for %s invoices",
+                     payment_move.name, payment_move.id, len(credit_lines))
+
+        # The credit line of each invoice is found back by its account, partner and
+        # label (which holds the invoice number), then checked against its amount
+        counterparts = {
+            (line.account_id.id, line.partner_id.id, line.name): line
+            for line in payment_move.line_ids
+        }
+        plan = []
+        for lines, (_command, _id, vals) in zip(receivable_lines, credit_lines):
+            counterpart = counterparts.get((vals['account_id'], vals['partner_id'], vals['name']))
+            if not counterpart or counterpart.company_currency_id.compare_amounts(counterpart.credit, vals['credit']):
+                _logger.error("Payment move %s: no counterpart for %s", payment_move.name, vals['name'])
+                continue
+            plan.append(lines + counterpart)
+        try:
+            self.env['account.move.line']._reconcile_plan(plan)
+        except Exception as e:
+            _logger.error("Reconciliation failed: %s", e)
+        invoices.invalidate_recordset(['payment_state', 'amount_residual'])
+        return payment_move
 
     # ==================== ACTION METHODS ====================
     
@@ -329,10 +692,14 @@ Mode de paiement: Espèces à la livraison (COD)
         if self.state == 'cancelled':
             raise UserError(_('Impossible de créer une facture pour une facturation annulée.'))
         
+        # Lock the billing so the invoicing cron cannot invoice it at the same time
+        if not self._lock_uninvoiced():
+            raise UserError(_('Une facture existe déjà pour cette facturation.'))
+        
         # Create invoice using Odoo's standard method
         invoice_vals = self._prepare_invoice_vals()
         invoice = self.env['account.move'].create(invoice_vals)
-        self.invoice_id = invoice.id
+        self.write({'invoice_id': invoice.id, 'invoice_error': False})
         
         self.message_post(body=_('Facture %s créée') % invoice.name)
         
@@ -388,92 +755,21 @@ Mode de paiement: Espèces à la livraison (COD)
             # Create invoice first
             self.action_create_invoice()
         
+        if not self._filter_cash_on_delivery():
+            raise UserError(_(
+                "La facture %s est une facture consolidée de l'entreprise: "
+                "elle ne peut pas être encaissée en espèces pour une seule livraison.",
+                self.invoice_id.name,
+            ))
+        
         if self.invoice_id.state == 'draft':
             self.invoice_id.action_post()
         
         if self.invoice_id.payment_state == 'paid':
             return {'type': 'ir.actions.act_window_close'}
         
-        # Find cash journal
-        cash_journal = self.env['account.journal'].search([
-            ('type', '=', 'cash'),
-            ('company_id', '=', self.env.company.id),
-        ], limit=1)
-        
-        if not cash_journal:
-            cash_journal = self.env['account.journal'].search([
-                ('type', '=', 'bank'),
-                ('company_id', '=', self.env.company.id),
-            ], limit=1)
-        
-        if not cash_journal:
-            raise UserError(_('Aucun journal de caisse ou banque trouvé.'))
-        
-        # Get the receivable account from the invoice
-        invoice_receivable_line = self.invoice_id.line_ids.filtered(
-            lambda l: l.account_id.account_type == 'asset_receivable'
-        )
-        
-        if not invoice_receivable_line:
-            raise UserError(_('Aucun compte client trouvé sur la facture.'))
-        
-        receivable_account = invoice_receivable_line[0].account_id
-        
-        # Create the payment journal entry directly
-        move_vals = {
-            'move_type': 'entry',
-            'journal_id': cash_journal.id,
-            'date': fields.Date.today(),
-            'ref': f"Paiement {self.invoice_id.name}",
-            'line_ids': [
-                # Debit: Cash account (increases cash)
-                (0, 0, {
-                    'account_id': cash_journal.default_account_id.id,
-                    'partner_id': self.invoice_id.partner_id.id,
-                    'name': f"Paiement client - {self.invoice_id.name}",
-                    'debit': self.invoice_id.amount_residual,
-                    'credit': 0,
-                }),
-                # Credit: Receivable account (decreases receivable)
-                (0, 0, {
-                    'account_id': receivable_account.id,
-                    'partner_id': self.invoice_id.partner_id.id,
-                    'name': f"Paiement client - {self.invoice_id.name}",
-                    'debit': 0,
-                    'credit': self.invoice_id.amount_residual,
-                }),
-            ],
-        }
-        
-        payment_move = self.env['account.move'].create(move_vals)
-        payment_move.action_post()
-        
-        _logger.info("Payment move created: %s (id=%s), state=%s", 
-                    payment_move.name, payment_move.id, payment_move.state)
-        
-        # Now reconcile the payment with the invoice
-        # Get the receivable line from the payment move
-        payment_receivable_line = payment_move.line_ids.filtered(
-            lambda l: l.account_id.id == receivable_account.id
-            and not l.reconciled
-        )
-        
-        # Get unreconciled receivable line from invoice
-        invoice_receivable_line = self.invoice_id.line_ids.filtered(
-            lambda l: l.account_id.account_type == 'asset_receivable'
-            and not l.reconciled
-        )
-        
-        # Reconcile
-        if invoice_receivable_line and payment_receivable_line:
-            try:
-                (invoice_receivable_line + payment_receivable_line).reconcile()
-                _logger.info("Reconciliation successful!")
-            except Exception as e:
-                _logger.error("Reconciliation failed: %s", e)
-        
-        # Refresh states
-        self.invoice_id.invalidate_recordset(['payment_state', 'amount_residual'])
+        # Single cash entry reconciled with the invoice
+        self._pay_cash()
         
         # Check if invoice is now paid
         if self.invoice_id.payment_state == 'paid':
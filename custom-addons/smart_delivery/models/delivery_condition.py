@@ -33,6 +33,7 @@ class DeliveryCondition(models.Model):
     
     photo = fields.Binary(string='Photo de Livraison', help='Photo prise lors de la livraison')
     photo_filename = fields.Char(string='Nom du Fichier Photo')
+    photo_thumbnail = fields.Image(string='Miniature de la Photo', related='photo', max_width=256, max_height=256, store=True)
     
     biometric_score = fields.Float(string='Score Biométrique', digits=(3, 2))
     
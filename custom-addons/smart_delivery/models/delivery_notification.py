@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from ..utils.firebase_utils import (
+    FCM_ERROR_UNREGISTERED,
+    FCM_MULTICAST_LIMIT,
+    get_fcm_transport,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Delay before each new attempt of a failed notification (seconds)
+RETRY_DELAYS = [30, 120, 600, 1800]
+# Sent notifications are kept this long for troubleshooting, then garbage collected
+SENT_RETENTION_DAYS = 7
+
+
+class DeliveryNotification(models.Model):
+    """Outbox of FCM push notifications.
+
+    Notifications are queued by the business code and sent by a cron, so an
+    order write or an API call never waits for Firebase.
+    """
+    _name = 'delivery.notification'
+    _description = 'Notification Push (File d\'attente)'
+    _order = 'id'
+
+    token = fields.Char(string='Token FCM', required=True, index=True)
+    title = fields.Char(string='Titre')
+    body = fields.Text(string='Message')
+    data = fields.Text(string='Données (JSON)')
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('sent', 'Envoyée'),
+        ('failed', 'Échouée'),
+    ], string='État', default='pending', required=True, index=True)
+    attempt_count = fields.Integer(string='Tentatives', default=0)
+    next_attempt_date = fields.Datetime(string='Prochaine Tentative', default=fields.Datetime.now, index=True)
+    sent_date = fields.Datetime(string='Date d\'Envoi')
+    error_message = fields.Text(string='Erreur')
+
+    @api.model
+    def enqueue(self, notifications):
+        """Queue push notifications and wake up the sending cron.
+
+        :param notifications: list of (tokens, title, body, data) tuples
+        :return: the created delivery.notification records
+        """
+        vals_list = []
+        for tokens, title, body, data in notifications:
+            data_json = json.dumps(data or {}, sort_keys=True)
+            for token in dict.fromkeys(tokens or []):
+                if token:
+                    vals_list.append({
+                        'token': token,
+                        'title': title,
+                        'body': body,
+                        'data': data_json,
+                    })
+        if not vals_list:
+            return self.browse()
+
+        records = self.sudo().create(vals_list)
+        cron = self.env.ref('smart_delivery.ir_cron_send_push_notifications', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+        return records
+
+    @api.model
+    def _cron_send_pending(self, limit=10000):
+        """Send the pending notifications that are due"""
+        notifications = self.search([
+            ('state', '=', 'pending'),
+            ('next_attempt_date', '<=', fields.Datetime.now()),
+        ], limit=limit)
+        notifications._send()
+
+    def _send(self):
+        """Send the notifications, coalescing identical messages into multicast requests."""
+        if not self:
+            return
+
+        transport = get_fcm_transport(self.env)
+        groups = defaultdict(list)
+        for notification in self:
+            groups[(notification.title, notification.body, notification.data)].append(notification)
+
+        sent_ids = []
+        unregistered = defaultdict(list)  # error message -> notification ids
+        transient = []  # (notification, error message)
+        for (title, body, data), group in groups.items():
+            payload = json.loads(data) if data else {}
+            for start in range(0, len(group), FCM_MULTICAST_LIMIT):
+                chunk = group[start:start + FCM_MULTICAST_LIMIT]
+                results = transport.send_multicast([n.token for n in chunk], title, body, payload)
+                for notification, error in zip(chunk, results):
+                    if error is None:
+                        sent_ids.append(notification.id)
+                    elif error[0] == FCM_ERROR_UNREGISTERED:
+                        unregistered[error[1]].append(notification.id)
+                    else:
+                        transient.append((notification, error[1]))
+
+        now = fields.Datetime.now()
+        self.browse(sent_ids).write({
+            'state': 'sent',
+            'sent_date': now,
+            'error_message': False,
+        })
+        for message, ids in unregistered.items():
+            self.browse(ids).write({
+                'state': 'failed',
+                'error_message': message,
+            })
+        for notification, message in transient:
+            notification._schedule_retry(message, now)
+
+        invalid_tokens = self.browse([nid for ids in unregistered.values() for nid in ids]).mapped('token')
+        if invalid_tokens:
+            self._prune_tokens(invalid_tokens)
+
+        _logger.info(
+            "FCM outbox: %s sent, %s unregistered, %s to retry",
+            len(sent_ids), sum(len(ids) for ids in unregistered.values()), len(transient),
+        )
+
+    def _schedule_retry(self, error_message, now):
+        """Plan the next attempt with an increasing delay, or give up."""
+        self.ensure_one()
+        attempt = self.attempt_count + 1
+        vals = {
+            'attempt_count': attempt,
+            'error_message': error_message,
+        }
+        if attempt > len(RETRY_DELAYS):
+            vals['state'] = 'failed'
+        else:
+            vals['next_attempt_date'] = now + timedelta(seconds=RETRY_DELAYS[attempt - 1])
+        self.write(vals)
+
+    @api.model
+    def _prune_tokens(self, tokens):
+        """Forget FCM tokens that Firebase reported as no longer registered."""
+        _logger.info("FCM outbox: clearing %s unregistered tokens", len(tokens))
+        for model in ('delivery.livreur', 'res.partner'):
+            records = self.env[model].sudo().search([('fcm_token', 'in', tokens)])
+            records.write({'fcm_token': False})
+        # Other messages queued for those tokens can never be delivered
+        self.search([('state', '=', 'pending'), ('token', 'in', tokens)]).write({
+            'state': 'failed',
+            'error_message': 'Token FCM désenregistré',
+        })
+
+    @api.autovacuum
+    def _gc_sent_notifications(self):
+        """Delete sent notifications older than SENT_RETENTION_DAYS"""
+        limit_date = fields.Datetime.now() - timedelta(days=SENT_RETENTION_DAYS)
+        self.search([('state', '=', 'sent'), ('sent_date', '<', limit_date)]).unlink()
@@ -1,15 +1,36 @@
 # -*- coding: utf-8 -*-
 
-import math
 import random
 import string
 import logging
-from datetime import timedelta
-from odoo import models, fields, api, _
+from collections import defaultdict
+from datetime import timedelta, timezone
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+
+from ..utils.dispatch_scheduler import DispatchScheduler, notify_deadlines
+from ..utils.eta import STOP_MINUTES, dispatch_costs, pickup_eta, travel_minutes
+from ..utils.geo import haversine_distance, haversine_matrix, k_nearest
+from ..utils.pricing import REQUIREMENT_FIELDS, compute_price
+from ..utils.order_feed import (
+    EVENT_OFFER, EVENT_OFFER_CLOSED, EVENT_STATUS, NOTIFICATION_TYPE,
+    enterprise_channel, livreur_channel,
+)
+from .delivery_route import ROUTE_ORDER_STATUSES
+from .livreur import DISPATCH_STATS_FIELDS
 
 _logger = logging.getLogger(__name__)
 
+# Dispatch timeouts (seconds) of the orders without sector rule
+DEFAULT_BATCH_TIMEOUT = 30
+DEFAULT_GLOBAL_TIMEOUT = 180
+# The batch of an order is picked among this many times its size of nearest livreurs
+DISPATCH_CANDIDATE_FACTOR = 3
+# Transaction advisory lock (with the order id) taken by the accepts of an order
+ACCEPT_LOCK = 'smart_delivery.accept'
+
 
 class DeliveryOrder(models.Model):
     _name = 'delivery.order'
@@ -23,8 +44,8 @@ class DeliveryOrder(models.Model):
     def _get_sector_type_selection(self):
         """Dynamic selection based on existing sector.rule records.
         Falls back to the original fixed list if no rules exist."""
-        rules = self.env['sector.rule'].search([])
-        if not rules:
+        tariffs = self.env['sector.rule']._get_tariffs()
+        if not tariffs:
             return [
                 ('standard', 'Standard'),
                 ('premium', 'Premium'),
@@ -32,7 +53,7 @@ class DeliveryOrder(models.Model):
                 ('fragile', 'Fragile'),
                 ('medical', 'Médical'),
             ]
-        return [(r.sector_type, r.sector_type.capitalize()) for r in rules if r.sector_type]
+        return [(sector_type, sector_type.capitalize()) for sector_type in tariffs]
 
     sector_type = fields.Selection(
         selection=_get_sector_type_selection,
@@ -45,16 +66,14 @@ class DeliveryOrder(models.Model):
     def _onchange_sector_type(self):
         """Applique automatiquement les règles du secteur sélectionné"""
         if self.sector_type:
-            sector_rule = self.env['sector.rule'].search([
-                ('sector_type', '=', self.sector_type)
-            ], limit=1)
-            if sector_rule:
-                self.otp_required = sector_rule.otp_required
-                self.signature_required = sector_rule.signature_required
-                self.photo_required = sector_rule.photo_required
-                self.biometric_required = sector_rule.biometric_required
+            tariff = self.env['sector.rule']._get_tariff(self.sector_type)
+            if tariff:
+                self.otp_required = tariff.otp_required
+                self.signature_required = tariff.signature_required
+                self.photo_required = tariff.photo_required
+                self.biometric_required = tariff.biometric_required
     
-    sender_id = fields.Many2one('res.partner', string='Expéditeur', required=True, tracking=True,
+    sender_id = fields.Many2one('res.partner', string='Expéditeur', required=True, tracking=True, index=True,
                                  domain="[('is_delivery_enterprise', '=', True)]",
                                  help="L'entreprise qui envoie le colis. Seules les entreprises inscrites sont affichées.")
     receiver_name = fields.Char(string='Nom du Destinataire', tracking=True)
@@ -65,7 +84,7 @@ class DeliveryOrder(models.Model):
     drop_lat = fields.Float(string='Latitude Livraison', digits=(10, 7), default=0.0)
     drop_long = fields.Float(string='Longitude Livraison', digits=(10, 7), default=0.0)
     
-    assigned_livreur_id = fields.Many2one('delivery.livreur', string='Livreur Assigné', tracking=True,
+    assigned_livreur_id = fields.Many2one('delivery.livreur', string='Livreur Assigné', tracking=True, index=True,
                                           help="Seuls les livreurs ayant le type de secteur sélectionné sont affichés")
     
     status = fields.Selection([
@@ -96,6 +115,11 @@ class DeliveryOrder(models.Model):
     )
     dispatch_start_time = fields.Datetime(string='Début du Batch')
     first_dispatch_time = fields.Datetime(string='Début du Dispatching')
+    accept_time = fields.Datetime(string='Acceptée le', readonly=True)
+    pickup_eta_minutes = fields.Float(
+        string='Temps Prévu jusqu\'au Pickup (min)', readonly=True, digits=(10, 1),
+        help="Prédiction faite à l'acceptation, comparée au temps réel pour calibrer les prédictions du livreur",
+    )
     
     # Conditions de validation
     otp_required = fields.Boolean(string='OTP Requis', default=False)
@@ -161,14 +185,10 @@ class DeliveryOrder(models.Model):
             
             # Appliquer les règles du secteur
             if vals.get('sector_type'):
-                sector_rule = self.env['sector.rule'].search([
-                    ('sector_type', '=', vals['sector_type'])
-                ], limit=1)
-                if sector_rule:
-                    vals.setdefault('otp_required', sector_rule.otp_required)
-                    vals.setdefault('signature_required', sector_rule.signature_required)
-                    vals.setdefault('photo_required', sector_rule.photo_required)
-                    vals.setdefault('biometric_required', sector_rule.biometric_required)
+                tariff = self.env['sector.rule']._get_tariff(vals['sector_type'])
+                if tariff:
+                    for requirement in REQUIREMENT_FIELDS:
+                        vals.setdefault(requirement, getattr(tariff, requirement))
         
             # Auto-set status to 'assigned' if a livreur is provided
             if vals.get('assigned_livreur_id'):
@@ -209,8 +229,25 @@ class DeliveryOrder(models.Model):
                     if livreur.exists() and livreur.registration_status == 'approved' and livreur.availability:
                         vals['status'] = 'assigned'
                     break  # Only need to check once
-        
-        return super().write(vals)
+
+        # Audience of the live feed before the write changes it
+        previous = {}
+        if 'status' in vals:
+            previous = {
+                order.id: (
+                    order.status,
+                    order.assigned_livreur_id.id,
+                    order.dispatched_livreur_ids.ids if order.status == 'dispatching' else [],
+                )
+                for order in self
+            }
+
+        result = super().write(vals)
+        if previous:
+            self._publish_status_changes(previous)
+            self._update_livreur_tours(previous)
+            self._update_livreur_stats(previous)
+        return result
     
     @api.depends('pickup_lat', 'pickup_long', 'drop_lat', 'drop_long')
     def _compute_distance(self):
@@ -226,17 +263,7 @@ class DeliveryOrder(models.Model):
     @staticmethod
     def _haversine_distance(lat1, lon1, lat2, lon2):
         """Calcule la distance en km entre deux points GPS"""
-        R = 6371  # Rayon de la Terre en km
-        
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        
-        a = (math.sin(dlat / 2) ** 2 +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlon / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return haversine_distance(lat1, lon1, lat2, lon2)
     
     def assign_livreur(self, force=False):
         """Lance le processus de dispatching (batch par batch)"""
@@ -282,9 +309,7 @@ class DeliveryOrder(models.Model):
         self.ensure_one()
         
         # 1. Find potential livreurs
-        sector_rule = self.env['sector.rule'].search([
-            ('sector_type', '=', self.sector_type)
-        ], limit=1)
+        sector_rule = self.env['sector.rule']._get_rule(self.sector_type)
 
         domain = [
             ('availability', '=', True),
@@ -294,9 +319,14 @@ class DeliveryOrder(models.Model):
         if sector_rule:
             domain.append(('sector_ids', 'in', [sector_rule.id]))
 
-        available_livreurs = self.env['delivery.livreur'].search(domain)
+        # 2. Among the closest ones, pick the N (batch size) expected to pick up the soonest
+        batch_size = self.dispatch_batch_size or 10
+        candidates = self.env['delivery.livreur']._search_nearest(
+            self.pickup_lat, self.pickup_long, batch_size * DISPATCH_CANDIDATE_FACTOR, domain,
+        )
+        next_batch = candidates._sorted_by_dispatch_cost(self.pickup_lat, self.pickup_long)[:batch_size]
         
-        if not available_livreurs:
+        if not next_batch:
             # No more drivers available
             if not self.dispatched_livreur_ids:
                  raise UserError(_('Aucun livreur disponible pour le moment'))
@@ -308,53 +338,129 @@ class DeliveryOrder(models.Model):
                 _logger.info(f"Order {self.id}: cycled through all available drivers.")
                 return False
 
-        # 2. Score and sort them
-        scored_livreurs = []
-        for livreur in available_livreurs:
-            distance = self._haversine_distance(
-                livreur.current_lat, livreur.current_long,
-                self.pickup_lat, self.pickup_long
-            )
-            # Simple score: closer is better
-            score = -distance 
-            scored_livreurs.append((score, livreur))
-        
-        # Sort by score descending (closest first)
-        scored_livreurs.sort(key=lambda x: x[0], reverse=True)
-        
-        # 3. Pick top N (batch size)
-        batch_size = self.dispatch_batch_size or 10
-        next_batch = [sl[1] for sl in scored_livreurs[:batch_size]]
+        # 3. Update order state and notify the batch
+        self._apply_dispatch_batches({self: next_batch})
         
-        if not next_batch:
-            return False
+        return True
+
+    def _dispatch_next_batches(self):
+        """Dispatch the next batch of every order of the recordset in one pass.
+
+        Driver positions are loaded once per sector and the order x driver distance
+        matrix is computed in a single vectorized call, instead of one driver search
+        and one Python distance loop per order. As for a single order, the drivers
+        are prefiltered with a bounding box around the pickups (see the livreur's
+        _search_near_points). They are ranked by their expected time to pickup
+        (see utils/eta.py), not only by distance.
+
+        :return: dict {order: livreurs} of the batches that were sent
+        """
+        Livreur = self.env['delivery.livreur']
+        tariffs = self.env['sector.rule']._get_tariffs()
+
+        batches = {}
+        for sector_type, orders in self.grouped('sector_type').items():
+            domain = [
+                ('availability', '=', True),
+                ('verified', '=', True),
+            ]
+            tariff = tariffs.get(sector_type)
+            if tariff:
+                domain.append(('sector_ids', 'in', [tariff.id]))
+
+            max_batch_size = max(order.dispatch_batch_size or 10 for order in orders)
+            livreurs = Livreur._search_near_points(
+                list(zip(orders.mapped('pickup_lat'), orders.mapped('pickup_long'))),
+                max_batch_size * DISPATCH_CANDIDATE_FACTOR,
+                domain,
+                [set(order.dispatched_livreur_ids.ids) for order in orders],
+            )
+            if not livreurs:
+                _logger.info(f"No available driver for sector {sector_type}: {len(orders)} orders kept in dispatching.")
+                continue
+            livreurs.fetch(DISPATCH_STATS_FIELDS)
+
+            livreur_ids = livreurs.ids
+            column_by_livreur = {livreur_id: col for col, livreur_id in enumerate(livreur_ids)}
+            distances = haversine_matrix(
+                orders.mapped('pickup_lat'), orders.mapped('pickup_long'),
+                livreurs.mapped('current_lat'), livreurs.mapped('current_long'),
+            )
+            # Exclude already notified drivers
+            excluded = [
+                {column_by_livreur[lid] for lid in order.dispatched_livreur_ids.ids if lid in column_by_livreur}
+                for order in orders
+            ]
+            costs = dispatch_costs(distances, livreurs._get_dispatch_stats())
+            ranked = k_nearest(costs, max_batch_size, excluded)
+
+            for order, columns in zip(orders, ranked):
+                columns = columns[:order.dispatch_batch_size or 10]
+                if not columns:
+                    _logger.info(f"Order {order.id}: cycled through all available drivers.")
+                    continue
+                batches[order] = Livreur.browse([livreur_ids[col] for col in columns])
+
+        self._apply_dispatch_batches(batches)
+        return batches
+
+    def _apply_dispatch_batches(self, batches):
+        """Store the new dispatch batch of several orders at once and notify the drivers.
 
-        # 4. Update order state
-        # Clear current batch and add new ones
-        batch_ids = [l.id for l in next_batch]
-        vals = {
+        :param batches: dict {order: livreurs}
+        """
+        batches = {order: livreurs for order, livreurs in batches.items() if livreurs}
+        if not batches:
+            return
+
+        orders = self.browse([order.id for order in batches])
+        now = fields.Datetime.now()
+        orders.filtered(lambda o: not o.first_dispatch_time).write({'first_dispatch_time': now})
+        orders.write({
             'status': 'dispatching',
-            'current_batch_livreur_ids': [(6, 0, batch_ids)],
-            'dispatched_livreur_ids': [(4, l_id) for l_id in batch_ids],
-            'dispatch_start_time': fields.Datetime.now()
-        }
-        if not self.first_dispatch_time:
-            vals['first_dispatch_time'] = fields.Datetime.now()
-            
-        self.write(vals)
-        
-        # 5. Send Notifications (FCM)
-        self._notify_livreurs(next_batch)
-        
-        return True
+            'dispatch_start_time': now,
+        })
+
+        # Many2many updates through the ORM, one write per distinct batch of livreurs
+        orders_by_batch = defaultdict(list)
+        livreur_ids = []
+        for order, livreurs in batches.items():
+            orders_by_batch[tuple(livreurs.ids)].append(order.id)
+            livreur_ids.extend(livreurs.ids)
+        for batch_livreur_ids, batch_order_ids in orders_by_batch.items():
+            self.browse(batch_order_ids).write({
+                'current_batch_livreur_ids': [(6, 0, list(batch_livreur_ids))],
+                'dispatched_livreur_ids': [(4, livreur_id) for livreur_id in batch_livreur_ids],
+            })
+        self.env['delivery.livreur']._count_dispatch_offers(livreur_ids)
+
+        orders._schedule_dispatch_deadlines()
+
+        self._notify_dispatched_batches(batches)
+        self._publish_offers(batches)
+
+    def _notify_dispatched_batches(self, batches):
+        """Queues the FCM notifications of several dispatch batches at once."""
+        notifications = []
+        for order, livreurs in batches.items():
+            notification = order._prepare_new_order_notification(livreurs)
+            if notification:
+                notifications.append(notification)
+        self.env['delivery.notification'].enqueue(notifications)
 
     def _notify_livreurs(self, livreurs):
-        """Sends FCM notifications to the list of livreurs."""
-        from ..utils.firebase_utils import send_push_notification
+        """Queues FCM notifications to the list of livreurs."""
+        notification = self._prepare_new_order_notification(livreurs)
+        if not notification:
+            return
         
+        self.env['delivery.notification'].enqueue([notification])
+
+    def _prepare_new_order_notification(self, livreurs):
+        """Returns the (tokens, title, body, data) of the new order notification, or None."""
         tokens = [l.fcm_token for l in livreurs if l.fcm_token]
         if not tokens:
-            return
+            return None
             
         title = "Nouvelle Commande Disponible!"
         body = f"Commande {self.name} de {self.sender_id.name}. Distance: {self.distance_km:.1f}km. Secteur: {self.sector_type}"
@@ -374,12 +480,10 @@ class DeliveryOrder(models.Model):
             'created_at': fields.Datetime.now().isoformat(),
         }
         
-        send_push_notification(tokens, title, body, data, env=self.env)
+        return tokens, title, body, data
 
     def _notify_enterprise_assigned(self, livreur):
-        """Sends FCM notification to sender when order is assigned."""
-        from ..utils.firebase_utils import send_push_notification
-        
+        """Queues FCM notification to sender when order is assigned."""
         if not self.sender_id or not self.sender_id.fcm_token:
             return
             
@@ -401,12 +505,10 @@ class DeliveryOrder(models.Model):
             'drop_long': f"{self.drop_long:.7f}" if self.drop_long else '0.0',
         }
         
-        send_push_notification(tokens, title, body, data, env=self.env)
+        self.env['delivery.notification'].enqueue([(tokens, title, body, data)])
 
     def _notify_enterprise_delivered(self):
-        """Sends FCM notification to sender when order is delivered."""
-        from ..utils.firebase_utils import send_push_notification
-        
+        """Queues FCM notification to sender when order is delivered."""
         if not self.sender_id or not self.sender_id.fcm_token:
             return
             
@@ -430,7 +532,202 @@ class DeliveryOrder(models.Model):
             'drop_long': f"{self.drop_long:.7f}" if self.drop_long else '0.0',
         }
         
-        send_push_notification(tokens, title, body, data, env=self.env)
+        self.env['delivery.notification'].enqueue([(tokens, title, body, data)])
+
+    # ==================== TOURS ====================
+
+    def _update_livreur_tours(self, previous):
+        """Re-plan the tours of the livreurs whose orders to carry changed.
+
+        An accepted order is inserted in the current tour of its livreur, a
+        picked up one loses its pickup stop, a finished one leaves the tour.
+
+        :param previous: dict {order id: (status, assigned livreur id, ...)} read before the write
+        """
+        livreur_ids = set()
+        for order in self:
+            old_status, old_livreur_id = previous[order.id][:2]
+            if order.status != old_status and (
+                order.status in ROUTE_ORDER_STATUSES or old_status in ROUTE_ORDER_STATUSES
+            ):
+                livreur_ids.update((old_livreur_id, order.assigned_livreur_id.id))
+        livreur_ids.discard(False)
+        if livreur_ids:
+            self.env['delivery.route'].sudo()._plan_livreur_tours(self.env['delivery.livreur'].browse(livreur_ids))
+
+    def _update_livreur_stats(self, previous):
+        """Feed the pickup times of the picked up orders to the statistics of their livreurs.
+
+        :param previous: dict {order id: (status, assigned livreur id, ...)} read before the write
+        """
+        now = fields.Datetime.now()
+        samples = [
+            (order.assigned_livreur_id.id, (now - order.accept_time).total_seconds() / 60.0, order.pickup_eta_minutes)
+            for order in self
+            if previous[order.id][0] == 'assigned' and order.status == 'on_way'
+            and order.assigned_livreur_id and order.accept_time and order.pickup_eta_minutes
+        ]
+        if samples:
+            self.env['delivery.livreur'].sudo()._record_pickup_times(samples)
+
+    def _get_etas(self):
+        """Predicted minutes before the pickup and the drop of the orders being delivered.
+
+        The stops of the planned tour of the livreur that come first delay the
+        ones of the order; without tour, the livreur goes straight to the order.
+
+        :return: dict {order id: (minutes to pickup, None once picked up; minutes to drop)}
+        """
+        orders = self.filtered(lambda order: order.status in ROUTE_ORDER_STATUSES and order.assigned_livreur_id)
+        if not orders:
+            return {}
+        livreurs = orders.assigned_livreur_id
+        stats = dict(zip(livreurs.ids, livreurs._get_dispatch_stats()))
+
+        # Arrival at each stop of the tours, from the current position of the livreurs
+        arrivals = {}
+        positions = {livreur.id: (livreur.current_lat, livreur.current_long) for livreur in livreurs}
+        elapsed = defaultdict(float)
+        stops = self.env['delivery.route'].sudo().search_fetch(
+            [('livreur_id', 'in', livreurs.ids), ('stop_type', '!=', False)],
+            ['livreur_id', 'order_id', 'stop_type', 'waypoint_lat', 'waypoint_long'],
+        )
+        for stop in stops:
+            livreur_id = stop.livreur_id.id
+            lat, long = positions[livreur_id]
+            distance = haversine_distance(lat, long, stop.waypoint_lat, stop.waypoint_long) if lat or long else 0.0
+            arrivals[stop.order_id.id, stop.stop_type] = elapsed[livreur_id] + travel_minutes(distance, stats[livreur_id])
+            elapsed[livreur_id] = arrivals[stop.order_id.id, stop.stop_type] + STOP_MINUTES
+            positions[livreur_id] = (stop.waypoint_lat, stop.waypoint_long)
+
+        etas = {}
+        for order in orders:
+            livreur = order.assigned_livreur_id
+            driver = stats[livreur.id]
+            pickup = arrivals.get((order.id, 'pickup'))
+            drop = arrivals.get((order.id, 'drop'))
+            if drop is None:
+                lat, long = livreur.current_lat, livreur.current_long
+                if not (lat or long):
+                    # Unknown position: assume the livreur is at the pickup
+                    lat, long = order.pickup_lat, order.pickup_long
+                if order.status == 'assigned':
+                    pickup = travel_minutes(haversine_distance(lat, long, order.pickup_lat, order.pickup_long), driver)
+                    drop = pickup + STOP_MINUTES + travel_minutes(order.distance_km, driver)
+                else:
+                    drop = travel_minutes(haversine_distance(lat, long, order.drop_lat, order.drop_long), driver)
+            etas[order.id] = (pickup if order.status == 'assigned' else None, drop)
+        return etas
+
+    # ==================== LIVE FEED ====================
+
+    def _get_feed_payload(self, event):
+        """Message of the live feed about the order"""
+        self.ensure_one()
+        return {
+            'event': event,
+            'order_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'assigned_livreur_id': self.assigned_livreur_id.id or None,
+            'at': fields.Datetime.now().isoformat(),
+        }
+
+    def _publish_feed(self, notifications):
+        """Send (channel, payload) notifications on the bus, delivered on commit"""
+        Bus = self.env['bus.bus']
+        for channel, payload in notifications:
+            Bus._sendone(channel, NOTIFICATION_TYPE, payload)
+
+    def _publish_offers(self, batches):
+        """Publish the new orders proposed to the livreurs of dispatch batches.
+
+        The message holds what /orders/available returns for the order, so
+        the app can show the offer without fetching it.
+
+        :param batches: dict {order: livreurs}
+        """
+        orders = self.browse([order.id for order in batches])
+        deadlines = orders._get_dispatch_deadline_datetimes()
+        notifications = []
+        for order, livreurs in batches.items():
+            batch_deadline = deadlines.get(order.id, (None, None))[0]
+            payload = dict(
+                order._get_feed_payload(EVENT_OFFER),
+                pickup_lat=order.pickup_lat,
+                pickup_long=order.pickup_long,
+                drop_lat=order.drop_lat,
+                drop_long=order.drop_long,
+                distance_km=order.distance_km,
+                sender=order.sender_id.name,
+                deadline=batch_deadline.isoformat() if batch_deadline else None,
+            )
+            notifications.extend((livreur_channel(self.env, livreur.id), payload) for livreur in livreurs)
+        self._publish_feed(notifications)
+
+    def _publish_status_changes(self, previous):
+        """Publish the status changes of the orders.
+
+        The sender enterprise and the assigned livreur (before and after the
+        change) get the new status; the livreurs the order was proposed to
+        are told it is no longer available when it leaves the dispatch.
+
+        :param previous: dict {order id: (status, assigned livreur id,
+                         dispatched livreur ids)} read before the write
+        """
+        notifications = []
+        for order in self:
+            old_status, old_livreur_id, dispatched_ids = previous[order.id]
+            if order.status == old_status:
+                continue
+            payload = order._get_feed_payload(EVENT_STATUS)
+            payload['previous_status'] = old_status
+            if order.sender_id:
+                notifications.append((enterprise_channel(self.env, order.sender_id.commercial_partner_id.id), payload))
+            livreur_ids = {old_livreur_id, order.assigned_livreur_id.id} - {False}
+            notifications.extend((livreur_channel(self.env, livreur_id), payload) for livreur_id in livreur_ids)
+            if order.status != 'dispatching':
+                closed = order._get_feed_payload(EVENT_OFFER_CLOSED)
+                notifications.extend(
+                    (livreur_channel(self.env, livreur_id), closed)
+                    for livreur_id in dispatched_ids if livreur_id not in livreur_ids
+                )
+        self._publish_feed(notifications)
+
+    def _claim_for_accept(self, livreur):
+        """Assign the order to the livreur if it is still being dispatched.
+
+        The accepts of an order first try to take a transaction lock of their
+        own on it, without waiting: the acceptors racing the one holding it
+        are told the order is taken right away, in their own transaction. The
+        holder then claims the order with a conditional UPDATE, which only
+        waits for the other transactions holding the row (timeout cron, status
+        write, tour planning...) and goes on if they left the order dispatching.
+
+        When the row was changed by a transaction committed after ours started,
+        an accept included, the SerializationFailure is raised so that the
+        caller retries in a new transaction, which sees the current status.
+
+        The cache is left as is when the order is claimed: the following
+        write() reads the values from before the claim as previous values.
+
+        :return: True if the order is now assigned to the livreur in this transaction
+        """
+        self.ensure_one()
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s), %s)", [ACCEPT_LOCK, self.id])
+        if not self.env.cr.fetchone()[0]:
+            return False
+        self.flush_recordset(['status', 'assigned_livreur_id'])
+        self.env.cr.execute("""
+            UPDATE delivery_order
+               SET status = 'assigned', assigned_livreur_id = %s
+             WHERE id = %s AND status = 'dispatching'
+         RETURNING id
+        """, [livreur.id, self.id])
+        claimed = bool(self.env.cr.fetchone())
+        if not claimed:
+            self.invalidate_recordset(['status', 'assigned_livreur_id'])
+        return claimed
 
     def action_accept_delivery(self, livreur_id):
         """Called when a livreur accepts the order via API."""
@@ -454,12 +751,22 @@ class DeliveryOrder(models.Model):
         if not livreur.availability or not livreur.verified:
             return {'error': _('Vous n\'êtes pas disponible ou vérifié'), 'code': 'LIVREUR_NOT_AVAILABLE'}
 
-        # Assign!
+        # Claim the order; the acceptors racing the winner are told it is taken
+        if not self._claim_for_accept(livreur):
+            return {'error': _('Cette commande a déjà été acceptée par un autre livreur'), 'code': 'ORDER_NOT_AVAILABLE'}
+
+        # Assign! The predicted pickup time is kept to calibrate the next predictions
+        distance = 0.0
+        if livreur.current_lat or livreur.current_long:
+            distance = haversine_distance(livreur.current_lat, livreur.current_long, self.pickup_lat, self.pickup_long)
         self.write({
             'status': 'assigned',
             'assigned_livreur_id': livreur.id,
             'current_batch_livreur_ids': [(5, 0, 0)], # clear batch
+            'accept_time': fields.Datetime.now(),
+            'pickup_eta_minutes': pickup_eta(distance, livreur._get_dispatch_stats()[0]),
         })
+        livreur._count_dispatch_accept()
         
         # Notify enterprise (sender) about assignment
         self._notify_enterprise_assigned(livreur)
@@ -467,30 +774,164 @@ class DeliveryOrder(models.Model):
         # Notify success
         return {'success': True}
 
-    def process_dispatch_timeout(self):
-        """Called by Cron to process timeouts and move to next batch."""
-        # Find orders in dispatching state that have timed out
-        timeout_seconds = 30
-        timeout_threshold = fields.Datetime.now() - timedelta(seconds=timeout_seconds)
-        
-        orders = self.search([
-            ('status', '=', 'dispatching'),
-            ('dispatch_start_time', '<', timeout_threshold)
-        ])
-        
-        for order in orders:
-            # Check global timeout (3 minutes)
+    def _register_hook(self):
+        super()._register_hook()
+        DispatchScheduler.ensure_started(self.env.cr.dbname)
+
+    def init(self):
+        super().init()
+        # Keyset pagination of the order lists on (create_date, id)
+        tools.create_index(
+            self.env.cr, 'delivery_order_create_date_id_index', self._table,
+            ['create_date', 'id'],
+        )
+
+    def _get_dispatch_timeouts(self):
+        """Batch and global dispatch timeouts (seconds) of each order, from its sector rule.
+
+        :return: dict {order id: (batch_timeout, global_timeout)}
+        """
+        tariffs = self.env['sector.rule']._get_tariffs()
+        timeouts = {}
+        for order in self:
+            tariff = tariffs.get(order.sector_type)
+            if tariff:
+                timeouts[order.id] = (tariff.dispatch_batch_timeout, tariff.dispatch_global_timeout)
+            else:
+                timeouts[order.id] = (DEFAULT_BATCH_TIMEOUT, DEFAULT_GLOBAL_TIMEOUT)
+        return timeouts
+
+    def _get_dispatch_deadline_datetimes(self):
+        """Batch and global deadlines of the orders being dispatched.
+
+        :return: dict {order id: (batch_deadline, global_deadline)}, the global
+                 deadline being None when the dispatch start is unknown
+        """
+        timeouts = self._get_dispatch_timeouts()
+        deadlines = {}
+        for order in self:
+            if order.status != 'dispatching' or not order.dispatch_start_time:
+                continue
+            batch_timeout, global_timeout = timeouts[order.id]
+            global_deadline = None
             if order.first_dispatch_time:
-                global_timeout = order.first_dispatch_time + timedelta(minutes=3)
-                if fields.Datetime.now() > global_timeout:
-                    _logger.info(f"Order {order.name} timed out globally (3 mins). Cancelling.")
-                    order.action_cancel()
-                    continue
+                global_deadline = order.first_dispatch_time + timedelta(seconds=global_timeout)
+            deadlines[order.id] = (order.dispatch_start_time + timedelta(seconds=batch_timeout), global_deadline)
+        return deadlines
+
+    @api.model
+    def _get_next_dispatch_deadlines(self):
+        """Next expiry of each order being dispatched (all of them if the recordset is empty).
+
+        :return: list of POSIX timestamps, one per order
+        """
+        orders = self or self.search([('status', '=', 'dispatching')])
+        return [
+            (min(batch_deadline, global_deadline) if global_deadline else batch_deadline).replace(tzinfo=timezone.utc).timestamp()
+            for batch_deadline, global_deadline in orders._get_dispatch_deadline_datetimes().values()
+        ]
+
+    def _schedule_dispatch_deadlines(self):
+        """Publish the next expiry of the orders to the dispatch scheduler, on commit."""
+        deadlines = self._get_next_dispatch_deadlines() if self else []
+        if deadlines:
+            notify_deadlines(self.env.cr, deadlines)
+
+    def _split_expired_dispatches(self, now):
+        """Orders past their global deadline, and the other ones past their batch deadline.
+
+        :return: tuple (orders to cancel, orders to dispatch to their next batch)
+        """
+        to_cancel = self.browse()
+        to_dispatch = self.browse()
+        for order_id, (batch_deadline, global_deadline) in self._get_dispatch_deadline_datetimes().items():
+            order = self.browse(order_id)
+            if global_deadline and now >= global_deadline:
+                to_cancel |= order
+            elif now >= batch_deadline:
+                to_dispatch |= order
+        return to_cancel, to_dispatch
+
+    @api.model
+    def _process_dispatch_deadlines(self, order_ids=None):
+        """Cancel the orders past their global timeout and move the ones past their
+        batch timeout to the next batch.
+
+        Called by the cron on every order being dispatched. Only the expired
+        orders are locked, then their deadlines are checked again, so
+        concurrent callers never process the same expiry twice and the orders
+        still waiting for an answer stay free for the livreurs accepting them.
+        """
+        if order_ids is not None:
+            if not order_ids:
+                return
+            orders = self.browse(order_ids)
+        else:
+            orders = self.search([('status', '=', 'dispatching')])
+        now = fields.Datetime.now()
+        to_cancel, to_dispatch = orders._split_expired_dispatches(now)
+        expired = to_cancel | to_dispatch
+        if not expired:
+            return
+
+        self.env.cr.execute("""
+            SELECT id FROM delivery_order
+             WHERE id IN %s AND status = 'dispatching'
+             ORDER BY id
+               FOR UPDATE SKIP LOCKED
+        """, [tuple(expired.ids)])
+        orders = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not orders:
+            return
+        orders.invalidate_recordset(['status', 'dispatch_start_time', 'first_dispatch_time'])
+        to_cancel, to_dispatch = orders._split_expired_dispatches(now)
 
-            _logger.info(f"Processing timeout for order {order.name}")
-            order._dispatch_next_batch()
+        for order in to_cancel:
+            _logger.info(f"Order {order.name} timed out globally. Cancelling.")
+            order.action_cancel()
+
+        if to_dispatch:
+            _logger.info(f"Processing timeout for {len(to_dispatch)} orders")
+            to_dispatch._dispatch_next_batches()
+
+    def process_dispatch_timeout(self):
+        """Called by Cron to process timeouts and move to next batch.
+
+        The dispatch scheduler triggers the cron as each deadline expires (see
+        utils/dispatch_scheduler.py); the periodic run only catches up on the
+        deadlines it missed (no leader running, lost notification, ...).
+        """
+        self._process_dispatch_deadlines()
 
     
+    # ==================== STATISTICS ====================
+
+    @api.model
+    def _get_status_counts(self, domain, since=None):
+        """Count the orders of `domain` per status in a single grouped query.
+
+        :param since: optional datetime, the orders created from then on are counted apart
+        :return: tuple (dict {status: count} holding every status, count of orders created since `since`)
+        """
+        status = SQL.identifier(self._table, 'status', to_flush=self._fields['status'])
+        created_since = SQL("0")
+        if since:
+            created_since = SQL(
+                "COUNT(*) FILTER (WHERE %s >= %s)",
+                SQL.identifier(self._table, 'create_date', to_flush=self._fields['create_date']),
+                since,
+            )
+        query = self._search(domain)
+        query.groupby = status
+        rows = self.env.execute_query(query.select(status, SQL("COUNT(*)"), created_since))
+
+        counts = dict.fromkeys((key for key, _label in self._fields['status'].selection), 0)
+        since_count = 0
+        for status_value, count, since_value in rows:
+            counts[status_value] = count
+            since_count += since_value
+        return counts, since_count
+
     def validate_conditions(self):
         """Valide toutes les conditions requises pour la livraison"""
         self.ensure_one()
@@ -538,32 +979,19 @@ class DeliveryOrder(models.Model):
     def _generate_billing(self):
         """Génère la facturation pour la commande basée sur les règles de secteur
         
-        Crée un enregistrement delivery.billing et génère automatiquement
-        la facture Odoo (account.move) associée.
+        Crée un enregistrement delivery.billing. La facture Odoo (account.move)
+        n'est pas créée ici : la facturation rejoint la file traitée par lots
+        par delivery.billing._cron_invoice_pending.
         """
         self.ensure_one()
         
         if self.billing_id:
             return self.billing_id[0]
         
-        # Get pricing from sector rule
-        sector_rule = self.env['sector.rule'].search([
-            ('sector_type', '=', self.sector_type)
-        ], limit=1)
-        
-        if sector_rule:
-            base_tariff = sector_rule.base_price
-            distance_fee_per_km = sector_rule.distance_fee_per_km
-            free_distance = sector_rule.free_distance_km
-        else:
-            # Fallback default values
-            base_tariff = 50.0
-            distance_fee_per_km = 10.0
-            free_distance = 5.0
-        
-        # Calculate distance fees (beyond free distance)
-        extra_km = max(0, self.distance_km - free_distance)
-        extra_fee = extra_km * distance_fee_per_km
+        # Pricing of the sector (default tariff without rule), distance fees beyond the free distance
+        base_tariff, extra_fee = compute_price(
+            self.env['sector.rule']._get_tariff(self.sector_type), self.distance_km,
+        )
         
         # Create billing record
         billing = self.env['delivery.billing'].create({
@@ -573,12 +1001,6 @@ class DeliveryOrder(models.Model):
             'extra_fee': extra_fee,
         })
         
-        # Auto-create invoice in Odoo Accounting
-        try:
-            billing.action_create_invoice()
-        except Exception as e:
-            _logger.warning(f"Could not auto-create invoice for billing {billing.id}: {e}")
-        
         return billing
     
     def action_start_delivery(self):
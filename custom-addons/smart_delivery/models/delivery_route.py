@@ -2,6 +2,12 @@
 
 from odoo import models, fields, api
 
+from ..utils.geo import haversine_distance
+from ..utils.route_planner import plan_route
+
+# Order statuses whose stops are part of the tour of the assigned livreur
+ROUTE_ORDER_STATUSES = ('assigned', 'on_way')
+
 
 class DeliveryRoute(models.Model):
     _name = 'delivery.route'
@@ -9,16 +15,112 @@ class DeliveryRoute(models.Model):
     _order = 'sequence, id'
 
     order_id = fields.Many2one('delivery.order', string='Commande', required=True, ondelete='cascade')
-    
+
     waypoint_lat = fields.Float(string='Latitude Point de Passage', required=True, digits=(10, 7))
     waypoint_long = fields.Float(string='Longitude Point de Passage', required=True, digits=(10, 7))
-    
+
     sequence = fields.Integer(string='Séquence', default=10)
-    
+
     name = fields.Char(string='Nom du Point', compute='_compute_name', store=True)
-    
-    @api.depends('waypoint_lat', 'waypoint_long')
+
+    # Stops planned by the tour optimization (manual waypoints have no stop type)
+    livreur_id = fields.Many2one('delivery.livreur', string='Livreur', index=True, ondelete='cascade')
+    stop_type = fields.Selection([
+        ('pickup', 'Enlèvement'),
+        ('drop', 'Livraison'),
+    ], string='Type d\'Arrêt')
+    leg_distance_km = fields.Float(string='Distance depuis l\'Arrêt Précédent (km)', digits=(10, 2))
+
+    @api.depends('waypoint_lat', 'waypoint_long', 'stop_type', 'order_id.name')
     def _compute_name(self):
+        stop_labels = dict(self._fields['stop_type']._description_selection(self.env))
         for record in self:
-            record.name = f"Point ({record.waypoint_lat:.5f}, {record.waypoint_long:.5f})"
+            if record.stop_type:
+                record.name = f"{stop_labels[record.stop_type]} {record.order_id.name}"
+            else:
+                record.name = f"Point ({record.waypoint_lat:.5f}, {record.waypoint_long:.5f})"
+
+    # ==================== TOUR PLANNING ====================
+
+    @api.model
+    def _plan_livreur_tours(self, livreurs, incremental=True):
+        """Sequence the stops of the orders the livreurs carry and store them.
+
+        Each livreur visits the pickup of its assigned orders and the drop of
+        its assigned and on way orders, every pickup before its drop, starting
+        from its current position.
+
+        :param incremental: keep the current sequence and only insert the stops
+                            of the new orders (then improve it), instead of
+                            planning the whole tour again
+        """
+        livreurs = livreurs.exists()
+        if not livreurs:
+            return
+        orders = self.env['delivery.order'].search_fetch([
+            ('assigned_livreur_id', 'in', livreurs.ids),
+            ('status', 'in', ROUTE_ORDER_STATUSES),
+        ], ['name', 'status', 'assigned_livreur_id', 'pickup_lat', 'pickup_long', 'drop_lat', 'drop_long'])
+        planned = self.search_fetch(
+            [('livreur_id', 'in', livreurs.ids), ('stop_type', '!=', False)],
+            ['livreur_id', 'order_id', 'stop_type'],
+        )
+
+        current_tours = {}
+        for stop in planned:
+            current_tours.setdefault(stop.livreur_id.id, []).append((stop.order_id.id, stop.stop_type))
+        orders_by_livreur = orders.grouped('assigned_livreur_id')
+
+        vals_list = []
+        for livreur in livreurs:
+            vals_list += self._prepare_tour_vals(
+                livreur,
+                orders_by_livreur.get(livreur, orders.browse()),
+                current_tours.get(livreur.id) if incremental else None,
+            )
+        planned.unlink()
+        self.create(vals_list)
+
+    @api.model
+    def _prepare_tour_vals(self, livreur, orders, current_tour=None):
+        """Values of the planned stops of a livreur, in visit order.
+
+        :param current_tour: list of (order id, stop type) of the current tour
+        """
+        stops = []       # (order, stop type, lat, long)
+        pickup_of = {}   # index of a drop -> index of its pickup
+        for order in orders:
+            if order.status == 'assigned' and (order.pickup_lat or order.pickup_long):
+                stops.append((order, 'pickup', order.pickup_lat, order.pickup_long))
+            if order.drop_lat or order.drop_long:
+                if stops and stops[-1][0] == order:
+                    pickup_of[len(stops) + 1] = len(stops)
+                stops.append((order, 'drop', order.drop_lat, order.drop_long))
+        if not stops:
+            return []
+
+        if livreur.current_lat or livreur.current_long:
+            start = (livreur.current_lat, livreur.current_long)
+        else:
+            start = stops[0][2:]
+        sequence = None
+        if current_tour:
+            index_of = {(order.id, stop_type): index for index, (order, stop_type, _lat, _long) in enumerate(stops, 1)}
+            sequence = [index_of[key] for key in current_tour if key in index_of]
+        sequence, _length = plan_route(start, [stop[2:] for stop in stops], pickup_of, sequence)
 
+        vals_list = []
+        previous = start
+        for rank, index in enumerate(sequence, 1):
+            order, stop_type, lat, long = stops[index - 1]
+            vals_list.append({
+                'order_id': order.id,
+                'livreur_id': livreur.id,
+                'stop_type': stop_type,
+                'waypoint_lat': lat,
+                'waypoint_long': long,
+                'sequence': rank,
+                'leg_distance_km': haversine_distance(previous[0], previous[1], lat, long),
+            })
+            previous = (lat, long)
+        return vals_list
@@ -71,6 +71,15 @@ class DeliveryEnterprise(models.Model):
     website = fields.Char(string='Site web')
     description = fields.Text(string='Description de l\'activité')
     
+    # Invoicing
+    invoicing_mode = fields.Selection([
+        ('per_delivery', 'Par livraison (destinataire)'),
+        ('daily', 'Facture consolidée quotidienne'),
+        ('weekly', 'Facture consolidée hebdomadaire'),
+    ], string='Facturation', default='per_delivery', required=True, tracking=True,
+       help='Par livraison: une facture par commande au destinataire (paiement à la livraison). '
+            'Consolidée: une seule facture à l\'entreprise pour toutes ses livraisons de la journée ou de la semaine.')
+    
     # Statistics
     order_count = fields.Integer(string='Nombre de Commandes', compute='_compute_order_count')
     
@@ -233,6 +242,14 @@ class DeliveryEnterprise(models.Model):
         
         return result
     
+    # ==================== REGISTRATION ====================
+    
+    @api.model
+    def _phone_in_use(self, phone):
+        """Whether an enterprise already uses this phone number, whatever its formatting"""
+        partners = self.env['res.partner'].with_context(active_test=False)._search_by_phones([phone])
+        return bool(partners) and bool(self.search_count([('partner_id', 'in', partners.ids)], limit=1))
+    
     # ==================== REGISTRATION APPROVAL ACTIONS ====================
     
     def action_approve_registration(self):
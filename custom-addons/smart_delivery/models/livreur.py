@@ -1,9 +1,28 @@
 # -*- coding: utf-8 -*-
 
 import base64
-from odoo import models, fields, api, _
+from collections import Counter
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
+from ..utils.auth_cache import invalidate_users_on_commit
+from ..utils.eta import (
+    EWMA_ALPHA, DriverStats, acceptance_rate, driver_speed, dispatch_costs, ewma, slowness, track_speed,
+)
+from ..utils.geo import bounding_box, count_within, haversine_distance, haversine_matrix
+from .delivery_route import ROUTE_ORDER_STATUSES
+
+# Successive search radii (km) used to find the nearest livreurs around a point.
+# The search stops at the first radius that already contains enough candidates.
+NEAREST_SEARCH_RADII_KM = (2, 5, 10, 25, 50, 100, 250)
+
+# Fields read to score the livreurs for dispatch (see _get_dispatch_stats)
+DISPATCH_STATS_FIELDS = [
+    'vehicle_type', 'speed_avg_kmh', 'pickup_time_avg', 'pickup_eta_avg', 'current_load',
+    'dispatch_offer_count', 'dispatch_accept_count',
+]
+
 
 class DeliveryLivreur(models.Model):
     _name = 'delivery.livreur'
@@ -147,10 +166,15 @@ class DeliveryLivreur(models.Model):
                 # Clear password from vals (we don't store it in livreur)
                 vals.pop('password', None)
         
-        return super().create(vals_list)
+        livreurs = super().create(vals_list)
+        # The API resolves a user to its livreur from a cache
+        invalidate_users_on_commit(self.env, livreurs.user_id.ids)
+        return livreurs
     
     def write(self, vals):
         """Override write to update user if email/name changes"""
+        if 'user_id' in vals:
+            invalidate_users_on_commit(self.env, self.user_id.ids + [vals['user_id']])
         result = super().write(vals)
         
         # Update password if provided
@@ -174,6 +198,10 @@ class DeliveryLivreur(models.Model):
         
         return result
     
+    def unlink(self):
+        invalidate_users_on_commit(self.env, self.user_id.ids)
+        return super().unlink()
+    
     def action_reset_password(self):
         """Send password reset email to livreur"""
         self.ensure_one()
@@ -212,12 +240,26 @@ class DeliveryLivreur(models.Model):
     
     current_lat = fields.Float(string='Latitude Actuelle', digits=(10, 7), default=0.0)
     current_long = fields.Float(string='Longitude Actuelle', digits=(10, 7), default=0.0)
+    position_date = fields.Datetime(string='Date de la Position', readonly=True)
+    position_ids = fields.One2many('delivery.livreur.position', 'livreur_id', string='Historique des Positions')
     
     verified = fields.Boolean(string='Vérifié', default=False, tracking=True)
     
     order_ids = fields.One2many('delivery.order', 'assigned_livreur_id', string='Commandes')
+    tour_stop_ids = fields.One2many(
+        'delivery.route', 'livreur_id', string='Tournée',
+        domain=[('stop_type', '!=', False)],
+    )
     order_count = fields.Integer(string='Nombre de Commandes', compute='_compute_order_count')
     
+    def init(self):
+        super().init()
+        # Spatial prefilter for dispatch: bounding-box lookups on the driver position
+        tools.create_index(
+            self.env.cr, 'delivery_livreur_position_index', self._table,
+            ['current_lat', 'current_long'],
+        )
+
     @api.depends('order_ids')
     def _compute_order_count(self):
         for record in self:
@@ -259,6 +301,272 @@ class DeliveryLivreur(models.Model):
         
         return True
     
+    # ==================== SPATIAL SEARCH ====================
+
+    @api.model
+    def _search_nearest(self, lat, lon, limit, domain=None):
+        """Return up to `limit` livreurs matching `domain`, closest to (lat, lon) first.
+
+        Candidates are prefiltered in SQL with a bounding box that grows until it
+        holds enough livreurs, so the cost depends on the local density of drivers
+        and not on the size of the whole fleet.
+        """
+        domain = list(domain or [])
+        if limit <= 0:
+            return self.browse()
+
+        radii = NEAREST_SEARCH_RADII_KM
+        if self.search_count(domain, limit=limit + 1) <= limit:
+            # Small pool: everybody is a candidate, skip the spatial prefilter
+            radii = ()
+
+        for radius in radii + (None,):
+            search_domain = domain
+            if radius is not None:
+                min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+                search_domain = domain + [
+                    ('current_lat', '>=', min_lat),
+                    ('current_lat', '<=', max_lat),
+                ]
+                if min_lon is not None:
+                    search_domain += [
+                        ('current_long', '>=', min_lon),
+                        ('current_long', '<=', max_lon),
+                    ]
+
+            candidates = self.search_fetch(search_domain, ['current_lat', 'current_long'])
+            scored = sorted(
+                (haversine_distance(lat, lon, livreur.current_lat, livreur.current_long), livreur.id)
+                for livreur in candidates
+            )
+            if radius is not None:
+                # The box corners are farther than the radius: only points inside
+                # the circle are guaranteed to be among the true nearest ones.
+                scored = [item for item in scored if item[0] <= radius]
+                if len(scored) < limit:
+                    continue
+            return self.browse([livreur_id for _distance, livreur_id in scored[:limit]])
+
+        return self.browse()
+
+    @api.model
+    def _search_near_points(self, points, limit, domain=None, excluded_ids=None):
+        """Return the livreurs matching `domain` among which each point finds its `limit` closest ones.
+
+        Batched counterpart of _search_nearest: the candidates of all the points
+        are prefiltered with one bounding box, holding the box of each point,
+        that grows until every point has `limit` livreurs within the radius.
+
+        :param points: list of (lat, lon)
+        :param excluded_ids: optional list (one entry per point) of the sets of
+                             livreur ids not counted for the point
+        """
+        domain = list(domain or [])
+        if not points or limit <= 0:
+            return self.browse()
+        excluded_ids = excluded_ids or [set() for _point in points]
+
+        radii = NEAREST_SEARCH_RADII_KM
+        pool_size = limit + max(len(ids) for ids in excluded_ids)
+        if self.search_count(domain, limit=pool_size + 1) <= pool_size:
+            # Small pool: everybody is a candidate, skip the spatial prefilter
+            radii = ()
+
+        lats = [lat for lat, _lon in points]
+        lons = [lon for _lat, lon in points]
+        for radius in radii + (None,):
+            if radius is None:
+                return self.search_fetch(domain, ['current_lat', 'current_long'])
+
+            boxes = [bounding_box(lat, lon, radius) for lat, lon in points]
+            search_domain = domain + [
+                ('current_lat', '>=', min(box[0] for box in boxes)),
+                ('current_lat', '<=', max(box[1] for box in boxes)),
+            ]
+            if all(box[2] is not None for box in boxes):
+                search_domain += [
+                    ('current_long', '>=', min(box[2] for box in boxes)),
+                    ('current_long', '<=', max(box[3] for box in boxes)),
+                ]
+
+            candidates = self.search_fetch(search_domain, ['current_lat', 'current_long'])
+            column_by_livreur = {livreur_id: col for col, livreur_id in enumerate(candidates.ids)}
+            distances = haversine_matrix(lats, lons, candidates.mapped('current_lat'), candidates.mapped('current_long'))
+            excluded = [
+                {column_by_livreur[livreur_id] for livreur_id in ids if livreur_id in column_by_livreur}
+                for ids in excluded_ids
+            ]
+            # As in _search_nearest, only the livreurs inside the circle are
+            # guaranteed to be among the true nearest ones of a point
+            if all(count >= limit for count in count_within(distances, radius, excluded)):
+                return candidates
+
+        return self.browse()
+
+    # ==================== GPS INGESTION ====================
+
+    @api.model
+    def _ingest_positions(self, points):
+        """Store GPS fixes of one or several livreurs.
+
+        The fixes are appended to the position history in one INSERT, and each
+        livreur is moved to its most recent fix with a single UPDATE that skips
+        the ORM: no write_date bump, no tracking, no recompute. A fix older than
+        the stored position only goes to the history.
+
+        :param points: list of dicts with livreur_id, lat, long, recorded_at
+                       and optionally speed, heading, accuracy
+        """
+        if not points:
+            return
+        self.env['delivery.livreur.position']._insert_points(points)
+
+        latest = {}
+        for point in points:
+            current = latest.get(point['livreur_id'])
+            if current is None or point['recorded_at'] >= current['recorded_at']:
+                latest[point['livreur_id']] = point
+
+        position_fields = ['current_lat', 'current_long', 'position_date']
+        livreurs = self.browse(list(latest))
+        livreurs.flush_recordset(position_fields)
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS livreur
+               SET current_lat = fix.lat,
+                   current_long = fix.long,
+                   position_date = fix.recorded_at
+              FROM unnest(%s::int[], %s::numeric[], %s::numeric[], %s::timestamp[])
+                   AS fix(id, lat, long, recorded_at)
+             WHERE livreur.id = fix.id
+               AND (livreur.position_date IS NULL OR livreur.position_date <= fix.recorded_at)
+        """, [
+            list(latest),
+            [point['lat'] for point in latest.values()],
+            [point['long'] for point in latest.values()],
+            [point['recorded_at'] for point in latest.values()],
+        ])
+        livreurs.invalidate_recordset(position_fields)
+        self._record_speeds(points)
+
+    # ==================== DISPATCH STATISTICS ====================
+
+    # Updated incrementally: offers and acceptances as they happen, the pickup
+    # times when an order is picked up, the speed on each GPS update and the
+    # load when the orders of the livreur change status (see utils/eta.py)
+    dispatch_offer_count = fields.Integer(string='Offres Reçues', readonly=True)
+    dispatch_accept_count = fields.Integer(string='Offres Acceptées', readonly=True)
+    acceptance_rate = fields.Float(string='Taux d\'Acceptation', compute='_compute_acceptance_rate', digits=(3, 2))
+    pickup_time_avg = fields.Float(string='Temps Moyen jusqu\'au Pickup (min)', readonly=True, digits=(10, 1))
+    pickup_eta_avg = fields.Float(string='Temps Prévu Moyen jusqu\'au Pickup (min)', readonly=True, digits=(10, 1))
+    speed_avg_kmh = fields.Float(string='Vitesse Moyenne (km/h)', readonly=True, digits=(10, 1))
+    current_load = fields.Integer(string='Commandes en Cours', compute='_compute_current_load', store=True)
+
+    @api.depends('dispatch_offer_count', 'dispatch_accept_count')
+    def _compute_acceptance_rate(self):
+        for livreur in self:
+            livreur.acceptance_rate = acceptance_rate(livreur.dispatch_offer_count, livreur.dispatch_accept_count)
+
+    @api.depends('order_ids.status')
+    def _compute_current_load(self):
+        # One grouped query for all the livreurs whose orders changed
+        counts = dict(self.env['delivery.order']._read_group(
+            [('assigned_livreur_id', 'in', self._origin.ids), ('status', 'in', ROUTE_ORDER_STATUSES)],
+            ['assigned_livreur_id'], ['__count'],
+        ))
+        for livreur in self:
+            livreur.current_load = counts.get(livreur._origin, 0)
+
+    def _get_dispatch_stats(self):
+        """DriverStats of the livreurs, in the order of the recordset"""
+        return [
+            DriverStats(
+                driver_speed(livreur.speed_avg_kmh, livreur.vehicle_type),
+                slowness(livreur.pickup_time_avg, livreur.pickup_eta_avg),
+                livreur.current_load,
+                acceptance_rate(livreur.dispatch_offer_count, livreur.dispatch_accept_count),
+            )
+            for livreur in self
+        ]
+
+    def _sorted_by_dispatch_cost(self, lat, lon):
+        """The livreurs, the ones expected to pick up at (lat, lon) the soonest first"""
+        if not self:
+            return self
+        distances = [haversine_distance(lat, lon, livreur.current_lat, livreur.current_long) for livreur in self]
+        costs = dispatch_costs([distances], self._get_dispatch_stats())[0]
+        return self.browse([livreur_id for _cost, livreur_id in sorted(zip(costs, self.ids))])
+
+    @api.model
+    def _count_dispatch_offers(self, livreur_ids):
+        """Add the offers sent to the livreurs (an id per offer) to their statistics"""
+        self._increment_counter('dispatch_offer_count', Counter(livreur_ids))
+
+    def _count_dispatch_accept(self):
+        """Add an accepted offer to the statistics of the livreurs"""
+        self._increment_counter('dispatch_accept_count', Counter(self.ids))
+
+    @api.model
+    def _increment_counter(self, field_name, increments):
+        # In SQL, so that concurrent offers and accepts are all counted
+        livreurs = self.browse(list(increments))
+        livreurs.flush_recordset([field_name])
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS livreur
+               SET {field_name} = COALESCE(livreur.{field_name}, 0) + increment.value
+              FROM unnest(%s::int[], %s::int[]) AS increment(id, value)
+             WHERE livreur.id = increment.id
+        """, [list(increments), list(increments.values())])
+        livreurs.invalidate_recordset([field_name, 'acceptance_rate'])
+
+    @api.model
+    def _record_pickup_times(self, samples):
+        """Update the mean actual and predicted pickup times of the livreurs.
+
+        :param samples: list of (livreur id, actual minutes, predicted minutes)
+        """
+        averages = {}
+        for livreur_id, actual, predicted in samples:
+            livreur = self.browse(livreur_id)
+            time_avg, eta_avg = averages.get(livreur_id, (livreur.pickup_time_avg, livreur.pickup_eta_avg))
+            averages[livreur_id] = (ewma(time_avg, actual), ewma(eta_avg, predicted))
+        for livreur_id, (time_avg, eta_avg) in averages.items():
+            self.browse(livreur_id).write({'pickup_time_avg': time_avg, 'pickup_eta_avg': eta_avg})
+
+    @api.model
+    def _record_speeds(self, points):
+        """Update the rolling speed of the livreurs with their new GPS fixes"""
+        tracks = {}
+        for point in points:
+            tracks.setdefault(point['livreur_id'], []).append(point)
+        speeds = {livreur_id: track_speed(track) for livreur_id, track in tracks.items()}
+        speeds = {livreur_id: speed for livreur_id, speed in speeds.items() if speed is not None}
+        if not speeds:
+            return
+        livreurs = self.browse(list(speeds))
+        livreurs.flush_recordset(['speed_avg_kmh'])
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS livreur
+               SET speed_avg_kmh = CASE
+                       WHEN COALESCE(livreur.speed_avg_kmh, 0) > 0
+                       THEN livreur.speed_avg_kmh + %s * (sample.speed - livreur.speed_avg_kmh)
+                       ELSE sample.speed
+                   END
+              FROM unnest(%s::int[], %s::float8[]) AS sample(id, speed)
+             WHERE livreur.id = sample.id
+        """, [EWMA_ALPHA, list(speeds), list(speeds.values())])
+        livreurs.invalidate_recordset(['speed_avg_kmh'])
+
+    # ==================== REGISTRATION ====================
+    
+    @api.model
+    def _phone_in_use(self, phone):
+        """Whether a livreur account already uses this phone number, whatever its formatting"""
+        partners = self.env['res.partner'].with_context(active_test=False)._search_by_phones([phone])
+        if not partners:
+            return False
+        users = self.env['res.users'].with_context(active_test=False).search([('partner_id', 'in', partners.ids)])
+        return bool(users) and bool(self.search_count([('user_id', 'in', users.ids)], limit=1))
+    
     # ==================== REGISTRATION APPROVAL ACTIONS ====================
     
     def action_approve_registration(self):
@@ -324,6 +632,54 @@ class DeliveryLivreur(models.Model):
             }
         }
     
+    # ==================== TOUR ====================
+
+    def action_optimize_tour(self):
+        """Plan again from scratch the tour of the orders the livreurs carry"""
+        self.env['delivery.route'].sudo()._plan_livreur_tours(self, incremental=False)
+        return True
+
+    # ==================== CASH SETTLEMENT ====================
+    
+    def action_settle_cash(self):
+        """End of shift: settle in a single cash entry all the cash-on-delivery
+        invoices of the orders delivered by the livreur that are still due."""
+        self.ensure_one()
+        Billing = self.env['delivery.billing']
+        billings = Billing.search([
+            ('order_id.assigned_livreur_id', '=', self.id),
+            ('order_id.status', '=', 'delivered'),
+            ('state', 'in', ('draft', 'invoiced', 'posted', 'partial')),
+        ])
+        # Deliveries still in the invoicing queue are invoiced now
+        pending = billings.filtered(
+            lambda billing: not billing.invoice_id and billing.enterprise_id.invoicing_mode in (False, 'per_delivery')
+        )
+        pending._lock_uninvoiced()._create_invoices()
+        billings.invoice_id.filtered(lambda invoice: invoice.state == 'draft').action_post()
+        # Consolidated invoices are paid by the enterprise, not collected by the livreur
+        payment_move = billings._pay_cash()
+        
+        if not payment_move:
+            message, notification_type = _('Aucun encaissement en attente pour %s.') % self.name, 'info'
+        else:
+            message = _('%(count)s factures encaissées pour %(amount)s MRU (%(move)s).') % {
+                'count': len(payment_move.line_ids) - 1,
+                'amount': payment_move.amount_total,
+                'move': payment_move.name,
+            }
+            notification_type = 'success'
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Clôture de Caisse'),
+                'message': message,
+                'type': notification_type,
+                'sticky': False,
+            }
+        }
+    
     # ==================== DOCUMENT MIGRATION ====================
     
     @api.model
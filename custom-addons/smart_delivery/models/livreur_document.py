@@ -26,6 +26,7 @@ class LivreurDocument(models.Model):
         attachment=True
     )
     photo_filename = fields.Char(string='Nom du fichier')
+    photo_thumbnail = fields.Image(string='Miniature', related='photo', max_width=256, max_height=256, store=True)
     sequence = fields.Integer(string='Séquence', default=10)
     
     # Optional: track document verification status
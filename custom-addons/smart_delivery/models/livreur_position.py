@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+
+# Position history is kept this long, then garbage collected
+POSITION_RETENTION_DAYS = 30
+
+
+class DeliveryLivreurPosition(models.Model):
+    """GPS history of the livreurs.
+
+    Append-only time series written in bulk by the location ingestion
+    endpoint: no ORM create, no audit columns, no chatter.
+    """
+    _name = 'delivery.livreur.position'
+    _description = 'Position GPS du Livreur'
+    _order = 'recorded_at desc, id desc'
+    _log_access = False
+
+    livreur_id = fields.Many2one('delivery.livreur', string='Livreur', required=True, ondelete='cascade')
+    latitude = fields.Float(string='Latitude', digits=(10, 7), required=True)
+    longitude = fields.Float(string='Longitude', digits=(10, 7), required=True)
+    recorded_at = fields.Datetime(string='Date du Relevé', required=True)
+    speed = fields.Float(string='Vitesse (m/s)')
+    heading = fields.Float(string='Cap (°)')
+    accuracy = fields.Float(string='Précision (m)')
+
+    def init(self):
+        super().init()
+        tools.create_index(
+            self.env.cr, 'delivery_livreur_position_livreur_recorded_index', self._table,
+            ['livreur_id', 'recorded_at'],
+        )
+
+    @api.model
+    def _insert_points(self, points):
+        """Append GPS fixes with a single multi-row INSERT.
+
+        :param points: list of dicts with livreur_id, lat, long, recorded_at
+                       and optionally speed, heading, accuracy
+        """
+        if not points:
+            return
+        columns = ('livreur_id', 'latitude', 'longitude', 'recorded_at', 'speed', 'heading', 'accuracy')
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} ({', '.join(columns)})
+            SELECT * FROM unnest(
+                %s::int[], %s::numeric[], %s::numeric[], %s::timestamp[],
+                %s::float8[], %s::float8[], %s::float8[]
+            )
+        """, [
+            [point['livreur_id'] for point in points],
+            [point['lat'] for point in points],
+            [point['long'] for point in points],
+            [point['recorded_at'] for point in points],
+            [point.get('speed') for point in points],
+            [point.get('heading') for point in points],
+            [point.get('accuracy') for point in points],
+        ])
+
+    @api.autovacuum
+    def _gc_positions(self):
+        """Delete positions older than POSITION_RETENTION_DAYS"""
+        limit_date = fields.Datetime.now() - timedelta(days=POSITION_RETENTION_DAYS)
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE recorded_at < %s", [limit_date])
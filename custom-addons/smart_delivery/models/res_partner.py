@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import column_exists, create_column
+
+from ..utils.auth_cache import clear_on_commit
+from ..utils.phone import DEFAULT_COUNTRY_CODE, NATIONAL_NUMBER_LENGTH, normalize_phone
 
 
 class ResPartner(models.Model):
@@ -21,6 +26,101 @@ class ResPartner(models.Model):
     
     fcm_token = fields.Char(string='Token FCM (Push Notification)', help="Token Firebase pour les notifications push")
     
+    # Phone lookups (receivers of the orders, registration duplicates) go through this indexed column
+    phone_normalized = fields.Char(
+        string='Téléphone Normalisé',
+        compute='_compute_phone_normalized',
+        store=True,
+        index=True,
+    )
+    
+    def _auto_init(self):
+        if not column_exists(self.env.cr, 'res_partner', 'phone_normalized'):
+            # Backfill the column in SQL instead of computing it for every partner
+            create_column(self.env.cr, 'res_partner', 'phone_normalized', 'varchar')
+            self._backfill_phone_normalized()
+        return super()._auto_init()
+    
+    @api.model
+    def _backfill_phone_normalized(self):
+        """Set phone_normalized of all the partners in SQL, like normalize_phone does"""
+        self.env.cr.execute(SQL(
+            r"""
+                UPDATE res_partner
+                   SET phone_normalized = NULLIF(
+                           CASE
+                               WHEN phone.international IS NULL THEN phone.digits
+                               WHEN LEFT(phone.international, %(code_length)s) = %(country_code)s
+                                AND LENGTH(phone.international) = %(international_length)s
+                               THEN SUBSTRING(phone.international FROM %(code_length)s + 1)
+                               ELSE phone.international
+                           END,
+                           ''
+                       )
+                  FROM (
+                        SELECT id, digits,
+                               CASE
+                                   WHEN phone ~ '^\s*\+' THEN digits
+                                   WHEN digits LIKE '00%%' THEN SUBSTRING(digits FROM 3)
+                               END AS international
+                          FROM (
+                                SELECT id, phone, REGEXP_REPLACE(phone, '\D+', '', 'g') AS digits
+                                  FROM res_partner
+                                 WHERE phone IS NOT NULL
+                               ) AS partner_phone
+                       ) AS phone
+                 WHERE phone.id = res_partner.id
+            """,
+            country_code=DEFAULT_COUNTRY_CODE,
+            code_length=len(DEFAULT_COUNTRY_CODE),
+            international_length=len(DEFAULT_COUNTRY_CODE) + NATIONAL_NUMBER_LENGTH,
+        ))
+        self.invalidate_model(['phone_normalized'])
+    
+    def write(self, vals):
+        # The API caches the company (commercial partner) of each user
+        if 'parent_id' in vals or 'is_company' in vals:
+            clear_on_commit(self.env)
+        return super().write(vals)
+    
+    @api.depends('phone')
+    def _compute_phone_normalized(self):
+        for partner in self:
+            partner.phone_normalized = normalize_phone(partner.phone) or False
+    
+    @api.model
+    def _search_by_phones(self, phones):
+        """Partners whose phone is one of `phones`, whatever their formatting"""
+        normalized = {normalize_phone(phone) for phone in phones} - {''}
+        if not normalized:
+            return self.browse()
+        return self.search_fetch([('phone_normalized', 'in', list(normalized))], ['phone_normalized'], order='id')
+    
+    @api.model
+    def _resolve_phones(self, names_by_phone):
+        """Partner of each phone number, created when none matches.
+        
+        All the numbers are looked up in one query, and the missing partners
+        are created in one batch.
+        
+        :param names_by_phone: dict {phone: name of the partner to create}
+        :return: dict {normalized phone: partner}
+        """
+        partners = {}
+        for partner in self._search_by_phones(names_by_phone):
+            # The oldest partner wins when several share a number
+            partners.setdefault(partner.phone_normalized, partner)
+        
+        vals_by_phone = {}
+        for phone, name in names_by_phone.items():
+            normalized = normalize_phone(phone)
+            if normalized and normalized not in partners and normalized not in vals_by_phone:
+                vals_by_phone[normalized] = {'name': name or phone, 'phone': phone, 'customer_rank': 1}
+        if vals_by_phone:
+            created = self.create(list(vals_by_phone.values()))
+            partners.update(zip(vals_by_phone, created))
+        return partners
+    
     def _compute_is_delivery_enterprise(self):
         """Check if this partner is linked to an approved delivery enterprise"""
         for partner in self:
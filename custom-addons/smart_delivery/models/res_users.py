@@ -2,6 +2,11 @@
 
 from odoo import models, fields, api
 
+from ..utils.auth_cache import clear_on_commit, invalidate_users_on_commit
+
+# res.users fields the API authorization depends on
+AUTH_USER_FIELDS = {'groups_id', 'active', 'partner_id', 'delivery_user_type'}
+
 
 class ResUsers(models.Model):
     _inherit = 'res.users'
@@ -77,8 +82,15 @@ class ResUsers(models.Model):
             vals['password'] = vals.pop('set_password')
         elif 'set_password' in vals:
             vals.pop('set_password')
+        # Group changes may come through the in_group_*/sel_groups_* pseudo-fields of the form
+        if any(key in AUTH_USER_FIELDS or key.startswith(('in_group_', 'sel_groups_')) for key in vals):
+            invalidate_users_on_commit(self.env, self.ids)
         return super().write(vals)
     
+    def unlink(self):
+        invalidate_users_on_commit(self.env, self.ids)
+        return super().unlink()
+    
     @api.model_create_multi
     def create(self, vals_list):
         """Override create to handle password and use email as login"""
@@ -103,3 +115,12 @@ class ResUsers(models.Model):
         """Return the user type for Smart Delivery API"""
         self.ensure_one()
         return self.delivery_user_type or 'other'
+
+
+class ResGroups(models.Model):
+    _inherit = 'res.groups'
+
+    def write(self, vals):
+        if 'users' in vals:
+            clear_on_commit(self.env)
+        return super().write(vals)
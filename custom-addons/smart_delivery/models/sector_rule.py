@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
+
+from ..utils.pricing import Tariff
+
+# sector.rule fields held by the tariff cache
+TARIFF_FIELDS = [field for field in Tariff._fields if field != 'id']
 
 
 class SectorRule(models.Model):
@@ -37,6 +43,18 @@ class SectorRule(models.Model):
         help="Distance en kilomètres incluse dans le prix de base"
     )
     
+    # Dispatch timeouts
+    dispatch_batch_timeout = fields.Integer(
+        string='Délai par Batch (s)',
+        default=30,
+        help="Temps laissé aux livreurs d'un batch pour accepter avant de notifier le batch suivant"
+    )
+    dispatch_global_timeout = fields.Integer(
+        string='Délai Global (s)',
+        default=180,
+        help="Durée maximale du dispatching avant l'annulation de la commande"
+    )
+    
     description = fields.Text(string='Description')
     
     # Related livreurs
@@ -68,9 +86,56 @@ class SectorRule(models.Model):
     
     _sql_constraints = [
         ('sector_type_unique', 'UNIQUE(sector_type)', 
-         'Une règle existe déjà pour ce type de secteur!')
+         'Une règle existe déjà pour ce type de secteur!'),
+        ('dispatch_batch_timeout_positive', 'CHECK(dispatch_batch_timeout > 0)',
+         'Le délai par batch doit être strictement positif!'),
+        ('dispatch_global_timeout_positive', 'CHECK(dispatch_global_timeout > 0)',
+         'Le délai global doit être strictement positif!'),
     ]
     
+    # ==================== TARIFF CACHE ====================
+
+    @api.model
+    @tools.ormcache()
+    def _get_tariffs(self):
+        """Tariffs of every sector, read once and kept in the registry cache.
+
+        The cache is cleared (in every worker) when a rule is created, changed
+        or deleted.
+
+        :return: dict {sector type: Tariff}, in the order of the rules
+        """
+        rules = self.sudo().search_read([], TARIFF_FIELDS, order='id')
+        return frozendict({rule['sector_type']: Tariff(**rule) for rule in rules if rule['sector_type']})
+
+    @api.model
+    def _get_tariff(self, sector_type):
+        """Tariff of a sector type, None if it has no rule"""
+        return self._get_tariffs().get(sector_type)
+
+    @api.model
+    def _get_rule(self, sector_type):
+        """Rule of a sector type (empty recordset if none), without searching it"""
+        tariff = self._get_tariff(sector_type)
+        return self.browse(tariff.id if tariff else [])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return rules
+
+    def write(self, vals):
+        result = super().write(vals)
+        if any(field in vals for field in TARIFF_FIELDS):
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
     @api.model
     def init(self):
         """Initialise les règles de secteur par défaut au chargement du module"""
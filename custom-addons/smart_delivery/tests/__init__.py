@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from . import test_dispatch
+from . import test_dispatch_timeout
+from . import test_notification_outbox
+from . import test_location_ingestion
+from . import test_api_log
+from . import test_stats
+from . import test_pagination
+from . import test_auth_cache
+from . import test_uploads
+from . import test_billing_invoicing
+from . import test_accept_concurrency
+from . import test_order_feed
+from . import test_route_planner
+from . import test_pricing
+from . import test_phone_lookup
+from . import test_invoice_pdf_cache
+from . import test_load
+from . import test_eta
@@ -0,0 +1,112 @@
+import random
+from datetime import timedelta
+
+from odoo import fields
+
+# Generated data is scattered over ~20 km around this point
+AREA_CENTER = (18.08, -15.97)
+AREA_SPAN = 0.2
+
+
+def percentiles(samples, ranks=(50, 90, 99)):
+    """dict {rank: value} of the nearest-rank percentiles of `samples`"""
+    ordered = sorted(samples)
+    if not ordered:
+        return dict.fromkeys(ranks, 0.0)
+    return {
+        rank: ordered[min(len(ordered) - 1, max(0, -(-rank * len(ordered) // 100) - 1))]
+        for rank in ranks
+    }
+
+
+class LoadDataGenerator:
+    """Reproducible livreurs, enterprises and orders for the load tests.
+
+    The same seed always generates the same dataset, so that runs of the
+    load tests on two versions of the module can be compared.
+    """
+
+    def __init__(self, env, seed=1, prefix='load'):
+        self.env = env
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+
+    def position(self):
+        return (
+            AREA_CENTER[0] + (self.rng.random() - 0.5) * AREA_SPAN,
+            AREA_CENTER[1] + (self.rng.random() - 0.5) * AREA_SPAN,
+        )
+
+    def sector(self, sector_type=None):
+        return self.env['sector.rule'].create({'sector_type': sector_type or f'{self.prefix}_sector'})
+
+    def livreurs(self, count, sector=None):
+        """Approved and available livreurs, each with a user to call the API"""
+        vals_list = []
+        for i in range(count):
+            lat, long = self.position()
+            vals_list.append({
+                'name': f'{self.prefix.title()} Livreur {i}',
+                'phone': f'3{i:07d}',
+                'email': f'{self.prefix}.livreur{i}@example.com',
+                'password': f'{self.prefix}-password',
+                'nni': f'{self.prefix.upper()}{i:08d}',
+                'vehicle_type': self.rng.choice(['motorcycle', 'car', 'bicycle']),
+                'current_lat': lat,
+                'current_long': long,
+                'availability': True,
+                'verified': True,
+                'registration_status': 'approved',
+                'sector_ids': [(6, 0, sector.ids)] if sector else [],
+            })
+        return self.env['delivery.livreur'].create(vals_list)
+
+    def enterprises(self, count):
+        """Approved enterprises, each with a user to call the API"""
+        return self.env['delivery.enterprise'].create([{
+            'name': f'{self.prefix.title()} Enterprise {i}',
+            'email': f'{self.prefix}.enterprise{i}@example.com',
+            'password': f'{self.prefix}-password',
+            'phone': f'4{i:07d}',
+            'registration_status': 'approved',
+        } for i in range(count)])
+
+    def orders(self, count, senders, sector_type='standard', livreurs=None, **vals):
+        """Orders spread over the senders (partners), in draft unless `vals` says otherwise
+
+        :param livreurs: livreurs the orders are assigned to in turn
+        """
+        vals_list = []
+        for i in range(count):
+            pickup, drop = self.position(), self.position()
+            if livreurs:
+                vals['assigned_livreur_id'] = livreurs[i % len(livreurs)].id
+            vals_list.append({
+                'sector_type': sector_type,
+                'sender_id': senders[i % len(senders)].id,
+                'receiver_name': f'{self.prefix.title()} Receiver {i}',
+                'receiver_phone': f'5{i:07d}',
+                'pickup_lat': pickup[0],
+                'pickup_long': pickup[1],
+                'drop_lat': drop[0],
+                'drop_long': drop[1],
+                **vals,
+            })
+        return self.env['delivery.order'].create(vals_list)
+
+    def gps_points(self, count, start=None):
+        """A track of `count` fixes one second apart, ending now"""
+        lat, long = start or self.position()
+        now = fields.Datetime.now()
+        points = []
+        for i in range(count):
+            lat += (self.rng.random() - 0.5) * 0.0005
+            long += (self.rng.random() - 0.5) * 0.0005
+            recorded_at = now - timedelta(seconds=count - i)
+            points.append({
+                'lat': lat,
+                'long': long,
+                'timestamp': recorded_at.isoformat(),
+                'speed': round(self.rng.uniform(0.0, 15.0), 1),
+            })
+        return points
@@ -0,0 +1,211 @@
+import threading
+import time
+from unittest.mock import patch
+
+from psycopg2 import errors as pg_errors
+
+from odoo import SUPERUSER_ID, api, fields
+from odoo.sql_db import db_connect
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, TransactionCase, get_db_name
+
+from odoo.addons.smart_delivery.controllers.api import ACCEPT_MAX_TRIES
+
+ACCEPTORS = 12
+
+
+def _livreur_vals(i):
+    return {
+        'name': f'Accept Driver {i}',
+        'phone': f'2200{i:04d}',
+        'vehicle_type': 'motorcycle',
+        'availability': True,
+        'verified': True,
+        'registration_status': 'approved',
+    }
+
+
+def _order_vals(sender, livreurs):
+    return {
+        'sector_type': 'standard',
+        'sender_id': sender.id,
+        'receiver_name': 'Accept Receiver',
+        'receiver_phone': '22009999',
+        'status': 'dispatching',
+        'dispatched_livreur_ids': [(6, 0, livreurs.ids)],
+        'current_batch_livreur_ids': [(6, 0, livreurs.ids)],
+    }
+
+
+@tagged('post_install', '-at_install')
+class TestAcceptDelivery(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sender = cls.env['res.partner'].create({'name': 'Accept Shipper'})
+        cls.livreurs = cls.env['delivery.livreur'].create([_livreur_vals(i) for i in range(2)])
+        cls.order = cls.env['delivery.order'].create(_order_vals(cls.sender, cls.livreurs))
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_second_accept_is_refused(self, _notify):
+        first, second = self.livreurs
+        self.assertEqual(self.order.action_accept_delivery(first.id), {'success': True})
+        result = self.order.action_accept_delivery(second.id)
+        self.assertEqual(result['code'], 'ORDER_NOT_AVAILABLE')
+        self.assertEqual(self.order.assigned_livreur_id, first)
+        self.assertFalse(self.order.current_batch_livreur_ids)
+
+
+class CommittedOrderCase(BaseCase):
+    """Order dispatched to `acceptors` livreurs, committed beforehand and removed afterwards,
+    so that each transaction of the test runs on its own database connection."""
+    acceptors = 1
+
+    def setUp(self):
+        super().setUp()
+        self.dbname = get_db_name()
+        with db_connect(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            sender = env['res.partner'].create({'name': 'Stress Shipper'})
+            livreurs = env['delivery.livreur'].create([_livreur_vals(100 + i) for i in range(self.acceptors)])
+            order = env['delivery.order'].create(_order_vals(sender, livreurs))
+            self.sender_id, self.livreur_ids, self.order_id = sender.id, livreurs.ids, order.id
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with db_connect(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            order = env['delivery.order'].browse(self.order_id)
+            order.unlink()
+            env['delivery.livreur'].browse(self.livreur_ids).unlink()
+            env['res.partner'].browse(self.sender_id).unlink()
+
+    def _read_order(self):
+        with db_connect(self.dbname).cursor() as cr:
+            cr.execute("SELECT status, assigned_livreur_id FROM delivery_order WHERE id = %s", [self.order_id])
+            return cr.fetchone()
+
+
+@tagged('post_install', '-at_install')
+class TestAcceptLockedOrder(CommittedOrderCase):
+    """Another transaction holds the order while a livreur accepts it"""
+    acceptors = 2
+
+    def _accept_behind_cron(self, cron_change):
+        """Accept the order while another transaction holds its lock.
+
+        :param cron_change: callable(env) run by the lock holder before it commits
+        :return: result of the accept, or the exception it raised
+        """
+        started = threading.Event()
+        results = {}
+
+        def accept():
+            with db_connect(self.dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                order = env['delivery.order'].browse(self.order_id)
+                order.status
+                started.set()
+                try:
+                    results['result'] = order.action_accept_delivery(self.livreur_ids[0])
+                except Exception as e:
+                    results['result'] = e
+
+        with db_connect(self.dbname).cursor() as cron_cr:
+            # Lock taken by the cron on the expired orders
+            cron_cr.execute("SELECT id FROM delivery_order WHERE id = %s FOR UPDATE", [self.order_id])
+            thread = threading.Thread(target=accept)
+            thread.start()
+            started.wait(10)
+            time.sleep(0.5)
+            self.assertTrue(thread.is_alive(), "The accept waits for the lock")
+            cron_change(api.Environment(cron_cr, SUPERUSER_ID, {}))
+        thread.join(timeout=30)
+        return results['result']
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_accept_waits_for_cron(self, _notify):
+        result = self._accept_behind_cron(lambda env: None)
+        self.assertEqual(result, {'success': True}, "A lock alone does not make the order taken")
+        self.assertEqual(self._read_order(), ('assigned', self.livreur_ids[0]))
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_accept_retried_after_next_batch(self, _notify):
+        def next_batch(env):
+            env['delivery.order'].browse(self.order_id).dispatch_start_time = fields.Datetime.now()
+
+        result = self._accept_behind_cron(next_batch)
+        self.assertIsInstance(result, pg_errors.SerializationFailure,
+                              "The accept is to be retried, not answered as taken")
+        self.assertEqual(self._read_order(), ('dispatching', None))
+
+        # The retry in a new transaction gets the order
+        with db_connect(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            result = env['delivery.order'].browse(self.order_id).action_accept_delivery(self.livreur_ids[0])
+        self.assertEqual(result, {'success': True})
+        self.assertEqual(self._read_order(), ('assigned', self.livreur_ids[0]))
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_concurrent_accept_is_told_taken(self, _notify):
+        with db_connect(self.dbname).cursor() as winner_cr:
+            winner_env = api.Environment(winner_cr, SUPERUSER_ID, {})
+            result = winner_env['delivery.order'].browse(self.order_id).action_accept_delivery(self.livreur_ids[0])
+            self.assertEqual(result, {'success': True})
+
+            # Answered in its own transaction, without waiting for the winner to commit
+            with db_connect(self.dbname).cursor() as loser_cr:
+                loser_env = api.Environment(loser_cr, SUPERUSER_ID, {})
+                result = loser_env['delivery.order'].browse(self.order_id).action_accept_delivery(self.livreur_ids[1])
+            self.assertEqual(result['code'], 'ORDER_NOT_AVAILABLE')
+        self.assertEqual(self._read_order(), ('assigned', self.livreur_ids[0]))
+
+
+@tagged('post_install', '-at_install', '-standard', 'smart_delivery_stress')
+class TestAcceptConcurrency(CommittedOrderCase):
+    """Every livreur of a batch accepts the same order at the same time.
+
+    Each acceptor runs in its own thread with its own database connection, so
+    the transactions really overlap. Run on demand: --test-tags smart_delivery_stress
+    """
+    acceptors = ACCEPTORS
+
+    def _accept(self, livreur_id, barrier, results):
+        with db_connect(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            order = env['delivery.order'].browse(self.order_id)
+            # Read the order before racing, like the API does when resolving it
+            order.status
+            barrier.wait()
+            # Retried in a new transaction on serialization failures, like the API does
+            for _try in range(ACCEPT_MAX_TRIES):
+                try:
+                    results[livreur_id] = order.action_accept_delivery(livreur_id)
+                    break
+                except pg_errors.SerializationFailure:
+                    cr.rollback()
+                except Exception as e:
+                    results[livreur_id] = {'exception': repr(e)}
+                    raise
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_simultaneous_accepts(self, _notify):
+        barrier = threading.Barrier(ACCEPTORS)
+        results = {}
+        threads = [
+            threading.Thread(target=self._accept, args=(livreur_id, barrier, results))
+            for livreur_id in self.livreur_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        self.assertEqual(len(results), ACCEPTORS, "Every acceptor got an answer")
+        winners = [livreur_id for livreur_id, result in results.items() if result.get('success')]
+        losers = [result.get('code') for result in results.values() if not result.get('success')]
+        self.assertEqual(len(winners), 1, f"Exactly one livreur gets the order: {results}")
+        self.assertEqual(set(losers), {'ORDER_NOT_AVAILABLE'}, "The others are told it is taken, without error")
+
+        self.assertEqual(self._read_order(), ('assigned', winners[0]))
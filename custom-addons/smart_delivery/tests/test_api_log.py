@@ -0,0 +1,79 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.api_log_buffer import api_log_buffer
+
+
+@tagged('post_install', '-at_install')
+class TestApiLog(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ApiLog = self.env['api.log']
+        self.ICP = self.env['ir.config_parameter'].sudo()
+        # Logs are written directly in tests; the buffer is only used, and flushed, by test_buffered_logs
+        self.startPatcher(patch.object(api_log_buffer, '_ensure_thread'))
+        api_log_buffer.pop(self.env.cr.dbname)
+        self.addCleanup(api_log_buffer.pop, self.env.cr.dbname)
+
+    def _last_log(self, endpoint):
+        self.ApiLog._flush_buffer()
+        return self.ApiLog.search([('endpoint', '=', endpoint)], limit=1)
+
+    def test_payload_redaction_and_truncation(self):
+        """Secrets and files are never stored, payloads are capped"""
+        self.ICP.set_param('smart_delivery.api_log_max_payload_size', 300)
+        self.ApiLog.log_request('test', '/test/register', {
+            'login': 'driver@example.com',
+            'password': 'secret',
+            'photo': 'A' * 100000,
+            'documents': [{'name': 'CNI', 'photo': 'B' * 5000}],
+        }, {'success': True, 'token': 'jwt'})
+
+        log = self._last_log('/test/register')
+        self.assertIn('driver@example.com', log.payload)
+        self.assertNotIn('secret', log.payload)
+        self.assertNotIn('AAAA', log.payload)
+        self.assertNotIn('BBBB', log.payload)
+        self.assertIn('<100000 octets>', log.payload)
+        self.assertNotIn('jwt', log.response)
+        self.assertLessEqual(len(log.payload), 400)
+
+    def test_sampling(self):
+        """Successful calls follow the endpoint sampling rate, errors are always logged"""
+        self.ICP.set_param('smart_delivery.api_log_sample_rates', '{"/test/sampled/*": 0}')
+        self.ApiLog.log_request('test', '/test/sampled/1', {}, {'success': True})
+        self.assertFalse(self._last_log('/test/sampled/1'))
+
+        self.ApiLog.log_request('test', '/test/sampled/1', {}, {'success': False}, 500, 'boom')
+        self.assertTrue(self._last_log('/test/sampled/1'))
+
+        self.ApiLog.log_request('test', '/test/other', {}, {'success': True})
+        self.assertTrue(self._last_log('/test/other'))
+
+    def test_buffered_logs(self):
+        """Logs wait in the buffer until it is flushed, then are created in bulk"""
+        for i in range(3):
+            api_log_buffer.add(self.env.cr.dbname, {'client_id': 'test', 'endpoint': f'/test/buffered/{i}', 'status_code': 200})
+        self.assertFalse(self.ApiLog.search([('endpoint', '=like', '/test/buffered/%')]))
+
+        self.ApiLog._flush_buffer()
+        self.assertEqual(len(self.ApiLog.search([('endpoint', '=like', '/test/buffered/%')])), 3)
+
+    def test_invalid_sample_rates(self):
+        """Malformed sampling settings are ignored instead of failing the requests"""
+        for raw in ('[]', '1', '"rate"', '{"/test/*": "often"}', '{"/test/*": null}'):
+            self.ICP.set_param('smart_delivery.api_log_sample_rates', raw)
+            self.ApiLog.log_request('test', '/test/invalid_rates', {}, {'success': True})
+        self.assertEqual(len(self.ApiLog.search([('endpoint', '=', '/test/invalid_rates')])), 5)
+
+    def test_invalid_settings(self):
+        """Malformed numeric settings fall back to their defaults"""
+        self.ICP.set_param('smart_delivery.api_log_default_sample_rate', 'often')
+        self.ICP.set_param('smart_delivery.api_log_max_payload_size', '4k')
+        self.ICP.set_param('smart_delivery.api_log_retention_days', 'month')
+        self.ApiLog.log_request('test', '/test/invalid_settings', {'value': 'x' * 100}, {'success': True})
+        self.assertIn('x' * 100, self._last_log('/test/invalid_settings').payload)
+        self.ApiLog._gc_api_logs()
@@ -0,0 +1,45 @@
+import time
+from unittest.mock import patch
+
+from odoo.tests import BaseCase
+
+from odoo.addons.smart_delivery.utils.auth_cache import AuthCache, AuthInfo
+
+
+class TestAuthCache(BaseCase):
+
+    def _info(self, user_id):
+        return AuthInfo(user_id=user_id, user_type='livreur', livreur_id=user_id * 10, partner_id=user_id * 100)
+
+    def test_lru_bound(self):
+        cache = AuthCache(max_entries=2)
+        cache.set('db', 'token1', self._info(1))
+        cache.set('db', 'token2', self._info(2))
+        cache.get('db', 'token1')  # token2 becomes the least recently used
+        cache.set('db', 'token3', self._info(3))
+        self.assertEqual(cache.get('db', 'token1'), self._info(1))
+        self.assertIsNone(cache.get('db', 'token2'))
+        self.assertEqual(cache.get('db', 'token3'), self._info(3))
+
+    def test_ttl_and_token_expiry(self):
+        cache = AuthCache(ttl=60)
+        now = time.time()
+        cache.set('db', 'short', self._info(1), token_expiry=now + 5)
+        cache.set('db', 'long', self._info(2), token_expiry=now + 3600)
+        with patch('odoo.addons.smart_delivery.utils.auth_cache.time.time', return_value=now + 10):
+            self.assertIsNone(cache.get('db', 'short'))
+            self.assertEqual(cache.get('db', 'long'), self._info(2))
+        with patch('odoo.addons.smart_delivery.utils.auth_cache.time.time', return_value=now + 61):
+            self.assertIsNone(cache.get('db', 'long'))
+
+    def test_invalidation(self):
+        cache = AuthCache()
+        cache.set('db', 'token1', self._info(1))
+        cache.set('db', 'token2', self._info(2))
+        cache.set('other_db', 'token1', self._info(1))
+        cache.invalidate_users('db', [1])
+        self.assertIsNone(cache.get('db', 'token1'))
+        self.assertEqual(cache.get('db', 'token2'), self._info(2))
+        self.assertEqual(cache.get('other_db', 'token1'), self._info(1))
+        cache.clear('db')
+        self.assertIsNone(cache.get('db', 'token2'))
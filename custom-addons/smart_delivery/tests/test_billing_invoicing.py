@@ -0,0 +1,166 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBillingInvoicing(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sender = cls.env['res.partner'].create({'name': 'Invoicing Shipper'})
+        cls.livreur = cls.env['delivery.livreur'].create({
+            'name': 'Invoicing Driver',
+            'phone': '22000401',
+            'vehicle_type': 'motorcycle',
+        })
+
+    def _deliver(self, count, sender=None):
+        orders = self.env['delivery.order'].create([{
+            'sector_type': 'standard',
+            'sender_id': (sender or self.sender).id,
+            'receiver_name': f'Receiver {i}',
+            'receiver_phone': f'2201{i:04d}',
+            'assigned_livreur_id': self.livreur.id,
+        } for i in range(count)])
+        orders.write({'status': 'delivered'})
+        return self.env['delivery.billing'].concat(*(order._generate_billing() for order in orders))
+
+    def test_delivery_does_not_invoice(self):
+        """Billings wait in the queue, the cron invoices and posts them in bulk"""
+        billings = self._deliver(3)
+        self.assertFalse(billings.invoice_id)
+
+        self.env['delivery.billing']._cron_invoice_pending()
+        self.assertEqual(len(billings.invoice_id), 3)
+        self.assertEqual(set(billings.invoice_id.mapped('state')), {'posted'})
+        self.assertEqual(
+            billings.invoice_id.partner_id, billings.receiver_partner_id,
+            "Per-delivery invoices are addressed to the receiver",
+        )
+
+    def test_consolidated_invoicing(self):
+        """Daily enterprises get one invoice per closed day"""
+        enterprise = self.env['delivery.enterprise'].create({
+            'name': 'Daily Shipper',
+            'email': 'daily.shipper@example.com',
+            'phone': '22000402',
+            'invoicing_mode': 'daily',
+        })
+        yesterday = self._deliver(2, sender=enterprise.partner_id)
+        today = self._deliver(1, sender=enterprise.partner_id)
+        self.assertEqual(yesterday.enterprise_id, enterprise)
+        self.env.cr.execute(
+            "UPDATE delivery_billing SET create_date = %s WHERE id IN %s",
+            [fields.Datetime.now() - timedelta(days=1), tuple(yesterday.ids)],
+        )
+        yesterday.invalidate_recordset(['create_date'])
+
+        self.env['delivery.billing']._cron_invoice_pending()
+        invoice = yesterday.invoice_id
+        self.assertEqual(len(invoice), 1)
+        self.assertEqual(invoice.partner_id, enterprise.partner_id)
+        self.assertEqual(invoice.amount_untaxed, sum(yesterday.mapped('total_amount')))
+        self.assertFalse(today.invoice_id, "The current day is not closed yet")
+
+    def test_consolidated_invoicing_batch(self):
+        """A batch takes closed days whole, oldest first, and leaves the next ones to the next run"""
+        enterprise = self.env['delivery.enterprise'].create({
+            'name': 'Batched Shipper',
+            'email': 'batched.shipper@example.com',
+            'phone': '22000404',
+            'invoicing_mode': 'daily',
+        })
+        older = self._deliver(2, sender=enterprise.partner_id)
+        newer = self._deliver(1, sender=enterprise.partner_id)
+        for billings, days in ((older, 3), (newer, 2)):
+            self.env.cr.execute(
+                "UPDATE delivery_billing SET create_date = %s WHERE id IN %s",
+                [fields.Datetime.now() - timedelta(days=days), tuple(billings.ids)],
+            )
+        (older + newer).invalidate_recordset(['create_date'])
+
+        self.env['delivery.billing']._cron_invoice_pending(limit=1)
+        self.assertEqual(len(older.invoice_id), 1, "A closed day is never split across batches")
+        self.assertFalse(newer.invoice_id)
+
+        self.env['delivery.billing']._cron_invoice_pending(limit=1)
+        self.assertEqual(len(newer.invoice_id), 1)
+        self.assertNotEqual(newer.invoice_id, older.invoice_id)
+
+    def test_invoicing_errors(self):
+        """A billing failing to invoice or to post leaves the queue without holding back the others"""
+        Billing = self.env['delivery.billing']
+        Move = self.env['account.move']
+        billings = self._deliver(3)
+        create_failing, post_failing, valid = billings
+        prepare_invoice_vals = type(Billing)._prepare_invoice_vals
+        action_post = type(Move).action_post
+
+        def _prepare_invoice_vals(billing, *args, **kwargs):
+            vals = prepare_invoice_vals(billing, *args, **kwargs)
+            if billing == create_failing:
+                vals['invoice_line_ids'][0][2]['account_id'] = 999999999
+            return vals
+
+        def _action_post(moves):
+            if post_failing.invoice_id in moves:
+                raise UserError("Posting refused")
+            return action_post(moves)
+
+        with patch.object(type(Billing), '_prepare_invoice_vals', _prepare_invoice_vals), \
+                patch.object(type(Move), 'action_post', _action_post):
+            Billing._cron_invoice_pending()
+
+        self.assertFalse(create_failing.invoice_id)
+        self.assertTrue(create_failing.invoice_error)
+        self.assertEqual(post_failing.invoice_id.state, 'draft')
+        self.assertEqual(post_failing.invoice_error, "Posting refused")
+        self.assertEqual(valid.invoice_id.state, 'posted')
+        self.assertFalse(valid.invoice_error)
+
+    def test_quick_pay_consolidated(self):
+        """A consolidated invoice is paid by the enterprise, not collected in cash for one delivery"""
+        enterprise = self.env['delivery.enterprise'].create({
+            'name': 'Weekly Shipper',
+            'email': 'weekly.shipper@example.com',
+            'phone': '22000403',
+            'invoicing_mode': 'weekly',
+        })
+        billings = self._deliver(2, sender=enterprise.partner_id)
+        self.env.cr.execute(
+            "UPDATE delivery_billing SET create_date = %s WHERE id IN %s",
+            [fields.Datetime.now() - timedelta(days=8), tuple(billings.ids)],
+        )
+        billings.invalidate_recordset(['create_date'])
+        self.env['delivery.billing']._cron_invoice_pending()
+        invoice = billings.invoice_id
+        self.assertEqual(len(invoice), 1)
+        residual = invoice.amount_residual
+
+        with self.assertRaises(UserError):
+            billings[0].action_quick_pay_cash()
+        self.assertFalse(billings[0]._pay_cash(), "Consolidated invoices are not settled in cash")
+        self.assertEqual(invoice.amount_residual, residual)
+
+    def test_settle_cash(self):
+        """A shift is settled with one cash entry reconciled with every invoice"""
+        billings = self._deliver(2)
+        self.env['delivery.billing']._cron_invoice_pending()
+
+        self.livreur.action_settle_cash()
+        self.assertEqual(set(billings.mapped('invoice_payment_state')), {'paid'})
+        payments = self.env['account.move'].search([('ref', '=like', 'Encaissement espèces%')])
+        self.assertEqual(len(payments), 1)
+        for invoice in billings.invoice_id:
+            receivable = invoice.line_ids.filtered(lambda l: l.account_id.account_type == 'asset_receivable')
+            self.assertEqual(
+                receivable.matched_credit_ids.credit_move_id.name, f"Paiement client - {invoice.name}",
+                "Each invoice is reconciled with its own credit line",
+            )
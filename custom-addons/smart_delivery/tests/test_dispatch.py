@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import json
+
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import UserError
 from datetime import timedelta
@@ -52,8 +54,16 @@ class TestDeliveryDispatch(TransactionCase):
             'dispatch_batch_size': 5 # Smaller batch for testing
         })
 
-    @patch('smart_delivery.models.delivery_order.send_push_notification')
-    def test_dispatch_flow(self, mock_send_push):
+    def _queued_new_order_tokens(self):
+        """FCM tokens of the new order notifications of the order waiting in the outbox"""
+        notifications = self.env['delivery.notification'].search([('state', '=', 'pending')])
+        return {
+            notification.token for notification in notifications
+            if json.loads(notification.data).get('type') == 'new_order'
+            and json.loads(notification.data).get('order_id') == str(self.order.id)
+        }
+
+    def test_dispatch_flow(self):
         """Test the full dispatch flow"""
         
         # 1. Start Dispatch
@@ -62,6 +72,10 @@ class TestDeliveryDispatch(TransactionCase):
         self.assertEqual(self.order.status, 'dispatching')
         self.assertEqual(len(self.order.current_batch_livreur_ids), 5)
         self.assertEqual(len(self.order.dispatched_livreur_ids), 5)
+        self.assertLessEqual(
+            set(self.order.current_batch_livreur_ids.mapped('fcm_token')), self._queued_new_order_tokens(),
+            "The livreurs of the batch are notified through the outbox",
+        )
         
         # Check closest livreurs are picked first
         # Livreur 0 should be closest (same lat/long as pickup)
@@ -73,6 +87,7 @@ class TestDeliveryDispatch(TransactionCase):
         
         self.assertEqual(len(self.order.current_batch_livreur_ids), 5) # New batch of 5
         self.assertEqual(len(self.order.dispatched_livreur_ids), 10) # Total 10 notified
+        self.assertLessEqual(set(self.order.current_batch_livreur_ids.mapped('fcm_token')), self._queued_new_order_tokens())
         
         # Check that previous batch members are NOT in current batch
         self.assertNotIn(self.livreurs[0], self.order.current_batch_livreur_ids)
@@ -89,10 +104,10 @@ class TestDeliveryDispatch(TransactionCase):
         self.assertEqual(self.order.assigned_livreur_id, accepting_livreur)
         self.assertFalse(self.order.current_batch_livreur_ids) # Batch cleared
 
-    @patch('smart_delivery.models.delivery_order.send_push_notification')
-    def test_acceptance_restrictions(self, mock_send_push):
+    def test_acceptance_restrictions(self):
         """Test restrictions on acceptance"""
         self.order.assign_livreur()
+        self.assertNotIn(self.livreurs[14].fcm_token, self._queued_new_order_tokens())
         
         # Try to accept with a livreur who was NOT notified (e.g. Livreur 14, who is far away and not in first batch of 5)
         # Note: We created 15 livreurs, batch size 5. Livreur 14 should be last.
@@ -102,3 +117,95 @@ class TestDeliveryDispatch(TransactionCase):
         self.assertIn('error', result)
         self.assertEqual(result.get('code'), 'NOT_AUTHORIZED')
 
+
+    def test_search_nearest_livreurs(self):
+        """Nearest search returns the closest livreurs first, whatever the fleet size"""
+        far_livreur = self.Livreur.create({
+            'name': 'Livreur Loin',
+            'phone': '123450000',
+            'email': 'livreur_loin@test.com',
+            'nni': 'REF-FAR',
+            'vehicle_type': 'car',
+            'current_lat': 14.7,
+            'current_long': -17.4,
+            'availability': True,
+            'verified': True,
+            'registration_status': 'approved',
+            'sector_ids': [(4, self.sector.id)],
+        })
+        domain = [('sector_ids', 'in', [self.sector.id])]
+
+        nearest = self.Livreur._search_nearest(18.0, -15.0, 3, domain)
+        self.assertEqual(nearest.ids, [l.id for l in self.livreurs[:3]])
+
+        # Asking for the whole fleet falls back to an unbounded search
+        everyone = self.Livreur._search_nearest(18.0, -15.0, 100, domain)
+        self.assertEqual(len(everyone), 16)
+        self.assertEqual(everyone[-1], far_livreur)
+
+    def test_search_near_points(self):
+        """The batched search only loads the livreurs around the pickups"""
+        far_livreur = self.Livreur.create({
+            'name': 'Livreur Loin',
+            'phone': '123450001',
+            'email': 'livreur_loin_batch@test.com',
+            'nni': 'REF-FAR-BATCH',
+            'vehicle_type': 'car',
+            'current_lat': 14.7,
+            'current_long': -17.4,
+            'availability': True,
+            'verified': True,
+            'registration_status': 'approved',
+            'sector_ids': [(4, self.sector.id)],
+        })
+        domain = [('sector_ids', 'in', [self.sector.id])]
+        points = [(18.0, -15.0), (18.05, -15.0)]
+
+        candidates = self.Livreur._search_near_points(points, 3, domain)
+        self.assertLessEqual(set(self.livreurs[:3] + self.livreurs[5:8]), set(candidates))
+        self.assertNotIn(far_livreur, candidates)
+
+        # The excluded livreurs of a point do not count: the box grows to find others
+        excluded_ids = [set(l.id for l in self.livreurs[:3]), set()]
+        candidates = self.Livreur._search_near_points(points, 3, domain, excluded_ids)
+        self.assertLessEqual(set(self.livreurs[:6]), set(candidates))
+
+        # Asking for the whole fleet falls back to an unbounded search
+        self.assertIn(far_livreur, self.Livreur._search_near_points(points, 100, domain))
+
+    def test_bulk_dispatch_next_batches(self):
+        """The cron dispatches every timed-out order in one pass"""
+        other_order = self.DeliveryOrder.create({
+            'sender_id': self.sender.id,
+            'receiver_phone': '88888888',
+            'pickup_lat': 18.14,
+            'pickup_long': -15.0,  # Near Livreur 14
+            'drop_lat': 18.2,
+            'drop_long': -15.1,
+            'sector_type': 'standard',
+            'dispatch_batch_size': 3,
+        })
+        orders = self.order | other_order
+        # Orders are auto-dispatched on creation: start again from a clean state
+        orders.write({
+            'status': 'dispatching',
+            'dispatched_livreur_ids': [(5, 0, 0)],
+            'current_batch_livreur_ids': [(5, 0, 0)],
+        })
+        Notification = self.env['delivery.notification']
+        Notification.search([]).unlink()
+
+        batches = orders._dispatch_next_batches()
+
+        self.assertEqual(batches[self.order].ids, [l.id for l in self.livreurs[:5]])
+        self.assertEqual(batches[other_order].ids, [l.id for l in self.livreurs[14:11:-1]])
+        self.assertEqual(self.order.current_batch_livreur_ids, batches[self.order])
+        self.assertTrue(other_order.dispatch_start_time)
+        # One queued notification per notified driver, none sent synchronously
+        self.assertEqual(Notification.search_count([('state', '=', 'pending')]), 8)
+
+        # Second round skips the drivers that were already notified
+        batches = orders._dispatch_next_batches()
+        self.assertEqual(batches[self.order].ids, [l.id for l in self.livreurs[5:10]])
+        self.assertEqual(len(self.order.dispatched_livreur_ids), 10)
+        self.assertEqual(len(other_order.dispatched_livreur_ids), 6)
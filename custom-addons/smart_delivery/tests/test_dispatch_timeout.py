@@ -2,7 +2,7 @@
 from odoo.tests.common import TransactionCase
 from odoo.tests import tagged
 from odoo import fields
-from datetime import timedelta
+from datetime import timedelta, timezone
 from unittest.mock import patch, MagicMock
 
 @tagged('post_install', '-at_install')
@@ -68,3 +68,51 @@ class TestDispatchTimeout(TransactionCase):
         self.order.process_dispatch_timeout()
         self.assertEqual(self.order.status, 'cancelled', "Order should be cancelled after 4 mins")
 
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.fields.Datetime')
+    def test_sector_rule_timeouts(self, mock_datetime):
+        """Batch and global timeouts come from the sector rule of the order"""
+        rule = self.env['sector.rule'].search([('sector_type', '=', 'standard')], limit=1)
+        rule.write({'dispatch_batch_timeout': 5, 'dispatch_global_timeout': 20})
+        self.Livreur.create({
+            'name': 'Test Driver 2',
+            'phone': '123456780',
+            'vehicle_type': 'motorcycle',
+            'registration_status': 'approved',
+            'availability': True,
+            'verified': True,
+            'current_lat': 18.5,
+            'current_long': -15.5,
+            'sector_ids': [(4, rule.id)],
+        })
+        self.livreur1.sector_ids = [(4, rule.id)]
+
+        start_time = fields.Datetime.now()
+        mock_datetime.now.return_value = start_time
+        self.order.dispatch_batch_size = 1
+        with patch('odoo.addons.smart_delivery.models.delivery_order.notify_deadlines') as mock_notify:
+            self.order.assign_livreur(force=True)
+        self.assertEqual(self.order.dispatch_start_time, start_time)
+
+        # The batch deadline is published to the dispatch scheduler
+        [deadline] = self.order._get_next_dispatch_deadlines()
+        self.assertAlmostEqual(
+            deadline - start_time.replace(tzinfo=timezone.utc).timestamp(), 5, places=3)
+        mock_notify.assert_called_once_with(self.env.cr, [deadline])
+
+        # Before the batch deadline nothing moves
+        mock_datetime.now.return_value = start_time + timedelta(seconds=4)
+        self.DeliveryOrder._process_dispatch_deadlines(self.order.ids)
+        self.assertEqual(self.order.dispatch_start_time, start_time)
+
+        # Right after it, the next batch is dispatched
+        next_time = start_time + timedelta(seconds=6)
+        mock_datetime.now.return_value = next_time
+        self.DeliveryOrder._process_dispatch_deadlines(self.order.ids)
+        self.assertEqual(self.order.dispatch_start_time, next_time)
+        self.assertEqual(len(self.order.dispatched_livreur_ids), 2)
+
+        # Past the global deadline the order is cancelled
+        mock_datetime.now.return_value = start_time + timedelta(seconds=21)
+        self.DeliveryOrder._process_dispatch_deadlines(self.order.ids)
+        self.assertEqual(self.order.status, 'cancelled')
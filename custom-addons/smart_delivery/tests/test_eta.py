@@ -0,0 +1,92 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.eta import DriverStats, dispatch_costs
+from odoo.addons.smart_delivery.utils.geo import np
+
+
+@tagged('post_install', '-at_install')
+@patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+class TestEta(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sector = cls.env['sector.rule'].create({'sector_type': 'eta_test'})
+        cls.sender = cls.env['res.partner'].create({'name': 'ETA Shipper'})
+        cls.idle, cls.busy = cls.env['delivery.livreur'].create([{
+            'name': name,
+            'phone': phone,
+            'vehicle_type': 'motorcycle',
+            'availability': True,
+            'verified': True,
+            'registration_status': 'approved',
+            'sector_ids': [(6, 0, cls.sector.ids)],
+            'current_lat': lat,
+            'current_long': -16.0,
+        } for name, phone, lat in [('Idle Driver', '22001001', 18.01), ('Busy Driver', '22001002', 18.0)]])
+
+    def _orders(self, count, **vals):
+        return self.env['delivery.order'].create([{
+            'sector_type': 'eta_test',
+            'sender_id': self.sender.id,
+            'receiver_phone': f'2200110{i}',
+            'pickup_lat': 18.0,
+            'pickup_long': -16.0,
+            'drop_lat': 18.05,
+            'drop_long': -16.0,
+            **vals,
+        } for i in range(count)])
+
+    def test_dispatch_costs(self, _notify):
+        close_but_loaded = DriverStats(speed_kmh=20.0, slowness=1.0, load=2, acceptance_rate=0.5)
+        farther_idle = DriverStats(speed_kmh=20.0, slowness=1.0, load=0, acceptance_rate=0.5)
+        costs = dispatch_costs([[1.0, 2.0]], [close_but_loaded, farther_idle])
+        (loaded, idle), = costs
+        self.assertLess(idle, loaded)
+        if np is not None:
+            self.assertIsInstance(costs, np.ndarray, "The cost matrix is handed over to k_nearest as is")
+
+    def test_dispatch_prefers_idle_livreurs(self, _notify):
+        self._orders(2, assigned_livreur_id=self.busy.id, status='assigned')
+        self.assertEqual(self.busy.current_load, 2)
+
+        order = self._orders(1, dispatch_batch_size=1)
+        order._dispatch_next_batches()
+        self.assertEqual(order.current_batch_livreur_ids, self.idle, "The closest livreur is busy")
+        self.assertEqual(self.idle.dispatch_offer_count, 1)
+
+    def test_statistics_follow_the_order(self, _notify):
+        order = self._orders(1, status='dispatching', dispatched_livreur_ids=[(6, 0, self.idle.ids)])
+        order.action_accept_delivery(self.idle.id)
+        self.assertEqual((self.idle.dispatch_accept_count, self.idle.current_load), (1, 1))
+        self.assertTrue(order.accept_time)
+        self.assertGreater(order.pickup_eta_minutes, 0.0)
+
+        pickup_eta, drop_eta = order._get_etas()[order.id]
+        self.assertGreater(drop_eta, pickup_eta)
+
+        order.accept_time = fields.Datetime.now() - timedelta(minutes=20)
+        order.action_start_delivery()
+        self.assertAlmostEqual(self.idle.pickup_time_avg, 20.0, places=0)
+        self.assertEqual(self.idle.pickup_eta_avg, order.pickup_eta_minutes)
+        self.assertIsNone(order._get_etas()[order.id][0], "Picked up")
+
+        order.write({'status': 'delivered'})
+        self.assertEqual(self.idle.current_load, 0)
+        self.assertFalse(order._get_etas())
+
+    def test_speed_from_gps(self, _notify):
+        now = fields.Datetime.now()
+        self.env['delivery.livreur']._ingest_positions([
+            {'livreur_id': self.idle.id, 'lat': 18.01, 'long': -16.0, 'recorded_at': now, 'speed': 10.0},
+        ])
+        self.assertAlmostEqual(self.idle.speed_avg_kmh, 36.0)
+        self.env['delivery.livreur']._ingest_positions([
+            {'livreur_id': self.idle.id, 'lat': 18.01, 'long': -16.0, 'recorded_at': now, 'speed': 0.0},
+        ])
+        self.assertAlmostEqual(self.idle.speed_avg_kmh, 36.0, msg="Stops do not count as travel")
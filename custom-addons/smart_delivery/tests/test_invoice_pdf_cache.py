@@ -0,0 +1,95 @@
+import io
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestInvoicePdfCache(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sender = cls.env['res.partner'].create({'name': 'PDF Shipper'})
+        cls.livreur = cls.env['delivery.livreur'].create({
+            'name': 'PDF Driver',
+            'phone': '22000901',
+            'vehicle_type': 'motorcycle',
+        })
+
+    def setUp(self):
+        super().setUp()
+        # wkhtmltopdf is not run by the tests: each invoice gets its own fake PDF
+        self.rendered = []
+
+        def _render_qweb_pdf_prepare_streams(report, report_ref, data, res_ids=None):
+            self.rendered.append(list(res_ids))
+            return {
+                res_id: {'stream': io.BytesIO(f'%PDF invoice {res_id}'.encode()), 'attachment': None}
+                for res_id in res_ids
+            }
+
+        self.startPatcher(patch.object(
+            type(self.env['ir.actions.report']), '_render_qweb_pdf_prepare_streams', _render_qweb_pdf_prepare_streams,
+        ))
+
+    def _invoice(self, count):
+        orders = self.env['delivery.order'].create([{
+            'sector_type': 'standard',
+            'sender_id': self.sender.id,
+            'receiver_name': f'PDF Receiver {i}',
+            'receiver_phone': f'2209{i:04d}',
+            'assigned_livreur_id': self.livreur.id,
+        } for i in range(count)])
+        orders.write({'status': 'delivered'})
+        self.env['delivery.billing']._cron_invoice_pending()
+        return self.env['delivery.billing'].search([('order_id', 'in', orders.ids)]).invoice_id
+
+    def test_posted_invoices_are_prerendered(self):
+        invoices = self._invoice(2)
+        cached = invoices._get_delivery_pdf_attachments()
+        self.assertEqual(set(cached), set(invoices.ids))
+
+        invoice = invoices[0]
+        invoice.fetch(['write_date'])
+        with self.assertQueryCount(1):
+            self.assertEqual(invoice._get_delivery_pdf(), cached[invoice.id])
+
+    def test_changed_invoice_is_rendered_again(self):
+        invoice = self._invoice(1)
+        first = invoice._get_delivery_pdf()
+
+        # A later change of the invoice (the write date of one transaction does not move)
+        self.env.cr.execute(
+            "UPDATE account_move SET write_date = write_date + interval '1 minute' WHERE id = %s", [invoice.id],
+        )
+        invoice.invalidate_recordset(['write_date'])
+        second = invoice._get_delivery_pdf()
+        self.assertNotEqual(second, first)
+        self.assertFalse(first.exists(), "The PDF of the previous version is removed")
+        self.assertEqual(invoice._get_delivery_pdf(), second)
+
+    def test_invoices_are_rendered_at_once(self):
+        invoices = self._invoice(3)
+        self.rendered.clear()
+
+        attachments = invoices._render_delivery_pdfs()
+        self.assertEqual(self.rendered, [invoices.ids], "The invoices are rendered with a single wkhtmltopdf run")
+        self.assertEqual(invoices._get_delivery_pdf_attachments(), attachments)
+        for invoice in invoices:
+            self.assertEqual(attachments[invoice.id].raw, f'%PDF invoice {invoice.id}'.encode())
+
+    def test_unsplit_pdf_is_rendered_per_invoice(self):
+        invoices = self._invoice(2)
+        unsplit = {
+            False: {'stream': io.BytesIO(b'%PDF all invoices'), 'attachment': None},
+            **{invoice.id: {'stream': None, 'attachment': None} for invoice in invoices},
+        }
+        Report = type(self.env['ir.actions.report'])
+        with patch.object(Report, '_render_qweb_pdf_prepare_streams', return_value=unsplit):
+            attachments = invoices._render_delivery_pdfs()
+        self.assertEqual(set(attachments), set(invoices.ids))
+        self.assertTrue(all(attachment.raw for attachment in attachments.values()))
+        self.assertNotIn(b'%PDF all invoices', [attachment.raw for attachment in attachments.values()])
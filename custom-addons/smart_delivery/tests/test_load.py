@@ -0,0 +1,194 @@
+import json
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import SkipTest
+
+from odoo import fields
+from odoo.tests import HttpCase, tagged
+
+from odoo.addons.smart_delivery.utils.jwt_auth import JWT_AVAILABLE, JWTAuth
+
+from .common import LoadDataGenerator, percentiles
+
+_logger = logging.getLogger(__name__)
+
+LOAD_LIVREURS = 200
+LOAD_ENTERPRISES = 20
+LOAD_ORDERS = 1000
+
+# Most queries one call may run. They stay well below the page and batch
+# sizes, so that a query per row (or per order) makes the scenario fail.
+QUERY_BUDGETS = {
+    'gps_ping': 25,
+    'livreur_orders_page': 30,
+    'enterprise_orders_page': 30,
+    'livreur_stats': 20,
+    'enterprise_stats': 20,
+    'dispatch_cron': 300,
+}
+
+
+@tagged('post_install', '-at_install', '-standard', 'smart_delivery_load')
+class TestApiLoad(HttpCase):
+    """Latency and query count of the busiest API calls on a generated dataset.
+
+    Run on demand against the local test server:
+        --test-tags smart_delivery_load
+    Each scenario logs the p50/p90/p99 latencies of its calls.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if not JWT_AVAILABLE:
+            raise SkipTest("PyJWT is required to call the API")
+        cls.generator = LoadDataGenerator(cls.env)
+        cls.sector = cls.generator.sector()
+        cls.livreurs = cls.generator.livreurs(LOAD_LIVREURS, cls.sector)
+        cls.enterprises = cls.generator.enterprises(LOAD_ENTERPRISES)
+        cls.orders = cls.generator.orders(
+            LOAD_ORDERS, cls.enterprises.partner_id, cls.sector.sector_type,
+            livreurs=cls.livreurs, status='assigned',
+        )
+        cls.tokens = {
+            user.id: JWTAuth.generate_token(user.id, user.login)
+            for user in cls.livreurs.user_id | cls.enterprises.user_id
+        }
+
+    def _call(self, user, path, payload=None):
+        """(decoded response, status, seconds, queries) of an API call as `user`"""
+        headers = {'Authorization': f'Bearer {self.tokens[user.id]}'}
+        data = None
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+            data = json.dumps(payload)
+        queries = self.cr.sql_log_count
+        started = time.perf_counter()
+        response = self.url_open(path, data=data, headers=headers, timeout=60)
+        elapsed = time.perf_counter() - started
+        return response.json(), response.status_code, elapsed, self.cr.sql_log_count - queries
+
+    def _report(self, scenario, timings, queries=None):
+        """Log the latency percentiles of a scenario and check its query budget"""
+        ranks = percentiles(timings)
+        _logger.info(
+            "%s: %d calls, p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms%s",
+            scenario, len(timings), ranks[50] * 1000, ranks[90] * 1000, ranks[99] * 1000,
+            max(timings) * 1000, f", {max(queries)} queries max" if queries else "",
+        )
+        if queries:
+            self.assertLessEqual(max(queries), QUERY_BUDGETS[scenario], f"{scenario} exceeds its query budget")
+
+    def test_gps_ping_storm(self):
+        """Every livreur sends a few batches of fixes"""
+        timings, queries = [], []
+        for _round in range(3):
+            for livreur in self.livreurs:
+                body, status, elapsed, count = self._call(
+                    livreur.user_id, '/smart_delivery/api/livreur/location',
+                    {'points': self.generator.gps_points(10)},
+                )
+                self.assertEqual(status, 200, body)
+                timings.append(elapsed)
+                queries.append(count)
+        self._report('gps_ping', timings, queries)
+        self.assertEqual(
+            self.env['delivery.livreur.position'].search_count([('livreur_id', 'in', self.livreurs.ids)]),
+            3 * 10 * len(self.livreurs),
+        )
+
+    def test_accept_throughput(self):
+        """The livreurs of a batch accept the order one after the other: the first one gets it.
+
+        A throughput smoke test: the test server runs the requests one at a
+        time on the test cursor, so they never overlap. The race between
+        simultaneous accepts is covered by TestAcceptConcurrency.
+        """
+        Order = self.env['delivery.order']
+        contenders = 8
+        offers = {}
+        for index, order in enumerate(self.generator.orders(
+            25, self.enterprises.partner_id, self.sector.sector_type, status='dispatching',
+        )):
+            livreurs = self.livreurs[index * contenders % len(self.livreurs):][:contenders]
+            order.dispatched_livreur_ids = livreurs
+            offers[order] = livreurs
+
+        timings = []
+        statuses = Counter()
+        for order, livreurs in offers.items():
+            for livreur in livreurs:
+                _body, status, elapsed, _count = self._call(
+                    livreur.user_id, '/smart_delivery/api/orders/accept', {'order_id': order.id},
+                )
+                statuses[order, status] += 1
+                timings.append(elapsed)
+        for order in offers:
+            self.assertEqual(statuses[order, 200], 1, f"{order.name} is accepted once")
+            self.assertEqual(statuses[order, 409], contenders - 1)
+        self._report('accepts', timings)
+        self.assertEqual(set(Order.browse([order.id for order in offers]).mapped('status')), {'assigned'})
+
+    def test_listing_pagination(self):
+        """Livreurs and enterprises walk all their orders page by page"""
+        for scenario, users, path in [
+            ('livreur_orders_page', self.livreurs[:20].user_id, '/smart_delivery/api/livreur/my-orders'),
+            ('enterprise_orders_page', self.enterprises.user_id, '/smart_delivery/api/enterprise/my-orders'),
+        ]:
+            timings, queries = [], []
+            seen = 0
+            for user in users:
+                cursor = None
+                while True:
+                    query = '?limit=10' + (f'&cursor={cursor}' if cursor else '')
+                    body, status, elapsed, count = self._call(user, path + query)
+                    self.assertEqual(status, 200, body)
+                    timings.append(elapsed)
+                    queries.append(count)
+                    seen += len(body['orders'])
+                    cursor = body['pagination'].get('next_cursor')
+                    if not cursor:
+                        break
+            self._report(scenario, timings, queries)
+            self.assertEqual(seen, self.env['delivery.order'].search_count([
+                ('assigned_livreur_id', 'in', self.livreurs[:20].ids),
+            ]) if scenario == 'livreur_orders_page' else LOAD_ORDERS)
+
+    def test_stats(self):
+        for scenario, users, path in [
+            ('livreur_stats', self.livreurs.user_id, '/smart_delivery/api/livreur/stats'),
+            ('enterprise_stats', self.enterprises.user_id, '/smart_delivery/api/enterprise/stats'),
+        ]:
+            timings, queries = [], []
+            for user in users:
+                body, status, elapsed, count = self._call(user, path)
+                self.assertEqual(status, 200, body)
+                timings.append(elapsed)
+                queries.append(count)
+            self._report(scenario, timings, queries)
+
+    def test_dispatch_cron(self):
+        """The cron moves 1000 orders past their batch timeout to their next batch"""
+        Order = self.env['delivery.order']
+        now = fields.Datetime.now()
+        orders = self.generator.orders(
+            LOAD_ORDERS, self.enterprises.partner_id, self.sector.sector_type,
+            status='dispatching',
+            first_dispatch_time=now,
+            dispatch_start_time=now - timedelta(hours=1),
+            dispatch_batch_size=5,
+        )
+        self.env.flush_all()
+
+        queries = self.cr.sql_log_count
+        started = time.perf_counter()
+        Order.process_dispatch_timeout()
+        self.env.flush_all()
+        elapsed = time.perf_counter() - started
+        self._report('dispatch_cron', [elapsed], [self.cr.sql_log_count - queries])
+
+        orders.invalidate_recordset()
+        self.assertTrue(all(len(order.current_batch_livreur_ids) == 5 for order in orders))
+        self.assertTrue(all(order.dispatch_start_time > now - timedelta(hours=1) for order in orders))
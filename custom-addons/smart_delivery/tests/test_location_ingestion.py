@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.controllers.api import SmartDeliveryAPI
+
+
+@tagged('post_install', '-at_install')
+class TestLocationIngestion(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.livreur = self.env['delivery.livreur'].create({
+            'name': 'GPS Driver',
+            'phone': '22000001',
+            'vehicle_type': 'motorcycle',
+            'availability': True,
+            'verified': True,
+        })
+
+    def test_ingest_batch_keeps_latest_position(self):
+        """The most recent fix becomes the current position, all fixes go to the history"""
+        now = fields.Datetime.now()
+        write_date = self.livreur.write_date
+        points = [
+            {'livreur_id': self.livreur.id, 'lat': 18.10, 'long': -15.90, 'recorded_at': now - timedelta(seconds=10)},
+            {'livreur_id': self.livreur.id, 'lat': 18.12, 'long': -15.92, 'recorded_at': now, 'speed': 7.5},
+            {'livreur_id': self.livreur.id, 'lat': 18.11, 'long': -15.91, 'recorded_at': now - timedelta(seconds=5)},
+        ]
+        self.env['delivery.livreur']._ingest_positions(points)
+
+        self.assertAlmostEqual(self.livreur.current_lat, 18.12)
+        self.assertAlmostEqual(self.livreur.current_long, -15.92)
+        self.assertEqual(self.livreur.position_date, now)
+        self.assertEqual(self.livreur.write_date, write_date, "Ingestion must not go through the ORM write")
+        self.assertEqual(len(self.livreur.position_ids), 3)
+        self.assertEqual(self.livreur.position_ids[0].speed, 7.5)
+
+    def test_ingest_late_fix_only_goes_to_history(self):
+        """A fix older than the stored position does not move the livreur back"""
+        now = fields.Datetime.now()
+        Livreur = self.env['delivery.livreur']
+        Livreur._ingest_positions([
+            {'livreur_id': self.livreur.id, 'lat': 18.2, 'long': -15.8, 'recorded_at': now},
+        ])
+        Livreur._ingest_positions([
+            {'livreur_id': self.livreur.id, 'lat': 18.0, 'long': -16.0, 'recorded_at': now - timedelta(minutes=1)},
+        ])
+
+        self.assertAlmostEqual(self.livreur.current_lat, 18.2)
+        self.assertEqual(len(self.livreur.position_ids), 2)
+        # Dispatch reads the same position
+        nearest = Livreur._search_nearest(18.2, -15.8, 1, [('id', '=', self.livreur.id)])
+        self.assertEqual(nearest, self.livreur)
+
+    def test_parse_out_of_range_timestamp(self):
+        """An epoch timestamp out of the datetime range is a validation error"""
+        for timestamp in (1e300, float('inf'), -1e20):
+            with self.assertRaises(ValueError):
+                SmartDeliveryAPI()._parse_location_points(
+                    {'lat': 18.0, 'long': -15.0, 'timestamp': timestamp}, self.livreur.id)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.firebase_utils import LocalTransport
+
+
+class TestNotificationOutbox(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('smart_delivery.fcm_transport', 'local')
+        LocalTransport.reset()
+        self.addCleanup(LocalTransport.reset)
+        self.Notification = self.env['delivery.notification']
+
+        self.livreur = self.env['delivery.livreur'].create({
+            'name': 'Livreur Outbox',
+            'phone': '22200000',
+            'nni': 'REF-OUTBOX',
+            'vehicle_type': 'motorcycle',
+            'fcm_token': 'stale_token',
+        })
+
+    def test_enqueue_and_send(self):
+        """Queued messages are sent by the cron, identical payloads are coalesced"""
+        self.Notification.enqueue([
+            (['token_a', 'token_b', 'token_a'], 'Titre', 'Corps', {'order_id': '1'}),
+            (['token_c'], 'Autre', 'Corps', {}),
+        ])
+        notifications = self.Notification.search([('state', '=', 'pending')])
+        self.assertEqual(len(notifications), 3, "Duplicate tokens of one message are queued once")
+        self.assertFalse(LocalTransport.sent, "Nothing is sent before the cron runs")
+
+        with patch.object(LocalTransport, 'send_multicast', autospec=True,
+                          side_effect=LocalTransport.send_multicast) as send_multicast:
+            self.Notification._cron_send_pending()
+        self.assertEqual(send_multicast.call_count, 2, "One multicast request per distinct message")
+        self.assertEqual(set(notifications.mapped('state')), {'sent'})
+        self.assertEqual(len(LocalTransport.sent), 3)
+
+    def test_unregistered_token_is_pruned(self):
+        """Unregistered tokens are cleared from the livreur and never retried"""
+        LocalTransport.unregistered_tokens.add('stale_token')
+        notification = self.Notification.enqueue([(['stale_token'], 'Titre', 'Corps', {})])
+
+        self.Notification._cron_send_pending()
+
+        self.assertEqual(notification.state, 'failed')
+        self.assertFalse(self.livreur.fcm_token)
+
+    def test_transient_error_is_retried_with_backoff(self):
+        """Transient errors are rescheduled with an increasing delay"""
+        notification = self.Notification.enqueue([(['token_a'], 'Titre', 'Corps', {})])
+        with patch.object(LocalTransport, 'send_multicast', return_value=[('transient', 'timeout')]):
+            notification._send()
+            first_retry = notification.next_attempt_date
+            self.assertEqual(notification.state, 'pending')
+            self.assertEqual(notification.attempt_count, 1)
+            self.assertGreater(first_retry, fields.Datetime.now())
+
+            notification._send()
+            self.assertGreater(notification.next_attempt_date - first_retry, timedelta(seconds=30))
+
+            for _attempt in range(5):
+                notification._send()
+        self.assertEqual(notification.state, 'failed')
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.order_feed import NOTIFICATION_TYPE, enterprise_channel, livreur_channel
+
+
+@tagged('post_install', '-at_install')
+class TestOrderFeed(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env['res.partner'].create({'name': 'Feed Shipper', 'is_company': True})
+        cls.sender = cls.env['res.partner'].create({'name': 'Feed Contact', 'parent_id': cls.company.id})
+        cls.livreurs = cls.env['delivery.livreur'].create([{
+            'name': f'Feed Driver {i}',
+            'phone': f'2200050{i}',
+            'vehicle_type': 'motorcycle',
+            'availability': True,
+            'verified': True,
+            'registration_status': 'approved',
+            'current_lat': 18.0,
+            'current_long': -15.0,
+        } for i in range(2)])
+        cls.order = cls.env['delivery.order'].create({
+            'sector_type': 'standard',
+            'sender_id': cls.sender.id,
+            'receiver_name': 'Feed Receiver',
+            'receiver_phone': '22000509',
+            'pickup_lat': 18.0,
+            'pickup_long': -15.0,
+            'drop_lat': 18.1,
+            'drop_long': -15.1,
+        })
+
+    def _capture(self):
+        return patch.object(type(self.env['bus.bus']), '_sendone', autospec=True)
+
+    def _sent(self, sendone):
+        """[(channel, payload)] sent on the bus"""
+        notifications = [call.args[1:] for call in sendone.call_args_list]
+        self.assertEqual({notif_type for _channel, notif_type, _payload in notifications} - {NOTIFICATION_TYPE}, set())
+        return [(channel, payload) for channel, _notif_type, payload in notifications]
+
+    def test_channels_are_signed(self):
+        channel = livreur_channel(self.env, 5)
+        self.assertTrue(channel.startswith('smart_delivery.livreur.5.'))
+        self.assertEqual(channel, livreur_channel(self.env, 5))
+        self.assertNotEqual(channel.rsplit('.', 1)[1], livreur_channel(self.env, 6).rsplit('.', 1)[1])
+
+    def test_offer_and_acceptance(self):
+        first, second = self.livreurs
+        with self._capture() as sendone:
+            self.order._apply_dispatch_batches({self.order: self.livreurs})
+        sent = self._sent(sendone)
+        offers = {channel: payload for channel, payload in sent if payload['event'] == 'offer'}
+        self.assertEqual(set(offers), {livreur_channel(self.env, first.id), livreur_channel(self.env, second.id)})
+        self.assertEqual(offers[livreur_channel(self.env, first.id)]['order_id'], self.order.id)
+        self.assertTrue(offers[livreur_channel(self.env, first.id)]['deadline'])
+
+        with self._capture() as sendone, \
+                patch.object(type(self.order), '_notify_enterprise_assigned'):
+            self.order.action_accept_delivery(first.id)
+        sent = self._sent(sendone)
+        self.assertIn((livreur_channel(self.env, second.id), 'offer_closed'), [(c, p['event']) for c, p in sent])
+        status = {channel: payload for channel, payload in sent if payload['event'] == 'status'}
+        self.assertEqual(
+            set(status), {enterprise_channel(self.env, self.company.id), livreur_channel(self.env, first.id)},
+            "The sender company and the assigned livreur follow the order",
+        )
+        payload = status[enterprise_channel(self.env, self.company.id)]
+        self.assertEqual((payload['status'], payload['previous_status']), ('assigned', 'dispatching'))
+        self.assertEqual(payload['assigned_livreur_id'], first.id)
+
+    def test_no_event_without_status_change(self):
+        with self._capture() as sendone:
+            self.order.write({'receiver_name': 'Renamed Receiver'})
+            self.order.write({'status': self.order.status})
+        self.assertFalse(self._sent(sendone))
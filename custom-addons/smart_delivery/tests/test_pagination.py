@@ -0,0 +1,44 @@
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.pagination import InvalidCursor, InvalidPageParameter, parse_page_parameters, search_page
+
+
+@tagged('post_install', '-at_install')
+class TestKeysetPagination(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        partner = self.env['res.partner'].create({'name': 'Paginated Shipper'})
+        self.orders = self.env['delivery.order'].create([{
+            'sector_type': 'standard',
+            'sender_id': partner.id,
+            'receiver_phone': f'2200{i:04d}',
+        } for i in range(7)])
+        self.domain = [('sender_id', '=', partner.id)]
+        self.order_spec = [('create_date', 'desc'), ('id', 'desc')]
+
+    def test_cursor_walks_all_rows_once(self):
+        """Following next_cursor returns every row once, in the offset order"""
+        Order = self.env['delivery.order']
+        expected = Order.search(self.domain, order='create_date desc, id desc').ids
+
+        seen = []
+        rows, cursor = search_page(Order, self.domain, self.order_spec, 3, field_names=['name'])
+        seen += [row['id'] for row in rows]
+        while cursor:
+            rows, cursor = search_page(Order, self.domain, self.order_spec, 3, cursor=cursor, field_names=['name'])
+            seen += [row['id'] for row in rows]
+
+        self.assertEqual(seen, expected)
+        self.assertIn('name', rows[0])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            search_page(self.env['delivery.order'], self.domain, self.order_spec, 3, cursor='not-a-cursor')
+
+    def test_page_parameters(self):
+        self.assertEqual(parse_page_parameters('20', '40'), (20, 40))
+        for limit, offset in (('abc', 0), (10, '-1'), (None, 0)):
+            with self.assertRaises(InvalidPageParameter):
+                parse_page_parameters(limit, offset)
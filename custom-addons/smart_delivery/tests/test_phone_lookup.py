@@ -0,0 +1,75 @@
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.phone import normalize_phone
+
+
+@tagged('post_install', '-at_install')
+class TestPhoneLookup(TransactionCase):
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('22 00 08 01'), '22000801')
+        self.assertEqual(normalize_phone('+222 22-00-08-01'), '22000801')
+        self.assertEqual(normalize_phone('0022222000801'), '22000801')
+        self.assertEqual(normalize_phone('+33 6 12 34 56 78'), '33612345678')
+        self.assertEqual(normalize_phone(False), '')
+
+    def test_backfill_phone_normalized(self):
+        """The SQL backfill of the install normalizes like normalize_phone"""
+        phones = ['22 00 08 01', '+222 22-00-08-01', ' +222 22000801', '0022222000801', '+33 6 12 34 56 78',
+                  '00 33 6 12 34 56 78', '+222 123', 'n/a', '']
+        partners = self.env['res.partner'].create([
+            {'name': f'Backfill {i}', 'phone': phone} for i, phone in enumerate(phones)
+        ])
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE res_partner SET phone_normalized = NULL WHERE id IN %s", [tuple(partners.ids)])
+
+        self.env['res.partner']._backfill_phone_normalized()
+        self.assertEqual(
+            partners.mapped('phone_normalized'),
+            [normalize_phone(phone) or False for phone in phones],
+        )
+
+    def test_resolve_phones(self):
+        Partner = self.env['res.partner']
+        existing = Partner.create({'name': 'Known Receiver', 'phone': '+222 22 00 08 02'})
+        partners = Partner._resolve_phones({
+            '22000802': 'Known Receiver',
+            '22 00 08 03': 'New Receiver',
+            '+22222000803': 'Same New Receiver',
+        })
+        self.assertEqual(set(partners), {'22000802', '22000803'})
+        self.assertEqual(partners['22000802'], existing)
+        self.assertEqual(partners['22000803'].name, 'New Receiver')
+
+        self.env.flush_all()
+        with self.assertQueryCount(1):
+            self.assertEqual(Partner._resolve_phones({'22000803': 'Again'})['22000803'], partners['22000803'])
+
+    def test_billing_receivers(self):
+        sender = self.env['res.partner'].create({'name': 'Phone Shipper'})
+        receiver = self.env['res.partner'].create({'name': 'Regular Receiver', 'phone': '22 00 08 04'})
+        orders = self.env['delivery.order'].create([{
+            'sector_type': 'standard',
+            'sender_id': sender.id,
+            'receiver_name': name,
+            'receiver_phone': phone,
+        } for name, phone in [('Regular', '22000804'), ('Other', '22000805'), ('Other again', '+222 22000805')]])
+        billings = self.env['delivery.billing'].create([{'order_id': order.id} for order in orders])
+
+        self.assertEqual(billings[0].receiver_partner_id, receiver)
+        self.assertTrue(billings[1].receiver_partner_id)
+        self.assertEqual(billings[1].receiver_partner_id, billings[2].receiver_partner_id)
+
+    def test_registration_duplicates(self):
+        enterprise = self.env['delivery.enterprise'].create({
+            'name': 'Phone Enterprise',
+            'email': 'phone.enterprise@example.com',
+            'phone': '22000806',
+        })
+        self.assertTrue(self.env['delivery.enterprise']._phone_in_use('+222 22 00 08 06'))
+        self.assertFalse(self.env['delivery.enterprise']._phone_in_use('22000807'))
+        self.assertFalse(
+            self.env['delivery.livreur']._phone_in_use(enterprise.phone),
+            "Only livreur accounts count for livreur registrations",
+        )
@@ -0,0 +1,57 @@
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.pricing import compute_price, compute_prices
+
+
+@tagged('post_install', '-at_install')
+class TestPricing(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rule = cls.env['sector.rule'].create({
+            'sector_type': 'pricing_test',
+            'base_price': 80.0,
+            'distance_fee_per_km': 12.0,
+            'free_distance_km': 3.0,
+            'photo_required': True,
+        })
+
+    def test_tariffs_are_cached(self):
+        SectorRule = self.env['sector.rule']
+        SectorRule._get_tariffs()
+        with self.assertQueryCount(0):
+            tariff = SectorRule._get_tariff('pricing_test')
+            self.assertIn(('pricing_test', 'Pricing_test'), self.env['delivery.order']._get_sector_type_selection())
+        self.assertEqual((tariff.id, tariff.base_price, tariff.photo_required), (self.rule.id, 80.0, True))
+
+        self.rule.base_price = 90.0
+        self.assertEqual(SectorRule._get_tariff('pricing_test').base_price, 90.0, "Changing a rule clears the cache")
+        self.rule.unlink()
+        self.assertIsNone(SectorRule._get_tariff('pricing_test'))
+
+    def test_compute_prices(self):
+        tariff = self.env['sector.rule']._get_tariff('pricing_test')
+        self.assertEqual(compute_price(tariff, 10.0), (80.0, 84.0))
+        self.assertEqual(compute_price(None, 2.0), (50.0, 0.0), "Sectors without rule use the default tariff")
+        self.assertEqual(
+            compute_prices([tariff, None, tariff], [10.0, 8.0, 1.0]),
+            ([80.0, 50.0, 80.0], [84.0, 30.0, 0.0]),
+        )
+
+    def test_billing_and_requirements_from_tariff(self):
+        order = self.env['delivery.order'].create({
+            'sector_type': 'pricing_test',
+            'sender_id': self.env['res.partner'].create({'name': 'Pricing Shipper'}).id,
+            'receiver_phone': '22000701',
+            'pickup_lat': 18.0,
+            'pickup_long': -16.0,
+            'drop_lat': 18.1,
+            'drop_long': -16.0,
+        })
+        self.assertTrue(order.photo_required)
+        self.assertFalse(order.otp_required)
+        billing = order._generate_billing()
+        self.assertEqual(billing.base_tariff, 80.0)
+        self.assertAlmostEqual(billing.extra_fee, (order.distance_km - 3.0) * 12.0)
@@ -0,0 +1,133 @@
+import logging
+import random
+import time
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.smart_delivery.utils.route_planner import (
+    distance_matrix, insert_cheapest, is_feasible, nearest_neighbour, plan_route, route_length,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+def _random_orders(count, seed=1):
+    """Stops of `count` orders scattered over ~20 km, pickup then drop, and their constraints"""
+    rng = random.Random(seed)
+    stops, pickup_of = [], {}
+    for _order in range(count):
+        stops.append((18.0 + rng.random() * 0.2, -16.0 + rng.random() * 0.2))
+        stops.append((18.0 + rng.random() * 0.2, -16.0 + rng.random() * 0.2))
+        pickup_of[len(stops)] = len(stops) - 1
+    return (18.1, -15.9), stops, pickup_of
+
+
+@tagged('post_install', '-at_install')
+class TestRoutePlanner(TransactionCase):
+
+    def test_pickup_before_drop(self):
+        # The drop is next to the livreur, its pickup far away: it cannot go first
+        start, stops = (18.0, -16.0), [(18.2, -16.0), (18.0, -16.001), (18.1, -16.0)]
+        sequence, _length = plan_route(start, stops, {2: 1})
+        self.assertTrue(is_feasible(sequence, {2: 1}))
+        self.assertLess(sequence.index(1), sequence.index(2))
+
+    def test_improves_nearest_neighbour(self):
+        start, stops, pickup_of = _random_orders(40)
+        dist = distance_matrix(start, stops)
+        greedy = nearest_neighbour(dist, range(1, len(stops) + 1), pickup_of)
+        sequence, length = plan_route(start, stops, pickup_of)
+        self.assertEqual(sorted(sequence), list(range(1, len(stops) + 1)))
+        self.assertTrue(is_feasible(sequence, pickup_of))
+        self.assertLessEqual(length, route_length(dist, greedy))
+
+    def test_incremental_insertion(self):
+        start, stops, pickup_of = _random_orders(20)
+        # Current tour of the first 19 orders, then the last one is added
+        current, _length = plan_route(start, stops[:-2], {d: p for d, p in pickup_of.items() if d <= 38})
+        sequence, _length = plan_route(start, stops, pickup_of, sequence=current)
+        self.assertEqual(sorted(sequence), list(range(1, 41)))
+        self.assertTrue(is_feasible(sequence, pickup_of))
+
+    def test_insert_drop_after_planned_pickup(self):
+        # The pickup is already planned, the new drop is next to the livreur:
+        # its cheapest position would be before the pickup
+        start, stops = (18.0, -16.0), [(18.2, -16.0), (18.0, -16.001)]
+        dist = distance_matrix(start, stops)
+        self.assertEqual(insert_cheapest(dist, [1], 1, 2), [1, 2])
+        sequence, _length = plan_route(start, stops, {2: 1}, sequence=[1])
+        self.assertEqual(sequence, [1, 2])
+
+    @patch('odoo.addons.smart_delivery.models.delivery_order.DeliveryOrder._notify_enterprise_assigned')
+    def test_tour_follows_orders(self, _notify):
+        sender = self.env['res.partner'].create({'name': 'Tour Shipper'})
+        livreur = self.env['delivery.livreur'].create({
+            'name': 'Tour Driver',
+            'phone': '22000601',
+            'vehicle_type': 'motorcycle',
+            'availability': True,
+            'verified': True,
+            'registration_status': 'approved',
+            'current_lat': 18.0,
+            'current_long': -16.0,
+        })
+        orders = self.env['delivery.order'].create([{
+            'sector_type': 'standard',
+            'sender_id': sender.id,
+            'receiver_name': f'Tour Receiver {i}',
+            'receiver_phone': f'2200061{i}',
+            'pickup_lat': 18.0 + i * 0.01,
+            'pickup_long': -16.0,
+            'drop_lat': 18.05 + i * 0.01,
+            'drop_long': -16.0,
+            'status': 'dispatching',
+            'dispatched_livreur_ids': [(6, 0, livreur.ids)],
+        } for i in range(3)])
+        for order in orders:
+            order.action_accept_delivery(livreur.id)
+
+        self.assertEqual(len(livreur.tour_stop_ids), 6)
+        self.assertEqual(livreur.tour_stop_ids.mapped('sequence'), [1, 2, 3, 4, 5, 6])
+        for order in orders:
+            pickup, drop = (livreur.tour_stop_ids.filtered(lambda s: s.order_id == order).sorted('sequence'))
+            self.assertEqual((pickup.stop_type, drop.stop_type), ('pickup', 'drop'))
+
+        orders[0].action_start_delivery()
+        self.assertEqual(len(livreur.tour_stop_ids), 5, "A picked up order only keeps its drop")
+        orders[1].action_cancel()
+        self.assertEqual(set(livreur.tour_stop_ids.order_id.ids), {orders[0].id, orders[2].id})
+
+
+@tagged('post_install', '-at_install', '-standard', 'smart_delivery_bench')
+class BenchRoutePlanner(BaseCase):
+    """Planning time and tour length for 50 to 500 stops.
+
+    Run on demand: --test-tags smart_delivery_bench
+    """
+
+    def test_bench_plan_route(self):
+        for order_count in (25, 50, 125, 250):
+            start, stops, pickup_of = _random_orders(order_count)
+            dist = distance_matrix(start, stops)
+            unsorted_length = route_length(dist, range(1, len(stops) + 1))
+            greedy_length = route_length(dist, nearest_neighbour(dist, range(1, len(stops) + 1), pickup_of))
+
+            started = time.perf_counter()
+            sequence, length = plan_route(start, stops, pickup_of)
+            plan_time = time.perf_counter() - started
+
+            current, _length = plan_route(start, stops[:-2], {d: p for d, p in pickup_of.items() if d < len(stops) - 1})
+            started = time.perf_counter()
+            plan_route(start, stops, pickup_of, sequence=current)
+            insert_time = time.perf_counter() - started
+
+            _logger.info(
+                "%d stops: planned in %.3fs (insertion of one order: %.3fs), "
+                "%.1f km vs %.1f km nearest neighbour, %.1f km unsorted",
+                len(stops), plan_time, insert_time, length, greedy_length, unsorted_length,
+            )
+            self.assertTrue(is_feasible(sequence, pickup_of))
+            self.assertLessEqual(length, greedy_length)
+            self.assertLess(plan_time, 5.0)
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestStats(TransactionCase):
+
+    def test_status_counts(self):
+        """Status counters and today's count come from one grouped query"""
+        partner = self.env['res.partner'].create({'name': 'Stats Shipper'})
+        Order = self.env['delivery.order']
+        orders = Order.create([{
+            'sector_type': 'standard',
+            'sender_id': partner.id,
+            'receiver_phone': '22000000',
+        } for _i in range(4)])
+        orders[0].status = 'delivered'
+        orders[1].status = 'delivered'
+        orders[2].status = 'failed'
+        orders[3].status = 'draft'
+
+        domain = [('sender_id', '=', partner.id)]
+        today_start = fields.Datetime.now() - timedelta(hours=1)
+        self.env.flush_all()
+        with self.assertQueryCount(1):
+            counts, today_count = Order._get_status_counts(domain, since=today_start)
+        self.assertEqual(counts['delivered'], 2)
+        self.assertEqual(counts['failed'], 1)
+        self.assertEqual(counts['draft'], 1)
+        self.assertEqual(counts['on_way'], 0)
+        self.assertEqual(sum(counts.values()), 4)
+        self.assertEqual(today_count, 4)
+
+        counts, today_count = Order._get_status_counts(domain)
+        self.assertEqual(today_count, 0)
@@ -0,0 +1,51 @@
+import base64
+import io
+
+from PIL import Image
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.smart_delivery.utils.uploads import decode_base64, downscale_image, prepare_upload, read_upload
+
+
+def _jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@tagged('post_install', '-at_install')
+class TestUploads(TransactionCase):
+
+    def test_read_upload_base64(self):
+        raw = _jpeg(10, 10)
+        data = {'photo': 'data:image/jpeg;base64,' + base64.b64encode(raw).decode(), 'photo_filename': 'p.jpg'}
+        self.assertEqual(read_upload({}, data, 'photo', 'default.jpg'), (raw, 'p.jpg'))
+        self.assertEqual(read_upload({}, {}, 'photo', 'default.jpg'), (None, None))
+        with self.assertRaises(ValueError):
+            decode_base64('not base64!')
+
+    def test_downscale_image(self):
+        """Large photos are shrunk to 1920px, other files are stored untouched"""
+        image = Image.open(io.BytesIO(downscale_image(_jpeg(4000, 3000))))
+        self.assertEqual(image.size, (1920, 1440))
+        pdf = b'%PDF-1.4 fake document'
+        self.assertEqual(downscale_image(pdf), pdf)
+
+    def test_document_thumbnail(self):
+        livreur = self.env['delivery.livreur'].create({
+            'name': 'Upload Driver',
+            'phone': '22000301',
+            'vehicle_type': 'motorcycle',
+        })
+        document = self.env['livreur.document'].create({
+            'livreur_id': livreur.id,
+            'name': 'Photo NNI',
+            'photo': prepare_upload(_jpeg(2000, 1000)),
+        })
+        thumbnail = Image.open(io.BytesIO(base64.b64decode(document.photo_thumbnail)))
+        self.assertEqual(thumbnail.size, (256, 128))
+
+        document.photo = prepare_upload(b'%PDF-1.4 fake document')
+        self.assertFalse(document.photo_thumbnail)
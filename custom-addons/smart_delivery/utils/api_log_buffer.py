@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from odoo import api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# Flush every FLUSH_INTERVAL seconds, or as soon as FLUSH_SIZE logs are waiting
+FLUSH_INTERVAL = 5
+FLUSH_SIZE = 500
+# Logs received beyond this backlog are dropped rather than exhausting memory
+MAX_BUFFER_SIZE = 20000
+
+
+class ApiLogBuffer:
+    """Process-wide buffer of api.log values.
+
+    Requests only append to the buffer; a background thread creates the
+    records in bulk, one transaction per database and flush (see
+    api.log's _flush_buffer).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = defaultdict(list)
+        self._size = 0
+        self._dropped = 0
+        self._thread = None
+
+    def add(self, dbname, vals):
+        with self._lock:
+            if self._size >= MAX_BUFFER_SIZE:
+                self._dropped += 1
+                return
+            self._pending[dbname].append(vals)
+            self._size += 1
+            self._ensure_thread()
+        if self._size >= FLUSH_SIZE:
+            self._wakeup.set()
+
+    def pop(self, dbname):
+        """Remove and return the values waiting for the database"""
+        with self._lock:
+            vals_list = self._pending.pop(dbname, [])
+            self._size -= len(vals_list)
+        return vals_list
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='smart_delivery.api_log_buffer', daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            dbnames = list(self._pending)
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            _logger.warning("API log buffer full: %s logs dropped", dropped)
+
+        for dbname in dbnames:
+            try:
+                with Registry(dbname).cursor() as cr:
+                    api.Environment(cr, SUPERUSER_ID, {})['api.log']._flush_buffer()
+            except Exception:
+                _logger.exception("Could not write the API logs to %s", dbname)
+
+api_log_buffer = ApiLogBuffer()
+atexit.register(api_log_buffer.flush)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# What the API needs to know about the caller of a request
+AuthInfo = namedtuple('AuthInfo', ['user_id', 'user_type', 'livreur_id', 'partner_id'])
+
+# Bounds of the cache: entries are dropped least recently used first, and
+# never live longer than the TTL so changes made by other workers (which
+# only invalidate their own cache) are picked up within that delay.
+MAX_ENTRIES = 10000
+TTL_SECONDS = 60
+
+
+class AuthCache:
+    """Process-wide LRU cache JWT token -> AuthInfo, with a TTL.
+
+    Entries also expire with the token itself. The models invalidate the
+    entries of a user when its groups, livreur or company change.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (dbname, token digest) -> (AuthInfo, deadline)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(dbname, token):
+        return dbname, hashlib.sha256(token.encode()).digest()
+
+    def get(self, dbname, token):
+        key = self._key(dbname, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            info, deadline = entry
+            if time.time() >= deadline:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return info
+
+    def set(self, dbname, token, info, token_expiry=None):
+        """Cache the AuthInfo of a token.
+
+        :param token_expiry: POSIX timestamp after which the token is no longer valid
+        """
+        deadline = time.time() + self.ttl
+        if token_expiry:
+            deadline = min(deadline, token_expiry)
+        key = self._key(dbname, token)
+        with self._lock:
+            self._entries[key] = (info, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_users(self, dbname, user_ids):
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        with self._lock:
+            for key in [key for key, (info, _deadline) in self._entries.items()
+                        if key[0] == dbname and info.user_id in user_ids]:
+                del self._entries[key]
+
+    def clear(self, dbname=None):
+        with self._lock:
+            if dbname is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == dbname]:
+                    del self._entries[key]
+
+
+auth_cache = AuthCache()
+
+
+def invalidate_users_on_commit(env, user_ids):
+    """Drop the cached AuthInfo of users once the current transaction commits"""
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if user_ids:
+        dbname = env.cr.dbname
+        env.cr.postcommit.add(lambda: auth_cache.invalidate_users(dbname, user_ids))
+
+
+def clear_on_commit(env):
+    """Drop every cached AuthInfo of the database once the current transaction commits"""
+    dbname = env.cr.dbname
+    env.cr.postcommit.add(lambda: auth_cache.clear(dbname))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Wakes the dispatch timeout cron at the dispatch deadlines.
+
+ir.cron only notifies the cron workers of the triggers that are already due:
+a trigger in the future waits for their next poll, up to a minute later. One
+scheduler per database therefore keeps the upcoming deadlines in a priority
+queue and, as each one expires, adds an immediate trigger, which notifies the
+cron workers right away.
+
+Every process loading the registry starts a scheduler thread, but only the
+one holding the database advisory lock (the leader) listens to the deadlines
+and triggers the cron. The others retry to take the lock every few seconds,
+so a new leader takes over when the current one goes away.
+"""
+
+import heapq
+import json
+import logging
+import select
+import threading
+import time
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# PostgreSQL channel on which dispatch deadlines are published.
+# NOTIFY is only delivered on commit, so a rolled back dispatch never wakes the scheduler.
+DISPATCH_CHANNEL = 'smart_delivery_dispatch'
+# Advisory lock (per database) held by the leader scheduler for its whole session
+LEADER_LOCK = 'smart_delivery.dispatch_scheduler'
+# Payloads are limited to 8000 bytes by PostgreSQL
+NOTIFY_CHUNK_SIZE = 400
+# Upper bound of a wait; the queue is fully reloaded from the database at this pace
+MAX_SLEEP = 60
+# Delay between two attempts of a follower to become the leader
+ELECTION_DELAY = 5
+# Error backoff before reconnecting
+RECONNECT_DELAY = 5
+
+
+def notify_deadlines(cr, deadlines):
+    """Publish dispatch deadlines to the leader scheduler.
+
+    :param deadlines: list of POSIX timestamps
+    """
+    deadlines = sorted({round(deadline, 3) for deadline in deadlines})
+    for start in range(0, len(deadlines), NOTIFY_CHUNK_SIZE):
+        payload = json.dumps(deadlines[start:start + NOTIFY_CHUNK_SIZE])
+        cr.execute("SELECT pg_notify(%s, %s)", [DISPATCH_CHANNEL, payload])
+
+
+class DispatchScheduler(threading.Thread):
+    """Triggers the dispatch timeout cron of a database at each dispatch deadline"""
+    _schedulers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, dbname):
+        super().__init__(name=f'smart_delivery.dispatch_scheduler.{dbname}', daemon=True)
+        self.dbname = dbname
+        self.queue = []  # heap of POSIX timestamps
+
+    @classmethod
+    def ensure_started(cls, dbname):
+        """Start the scheduler of the database, once per process"""
+        if config['test_enable'] or config['stop_after_init']:
+            return
+        with cls._lock:
+            scheduler = cls._schedulers.get(dbname)
+            if scheduler and scheduler.is_alive():
+                return
+            scheduler = cls._schedulers[dbname] = cls(dbname)
+            scheduler.start()
+
+    def run(self):
+        while True:
+            try:
+                if not self._lead():
+                    time.sleep(ELECTION_DELAY)
+            except Exception:
+                _logger.exception("Dispatch scheduler of %s stopped, restarting", self.dbname)
+                time.sleep(RECONNECT_DELAY)
+
+    def _lead(self):
+        """Schedule the deadlines for as long as this thread is the leader.
+
+        :return: False if another scheduler is the leader
+        """
+        with odoo.sql_db.db_connect(self.dbname).cursor() as cr:
+            cr.execute("SELECT pg_try_advisory_lock(hashtext(%s))", [LEADER_LOCK])
+            if not cr.fetchone()[0]:
+                return False
+            try:
+                self._listen(cr)
+            finally:
+                # The connection goes back to the pool: release the session lock
+                cr.execute("SELECT pg_advisory_unlock(hashtext(%s))", [LEADER_LOCK])
+        return True
+
+    def _listen(self, cr):
+        conn = cr._cnx
+        cr.execute(f"LISTEN {DISPATCH_CHANNEL}")
+        cr.commit()
+        _logger.info("Dispatch scheduler of %s is the leader", self.dbname)
+        self._reload()
+        last_reload = time.time()
+        while True:
+            now = time.time()
+            timeout = MAX_SLEEP
+            if self.queue:
+                timeout = min(timeout, max(0, self.queue[0] - now))
+            if select.select([conn], [], [], timeout) != ([], [], []):
+                conn.poll()
+                while conn.notifies:
+                    for deadline in json.loads(conn.notifies.pop().payload):
+                        heapq.heappush(self.queue, deadline)
+            if time.time() - last_reload >= MAX_SLEEP:
+                self._reload()
+                last_reload = time.time()
+            self._process_due()
+
+    def _with_env(self, func):
+        registry = Registry(self.dbname)
+        with registry.cursor() as cr:
+            return func(api.Environment(cr, SUPERUSER_ID, {}))
+
+    def _reload(self):
+        """Rebuild the queue from the orders being dispatched"""
+        self.queue = self._with_env(lambda env: env['delivery.order']._get_next_dispatch_deadlines())
+        heapq.heapify(self.queue)
+
+    def _process_due(self):
+        now = time.time()
+        due = False
+        while self.queue and self.queue[0] <= now:
+            heapq.heappop(self.queue)
+            due = True
+        if due:
+            # A trigger due now notifies the cron workers on commit
+            self._with_env(lambda env: env.ref('smart_delivery.ir_cron_dispatch_timeout')._trigger())
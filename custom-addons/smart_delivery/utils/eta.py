@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Arrival time predictions and dispatch scoring of the livreurs.
+
+Each livreur carries a few statistics, updated incrementally as orders and
+GPS fixes come in (see the DISPATCH STATISTICS section of delivery.livreur):
+
+- its rolling speed, from the speeds of its GPS fixes;
+- how slow it is compared to the predictions: the ratio between its mean
+  actual pickup time and its mean predicted pickup time;
+- its load, the orders it is carrying;
+- its offers and acceptances, giving its acceptance rate.
+
+The pickup ETA of a livreur is its travel time to the pickup at its speed,
+scaled by its slowness, plus a delay per order it already carries. Dispatch
+ranks the livreurs by their expected time to pickup: the ETA divided by the
+probability that they accept the offer.
+"""
+
+from collections import namedtuple
+
+from .geo import haversine_distance, np
+
+# Speeds (km/h) of the livreurs without GPS history
+DEFAULT_SPEED_KMH = 20.0
+DEFAULT_SPEEDS_KMH = {
+    'bicycle': 12.0,
+    'motorcycle': 25.0,
+    'car': 22.0,
+}
+MIN_SPEED_KMH = 5.0
+MAX_SPEED_KMH = 80.0
+# Fixes slower than this are stops (traffic lights, pickups), not travel
+MOVING_SPEED_KMH = 3.0
+
+# Weight of a new sample in the rolling averages
+EWMA_ALPHA = 0.2
+# Time spent at each stop of the tour (pickup or drop)
+STOP_MINUTES = 5.0
+# Delay of a new pickup per order the livreur already carries
+LOAD_DELAY_MINUTES = 10.0
+# Slowness ratios outside this range are measurement noise
+MIN_SLOWNESS = 0.5
+MAX_SLOWNESS = 3.0
+# Acceptance prior: a new livreur is assumed to accept half of its offers,
+# as if it had already received this many of them
+PRIOR_OFFERS = 4.0
+PRIOR_ACCEPTANCE_RATE = 0.5
+
+# Statistics of a livreur used by the predictions
+DriverStats = namedtuple('DriverStats', ['speed_kmh', 'slowness', 'load', 'acceptance_rate'])
+
+
+def ewma(average, sample, alpha=EWMA_ALPHA):
+    """Rolling average updated with a new sample; the sample itself when there is no average yet"""
+    if not average:
+        return sample
+    return average + alpha * (sample - average)
+
+
+def acceptance_rate(offers, accepts):
+    """Acceptance rate of a livreur, smoothed towards the prior while it has few offers"""
+    return (accepts + PRIOR_OFFERS * PRIOR_ACCEPTANCE_RATE) / (offers + PRIOR_OFFERS)
+
+
+def slowness(pickup_time_avg, pickup_eta_avg):
+    """Ratio between the actual and the predicted pickup times of a livreur, 1 without history"""
+    if not pickup_time_avg or not pickup_eta_avg:
+        return 1.0
+    return min(MAX_SLOWNESS, max(MIN_SLOWNESS, pickup_time_avg / pickup_eta_avg))
+
+
+def driver_speed(speed_avg_kmh, vehicle_type=None):
+    """Speed (km/h) to predict the travel times of a livreur"""
+    speed = speed_avg_kmh or DEFAULT_SPEEDS_KMH.get(vehicle_type, DEFAULT_SPEED_KMH)
+    return min(MAX_SPEED_KMH, max(MIN_SPEED_KMH, speed))
+
+
+def travel_minutes(distance_km, stats):
+    """Predicted travel time of a livreur over `distance_km` km"""
+    return (distance_km or 0.0) / stats.speed_kmh * 60.0 * stats.slowness
+
+
+def pickup_eta(distance_km, stats):
+    """Predicted minutes before a livreur reaches a pickup `distance_km` km away"""
+    return travel_minutes(distance_km, stats) + stats.load * LOAD_DELAY_MINUTES
+
+
+def dispatch_costs(distances, stats):
+    """Expected minutes before the pickup of each order by each livreur.
+
+    :param distances: order x livreur matrix of the distances (km) to the pickups
+    :param stats: DriverStats of each livreur (one per column)
+    :return: order x livreur cost matrix, lower is better (for geo.k_nearest):
+             a numpy array, or lists of lists without numpy
+    """
+    if np is None:
+        return [
+            [pickup_eta(distance, driver) / driver.acceptance_rate for distance, driver in zip(row, stats)]
+            for row in distances
+        ]
+    distances = np.asarray(distances, dtype=float).reshape(-1, len(stats))
+    speed, slow, load, rate = np.array(stats, dtype=float).reshape(-1, 4).T
+    etas = distances / speed * 60.0 * slow + load * LOAD_DELAY_MINUTES
+    return etas / rate
+
+
+def track_speed(points):
+    """Mean moving speed (km/h) of a track of GPS fixes, None when it does not move.
+
+    Uses the speeds reported by the device (m/s), or else the distance and
+    time between consecutive fixes.
+
+    :param points: fixes of one livreur, dicts with lat, long, recorded_at and optionally speed
+    """
+    speeds = [point['speed'] * 3.6 for point in points if point.get('speed') is not None]
+    if not speeds:
+        ordered = sorted(points, key=lambda point: point['recorded_at'])
+        for previous, point in zip(ordered, ordered[1:]):
+            seconds = (point['recorded_at'] - previous['recorded_at']).total_seconds()
+            if seconds > 0:
+                distance = haversine_distance(previous['lat'], previous['long'], point['lat'], point['long'])
+                speeds.append(distance / seconds * 3600.0)
+    moving = [speed for speed in speeds if MOVING_SPEED_KMH <= speed <= MAX_SPEED_KMH]
+    if not moving:
+        return None
+    return sum(moving) / len(moving)
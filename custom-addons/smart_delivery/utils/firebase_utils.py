@@ -136,3 +136,97 @@ def send_push_notification(tokens, title, body, data=None, env=None):
     except Exception as e:
         _logger.error(f"FCM Send Error: {e}")
         return {"success": False, "error": str(e)}
+
+
+# FCM accepts at most 500 tokens per multicast request
+FCM_MULTICAST_LIMIT = 500
+
+# Per-token error codes returned by the transports
+FCM_ERROR_UNREGISTERED = 'unregistered'
+FCM_ERROR_TRANSIENT = 'transient'
+
+
+class FirebaseTransport:
+    """Sends multicast messages through firebase-admin."""
+
+    def __init__(self, env):
+        self.env = env
+
+    def send_multicast(self, tokens, title, body, data=None):
+        """
+        Send one message to up to FCM_MULTICAST_LIMIT tokens.
+
+        :return: one entry per token: None when delivered, otherwise an
+                 (error_code, message) tuple where error_code is
+                 FCM_ERROR_UNREGISTERED or FCM_ERROR_TRANSIENT
+        """
+        app = _get_firebase_app(env=self.env)
+        if not app:
+            return [(FCM_ERROR_TRANSIENT, 'Firebase not configured')] * len(tokens)
+
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=title, body=body),
+            data=data or {},
+        )
+        try:
+            response = messaging.send_each_for_multicast(message, app=app)
+        except Exception as e:
+            _logger.error(f"FCM Send Error: {e}")
+            return [(FCM_ERROR_TRANSIENT, str(e))] * len(tokens)
+
+        _logger.info(f"FCM: Sent {response.success_count} messages, {response.failure_count} failed.")
+        results = []
+        for resp in response.responses:
+            if resp.success:
+                results.append(None)
+            elif isinstance(resp.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                results.append((FCM_ERROR_UNREGISTERED, str(resp.exception)))
+            else:
+                results.append((FCM_ERROR_TRANSIENT, str(resp.exception)))
+        return results
+
+
+class LocalTransport:
+    """In-process transport that records messages instead of calling Firebase.
+
+    Used for tests and local development (``smart_delivery.fcm_transport = local``).
+    Tokens listed in ``unregistered_tokens`` are answered as unregistered.
+    """
+
+    sent = []
+    unregistered_tokens = set()
+
+    def __init__(self, env):
+        self.env = env
+
+    def send_multicast(self, tokens, title, body, data=None):
+        results = []
+        for token in tokens:
+            if token in self.unregistered_tokens:
+                results.append((FCM_ERROR_UNREGISTERED, 'Requested entity was not found.'))
+            else:
+                self.sent.append({'token': token, 'title': title, 'body': body, 'data': data or {}})
+                results.append(None)
+        return results
+
+    @classmethod
+    def reset(cls):
+        cls.sent = []
+        cls.unregistered_tokens = set()
+
+
+FCM_TRANSPORTS = {
+    'firebase': FirebaseTransport,
+    'local': LocalTransport,
+}
+
+
+def get_fcm_transport(env):
+    """Return the transport configured by ``smart_delivery.fcm_transport`` (default: firebase)."""
+    name = env['ir.config_parameter'].sudo().get_param('smart_delivery.fcm_transport', 'firebase')
+    transport_class = FCM_TRANSPORTS.get(name)
+    if not transport_class:
+        _logger.warning(f"Unknown FCM transport '{name}', falling back to firebase")
+        transport_class = FirebaseTransport
+    return transport_class(env)
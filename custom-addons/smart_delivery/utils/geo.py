@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+
+# One degree of latitude is ~111.32 km everywhere on the globe
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calcule la distance en km entre deux points GPS"""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_km.
+
+    The longitude bounds are None when the box would cross a pole or the
+    antimeridian; callers should then filter on latitude only.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat = lat - dlat
+    max_lat = lat + dlat
+
+    cos_lat = math.cos(math.radians(lat))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 1e-6:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+
+    dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    min_lon = lon - dlon
+    max_lon = lon + dlon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """Distances (km) between every point of the first set and every point of the second.
+
+    Returns a len(lats1) x len(lats2) matrix, computed in one vectorized pass
+    when numpy is installed (a numpy array) and as a list of lists otherwise.
+    """
+    if np is None:
+        return [
+            [haversine_distance(lat1, lon1, lat2, lon2) for lat2, lon2 in zip(lats2, lons2)]
+            for lat1, lon1 in zip(lats1, lons1)
+        ]
+
+    lat1 = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    lon1 = np.radians(np.asarray(lons1, dtype=float))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=float))[None, :]
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_pairwise(lats1, lons1, lats2, lons2):
+    """Distance (km) between the i-th point of the first set and the i-th point of the second.
+
+    Returns a list of len(lats1) distances, computed in one vectorized pass
+    when numpy is installed.
+    """
+    if np is None:
+        return [
+            haversine_distance(lat1, lon1, lat2, lon2)
+            for lat1, lon1, lat2, lon2 in zip(lats1, lons1, lats2, lons2)
+        ]
+
+    lat1 = np.radians(np.asarray(lats1, dtype=float))
+    lon1 = np.radians(np.asarray(lons1, dtype=float))
+    lat2 = np.radians(np.asarray(lats2, dtype=float))
+    lon2 = np.radians(np.asarray(lons2, dtype=float))
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return (EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).tolist()
+
+
+def count_within(matrix, radius, excluded=None):
+    """Number of columns of each row at a distance of at most radius.
+
+    :param matrix: distance matrix as returned by :func:`haversine_matrix`
+    :param excluded: optional list (one entry per row) of column index sets not to count
+    :return: one count per row
+    """
+    excluded = excluded or []
+    if np is None:
+        result = []
+        for row_index, row in enumerate(matrix):
+            skip = excluded[row_index] if row_index < len(excluded) else ()
+            result.append(sum(1 for col, distance in enumerate(row) if distance <= radius and col not in skip))
+        return result
+
+    within = np.asarray(matrix, dtype=float) <= radius
+    counts = within.sum(axis=1)
+    for row, skip in enumerate(excluded):
+        if skip:
+            counts[row] -= within[row, list(skip)].sum()
+    return counts.tolist()
+
+
+def k_nearest(matrix, k, excluded=None):
+    """Column indices of the k smallest distances of each row, closest first.
+
+    :param matrix: distance matrix as returned by :func:`haversine_matrix`
+    :param excluded: optional list (one entry per row) of column index sets to skip
+    :return: one list of column indices per row (shorter than k when not enough columns remain)
+    """
+    excluded = excluded or []
+    if np is None:
+        result = []
+        for row_index, row in enumerate(matrix):
+            skip = excluded[row_index] if row_index < len(excluded) else ()
+            nearest = heapq.nsmallest(k, (
+                (distance, col) for col, distance in enumerate(row) if col not in skip
+            ))
+            result.append([col for _distance, col in nearest])
+        return result
+
+    # Copied, the excluded cells are overwritten
+    dist = np.array(matrix, dtype=float)
+    if dist.size == 0 or k <= 0:
+        return [[] for _row in range(dist.shape[0])]
+
+    skipped = [(row, col) for row, skip in enumerate(excluded) for col in skip]
+    if skipped:
+        rows, cols = zip(*skipped)
+        dist[list(rows), list(cols)] = np.inf
+
+    k = min(k, dist.shape[1])
+    if k < dist.shape[1]:
+        candidates = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(dist.shape[1]), (dist.shape[0], 1))
+    order = np.take_along_axis(dist, candidates, axis=1).argsort(axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    finite = np.isfinite(np.take_along_axis(dist, candidates, axis=1))
+    return [row[mask].tolist() for row, mask in zip(candidates, finite)]
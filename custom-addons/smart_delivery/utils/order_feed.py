@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Live order feed published on the Odoo bus.
+
+Every livreur and every enterprise (commercial partner of the sender) has its
+own bus channel. The order transitions are published there, so the mobile apps
+subscribe once (websocket) instead of polling /orders/available and
+/delivery/status.
+
+The websocket accepts any string channel from any client, and the API clients
+authenticate with a JWT, not with an Odoo session: the channel names therefore
+carry an HMAC of the database secret and are only handed out to their owner
+by the authenticated /feed/channels endpoint.
+"""
+
+import hashlib
+import hmac
+
+# Type of the bus notifications of the feed
+NOTIFICATION_TYPE = 'smart_delivery/order'
+
+# Events of the feed
+EVENT_OFFER = 'offer'                # new order proposed to a livreur of the batch
+EVENT_OFFER_CLOSED = 'offer_closed'  # order no longer proposed (taken, cancelled...)
+EVENT_STATUS = 'status'              # status change of an order
+
+
+def _signed_channel(env, name):
+    secret = env['ir.config_parameter'].sudo().get_param('database.secret') or ''
+    signature = hmac.new(secret.encode(), name.encode(), hashlib.sha256).hexdigest()[:32]
+    return f'{name}.{signature}'
+
+
+def livreur_channel(env, livreur_id):
+    """Bus channel of a livreur"""
+    return _signed_channel(env, f'smart_delivery.livreur.{livreur_id}')
+
+
+def enterprise_channel(env, partner_id):
+    """Bus channel of an enterprise, identified by its commercial partner"""
+    return _signed_channel(env, f'smart_delivery.enterprise.{partner_id}')
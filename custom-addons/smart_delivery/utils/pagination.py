@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Keyset (cursor) pagination helpers for the list endpoints.
+
+A page is fetched with a domain "after the last row of the previous page"
+instead of an OFFSET, so deep pages cost the same as the first one. The
+cursor handed to the client is an opaque base64 token holding the sort key
+values of that last row.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidPageParameter(ValueError):
+    pass
+
+
+def _encode_value(value):
+    # Datetimes keep their microseconds (create_date has some), otherwise rows
+    # created within the same second as the cursor row would be skipped
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError(value)
+    return value
+
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key values of a row"""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, order_spec):
+    """Sort key values held by a cursor.
+
+    :raise InvalidCursor: if the cursor was not produced for this sort order
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(order_spec):
+            raise ValueError(values)
+        return [_decode_value(value) for value in values]
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def parse_page_parameters(limit, offset):
+    """The ?limit= and ?offset= query parameters, as non negative integers.
+
+    :raise InvalidPageParameter: on a value that is not a non negative integer
+    """
+    parsed = []
+    for name, value in (('limit', limit), ('offset', offset)):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise InvalidPageParameter(f'Paramètre {name} invalide: {value}')
+        if value < 0:
+            raise InvalidPageParameter(f'Paramètre {name} invalide: {value}')
+        parsed.append(value)
+    return tuple(parsed)
+
+
+def keyset_domain(order_spec, values):
+    """Domain of the rows sorted after `values` for the given order.
+
+    :param order_spec: list of (field name, 'asc' | 'desc'), ending with a
+                       unique field (the id) so the order is total
+    :param values: sort key values of the last row already returned
+    """
+    (field_name, direction), rest = order_spec[0], order_spec[1:]
+    after = [(field_name, '<' if direction == 'desc' else '>', values[0])]
+    if not rest:
+        return after
+    return ['|'] + after + ['&', (field_name, '=', values[0])] + keyset_domain(rest, values[1:])
+
+
+def order_clause(order_spec):
+    return ', '.join(f'{field_name} {direction}' for field_name, direction in order_spec)
+
+
+def search_page(model, domain, order_spec, limit, cursor=None, offset=0, field_names=None):
+    """Fetch one page of `model` with search_read.
+
+    With a cursor the page starts right after the row it designates,
+    otherwise `offset` rows are skipped (first page, legacy clients).
+
+    :return: tuple (rows, next cursor or None)
+    :raise InvalidCursor: on a malformed cursor
+    """
+    if cursor:
+        domain = list(domain) + keyset_domain(order_spec, decode_cursor(cursor, order_spec))
+        offset = 0
+    key_fields = [field_name for field_name, _direction in order_spec]
+    read_fields = list(dict.fromkeys(list(field_names or []) + key_fields))
+    rows = model.search_read(domain, read_fields, offset=offset, limit=limit, order=order_clause(order_spec), load=None)
+    next_cursor = None
+    if limit and len(rows) == limit:
+        next_cursor = encode_cursor([rows[-1][field_name] for field_name in key_fields])
+    return rows, next_cursor
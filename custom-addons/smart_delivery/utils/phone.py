@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Phone number normalization for partner lookups.
+
+The same number is typed in many ways ("22 00 01 02", "+222 22000102",
+"0022222000102"). Partners are looked up by a normalized form: digits only,
+national numbers without the country code.
+"""
+
+import re
+
+# Country code of the national numbers
+DEFAULT_COUNTRY_CODE = '222'
+NATIONAL_NUMBER_LENGTH = 8
+
+_NON_DIGITS = re.compile(r'\D+')
+
+
+def normalize_phone(phone):
+    """Normalized form of a phone number, '' when it holds no digit.
+
+    National numbers lose their country code, foreign numbers keep it
+    (without the + or 00 prefix).
+    """
+    if not phone:
+        return ''
+    digits = _NON_DIGITS.sub('', phone)
+    if phone.lstrip().startswith('+'):
+        international = digits
+    elif digits.startswith('00'):
+        international = digits[2:]
+    else:
+        return digits
+    if (international.startswith(DEFAULT_COUNTRY_CODE)
+            and len(international) == len(DEFAULT_COUNTRY_CODE) + NATIONAL_NUMBER_LENGTH):
+        return international[len(DEFAULT_COUNTRY_CODE):]
+    return international
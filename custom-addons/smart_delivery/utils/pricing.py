@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Delivery pricing from the sector tariffs.
+
+A delivery costs the base price of its sector, plus a fee per km beyond the
+distance included in the base price. The tariffs are read from the cache of
+sector.rule (see SectorRule._get_tariffs), never from the database per order.
+"""
+
+from collections import namedtuple
+
+from .geo import np
+
+# Pricing and requirements of a sector, as cached by sector.rule
+Tariff = namedtuple('Tariff', [
+    'id', 'sector_type',
+    'base_price', 'distance_fee_per_km', 'free_distance_km',
+    'otp_required', 'signature_required', 'photo_required', 'biometric_required',
+    'dispatch_batch_timeout', 'dispatch_global_timeout',
+])
+
+# Pricing of the sectors without rule
+DEFAULT_BASE_PRICE = 50.0
+DEFAULT_DISTANCE_FEE_PER_KM = 10.0
+DEFAULT_FREE_DISTANCE_KM = 5.0
+
+REQUIREMENT_FIELDS = ('otp_required', 'signature_required', 'photo_required', 'biometric_required')
+
+
+def tariff_terms(tariff):
+    """(base price, fee per km, free distance) of a tariff, the default ones for None"""
+    if tariff is None:
+        return DEFAULT_BASE_PRICE, DEFAULT_DISTANCE_FEE_PER_KM, DEFAULT_FREE_DISTANCE_KM
+    return tariff.base_price, tariff.distance_fee_per_km, tariff.free_distance_km
+
+
+def compute_price(tariff, distance_km):
+    """(base tariff, extra fee) of a delivery of `distance_km` km"""
+    base_price, fee_per_km, free_distance = tariff_terms(tariff)
+    return base_price, max(0.0, (distance_km or 0.0) - free_distance) * fee_per_km
+
+
+def compute_prices(tariffs, distances):
+    """(base tariffs, extra fees) of many deliveries at once.
+
+    :param tariffs: one Tariff (or None) per delivery
+    :param distances: one distance (km) per delivery
+    :return: tuple of two lists
+    """
+    if np is None:
+        prices = [compute_price(tariff, distance) for tariff, distance in zip(tariffs, distances)]
+        return [base for base, _extra in prices], [extra for _base, extra in prices]
+    if not tariffs:
+        return [], []
+
+    base, fee, free = np.array([tariff_terms(tariff) for tariff in tariffs], dtype=float).T
+    distances = np.array([distance or 0.0 for distance in distances], dtype=float)
+    return base.tolist(), (np.maximum(0.0, distances - free) * fee).tolist()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Stop sequencing of a livreur carrying several orders.
+
+A route starts at the position of the livreur and visits every stop once
+(open path, no return). The pickup of an order must come before its drop.
+The sequence is built with a nearest-neighbour pass, then improved with 2-opt
+moves that keep every pickup before its drop. New orders are inserted at the
+cheapest positions of an existing sequence, which is then improved again.
+
+Distances are great-circle distances from :func:`haversine_matrix`; the 2-opt
+gains of one pass are computed in a vectorized way when numpy is installed.
+"""
+
+from .geo import haversine_matrix, np
+
+# 2-opt stops after this many passes without reaching a local optimum
+MAX_TWO_OPT_PASSES = 50
+# Gains below this (km) are rounding noise, not improvements
+EPSILON_KM = 1e-9
+
+
+def distance_matrix(start, points):
+    """Distance matrix of the start point followed by the stops.
+
+    :param start: (lat, lon) of the livreur
+    :param points: list of (lat, lon) of the stops
+    :return: (n + 1) x (n + 1) matrix, index 0 being the start
+    """
+    lats = [start[0]] + [lat for lat, _lon in points]
+    lons = [start[1]] + [lon for _lat, lon in points]
+    return haversine_matrix(lats, lons, lats, lons)
+
+
+def route_length(dist, sequence):
+    """Length (km) of the path going from the start (index 0) through `sequence`"""
+    previous, total = 0, 0.0
+    for stop in sequence:
+        total += dist[previous][stop]
+        previous = stop
+    return total
+
+
+def is_feasible(sequence, pickup_of):
+    """Whether every drop of the sequence comes after its pickup"""
+    seen = set()
+    for stop in sequence:
+        pickup = pickup_of.get(stop)
+        if pickup is not None and pickup not in seen:
+            return False
+        seen.add(stop)
+    return True
+
+
+def nearest_neighbour(dist, stops, pickup_of):
+    """Greedy sequence: always go to the closest stop that can be visited.
+
+    :param dist: matrix returned by :func:`distance_matrix`
+    :param stops: indices (in the matrix) of the stops to visit
+    :param pickup_of: dict {drop index: pickup index} of the precedence constraints
+    """
+    pending = set(stops)
+    blocked = {drop for drop, pickup in pickup_of.items() if pickup in pending}
+    drops_of = {}
+    for drop, pickup in pickup_of.items():
+        drops_of.setdefault(pickup, []).append(drop)
+
+    sequence, current = [], 0
+    while pending:
+        row = dist[current]
+        stop = min(pending - blocked, key=lambda candidate: row[candidate])
+        sequence.append(stop)
+        pending.discard(stop)
+        blocked.difference_update(drops_of.get(stop, ()))
+        current = stop
+    return sequence
+
+
+def two_opt(dist, sequence, pickup_of, max_passes=MAX_TWO_OPT_PASSES):
+    """Improve a feasible sequence with precedence-preserving 2-opt moves.
+
+    Reversing the segment route[i..j] changes the path a -> b ... c -> d
+    into a -> c ... b -> d. A segment holding both stops of an order cannot be
+    reversed, as its drop would then come first.
+
+    :param sequence: every stop index of the matrix but the start, in visit order
+    """
+    route = [0] + list(sequence)
+    size = len(route)
+    if size < 4:
+        return route[1:]
+
+    partner = [-1] * size
+    for drop, pickup in pickup_of.items():
+        partner[drop] = pickup
+        partner[pickup] = drop
+
+    for _pass in range(max_passes):
+        improved = False
+        mates = _mate_positions(route, partner)
+        for i in range(1, size - 1):
+            limit = _reversal_limit(mates, i)
+            if limit <= i:
+                continue
+            j, gain = _best_reversal(dist, route, i, limit)
+            if gain > EPSILON_KM:
+                route[i:j + 1] = reversed(route[i:j + 1])
+                mates = _mate_positions(route, partner)
+                improved = True
+        if not improved:
+            break
+    return route[1:]
+
+
+def _mate_positions(route, partner):
+    """Position in the route of the other stop of the order of each stop, -1 if none"""
+    if np is not None:
+        stops = np.asarray(route)
+        mates = np.asarray(partner)[stops]
+        position = np.empty(len(route), dtype=int)
+        position[stops] = np.arange(len(route))
+        return np.where(mates >= 0, position[np.maximum(mates, 0)], -1)
+    position = {stop: index for index, stop in enumerate(route)}
+    return [position[partner[stop]] if partner[stop] >= 0 else -1 for stop in route]
+
+
+def _reversal_limit(mates, i):
+    """Largest j such that route[i..j] holds no pickup/drop pair"""
+    size = len(mates)
+    if np is not None:
+        following = mates[i + 1:]
+        closes_pair = (following >= i) & (following < np.arange(i + 1, size))
+        return i + int(np.argmax(closes_pair)) if closes_pair.any() else size - 1
+    for k in range(i + 1, size):
+        if i <= mates[k] < k:
+            return k - 1
+    return size - 1
+
+
+def _best_reversal(dist, route, i, limit):
+    """Segment end j in ]i, limit] whose reversal shortens the path the most.
+
+    :return: (j, gain in km), the gain being <= 0 when no reversal helps
+    """
+    a, b = route[i - 1], route[i]
+    last = len(route) - 1
+    if np is not None and isinstance(dist, np.ndarray):
+        ends = np.asarray(route[i + 1:limit + 1], dtype=int)
+        nexts = np.asarray(route[i + 2:limit + 2], dtype=int)
+        gains = dist[a, b] - dist[a, ends]
+        # The reversal of a segment ending on the last stop has no d
+        inner = len(nexts)
+        gains[:inner] += dist[ends[:inner], nexts] - dist[b, nexts]
+        best = int(np.argmax(gains))
+        return i + 1 + best, float(gains[best])
+
+    best_j, best_gain = i, 0.0
+    for j in range(i + 1, limit + 1):
+        c = route[j]
+        gain = dist[a][b] - dist[a][c]
+        if j < last:
+            d = route[j + 1]
+            gain += dist[c][d] - dist[b][d]
+        if gain > best_gain:
+            best_j, best_gain = j, gain
+    return best_j, best_gain
+
+
+def insert_cheapest(dist, sequence, pickup, drop):
+    """Insert an order in a sequence at the cheapest positions, pickup first.
+
+    :param pickup: index of the pickup stop, None when it is already done;
+                   when the sequence already holds it, only the drop is
+                   inserted, somewhere after it
+    :param drop: index of the drop stop
+    :return: new sequence
+    """
+    route = [0] + list(sequence)
+    size = len(route)
+    earliest = 0
+    if pickup in route[1:]:
+        earliest, pickup = route.index(pickup, 1), None
+
+    def added(previous, stop, following):
+        # Detour of visiting `stop` between `previous` and `following` (None: end of path)
+        if following is None:
+            return dist[previous][stop]
+        return dist[previous][stop] + dist[stop][following] - dist[previous][following]
+
+    if pickup is None:
+        best = min(range(earliest, size), key=lambda p: added(route[p], drop, route[p + 1] if p + 1 < size else None))
+        return route[1:best + 1] + [drop] + route[best + 1:]
+
+    best_cost, best_positions = None, None
+    for p in range(size):
+        following = route[p + 1] if p + 1 < size else None
+        # Drop right after the pickup
+        cost = dist[route[p]][pickup] + dist[pickup][drop]
+        if following is not None:
+            cost += dist[drop][following] - dist[route[p]][following]
+        if best_cost is None or cost < best_cost:
+            best_cost, best_positions = cost, (p, p)
+        pickup_cost = added(route[p], pickup, following)
+        for q in range(p + 1, size):
+            cost = pickup_cost + added(route[q], drop, route[q + 1] if q + 1 < size else None)
+            if cost < best_cost:
+                best_cost, best_positions = cost, (p, q)
+
+    p, q = best_positions
+    new_route = route[:p + 1] + [pickup] + route[p + 1:q + 1] + [drop] + route[q + 1:]
+    return new_route[1:]
+
+
+def plan_route(start, stops, pickup_of, sequence=None):
+    """Sequence of the stops of a livreur.
+
+    :param start: (lat, lon) of the livreur
+    :param stops: list of (lat, lon) of the stops; stop k has index k + 1
+                  in the distance matrix and in the returned sequence
+    :param pickup_of: dict {drop index: pickup index}
+    :param sequence: current feasible sequence of some of the stops, the
+                     others are inserted in it (incremental re-optimization);
+                     all stops are sequenced from scratch when None
+    :return: (sequence of stop indices, length in km)
+    """
+    if not stops:
+        return [], 0.0
+    dist = distance_matrix(start, stops)
+    indices = range(1, len(stops) + 1)
+    if sequence is None:
+        sequence = nearest_neighbour(dist, indices, pickup_of)
+    else:
+        sequence = [stop for stop in sequence if 0 < stop <= len(stops)]
+        planned = set(sequence)
+        pickups = set(pickup_of.values())
+        for stop in indices:
+            if stop in planned or stop in pickups:
+                continue
+            pickup = pickup_of.get(stop)
+            sequence = insert_cheapest(dist, sequence, pickup, stop)
+            planned.update((pickup, stop))
+    sequence = two_opt(dist, sequence, pickup_of)
+    return sequence, route_length(dist, sequence)
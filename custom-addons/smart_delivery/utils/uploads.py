@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Files uploaded to the API (delivery proofs, registration documents).
+
+Files are accepted as multipart parts (spooled to disk by werkzeug, never
+base64 encoded by the client) or, for older clients, as base64 values of the
+JSON body. Photos are downscaled before being stored, since phone cameras
+produce images far larger than needed to check a proof or a document.
+"""
+
+import base64
+import binascii
+
+from odoo.exceptions import UserError
+from odoo.tools.image import image_process
+from odoo.tools.mimetypes import guess_mimetype
+
+# Stored photos fit in this box (the thumbnails are related Image fields)
+IMAGE_MAX_SIZE = (1920, 1920)
+JPEG_QUALITY = 80
+# Formats re-encoded by image_process; anything else (PDF, SVG...) is stored as is
+RESIZABLE_MIMETYPES = {'image/jpeg', 'image/png', 'image/gif'}
+
+
+def decode_base64(value):
+    """Raw bytes of a base64 value, with or without a data: URL prefix.
+
+    :raise ValueError: if the value is not valid base64
+    """
+    if isinstance(value, str):
+        if 'base64,' in value:
+            value = value.split('base64,', 1)[1]
+        value = value.encode()
+    try:
+        return base64.b64decode(value, validate=False)
+    except (binascii.Error, TypeError):
+        raise ValueError('Fichier base64 invalide')
+
+
+def read_upload(files, data, key, default_filename):
+    """Uploaded file `key`: multipart part first, base64 value of `data` otherwise.
+
+    :param files: request.httprequest.files
+    :param data: JSON body or form fields of the request
+    :return: tuple (raw bytes, filename), (None, None) if nothing was sent
+    :raise ValueError: on an invalid base64 value
+    """
+    storage = files.get(key)
+    if storage and storage.filename:
+        return storage.read(), storage.filename
+    value = data.get(key)
+    if not value:
+        return None, None
+    return decode_base64(value), data.get(f'{key}_filename') or default_filename
+
+
+def downscale_image(raw, size=IMAGE_MAX_SIZE):
+    """Image resized to fit in `size`, other files unchanged"""
+    if not raw or guess_mimetype(raw) not in RESIZABLE_MIMETYPES:
+        return raw
+    try:
+        return image_process(raw, size=size, quality=JPEG_QUALITY)
+    except UserError:
+        # Not decodable as an image despite its signature: keep the original
+        return raw
+
+
+def prepare_upload(raw):
+    """Base64 value to store in an attachment Binary field for an uploaded file"""
+    return base64.b64encode(downscale_image(raw)) if raw else False
+
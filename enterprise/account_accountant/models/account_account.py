@@ -1,10 +1,18 @@
 import ast
 from odoo import models
+from odoo.tools import SQL
 
 
 class AccountAccount(models.Model):
     _inherit = "account.account"
 
+    def write(self, vals):
+        res = super().write(vals)
+        if 'reconcile' in vals:
+            # The journal items of the accounts enter or leave the matching token index
+            self.env['account.move.line.matching.token']._reindex(SQL("account_move_line.account_id = ANY(%s)", self.ids))
+        return res
+
     def action_open_reconcile(self):
         self.ensure_one()
         # Open reconciliation view for this account
@@ -122,6 +122,12 @@ class AccountBankStatementLine(models.Model):
         # we either already have statement lines to reconcile or compute them
         st_lines, remaining_line_id = (self, None) if self else _compute_st_lines_to_reconcile(configured_company)
 
+        # Match the tokens of all the statement lines at once, instead of once per statement line in the loop below.
+        token_matches = self.env['account.reconcile.model'].search([
+            ('rule_type', '=', 'invoice_matching'),
+            ('company_id', 'in', st_lines.company_id.ids),
+        ])._get_invoice_matching_token_matches(st_lines)
+
         nb_auto_reconciled_lines = 0
         for index, st_line in enumerate(st_lines):
             # we want the cron to run only for limit_time seconds
@@ -129,7 +135,10 @@ class AccountBankStatementLine(models.Model):
                 remaining_line_id = st_line.id
                 st_lines = st_lines[:index]
                 break
-            wizard = self.env['bank.rec.widget'].with_context(default_st_line_id=st_line.id).new({})
+            wizard = self.env['bank.rec.widget'].with_context(
+                default_st_line_id=st_line.id,
+                invoice_matching_token_matches=token_matches,
+            ).new({})
             wizard._action_trigger_matching_rules()
             if wizard.state == 'valid' and wizard.matching_rules_allow_auto_reconcile:
                 try:
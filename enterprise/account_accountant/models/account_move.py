@@ -10,6 +10,8 @@ from odoo.exceptions import UserError
 from odoo.osv import expression
 from odoo.tools import SQL, float_compare
 
+from .account_move_line_matching_token import MATCHING_TOKEN_LINE_FIELDS, MATCHING_TOKEN_MOVE_FIELDS
+
 
 _logger = logging.getLogger(__name__)
 
@@ -133,6 +135,12 @@ class AccountMove(models.Model):
             self.deferred_move_ids |= reversed_moves
         return super().button_draft()
 
+    def write(self, vals):
+        res = super().write(vals)
+        if MATCHING_TOKEN_MOVE_FIELDS.intersection(vals):
+            self.env['account.move.line.matching.token']._schedule_reindex(self.line_ids)
+        return res
+
     def unlink(self):
         # Prevent deferred moves under audit trail restriction from being unlinked
         deferral_moves = self.filtered(lambda move: move.company_id.check_account_audit_trail and move.deferred_original_move_ids)
@@ -497,7 +505,10 @@ class AccountMoveLine(models.Model):
                         "You cannot change the account for a deferred line in %(move_name)s if it has already been deferred.",
                         move_name=line.move_id.display_name
                     ))
-        return super().write(vals)
+        res = super().write(vals)
+        if MATCHING_TOKEN_LINE_FIELDS.intersection(vals):
+            self.env['account.move.line.matching.token']._schedule_reindex(self)
+        return res
 
     # ============================= START - Deferred management ====================================
     def _compute_has_deferred_moves(self):
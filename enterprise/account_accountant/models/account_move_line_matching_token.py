@@ -0,0 +1,120 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Key of the cursor's precommit data holding the ids of the journal items to reindex
+MATCHING_TOKEN_PENDING_KEY = 'account_accountant.matching_token_line_ids'
+
+# Fields of account.move whose change changes the tokens of its journal items
+MATCHING_TOKEN_MOVE_FIELDS = {'state', 'name', 'ref', 'payment_reference', 'line_ids'}
+
+# Fields of account.move.line whose change changes its tokens
+MATCHING_TOKEN_LINE_FIELDS = {'name', 'account_id'}
+
+# Number of characters of a token kept in the index. The exact token is a whole label or reference, which could otherwise exceed
+# the maximum size of a B-tree index entry and fail the reindexing, thus the posting of its move.
+MATCHING_TOKEN_MAX_LENGTH = 256
+
+
+class AccountMoveLineMatchingToken(models.Model):
+    """ Tokens of the references of the open journal items, used by the 'invoice_matching' reconciliation models.
+
+    Each posted and unreconciled journal item of a reconcilable account has one row per token of its label, of the name of its
+    move and of the reference of its move: the numerical tokens (the groups of digits) and the exact token (the whole value).
+    The tokens are cut to MATCHING_TOKEN_MAX_LENGTH characters, and so must be the ones looked up (see _get_indexed_tokens).
+    A value yielding the same token several times has as many rows, the number of matching rows ranking the candidates.
+
+    Matching a statement line is then an index lookup of its tokens (see account.reconcile.model's
+    _get_invoice_matching_amls_candidates) instead of tokenizing the references of all the open journal items, and many statement
+    lines can be matched at once (see account.reconcile.model's _get_invoice_matching_token_matches).
+
+    The journal items are reindexed lazily: the changes of their references, of their move's state or of their reconciliation only
+    schedule them, and they are reindexed before the transaction commits, or before the index is read.
+    """
+    _name = 'account.move.line.matching.token'
+    _description = "Journal Item Matching Token"
+    _log_access = False
+
+    move_line_id = fields.Many2one(comodel_name='account.move.line', required=True, readonly=True, index=True, ondelete='cascade')
+    token = fields.Char(required=True, readonly=True, index=True)
+
+    def init(self):
+        super().init()
+        # Fill the index when the module is installed (or upgraded to a version having it)
+        self.env.cr.execute(SQL("SELECT 1 FROM %s LIMIT 1", SQL.identifier(self._table)))
+        if not self.env.cr.fetchone():
+            self._reindex(SQL("TRUE"))
+
+    ####################################################
+    # MAINTENANCE
+    ####################################################
+
+    @api.model
+    def _reindex(self, line_condition):
+        """ Recompute the tokens of the journal items matching line_condition, a condition on the account_move_line table. """
+        self.env['account.move'].flush_model(['name', 'ref'])
+        self.env['account.move.line'].flush_model(['move_id', 'account_id', 'name', 'parent_state', 'reconciled'])
+        self.env['account.account'].flush_model(['reconcile'])
+        # The tokens are extracted like _get_invoice_matching_st_line_tokens does for the statement lines: the numerical tokens are
+        # the groups of digits of the value, once its other characters removed.
+        self.env.cr.execute(SQL(
+            r"""
+                DELETE FROM %(table)s matching_token
+                 USING account_move_line
+                 WHERE matching_token.move_line_id = account_move_line.id
+                   AND %(line_condition)s;
+
+                INSERT INTO %(table)s (move_line_id, token)
+                SELECT line_value.move_line_id, LEFT(line_token.token, %(max_length)s)
+                  FROM (
+                        SELECT account_move_line.id AS move_line_id,
+                               UNNEST(ARRAY[account_move_line.name, account_move.name, account_move.ref]) AS value
+                          FROM account_move_line
+                          JOIN account_move ON account_move.id = account_move_line.move_id
+                          JOIN account_account ON account_account.id = account_move_line.account_id
+                         WHERE %(line_condition)s
+                           AND account_move_line.parent_state = 'posted'
+                           AND account_move_line.reconciled IS NOT TRUE
+                           AND account_account.reconcile
+                       ) AS line_value
+                  JOIN LATERAL (
+                        SELECT UNNEST(
+                                   REGEXP_SPLIT_TO_ARRAY(
+                                       SUBSTRING(REGEXP_REPLACE(line_value.value, '[^0-9\s]', '', 'g'), '\S(?:.*\S)*'),
+                                       '\s+'
+                                   )
+                               )
+                         UNION ALL
+                        SELECT line_value.value
+                         WHERE line_value.value != ''
+                       ) AS line_token(token) ON line_token.token IS NOT NULL
+            """,
+            table=SQL.identifier(self._table),
+            line_condition=line_condition,
+            max_length=MATCHING_TOKEN_MAX_LENGTH,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _get_indexed_tokens(self, tokens):
+        """ Returns the tokens as stored in the index, to look them up. """
+        return {token[:MATCHING_TOKEN_MAX_LENGTH] for token in tokens}
+
+    @api.model
+    def _schedule_reindex(self, lines):
+        """ Schedule the journal items `lines` to be reindexed before the transaction commits, or before the index is read. """
+        line_ids = [line_id for line_id in lines.ids if line_id]
+        if not line_ids:
+            return
+        precommit = self.env.cr.precommit
+        if MATCHING_TOKEN_PENDING_KEY not in precommit.data:
+            precommit.data[MATCHING_TOKEN_PENDING_KEY] = set()
+            precommit.add(self._reindex_scheduled_lines)
+        precommit.data[MATCHING_TOKEN_PENDING_KEY].update(line_ids)
+
+    @api.model
+    def _reindex_scheduled_lines(self):
+        """ Reindex the journal items scheduled by _schedule_reindex. To be called before reading the index. """
+        line_ids = self.env.cr.precommit.data.pop(MATCHING_TOKEN_PENDING_KEY, None)
+        if line_ids:
+            self._reindex(SQL("account_move_line.id = ANY(%s)", sorted(line_ids)))
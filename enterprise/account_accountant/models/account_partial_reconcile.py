@@ -0,0 +1,20 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo import api, models
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = 'account.partial.reconcile'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # EXTENDS 'account' to remove the fully reconciled journal items from the matching token index.
+        partials = super().create(vals_list)
+        self.env['account.move.line.matching.token']._schedule_reindex(partials.debit_move_id | partials.credit_move_id)
+        return partials
+
+    def unlink(self):
+        # EXTENDS 'account' to add back the unreconciled journal items to the matching token index.
+        lines = self.debit_move_id | self.credit_move_id
+        res = super().unlink()
+        self.env['account.move.line.matching.token']._schedule_reindex(lines)
+        return res
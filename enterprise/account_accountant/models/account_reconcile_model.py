@@ -5,6 +5,10 @@ import re
 from collections import defaultdict
 from dateutil.relativedelta import relativedelta
 
+# Statement lines having a token shared by more journal items than this (years, sequence prefixes...) are left out of the batched
+# token matching, and matched on their own with the full domain of the rule (see _get_invoice_matching_token_matches)
+MATCHING_TOKEN_BATCH_MAX_FREQUENCY = 200
+
 
 class AccountReconcileModel(models.Model):
     _inherit = 'account.reconcile.model'
@@ -223,6 +227,7 @@ class AccountReconcileModel(models.Model):
             )
 
         assert self.rule_type == 'invoice_matching'
+        self.env['account.move.line.matching.token']._reindex_scheduled_lines()
         self.env['account.move'].flush_model()
         self.env['account.move.line'].flush_model()
 
@@ -231,81 +236,45 @@ class AccountReconcileModel(models.Model):
         tables = query.from_clause
         where_clause = query.where_clause or SQL("TRUE")
 
-        aml_cte = SQL()
-        sub_queries: list[SQL] = []
         numerical_tokens, exact_tokens, _text_tokens = self._get_invoice_matching_st_line_tokens(st_line)
         if numerical_tokens or exact_tokens:
-            aml_cte = SQL('''
-                WITH aml_cte AS (
-                    SELECT
-                        account_move_line.id as account_move_line_id,
-                        account_move_line.date as account_move_line_date,
-                        account_move_line.date_maturity as account_move_line_date_maturity,
-                        account_move_line.name as account_move_line_name,
-                        account_move_line__move_id.name as account_move_line__move_id_name,
-                        account_move_line__move_id.ref as account_move_line__move_id_ref
-                    FROM %s
-                    JOIN account_move account_move_line__move_id ON account_move_line__move_id.id = account_move_line.move_id
-                    WHERE %s
-                )
-            ''', tables, where_clause)
-        if numerical_tokens:
-            for table_alias, field in (
-                ('account_move_line', 'name'),
-                ('account_move_line__move_id', 'name'),
-                ('account_move_line__move_id', 'ref'),
-            ):
-                sub_queries.append(SQL(r'''
-                    SELECT
-                        account_move_line_id as id,
-                        account_move_line_date as date,
-                        account_move_line_date_maturity as date_maturity,
-                        UNNEST(
-                            REGEXP_SPLIT_TO_ARRAY(
-                                SUBSTRING(
-                                    REGEXP_REPLACE(%(field)s, '[^0-9\s]', '', 'g'),
-                                    '\S(?:.*\S)*'
-                                ),
-                                '\s+'
-                            )
-                        ) AS token
-                    FROM aml_cte
-                    WHERE %(field)s IS NOT NULL
-                ''', field=SQL("%s_%s", SQL(table_alias), SQL(field))))
-        if exact_tokens:
-            for table_alias, field in (
-                ('account_move_line', 'name'),
-                ('account_move_line__move_id', 'name'),
-                ('account_move_line__move_id', 'ref'),
-            ):
-                sub_queries.append(SQL('''
-                    SELECT
-                        account_move_line_id as id,
-                        account_move_line_date as date,
-                        account_move_line_date_maturity as date_maturity,
-                        %(field)s AS token
-                    FROM aml_cte
-                    WHERE %(field)s != ''
-                ''', field=SQL("%s_%s", SQL(table_alias), SQL(field))))
-        if sub_queries:
-            order_by = get_order_by_clause(prefix=SQL('sub.'))
-            candidate_ids = [r[0] for r in self.env.execute_query(SQL(
-                '''
-                    %s
-                    SELECT
-                        sub.id,
-                        COUNT(*) AS nb_match
-                    FROM (%s) AS sub
-                    WHERE sub.token IN %s
-                    GROUP BY sub.date_maturity, sub.date, sub.id
-                    HAVING COUNT(*) > 0
-                    ORDER BY nb_match DESC, %s
-                ''',
-                aml_cte,
-                SQL(" UNION ALL ").join(sub_queries),
-                tuple(numerical_tokens + exact_tokens),
-                order_by,
-            ))]
+            # The token matches may have been computed at once for many statement lines (see _get_invoice_matching_token_matches).
+            nb_match_by_aml_id = self._context.get('invoice_matching_token_matches', {}).get(self.id, {}).get(st_line.id)
+            if nb_match_by_aml_id is None:
+                order_by = get_order_by_clause(prefix=SQL('account_move_line.'))
+                candidate_ids = [r[0] for r in self.env.execute_query(SQL(
+                    '''
+                        SELECT
+                            account_move_line.id,
+                            COUNT(*) AS nb_match
+                        FROM %s
+                        JOIN account_move_line_matching_token matching_token ON matching_token.move_line_id = account_move_line.id
+                        WHERE %s AND matching_token.token IN %s
+                        GROUP BY account_move_line.date_maturity, account_move_line.date, account_move_line.id
+                        ORDER BY nb_match DESC, %s
+                    ''',
+                    tables,
+                    where_clause,
+                    tuple(self.env['account.move.line.matching.token']._get_indexed_tokens(numerical_tokens + exact_tokens)),
+                    order_by,
+                ))]
+            elif nb_match_by_aml_id:
+                order_by = get_order_by_clause(prefix=SQL('account_move_line.'))
+                candidate_ids = [r[0] for r in self.env.execute_query(SQL(
+                    '''
+                        SELECT account_move_line.id
+                        FROM %s
+                        WHERE %s AND account_move_line.id = ANY(%s)
+                        ORDER BY %s
+                    ''',
+                    tables,
+                    where_clause,
+                    list(nb_match_by_aml_id),
+                    order_by,
+                ))]
+                candidate_ids.sort(key=lambda aml_id: -nb_match_by_aml_id[aml_id])
+            else:
+                candidate_ids = []
             if candidate_ids:
                 return {
                     'allow_auto_reconcile': True,
@@ -349,6 +318,107 @@ class AccountReconcileModel(models.Model):
                 'amls': amls,
             }
 
+    def _get_invoice_matching_token_matches(self, st_lines):
+        """ Match the tokens of many statement lines at once, for the 'invoice_matching' rules in self.
+
+        This is the part of _get_invoice_matching_amls_candidates looking for the journal items sharing tokens with the statement
+        line, done in one query per rule instead of one per statement line and rule. The result is meant to be passed in the
+        'invoice_matching_token_matches' context key, _get_invoice_matching_amls_candidates then only filtering the journal items
+        found with its domain.
+
+        The query only applies the conditions of that domain that do not depend on the partner of the statement line: the company
+        of the rule, the sign of the amount, the currency and the date limit of the rule. The statement lines of other companies
+        than the rule's, and the ones having a token shared by more than MATCHING_TOKEN_BATCH_MAX_FREQUENCY journal items, are left
+        out: the latter are matched on their own, with the full domain.
+
+        :param st_lines: The statement lines to match.
+        :return: A dict {rule id: {statement line id: {journal item id: number of matching tokens}}}. Statement lines without tokens
+                 are left out.
+        """
+        self.env['account.move.line.matching.token']._reindex_scheduled_lines()
+        self.env['account.move.line'].flush_model(['balance', 'company_id', 'currency_id', 'date'])
+
+        token_matches = {}
+        for rec_model in self.filtered(lambda m: m.rule_type == 'invoice_matching'):
+            rec_model_matches = token_matches[rec_model.id] = {}
+            tokens_by_st_line = {}
+            for st_line in st_lines.filtered(lambda line: line.company_id == rec_model.company_id):
+                numerical_tokens, exact_tokens, _text_tokens = rec_model._get_invoice_matching_st_line_tokens(st_line)
+                st_line_tokens = self.env['account.move.line.matching.token']._get_indexed_tokens(numerical_tokens + exact_tokens)
+                if st_line_tokens:
+                    tokens_by_st_line[st_line] = st_line_tokens
+            if not tokens_by_st_line:
+                continue
+
+            frequent_tokens = {row[0] for row in self.env.execute_query(SQL(
+                '''
+                    SELECT candidate.token
+                    FROM UNNEST(%s::varchar[]) AS candidate(token)
+                    CROSS JOIN LATERAL (
+                        SELECT COUNT(*) AS nb_lines
+                        FROM (
+                            SELECT 1
+                            FROM account_move_line_matching_token matching_token
+                            WHERE matching_token.token = candidate.token
+                            LIMIT %s
+                        ) AS sample
+                    ) AS frequency
+                    WHERE frequency.nb_lines > %s
+                ''',
+                list(set().union(*tokens_by_st_line.values())),
+                MATCHING_TOKEN_BATCH_MAX_FREQUENCY + 1,
+                MATCHING_TOKEN_BATCH_MAX_FREQUENCY,
+            ))}
+
+            st_line_ids, tokens, inbound_flags, currency_ids = [], [], [], []
+            for st_line, st_line_tokens in tokens_by_st_line.items():
+                if st_line_tokens & frequent_tokens:
+                    continue
+                rec_model_matches[st_line.id] = {}
+                currency = st_line.foreign_currency_id or st_line.currency_id
+                for token in st_line_tokens:
+                    st_line_ids.append(st_line.id)
+                    tokens.append(token)
+                    inbound_flags.append(st_line.amount > 0.0)
+                    currency_ids.append(currency.id)
+            if not st_line_ids:
+                continue
+
+            conditions = [
+                SQL("CASE WHEN st_line_token.is_inbound THEN account_move_line.balance > 0.0 ELSE account_move_line.balance < 0.0 END"),
+                SQL(
+                    "account_move_line.company_id = ANY(%s)",
+                    self.env['res.company'].sudo().search([('id', 'child_of', rec_model.company_id.root_id.id)]).ids,
+                ),
+            ]
+            if rec_model.match_same_currency:
+                conditions.append(SQL("account_move_line.currency_id = st_line_token.currency_id"))
+            if rec_model.past_months_limit:
+                date_limit = fields.Date.context_today(rec_model) - relativedelta(months=rec_model.past_months_limit)
+                conditions.append(SQL("account_move_line.date >= %s", date_limit))
+
+            rows = self.env.execute_query(SQL(
+                '''
+                    SELECT
+                        st_line_token.st_line_id,
+                        matching_token.move_line_id,
+                        COUNT(*) AS nb_match
+                    FROM UNNEST(%s::int[], %s::varchar[], %s::boolean[], %s::int[]) AS st_line_token(st_line_id, token, is_inbound, currency_id)
+                    JOIN account_move_line_matching_token matching_token ON matching_token.token = st_line_token.token
+                    JOIN account_move_line ON account_move_line.id = matching_token.move_line_id
+                    WHERE %s
+                    GROUP BY st_line_token.st_line_id, matching_token.move_line_id
+                ''',
+                st_line_ids,
+                tokens,
+                inbound_flags,
+                currency_ids,
+                SQL(" AND ").join(conditions),
+            ))
+            for st_line_id, aml_id, nb_match in rows:
+                rec_model_matches[st_line_id][aml_id] = nb_match
+        return token_matches
+
     def _get_invoice_matching_rules_map(self):
         """ Get a mapping <priority_order, rule> that could be overridden in others modules.
 
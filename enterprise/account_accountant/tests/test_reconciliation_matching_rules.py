@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from freezegun import freeze_time
 from contextlib import contextmanager
+from unittest.mock import patch
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.account_accountant.models.account_move_line_matching_token import MATCHING_TOKEN_MAX_LENGTH
 from odoo.tests import Form, tagged
 from odoo import Command
 
@@ -1286,3 +1288,81 @@ class TestReconciliationMatchingRules(AccountTestInvoicingCommon):
                     'model': self.rule_1,
                 },
             })
+
+    @freeze_time('2020-01-01')
+    def test_matching_token_index(self):
+        matching_token = self.env['account.move.line.matching.token']
+
+        def get_tokens(line):
+            matching_token._reindex_scheduled_lines()
+            return set(matching_token.search([('move_line_id', '=', line.id)]).mapped('token'))
+
+        # Numerical and exact tokens of the reference
+        self.assertTrue({'12', '3456', 'RF12 3456'} <= get_tokens(self.invoice_line_6))
+
+        self.invoice_line_6.move_id.ref = 'RF98 7654'
+        tokens = get_tokens(self.invoice_line_6)
+        self.assertTrue({'98', '7654', 'RF98 7654'} <= tokens)
+        self.assertFalse({'3456', 'RF12 3456'} & tokens)
+
+        # Long references are cut, to fit in the index, and looked up cut the same way
+        long_ref = 'RF98 7654 ' + 'X' * 5000
+        self.invoice_line_6.move_id.ref = long_ref
+        self.assertIn(long_ref[:MATCHING_TOKEN_MAX_LENGTH], get_tokens(self.invoice_line_6))
+        self.assertEqual(matching_token._get_indexed_tokens([long_ref]), {long_ref[:MATCHING_TOKEN_MAX_LENGTH]})
+        self.invoice_line_6.move_id.ref = 'RF98 7654'
+
+        # Reconciled journal items leave the index, and come back once unreconciled
+        counterpart_move = self.env['account.move'].create({
+            'move_type': 'entry',
+            'date': '2019-09-01',
+            'line_ids': [
+                Command.create({
+                    'account_id': self.invoice_line_6.account_id.id,
+                    'partner_id': self.partner_3.id,
+                    'credit': 600.0,
+                }),
+                Command.create({
+                    'account_id': self.current_assets_account.id,
+                    'debit': 600.0,
+                }),
+            ],
+        })
+        counterpart_move.action_post()
+        counterpart_line = counterpart_move.line_ids.filtered(lambda line: line.account_id == self.invoice_line_6.account_id)
+        (self.invoice_line_6 + counterpart_line).reconcile()
+        self.assertFalse(get_tokens(self.invoice_line_6))
+
+        self.invoice_line_6.remove_move_reconcile()
+        self.assertTrue({'7654', 'RF98 7654'} <= get_tokens(self.invoice_line_6))
+
+        # Journal items of draft entries are not indexed
+        self.invoice_line_6.move_id.button_draft()
+        self.assertFalse(get_tokens(self.invoice_line_6))
+
+    @freeze_time('2020-01-01')
+    def test_matching_token_matches_batch(self):
+        st_lines = self.bank_line_1 + self.bank_line_2 + self.bank_line_3 + self.bank_line_4 + self.bank_line_5 + self.cash_line_1
+        rules = self.rule_1 + self.rule_2
+
+        token_matches = rules._get_invoice_matching_token_matches(st_lines)
+        self.assertEqual(list(token_matches), self.rule_1.ids)
+        self.assertIn(self.invoice_line_1.id, token_matches[self.rule_1.id][self.bank_line_1.id])
+
+        # Matching the statement lines with the batched token matches gives the same result as matching them one by one
+        for st_line in st_lines:
+            partner = st_line._retrieve_partner()
+            self.assertDictEqual(
+                rules.with_context(invoice_matching_token_matches=token_matches)._apply_rules(st_line, partner),
+                rules._apply_rules(st_line, partner),
+            )
+
+        # Statement lines having a token shared by too many journal items are left out of the batch, and matched on their own
+        with patch('odoo.addons.account_accountant.models.account_reconcile_model.MATCHING_TOKEN_BATCH_MAX_FREQUENCY', 0):
+            token_matches = rules._get_invoice_matching_token_matches(st_lines)
+        self.assertNotIn(self.bank_line_1.id, token_matches[self.rule_1.id])
+        st_line_partner = self.bank_line_1._retrieve_partner()
+        self.assertDictEqual(
+            rules.with_context(invoice_matching_token_matches=token_matches)._apply_rules(self.bank_line_1, st_line_partner),
+            rules._apply_rules(self.bank_line_1, st_line_partner),
+        )
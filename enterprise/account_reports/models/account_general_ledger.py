@@ -273,7 +273,7 @@ class GeneralLedgerCustomHandler(models.AbstractModel):
             if options_group.get('include_current_year_in_unaff_earnings'):
                 query_domain += [('account_id.include_initial_balance', '=', True)]
 
-            query = report._get_report_query(options_group, sum_date_scope, domain=query_domain)
+            query = report.with_context(account_report_balance_snapshot=True)._get_report_query(options_group, sum_date_scope, domain=query_domain)
             queries.append(SQL(
                 """
                 SELECT
@@ -312,7 +312,7 @@ class GeneralLedgerCustomHandler(models.AbstractModel):
                 # ]
 
                 new_options = self._get_options_unaffected_earnings(options_group)
-                query = report._get_report_query(new_options, 'strict_range', domain=unaff_earnings_domain)
+                query = report.with_context(account_report_balance_snapshot=True)._get_report_query(new_options, 'strict_range', domain=unaff_earnings_domain)
                 queries.append(SQL(
                     """
                     SELECT
@@ -506,7 +506,7 @@ class GeneralLedgerCustomHandler(models.AbstractModel):
                 ]
             if new_options.get('include_current_year_in_unaff_earnings'):
                 domain += [('account_id.include_initial_balance', '=', True)]
-            query = report._get_report_query(new_options, 'from_beginning', domain=domain)
+            query = report.with_context(account_report_balance_snapshot=True)._get_report_query(new_options, 'from_beginning', domain=domain)
             queries.append(SQL(
                 """
                 SELECT
@@ -722,7 +722,9 @@ class GeneralLedgerCustomHandler(models.AbstractModel):
                 progress = init_load_more_progress(initial_balance_line)
 
         # Get move lines
-        limit_to_load = report.load_more_limit + 1 if report.load_more_limit and options['export_mode'] != 'print' else None
+        # Streamed exports load all the move lines, by pages (see account.report's _get_streamed_export_lines)
+        page_size = options.get('export_page_size') or (report.load_more_limit if options['export_mode'] != 'print' else None)
+        limit_to_load = page_size + 1 if page_size else None
         if unfold_all_batch_data:
             aml_results = unfold_all_batch_data['aml_results'][model_id]
             has_more = unfold_all_batch_data['has_more'].get(model_id, False)
@@ -738,7 +740,7 @@ class GeneralLedgerCustomHandler(models.AbstractModel):
 
         return {
             'lines': lines,
-            'offset_increment': report.load_more_limit,
+            'offset_increment': page_size or report.load_more_limit,
             'has_more': has_more,
             'progress': next_progress,
         }
@@ -11,6 +11,8 @@ from odoo.addons.web.controllers.utils import clean_action
 from dateutil.relativedelta import relativedelta
 from markupsafe import Markup
 
+from .account_report_balance_snapshot import BALANCE_SNAPSHOT_MOVE_FIELDS
+
 
 class AccountMove(models.Model):
     _inherit = "account.move"
@@ -20,6 +22,35 @@ class AccountMove(models.Model):
     # technical field used to know whether to show the tax closing alert or not
     tax_closing_alert = fields.Boolean(compute='_compute_tax_closing_alert')
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Overridden to add the lines of the moves created posted to the balance snapshot of the reports, once they are complete
+        moves = super(AccountMove, self.with_context(skip_account_report_balance_snapshot=True)).create(vals_list).with_env(self.env)
+        if not self._context.get('skip_account_report_balance_snapshot'):
+            self.env['account.report.balance.snapshot']._add_lines(moves.filtered(lambda m: m.state == 'posted').line_ids)
+        return moves
+
+    def write(self, vals):
+        # Overridden to follow the posting, resetting to draft and changes of posted moves in the balance snapshot of the reports:
+        # their posted lines are removed from it before the write, and added back after it.
+        if self._context.get('skip_account_report_balance_snapshot') or not BALANCE_SNAPSHOT_MOVE_FIELDS.intersection(vals):
+            return super().write(vals)
+        moves_to_follow = self if vals.get('state') == 'posted' else self.filtered(lambda m: m.state == 'posted')
+        if not moves_to_follow:
+            return super().write(vals)
+
+        snapshot = self.env['account.report.balance.snapshot']
+        snapshot._add_lines(moves_to_follow.line_ids, sign=-1)
+        res = super(AccountMove, self.with_context(skip_account_report_balance_snapshot=True)).write(vals)
+        snapshot._add_lines(moves_to_follow.line_ids)
+        return res
+
+    def unlink(self):
+        # Overridden to remove the lines of the deleted posted moves from the balance snapshot of the reports
+        if not self._context.get('skip_account_report_balance_snapshot'):
+            self.env['account.report.balance.snapshot']._add_lines(self.filtered(lambda m: m.state == 'posted').line_ids, sign=-1)
+        return super(AccountMove, self.with_context(skip_account_report_balance_snapshot=True)).unlink()
+
     def _post(self, soft=True):
         # Overridden to create carryover external values and join the pdf of the report when posting the tax closing
         for move in self.filtered(lambda m: m.tax_closing_report_id):
@@ -6,12 +6,43 @@ from odoo import api, models, fields, _
 from odoo.exceptions import UserError
 from odoo.tools import SQL
 
+from .account_report_balance_snapshot import BALANCE_SNAPSHOT_LINE_FIELDS
+
 class AccountMoveLine(models.Model):
     _name = "account.move.line"
     _inherit = "account.move.line"
 
     exclude_bank_lines = fields.Boolean(compute='_compute_exclude_bank_lines', store=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Overridden to add the lines created in posted moves to the balance snapshot of the reports
+        lines = super().create(vals_list)
+        if not self._context.get('skip_account_report_balance_snapshot'):
+            self.env['account.report.balance.snapshot']._add_lines(lines.filtered(lambda line: line.move_id.state == 'posted'))
+        return lines
+
+    def write(self, vals):
+        # Overridden to follow the changes of posted lines in the balance snapshot of the reports: they are removed from it before
+        # the write, and added back after it.
+        if self._context.get('skip_account_report_balance_snapshot') or not BALANCE_SNAPSHOT_LINE_FIELDS.intersection(vals):
+            return super().write(vals)
+        posted_lines = self.filtered(lambda line: line.parent_state == 'posted')
+        if not posted_lines:
+            return super().write(vals)
+
+        snapshot = self.env['account.report.balance.snapshot']
+        snapshot._add_lines(posted_lines, sign=-1)
+        res = super(AccountMoveLine, self.with_context(skip_account_report_balance_snapshot=True)).write(vals)
+        snapshot._add_lines(posted_lines)
+        return res
+
+    def unlink(self):
+        # Overridden to remove the deleted posted lines from the balance snapshot of the reports
+        if not self._context.get('skip_account_report_balance_snapshot'):
+            self.env['account.report.balance.snapshot']._add_lines(self.filtered(lambda line: line.parent_state == 'posted'), sign=-1)
+        return super(AccountMoveLine, self.with_context(skip_account_report_balance_snapshot=True)).unlink()
+
     @api.depends('journal_id')
     def _compute_exclude_bank_lines(self):
         for move_line in self:
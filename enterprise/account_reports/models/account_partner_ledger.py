@@ -452,7 +452,9 @@ class PartnerLedgerCustomHandler(models.AbstractModel):
                 # For the first expansion of the line, the initial balance line gives the progress
                 progress = init_load_more_progress(initial_balance_line)
 
-        limit_to_load = report.load_more_limit + 1 if report.load_more_limit and options['export_mode'] != 'print' else None
+        # Streamed exports load all the move lines, by pages (see account.report's _get_streamed_export_lines)
+        page_size = options.get('export_page_size') or (report.load_more_limit if options['export_mode'] != 'print' else None)
+        limit_to_load = page_size + 1 if page_size else None
 
         if unfold_all_batch_data:
             aml_results = unfold_all_batch_data['aml_values'][record_id]
@@ -463,7 +465,7 @@ class PartnerLedgerCustomHandler(models.AbstractModel):
         treated_results_count = 0
         next_progress = progress
         for result in aml_results:
-            if options['export_mode'] != 'print' and report.load_more_limit and treated_results_count == report.load_more_limit:
+            if page_size and treated_results_count == page_size:
                 # We loaded one more than the limit on purpose: this way we know we need a "load more" line
                 has_more = True
                 break
@@ -3,11 +3,15 @@
 
 import ast
 import base64
+import copy
+import csv
 import datetime
 import io
 import json
 import logging
+import operator
 import re
+import tempfile
 from ast import literal_eval
 from collections import defaultdict
 from functools import cmp_to_key
@@ -21,10 +25,13 @@ from odoo import models, fields, api, _, osv
 from odoo.addons.web.controllers.utils import clean_action
 from odoo.exceptions import RedirectWarning, UserError, ValidationError
 from odoo.models import check_method_name
-from odoo.tools import date_utils, get_lang, float_is_zero, float_repr, SQL, parse_version, Query
+from odoo.tools import date_utils, get_lang, float_is_zero, float_repr, ormcache, SQL, parse_version, Query
 from odoo.tools.float_utils import float_round, float_compare
+from odoo.tools.lru import LRU
 from odoo.tools.misc import file_path, format_date, formatLang, split_every, xlsxwriter
-from odoo.tools.safe_eval import expr_eval, safe_eval
+from odoo.tools.safe_eval import safe_eval
+
+from .account_report_balance_snapshot import BALANCE_SNAPSHOT_DIMENSIONS, BALANCE_SNAPSHOT_IMPLIED_LEAVES
 
 _logger = logging.getLogger(__name__)
 
@@ -42,12 +49,49 @@ ACCOUNT_CODES_ENGINE_TAG_ID_PREFIX_REGEX = re.compile(r"tag\(((?P<id>\d+)|(?P<re
 # Performance optimisation: those engines always will receive None as their next_groupby, allowing more efficient batching.
 NO_NEXT_GROUPBY_ENGINES = {'tax_tags', 'account_codes'}
 
+# Engines computing all the column groups of a report in a single pass (see _compute_formula_batch_for_column_groups)
+COLUMN_GROUPS_BATCH_ENGINES = {'domain', 'account_codes'}
+
 NUMBER_FIGURE_TYPES = ('float', 'integer', 'monetary', 'percentage')
 
+# Operators allowed in aggregation formulas (see _compile_aggregation_plan)
+AGGREGATION_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+
 LINE_ID_HIERARCHY_DELIMITER = '|'
 
 CURRENCIES_USING_LAKH = {'AFN', 'BDT', 'INR', 'MMK', 'NPR', 'PKR', 'LKR'}
 
+# Expression totals of the column groups recently computed by this worker, shared by all users (see _get_cached_expression_totals)
+EXPRESSION_TOTALS_CACHE = LRU(256)
+
+# Engines whose results only depend on the balance snapshot, the report configuration and the external values. The tax tags of
+# the journal items are not in the snapshot, so the tax_tags engine is not cached.
+EXPRESSION_TOTALS_CACHE_ENGINES = {'domain', 'account_codes', 'external', 'aggregation'}
+
+# Dimensions of the balance snapshot whose records are followed by the cache watermark: the domains of the cached formulas can
+# only go through these relations
+EXPRESSION_TOTALS_CACHE_RELATIONS = {'account_id', 'company_id'}
+
+# Tables holding the data the cached expression totals depend on
+EXPRESSION_TOTALS_CACHE_TABLES = [
+    'account_move', 'account_move_line', 'account_report_balance_snapshot', 'account_report_balance_snapshot_version',
+    'account_report', 'account_report_line', 'account_report_expression', 'account_report_external_value',
+    'account_account', 'account_account_tag', 'res_currency_rate', 'res_company',
+]
+
+# Number of sublines the expand functions load at once for the streamed exports (see _get_streamed_export_lines)
+EXPORT_PAGE_SIZE = 5000
+
+# Number of rows an Excel sheet can hold
+XLSX_MAX_ROWS = 1048576
+
 
 class AccountReportAnnotation(models.Model):
     _name = 'account.report.annotation'
@@ -1375,9 +1419,15 @@ class AccountReport(models.Model):
         return SQL("(%(value)s) * COALESCE(account_currency_table.rate, 1)", value=value)
 
     @api.model
-    def _currency_table_aml_join(self, options, aml_alias=SQL('account_move_line')) -> SQL:
+    def _currency_table_aml_join(self, options, aml_alias=SQL('account_move_line'), period_key=None) -> SQL:
         """ Returns the JOIN condition to the currency table in a query needing to use it to convert aml balances from one currency to another.
+
+        :param period_key: SQL term giving the currency table period to use, if it is not the one of the options' dates (e.g. when one query
+                           computes several column groups).
         """
+        if period_key is None:
+            period_key = SQL("%s", options['date']['currency_table_period_key'])
+
         if options['currency_table']['type'] == 'cta':
             return SQL(
                 """
@@ -1401,7 +1451,7 @@ class AccountReport(models.Model):
                 income_prefix='income%',
                 expense_prefix='expense%',
                 currency_table=self._get_currency_table(options),
-                period_key=options['date']['currency_table_period_key'],
+                period_key=period_key,
             )
 
         return SQL(
@@ -1412,7 +1462,7 @@ class AccountReport(models.Model):
             """,
             aml_table=aml_alias,
             currency_table=self._get_currency_table(options),
-            period_key=options['date']['currency_table_period_key'],
+            period_key=period_key,
         )
 
     @api.model
@@ -1497,12 +1547,14 @@ class AccountReport(models.Model):
         else:
             options['hide_0_lines'] = False
 
-    def _filter_out_0_lines(self, lines):
+    def _filter_out_0_lines(self, lines, visible_line_ids=()):
         """ Returns a list containing all lines that are not zero or that are parent to non-zero lines.
             Can be used to ensure printed report does not include 0 lines, when hide_0_lines is toggled.
+
+            :param visible_line_ids: ids of lines to keep even if they are zero, e.g. because their sublines are not part of lines.
         """
         lines_to_hide = set()  # contain line ids to remove from lines
-        has_visible_children = set()  # contain parent line ids
+        has_visible_children = set(visible_line_ids)  # contain parent line ids
         # Traverse lines in reverse to keep track of visible parent lines required by children lines
         for line in reversed(lines):
             is_zero_line = all(col.get('figure_type') not in NUMBER_FIGURE_TYPES or col.get('is_zero', True) for col in line['columns'])
@@ -1681,6 +1733,8 @@ class AccountReport(models.Model):
         options['buttons'] = [
             {'name': _('PDF'), 'sequence': 10, 'action': 'export_file', 'action_param': 'export_to_pdf', 'file_export_type': _('PDF'), 'branch_allowed': True},
             {'name': _('Download Excel'), 'sequence': 20, 'action': 'export_file', 'action_param': 'export_to_xlsx', 'file_export_type': _('XLSX'), 'branch_allowed': True},
+            {'name': _('Excel (Background)'), 'sequence': 25, 'action': 'action_export_file_in_background', 'action_param': 'xlsx', 'branch_allowed': True},
+            {'name': _('CSV (Background)'), 'sequence': 26, 'action': 'action_export_file_in_background', 'action_param': 'csv', 'branch_allowed': True},
         ]
 
     def open_account_report_file_download_error_wizard(self, errors, content):
@@ -2038,8 +2092,172 @@ class AccountReport(models.Model):
         # Wrap the query with 'company_id IN (...)' to avoid bypassing company access rights.
         self.env['account.move.line']._apply_ir_rules(query)
 
+        if self._context.get('account_report_balance_snapshot') and query._tables['account_move_line'] == SQL.identifier('account_move_line'):
+            # The caller only uses columns the snapshot knows about; read the full months of the period from it
+            full_months = self._get_balance_snapshot_full_months(options, date_scope, domain)
+            if full_months:
+                query._tables['account_move_line'] = self.env['account.report.balance.snapshot']._get_aml_shadow_table(*full_months)
+
         return query
 
+    def _get_report_queries_for_column_groups(self, options_by_column_group, date_scope, domain=None):
+        """ Get the queries to run in order to aggregate the move lines of several column groups at once.
+
+        The column groups whose report queries read the same tables share the same query. When they can all use the balance snapshot, they
+        read it through the same table covering all their months (see _get_balance_snapshot_shared_full_months). Its FROM clause joins each move line to the
+        column_group table, containing one row per column group the line belongs to ; the column_group.column_group_key column can then be
+        used in the GROUP BY clause of the query to aggregate all these column groups in a single pass on the move lines. The currency table
+        is joined as well, using the currency table period of each column group.
+
+        :param options_by_column_group: A dict(column_group_key, options), the options being obtained from _split_options_per_column_group.
+
+        :return: A list of tuples (column_group_keys, table_references, search_condition), where table_references and search_condition are
+                 the FROM and WHERE clauses of the query to run for the column groups of column_group_keys.
+        """
+        # Each column group would read its own months from the balance snapshot: read the months of all of them from the same table
+        shared_full_months = (
+            self._context.get('account_report_balance_snapshot')
+            and len(options_by_column_group) > 1
+            and self._get_balance_snapshot_shared_full_months(options_by_column_group, date_scope, domain)
+        )
+        report = self.with_context(account_report_balance_snapshot=False) if shared_full_months else self
+
+        queries = []  # [[(table_references, currency_table_join), [(column_group_key, period_key, search_condition), ...]], ...]
+        for column_group_key, options in options_by_column_group.items():
+            query = report._get_report_query(options, date_scope, domain=domain)
+            if shared_full_months and query._tables['account_move_line'] == SQL.identifier('account_move_line'):
+                query._tables['account_move_line'] = self.env['account.report.balance.snapshot']._get_aml_shadow_table(*shared_full_months)
+            from_clause = query.from_clause
+            currency_table_join = self._currency_table_aml_join(options, period_key=SQL("column_group.currency_table_period_key"))
+            column_group = (column_group_key, options['date']['currency_table_period_key'], query.where_clause)
+
+            for (other_from_clause, other_currency_table_join), column_groups in queries:
+                if (
+                    (other_from_clause.code, other_from_clause.params) == (from_clause.code, from_clause.params)
+                    and (other_currency_table_join.code, other_currency_table_join.params) == (currency_table_join.code, currency_table_join.params)
+                ):
+                    column_groups.append(column_group)
+                    break
+            else:
+                queries.append([(from_clause, currency_table_join), [column_group]])
+
+        rslt = []
+        for (from_clause, currency_table_join), column_groups in queries:
+            if len(column_groups) == 1:
+                column_group_key, period_key, search_condition = column_groups[0]
+                column_group_table = SQL("(SELECT %s AS column_group_key, %s AS currency_table_period_key)", column_group_key, period_key)
+            else:
+                # Each move line is only matched with the column groups whose conditions it fulfills
+                column_group_table = SQL("(%s)", SQL(" UNION ALL ").join(
+                    SQL("SELECT %s AS column_group_key, %s AS currency_table_period_key WHERE %s", column_group_key, period_key, search_condition)
+                    for column_group_key, period_key, search_condition in column_groups
+                ))
+                search_condition = SQL(" OR ").join(SQL("(%s)", search_condition) for dummy, dummy, search_condition in column_groups)
+
+            table_references = SQL(
+                "%(from_clause)s JOIN LATERAL %(column_group_table)s AS column_group ON TRUE %(currency_table_join)s",
+                from_clause=from_clause,
+                column_group_table=column_group_table,
+                currency_table_join=currency_table_join,
+            )
+            rslt.append(([column_group_key for column_group_key, dummy, dummy in column_groups], table_references, search_condition))
+
+        return rslt
+
+    def _get_balance_snapshot_shared_full_months(self, options_by_column_group, date_scope, domain):
+        """ Returns the bounds of the months the column groups can all read from account.report.balance.snapshot through the same table,
+        or None if they cannot.
+
+        These months go from the first to the last full month of all the column groups (see _get_balance_snapshot_full_months). The rows
+        of the snapshot are dated on the first day of their month, so each column group still only selects the months of its period, as
+        long as none of its bounds falls in the middle of one of these months.
+        """
+        full_months_list = []
+        for options in options_by_column_group.values():
+            full_months = self._get_balance_snapshot_full_months(options, date_scope, domain)
+            if not full_months:
+                return None
+            full_months_list.append(full_months)
+
+        months_start = None if any(start is None for start, dummy in full_months_list) else min(start for start, dummy in full_months_list)
+        months_end = max(end for dummy, end in full_months_list)
+
+        def in_shared_months(day):
+            month = day.replace(day=1)
+            return (months_start is None or month >= months_start) and month < months_end
+
+        for options in options_by_column_group.values():
+            date_from, date_to = self._get_date_bounds_info(options, date_scope)
+            date_to = fields.Date.to_date(date_to)
+            if (date_to + relativedelta(days=1)).day != 1 and in_shared_months(date_to):
+                return None
+            if date_from:
+                date_from = fields.Date.to_date(date_from)
+                if date_from.day != 1 and in_shared_months(date_from):
+                    return None
+
+        return months_start, months_end
+
+    def _get_balance_snapshot_full_months(self, options, date_scope, domain):
+        """ Returns the bounds of the full months of the period that can be read from account.report.balance.snapshot instead
+        of account_move_line (see _get_full_months), or None if the snapshot cannot be used for these options and domain.
+
+        The snapshot only knows the posted journal items, aggregated per month on a few dimensions: every condition of the domain
+        (and of the record rules) must either be true for all posted items, or only target these dimensions and whole months.
+        """
+        if (
+            not date_scope
+            or options.get('analytic_accounts')
+            or options.get('analytic_groupby_option')
+            or options['currency_table']['type'] == 'cta'
+        ):
+            return None
+
+        date_from, date_to = self._get_date_bounds_info(options, date_scope)
+        period_bounds = {('<=', fields.Date.to_date(date_to))}
+        if date_from:
+            period_bounds.add(('>=', fields.Date.to_date(date_from)))
+
+        rules_domain = [] if self.env.su else self.env['ir.rule']._compute_domain('account.move.line', 'read')
+        if not self._is_balance_snapshot_domain([*domain, *(rules_domain or [])], period_bounds=period_bounds):
+            return None
+
+        return self.env['account.report.balance.snapshot']._get_full_months(date_from, date_to)
+
+    def _is_balance_snapshot_domain(self, domain, period_bounds=None):
+        """ Whether every condition of a domain on account.move.line is either true for all posted items, or only targets the dimensions
+        and the dates of the balance snapshot.
+
+        :param period_bounds: The date conditions allowed besides the bounds of whole months, as a set of (operator, date). None to allow
+                              any date condition.
+        """
+        Snapshot = self.env['account.report.balance.snapshot']
+        for leaf in domain:
+            if not osv.expression.is_leaf(leaf) or leaf in (osv.expression.TRUE_LEAF, osv.expression.FALSE_LEAF):
+                continue
+            field_path, operator, value = leaf
+            if field_path in ('parent_state', 'display_type'):
+                if (field_path, operator, tuple(value) if isinstance(value, list) else value) not in BALANCE_SNAPSHOT_IMPLIED_LEAVES:
+                    return False
+            elif field_path == 'date':
+                if period_bounds is not None and not Snapshot._is_month_bound(operator, value) and (
+                    not isinstance(value, (str, datetime.date)) or (operator, fields.Date.to_date(value)) not in period_bounds
+                ):
+                    return False
+            elif field_path.split('.')[0] not in BALANCE_SNAPSHOT_DIMENSIONS:
+                return False
+        return True
+
+    def _is_balance_snapshot_domain_formula(self, expressions, current_groupby, next_groupby):
+        """ Whether the balance snapshot can give the results of expressions of the domain engine grouped by current_groupby. It gives
+        the sums, but can only group and count the rows by the fields it knows about.
+        """
+        if current_groupby and current_groupby not in BALANCE_SNAPSHOT_DIMENSIONS:
+            return False
+        return (next_groupby.split(',')[0] if next_groupby else 'id') in BALANCE_SNAPSHOT_DIMENSIONS or not any(
+            'count_rows' in (expression.subformula or '') for expression in expressions
+        )
+
     def _create_report_budget_temp_table(self, options):
         self._cr.execute("SELECT 1 FROM information_schema.tables WHERE table_name='account_report_budget_temp_aml'")
         if self._cr.fetchone():
@@ -3009,23 +3227,80 @@ class AccountReport(models.Model):
                 forced_date_scope = self._standardize_date_scope_for_date_range(expression.date_scope)
                 add_expressions_to_groups(expanded_cross, grouped_formulas, force_date_scope=forced_date_scope)
 
+        # Results of the same computation done earlier on an unchanged ledger are reused
+        cache_key = None
+        if (
+            not forced_all_column_groups_expression_totals
+            and self._is_expression_totals_cache_enabled(options, grouped_formulas)
+            and not self._has_uncommitted_expression_totals_changes()
+        ):
+            cache_key = (
+                self.env.cr.dbname,
+                self.id,
+                tuple(sorted(expressions.ids)),
+                groupby_to_expand,
+                offset,
+                limit,
+                warnings is not None,
+                str(self.env['ir.rule']._compute_domain('account.move.line', 'read')),
+                self._get_expression_totals_cache_watermark(options),
+            )
+
+        # Find the column groups to compute, and the ones whose totals are cached
+        options_per_column_group = self._split_options_per_column_group(options)
+        cached_expression_totals = {}
+        cache_key_by_column_group = {}
+        options_to_compute = {}
+        for group_key, group_options in options_per_column_group.items():
+            if not col_groups_restrict or group_key in col_groups_restrict:
+                group_cache_key = cache_key and (*cache_key, str(self._get_dict_hashable_key_tuple(group_options)))
+                current_group_expression_totals = group_cache_key and self._get_cached_expression_totals(group_cache_key)
+                if current_group_expression_totals is None:
+                    cache_key_by_column_group[group_key] = group_cache_key
+                    options_to_compute[group_key] = group_options
+                else:
+                    cached_expression_totals[group_key] = current_group_expression_totals
+
+        # The engines able to do so aggregate the move lines of all the column groups in a single pass, instead of reading them once per
+        # column group. The load more feature pages through the results of each column group, so they are then computed separately.
+        batched_formula_results = {group_key: {} for group_key in options_to_compute}
+        if len(options_to_compute) > 1 and not offset and not limit:
+            for engine in sorted(COLUMN_GROUPS_BATCH_ENGINES.intersection(grouped_formulas)):
+                for batch_key, formulas_dict in grouped_formulas[engine].items():
+                    date_scope, current_groupby, next_groupby = batch_key
+                    formula_results_by_column_group = self._compute_formula_batch_for_column_groups(
+                        options_to_compute, engine, date_scope, formulas_dict, current_groupby, next_groupby,
+                    )
+                    for group_key, formula_results in formula_results_by_column_group.items():
+                        batched_formula_results[group_key][(engine, batch_key)] = formula_results
+
         # Treat each formula batch for each column group
         all_column_groups_expression_totals = {}
-        for group_key, group_options in self._split_options_per_column_group(options).items():
+        for group_key, group_options in options_per_column_group.items():
             if forced_all_column_groups_expression_totals:
                 forced_column_group_totals = forced_all_column_groups_expression_totals.get(group_key, None)
             else:
                 forced_column_group_totals = None
 
-            if not col_groups_restrict or group_key in col_groups_restrict:
+            if group_key in cached_expression_totals:
+                current_group_expression_totals = cached_expression_totals[group_key]
+            elif group_key in options_to_compute:
+                group_cache_key = cache_key_by_column_group[group_key]
+                group_warnings = {} if warnings is not None else None
                 current_group_expression_totals = self._compute_expression_totals_for_single_column_group(
                     group_options,
                     grouped_formulas,
                     forced_column_group_expression_totals=forced_column_group_totals,
                     offset=offset,
                     limit=limit,
-                    warnings=warnings,
+                    warnings=group_warnings,
+                    precomputed_formula_results=batched_formula_results[group_key],
                 )
+                if group_warnings:
+                    # Warnings are only raised while computing; keep computing the results having some
+                    warnings.update(group_warnings)
+                elif group_cache_key:
+                    self._set_cached_expression_totals(group_cache_key, current_group_expression_totals)
             else:
                 current_group_expression_totals = forced_column_group_totals
 
@@ -3033,6 +3308,130 @@ class AccountReport(models.Model):
 
         return all_column_groups_expression_totals
 
+    def _is_expression_totals_cache_enabled(self, options, grouped_formulas):
+        """ Whether the expression totals computed with these options can be cached. They can if they only depend on data followed by
+        _get_expression_totals_cache_watermark: the posted journal items (through the balance snapshot), the report configuration, the
+        accounts, the currency rates and the external values.
+
+        The changes of the journal items are only followed on the fields of the balance snapshot: the formulas reading the journal
+        items must only filter, group and count them on these fields (see _are_balance_snapshot_formulas).
+        """
+        return (
+            not options.get('all_entries')
+            and not options.get('unreconciled')
+            and not options.get('analytic_accounts')
+            and not options.get('report_cash_basis')
+            and not any(budget['selected'] for budget in options.get('budgets', []))
+            and not any(
+                column_group['forced_options'].get('analytic_groupby_option') or column_group['forced_options'].get('compute_budget')
+                for column_group in options['column_groups'].values()
+            )
+            and set(grouped_formulas) <= EXPRESSION_TOTALS_CACHE_ENGINES
+            and self._are_balance_snapshot_formulas(grouped_formulas)
+        )
+
+    def _are_balance_snapshot_formulas(self, grouped_formulas):
+        """ Whether the formulas of the engines reading the journal items only use the fields of the balance snapshot, as checked by
+        these engines to read it (see _is_balance_snapshot_domain and _is_balance_snapshot_domain_formula). Their domains can only go
+        through the relations of EXPRESSION_TOTALS_CACHE_RELATIONS.
+        """
+        line_formulas = {engine: grouped_formulas[engine] for engine in COLUMN_GROUPS_BATCH_ENGINES.intersection(grouped_formulas)}
+        if not line_formulas:
+            return True
+
+        def is_followed_domain(domain):
+            return self._is_balance_snapshot_domain(domain) and not any(
+                osv.expression.is_leaf(leaf) and isinstance(leaf[0], str) and '.' in leaf[0]
+                and leaf[0].split('.')[0] not in EXPRESSION_TOTALS_CACHE_RELATIONS
+                for leaf in domain
+            )
+
+        rules_domain = [] if self.env.su else self.env['ir.rule']._compute_domain('account.move.line', 'read')
+        if not is_followed_domain(rules_domain or []):
+            return False
+
+        for engine, formulas_by_batch_key in line_formulas.items():
+            for (dummy, current_groupby, next_groupby), formulas_dict in formulas_by_batch_key.items():
+                if engine == 'account_codes':
+                    if current_groupby and current_groupby not in BALANCE_SNAPSHOT_DIMENSIONS:
+                        return False
+                    continue
+
+                for formula, expressions in formulas_dict.items():
+                    try:
+                        line_domain = literal_eval(formula)
+                    except (ValueError, SyntaxError):
+                        return False
+                    if (
+                        not self._is_balance_snapshot_domain_formula(expressions, current_groupby, next_groupby)
+                        or not is_followed_domain(line_domain)
+                    ):
+                        return False
+        return True
+
+    def _has_uncommitted_expression_totals_changes(self):
+        """ Whether the current transaction modified data the expression totals depend on. Its results must then neither be served
+        from the cache, since they may differ, nor be cached, since the changes could be rolled back.
+        """
+        self.env.cr.execute(SQL(
+            """
+                SELECT 1
+                  FROM pg_stat_xact_user_tables
+                 WHERE relname = ANY(%s)
+                   AND n_tup_ins + n_tup_upd + n_tup_del > 0
+                 LIMIT 1
+            """,
+            EXPRESSION_TOTALS_CACHE_TABLES,
+        ))
+        return bool(self.env.cr.fetchone())
+
+    def _get_expression_totals_cache_watermark(self, options):
+        """ Returns a tuple changing whenever the data the expression totals depend on changes:
+        - the number of changes of the balance snapshot of the report companies, logged by the transactions posting, resetting or
+          modifying posted journal items (see account.report.balance.snapshot.version). They are logged in the same transactions as
+          the journal items: the totals computed in a transaction match the number of changes it reads;
+        - the last modification and the number of the report lines and expressions, the accounts, the companies, the currency rates and
+          the external values.
+        """
+        company_ids = self.get_report_company_ids(options)
+        self.env.cr.execute(SQL(
+            """
+                SELECT (
+                           SELECT ARRAY_AGG(ARRAY[company_id, change_count] ORDER BY company_id)
+                             FROM (
+                                 SELECT company_id, SUM(change_count) AS change_count
+                                   FROM account_report_balance_snapshot_version
+                                  WHERE company_id = ANY(%(company_ids)s)
+                               GROUP BY company_id
+                             ) AS snapshot_changes
+                       ),
+                       (SELECT ARRAY[MAX(write_date)::text, COUNT(*)::text] FROM account_report_line),
+                       (SELECT ARRAY[MAX(write_date)::text, COUNT(*)::text] FROM account_report_expression),
+                       (SELECT MAX(write_date) FROM account_account),
+                       (SELECT MAX(write_date) FROM res_company),
+                       (SELECT ARRAY[MAX(write_date)::text, COUNT(*)::text] FROM res_currency_rate),
+                       (SELECT ARRAY[MAX(write_date)::text, COUNT(*)::text] FROM account_report_external_value WHERE company_id = ANY(%(company_ids)s))
+            """,
+            company_ids=company_ids,
+        ))
+        return tuple(str(value) if isinstance(value, list) else value for value in self.env.cr.fetchone())
+
+    def _get_cached_expression_totals(self, cache_key):
+        """ Returns the expression totals of a column group cached under cache_key, or None if there are none. """
+        totals_by_expression_id = EXPRESSION_TOTALS_CACHE.get(cache_key)
+        if totals_by_expression_id is None:
+            return None
+        return {
+            self.env['account.report.expression'].browse(expression_id): copy.deepcopy(result)
+            for expression_id, result in totals_by_expression_id.items()
+        }
+
+    def _set_cached_expression_totals(self, cache_key, column_group_expression_totals):
+        # The records are bound to the current cursor: only their ids are kept
+        EXPRESSION_TOTALS_CACHE[cache_key] = {
+            expression.id: copy.deepcopy(result) for expression, result in column_group_expression_totals.items()
+        }
+
     def _standardize_date_scope_for_date_range(self, date_scope):
         """ Depending on the fact the report accepts date ranges or not, different date scopes might mean the same thing.
         This function is used so that, in those cases, only one of these date_scopes' values is used, to avoid useless creation
@@ -3069,7 +3468,7 @@ class AccountReport(models.Model):
             'owner_column_group': group_key,
         }
 
-    def _compute_expression_totals_for_single_column_group(self, column_group_options, grouped_formulas, forced_column_group_expression_totals=None, offset=0, limit=None, warnings=None):
+    def _compute_expression_totals_for_single_column_group(self, column_group_options, grouped_formulas, forced_column_group_expression_totals=None, offset=0, limit=None, warnings=None, precomputed_formula_results=None):
         """ Evaluates expressions for a single column group.
 
             :param column_group_options: The options dict obtained from _split_options_per_column_group() for the column group to evaluate.
@@ -3090,6 +3489,10 @@ class AccountReport(models.Model):
             :param limit: The SQL limit to apply when computing these expressions' result. Used if self.load_more_limit is set, to handle
                           the load more feature.
 
+            :param precomputed_formula_results: A dict((engine, (date_scope, current_groupby, next_groupby)), formula_results) giving the
+                                                results of the formula batches of grouped_formulas already computed for this column group,
+                                                in the format returned by _compute_formula_batch (see _compute_formula_batch_for_column_groups).
+
             :return: A dict(expression, {'value': value, 'has_sublines': has_sublines}), where:
                      - expression is one of the account.report.expressions that got evaluated
 
@@ -3180,9 +3583,13 @@ class AccountReport(models.Model):
             if selection_val[0] != 'aggregation'
         ]
         for engine in batchable_engines:
-            for (date_scope, current_groupby, next_groupby), formulas_dict in grouped_formulas.get(engine, {}).items():
-                formula_results = self._compute_formula_batch(column_group_options, engine, date_scope, formulas_dict, current_groupby, next_groupby,
-                                                              offset=offset, limit=limit, warnings=warnings)
+            for batch_key, formulas_dict in grouped_formulas.get(engine, {}).items():
+                date_scope, current_groupby, next_groupby = batch_key
+                if precomputed_formula_results and (engine, batch_key) in precomputed_formula_results:
+                    formula_results = precomputed_formula_results[(engine, batch_key)]
+                else:
+                    formula_results = self._compute_formula_batch(column_group_options, engine, date_scope, formulas_dict, current_groupby, next_groupby,
+                                                                  offset=offset, limit=limit, warnings=warnings)
                 inject_formula_results(
                     formula_results,
                     column_group_expression_totals,
@@ -3211,6 +3618,8 @@ class AccountReport(models.Model):
     def _compute_totals_no_batch_aggregation(self, column_group_options, formulas_dict, other_current_report_expr_totals, other_cross_report_expr_totals_by_scope):
         """ Computes expression totals for 'aggregation' engine, after all other engines have been evaluated.
 
+        The formulas are evaluated following the plan returned by _get_aggregation_plan, compiled once for all the column groups.
+
         :param column_group_options: The options for the column group being evaluated, as obtained from _split_options_per_column_group.
 
         :param formulas_dict: A dict {(formula, forced_date_scope): expressions}, containing only aggregation formulas.
@@ -3230,80 +3639,137 @@ class AccountReport(models.Model):
 
         :return : A dict((formula, expressions), result), where result is in the form {'result': numeric_value}
         """
-        def _resolve_subformula_on_dict(result, line_codes_expression_map, subformula):
-            split_subformula = subformula.split('.')
-            if len(split_subformula) > 1:
-                line_code, expression_label = split_subformula
-                return result[line_codes_expression_map[line_code][expression_label]]
-
-            if subformula.startswith('_expression:'):
-                expression_id = int(subformula.split(':')[1])
-                return result[expression_id]
-
-            # Wrong subformula; the KeyError is caught in the function below
-            raise KeyError()
-
-        def _check_is_float(to_test):
-            try:
-                float(to_test)
-                return True
-            except ValueError:
-                return False
-
-        def add_expression_to_map(expression, expression_res, figure_types_cache, current_report_eval_dict, current_report_codes_map, other_reports_eval_dict, other_reports_codes_map, cross_report=False):
-            """
-                Process an expression and its result, updating various dictionaries with relevant information.
-                Parameters:
-                - expression (object): The expression object to process.
-                - expression_res (dict): The result of the expression.
-                - figure_types_cache (dict): {report : {label: figure_type}}.
-                - current_report_eval_dict (dict): {expression_id: value}.
-                - current_report_codes_map (dict): {line_code: {expression_label: expression_id}}.
-                - other_reports_eval_dict (dict): {forced_date_scope: {expression_id: value}}.
-                - other_reports_codes_map (dict): {forced_date_scope: {line_code: {expression_label: expression_id}}}.
-                - cross_report: A boolean to know if we are processsing cross_report expression.
-            """
+        figure_types_cache = {}  # {report : {label: figure_type}}
 
+        def get_term_value(expression, expression_res):
             expr_report = expression.report_line_id.report_id
             report_default_figure_types = figure_types_cache.setdefault(expr_report, {})
-            expression_label = report_default_figure_types.get(expression.label, '_not_in_cache')
-            if expression_label == '_not_in_cache':
+            if expression.label not in report_default_figure_types:
                 report_default_figure_types[expression.label] = expr_report.column_ids.filtered(
                     lambda x: x.expression_label == expression.label).figure_type
 
-            default_figure_type = figure_types_cache[expr_report][expression.label]
-            figure_type = expression.figure_type or default_figure_type
+            figure_type = expression.figure_type or report_default_figure_types[expression.label]
             value = expression_res['value']
             if figure_type == 'monetary' and value:
                 value = self.env.company.currency_id.round(value)
+            return value
 
-            if cross_report:
-                other_reports_eval_dict.setdefault(forced_date_scope, {})[expression.id] = value
-            else:
-                current_report_eval_dict[expression.id] = value
+        # The values the formulas can refer to, by (forced_date_scope, expression id) ; forced_date_scope is None for the current report
+        values = {}
+        for expression, expression_res in other_current_report_expr_totals.items():
+            values[(None, expression.id)] = get_term_value(expression, expression_res)
 
-        current_report_eval_dict = {} # {expression_id: value}
-        other_reports_eval_dict = {} # {forced_date_scope: {expression_id: value}}
-        current_report_codes_map = {} # {line_code: {expression_label: expression_id}}
-        other_reports_codes_map = {} # {forced_date_scope: {line_code: {expression_label: expression_id}}}
+        for forced_date_scope, scope_expr_totals in other_cross_report_expr_totals_by_scope.items():
+            for expression, expression_res in scope_expr_totals.items():
+                values[(forced_date_scope, expression.id)] = get_term_value(expression, expression_res)
+
+        plan_key = (
+            self.id,
+            self.filter_date_range,
+            tuple((formula, forced_date_scope, tuple(expressions.ids)) for (formula, forced_date_scope), expressions in formulas_dict.items()),
+            tuple(sorted(expression.id for expression in other_current_report_expr_totals)),
+            tuple(sorted(
+                (forced_date_scope, tuple(sorted(expression.id for expression in scope_expr_totals)))
+                for forced_date_scope, scope_expr_totals in other_cross_report_expr_totals_by_scope.items()
+            )),
+        )
+        plan = self._get_aggregation_plan(plan_key, formulas_dict, other_current_report_expr_totals, other_cross_report_expr_totals_by_scope)
 
-        figure_types_cache = {}  # {report : {label: figure_type}}
-        for expression, expression_res in other_current_report_expr_totals.items():
-            add_expression_to_map(expression, expression_res, figure_types_cache, current_report_eval_dict, current_report_codes_map, other_reports_eval_dict, other_reports_codes_map)
+        rslt = {}
+        AccountReportExpression = self.env['account.report.expression']
+        for formula, evaluate, ignore_zero_division, expressions_plan in plan:
+            try:
+                formula_result = evaluate(values)
+            except ZeroDivisionError:
+                if not ignore_zero_division:
+                    raise
+                # Arbitrary choice; for clarity of the report. A 0 division could typically happen when there is no result in the period.
+                formula_result = 0
+
+            for expression_id, subformula, criterium, value_key, in_result in expressions_plan:
+                # Apply subformula
+                if criterium:
+                    criterium_value_key, bound_subformula = criterium
+                    bound_value = self._aggregation_apply_bounds(column_group_options, bound_subformula, values[criterium_value_key])
+                    expression_result = formula_result * int(bool(bound_value))
+                else:
+                    expression_result = self._aggregation_apply_bounds(column_group_options, subformula, formula_result)
+
+                if column_group_options.get('integer_rounding_enabled'):
+                    expression_result = float_round(expression_result, precision_digits=0, rounding_method=column_group_options['integer_rounding'])
+
+                # Make the result available to the formulas depending on it (explicitly or through the sum_children shortcut)
+                values[value_key] = expression_result
+
+                if in_result:
+                    rslt[(formula, AccountReportExpression.browse(expression_id))] = {'result': expression_result}
+
+        return rslt
+
+    @ormcache('plan_key')
+    def _get_aggregation_plan(self, plan_key, formulas_dict, other_current_report_expr_totals, other_cross_report_expr_totals_by_scope):
+        """ Returns the plan to follow to evaluate aggregation formulas, as compiled by _compile_aggregation_plan.
+
+        The plan only depends on the configuration of the reports, and is the same for all column groups and each time the report is
+        computed: it is cached under plan_key, a hashable identifying the parameters (see _compute_totals_no_batch_aggregation). The cache is
+        cleared whenever report lines or expressions are modified.
+        """
+        return self._compile_aggregation_plan(formulas_dict, other_current_report_expr_totals, other_cross_report_expr_totals_by_scope)
+
+    def _compile_aggregation_plan(self, formulas_dict, other_current_report_expr_totals, other_cross_report_expr_totals_by_scope):
+        """ Compiles aggregation formulas into a plan evaluating each of them once, after all the formulas it depends on.
+
+        The terms of a formula are references to the values of other expressions, either by line code (CODE.label) or by id (_expression:id,
+        used by sum_children). Those values are identified by a (forced_date_scope, expression id) key, forced_date_scope being None for
+        the expressions of the current report: these are the keys of the values dict _compute_totals_no_batch_aggregation passes to the plan.
+
+        The formulas of the aggregation expressions with a line code and no subformula are substituted for the terms referencing them,
+        so that the result is not rounded before being used. The other terms are read from the values of the non-aggregation expressions,
+        or from the results of the aggregation formulas computed earlier in the plan.
+
+        The parameters are the ones of _compute_totals_no_batch_aggregation.
+
+        :return: A tuple of steps (formula, evaluate, ignore_zero_division, expressions_plan), sorted so that each formula comes after the
+                 ones it depends on, where:
+                 - formula is the key of formulas_dict, as used in the result of _compute_totals_no_batch_aggregation
+                 - evaluate is a function computing the formula from the values dict
+                 - ignore_zero_division tells whether a division by zero makes the formula evaluate to 0 instead of raising an error
+                 - expressions_plan is a tuple of (expression_id, subformula, criterium, value_key, in_result) for each expression using the
+                   formula ; criterium being either None or (value_key, bound_subformula) for the if_other_expr_above/below subformulas,
+                   value_key the key under which the result is stored in the values dict, and in_result whether the result is returned.
+        """
+        term_separator_regex = r'(?<!\de)[+-]|[ ()/*]'
+        term_replacement_regex = r"(^|(?<=[ ()+/*-]))%s((?=[ ()+/*-])|$)"
+
+        def _check_is_float(to_test):
+            try:
+                float(to_test)
+                return True
+            except ValueError:
+                return False
+
+        # Index the expressions the formulas can refer to
+        value_keys = set()
+        current_report_codes_map = {}  # {line_code: {expression_label: expression_id}}
+        other_reports_codes_map = {}  # {forced_date_scope: {line_code: {expression_label: expression_id}}}
+        for expression in other_current_report_expr_totals:
+            value_keys.add((None, expression.id))
             if expression.report_line_id.code:
                 current_report_codes_map.setdefault(expression.report_line_id.code, {})[expression.label] = expression.id
 
         for forced_date_scope, scope_expr_totals in other_cross_report_expr_totals_by_scope.items():
-            for expression, expression_res in scope_expr_totals.items():
-                add_expression_to_map(expression, expression_res, figure_types_cache, current_report_eval_dict, current_report_codes_map, other_reports_eval_dict, other_reports_codes_map, True)
+            for expression in scope_expr_totals:
+                value_keys.add((forced_date_scope, expression.id))
                 if expression.report_line_id.code:
                     other_reports_codes_map.setdefault(forced_date_scope, {}).setdefault(expression.report_line_id.code, {})[expression.label] = expression.id
 
-        # Complete current_report_eval_dict with the formulas of uncomputed aggregation lines
-        aggregations_terms_to_evaluate = set() # Those terms are part of the formulas to evaluate; we know they will get a value eventually
-        for (formula, forced_date_scope), expressions in formulas_dict.items():
+        formula_keys_by_value_key = defaultdict(set)  # The formulas computing the value of each aggregation expression
+        inlined_formulas = {}  # {value_key: formula}
+        for formula_key, expressions in formulas_dict.items():
+            formula, forced_date_scope = formula_key
             for expression in expressions:
-                aggregations_terms_to_evaluate.add(f"_expression:{expression.id}") # In case it needs to be called by sum_children
+                value_key = (None if expression.report_line_id.report_id == self else forced_date_scope, expression.id)
+                formula_keys_by_value_key[value_key].add(formula_key)
 
                 if expression.report_line_id.code:
                     if expression.report_line_id.report_id == self:
@@ -3311,114 +3777,146 @@ class AccountReport(models.Model):
                     else:
                         other_reports_codes_map.setdefault(forced_date_scope, {}).setdefault(expression.report_line_id.code, {})[expression.label] = expression.id
 
-                    aggregations_terms_to_evaluate.add(f"{expression.report_line_id.code}.{expression.label}")
-
                     if not expression.subformula:
                         # Expressions with bounds cannot be replaced by their formula in formulas calling them (otherwize, bounds would be ignored).
                         # Same goes for cross_report, otherwise the forced_date_scope will be ignored, leading to an impossibility to get evaluate the expression.
-                        if expression.report_line_id.report_id == self:
-                            eval_dict = current_report_eval_dict
-                        else:
-                            eval_dict = other_reports_eval_dict.setdefault(forced_date_scope, {})
-
-                        eval_dict[expression.id] = formula
-
-        rslt = {}
-        to_treat = [(formula, formula, forced_date_scope) for (formula, forced_date_scope) in formulas_dict.keys()] # Formed like [(expanded formula, original unexpanded formula)]
-        term_separator_regex = r'(?<!\de)[+-]|[ ()/*]'
-        term_replacement_regex = r"(^|(?<=[ ()+/*-]))%s((?=[ ()+/*-])|$)"
-        while to_treat:
-            formula, unexpanded_formula, forced_date_scope = to_treat.pop(0)
-
-            full_eval_dict = {**current_report_eval_dict, **other_reports_eval_dict.get(forced_date_scope, {})}
-            full_codes_map = {**current_report_codes_map, **other_reports_codes_map.get(forced_date_scope, {})}
-
-            # Evaluate the formula
-            terms_to_eval = [term for term in re.split(term_separator_regex, formula) if term and not _check_is_float(term)]
-            if terms_to_eval:
-                # The formula can't be evaluated as-is. Replace the terms by their value or formula,
-                # and enqueue the formula back; it'll be tried anew later in the loop.
-                for term in terms_to_eval:
-                    try:
-                        expanded_term = _resolve_subformula_on_dict(
-                            full_eval_dict,
-                            full_codes_map,
-                            term,
-                        )
-                    except KeyError:
-                        if term in aggregations_terms_to_evaluate:
-                            # Then, the term is probably an aggregation with bounds that still needs to be computed. We need to keep on looping
-                            continue
-                        else:
-                            raise UserError(_("Could not expand term %(term)s while evaluating formula %(unexpanded_formula)s", term=term, unexpanded_formula=unexpanded_formula))
-
-                    formula = re.sub(term_replacement_regex % re.escape(term), f'({expanded_term})', formula)
+                        inlined_formulas[value_key] = formula
+
+        known_value_keys = value_keys | set(formula_keys_by_value_key)
+
+        def get_value_key(term, forced_date_scope):
+            """ Returns the key of the value a term refers to in the formulas evaluated with forced_date_scope, or None if it is unknown. """
+            split_term = term.split('.')
+            if len(split_term) == 2:
+                line_code, expression_label = split_term
+                codes_map = other_reports_codes_map.get(forced_date_scope, {}).get(line_code) or current_report_codes_map.get(line_code, {})
+                expression_id = codes_map.get(expression_label)
+            elif term.startswith('_expression:') and term.split(':')[1].isdigit():
+                expression_id = int(term.split(':')[1])
+            else:
+                expression_id = None
 
-                to_treat.append((formula, unexpanded_formula, forced_date_scope))
+            if not expression_id:
+                return None
+            if forced_date_scope and (forced_date_scope, expression_id) in known_value_keys:
+                return (forced_date_scope, expression_id)
+            return (None, expression_id)
 
-            else:
-                # The formula contains only digits and operators; it can be evaluated
-                if all(expr.subformula == "ignore_zero_division" for expr in formulas_dict[(unexpanded_formula, forced_date_scope)]):
-                    try:
-                        formula_result = expr_eval(formula)
-                    except ZeroDivisionError:
-                        # Arbitrary choice; for clarity of the report. A 0 division could typically happen when there is no result in the period.
-                        formula_result = 0
+        def expand_formula(formula, unexpanded_formula, forced_date_scope, terms_value_keys, expanded_value_keys=()):
+            """ Substitutes the inlined formulas and variable names to the terms of formula, the variable names being given by their
+            index in terms_value_keys, which is completed with the keys of the values to read.
+            """
+            for term in {term for term in re.split(term_separator_regex, formula) if term and not _check_is_float(term)}:
+                value_key = get_value_key(term, forced_date_scope)
+                if value_key in expanded_value_keys:
+                    raise UserError(_("The formula %(formula)s depends on its own result.", formula=unexpanded_formula))
+
+                if value_key in inlined_formulas:
+                    expanded_term = '(%s)' % expand_formula(
+                        inlined_formulas[value_key], unexpanded_formula, forced_date_scope, terms_value_keys, (*expanded_value_keys, value_key),
+                    )
+                elif value_key in known_value_keys:
+                    if value_key not in terms_value_keys:
+                        terms_value_keys.append(value_key)
+                    expanded_term = f'term_{terms_value_keys.index(value_key)}'
                 else:
-                    formula_result = expr_eval(formula)
-
-                for expression in formulas_dict[(unexpanded_formula, forced_date_scope)]:
-                    # Apply subformula
-                    if expression.subformula and expression.subformula.startswith('if_other_expr_'):
-                        other_expr_criterium_match = re.match(
-                            r"^(?P<criterium>\w+)\("
-                            r"(?P<line_code>\w+)[.](?P<expr_label>\w+),[ ]*"
-                            r"(?P<bound_params>.*)\)$",
-                            expression.subformula
-                        )
-                        if not other_expr_criterium_match:
-                            raise UserError(_("Wrong format for if_other_expr_above/if_other_expr_below formula: %s", expression.subformula))
-
-                        criterium_code = other_expr_criterium_match['line_code']
-                        criterium_label = other_expr_criterium_match['expr_label']
-                        criterium_expression_id = full_codes_map.get(criterium_code, {}).get(criterium_label)
-                        criterium_val = full_eval_dict.get(criterium_expression_id)
-
-                        if not criterium_expression_id:
-                            raise UserError(_("This subformula references an unknown expression: %s", expression.subformula))
-
-                        if not isinstance(criterium_val, (float, int)):
-                            # The criterium expression has not be evaluated yet. Postpone the evaluation of this formula, and skip this expression
-                            # for now. We still try to evaluate other expressions using this formula if any; this means those expressions will
-                            # be processed a second time later, giving the same result. This is a rare corner case, and not so costly anyway.
-                            to_treat.append((formula, unexpanded_formula, forced_date_scope))
-                            continue
+                    raise UserError(_("Could not expand term %(term)s while evaluating formula %(unexpanded_formula)s", term=term, unexpanded_formula=unexpanded_formula))
+
+                formula = re.sub(term_replacement_regex % re.escape(term), expanded_term, formula)
+            return formula
+
+        def compile_node(node, terms_value_keys, unexpanded_formula):
+            """ Compiles an arithmetic expression into a function of the values dict. """
+            if isinstance(node, ast.BinOp) and type(node.op) in AGGREGATION_BINARY_OPERATORS:
+                operator_function = AGGREGATION_BINARY_OPERATORS[type(node.op)]
+                left = compile_node(node.left, terms_value_keys, unexpanded_formula)
+                right = compile_node(node.right, terms_value_keys, unexpanded_formula)
+                return lambda values: operator_function(left(values), right(values))
+            if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+                operand = compile_node(node.operand, terms_value_keys, unexpanded_formula)
+                if isinstance(node.op, ast.UAdd):
+                    return operand
+                return lambda values: -operand(values)
+            if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+                constant = node.value
+                return lambda values: constant
+            if isinstance(node, ast.Name) and node.id.startswith('term_'):
+                value_key = terms_value_keys[int(node.id.removeprefix('term_'))]
+                return lambda values: values[value_key]
+            raise UserError(_("Invalid aggregation formula: %s", unexpanded_formula))
+
+        # Compile each formula, and find the formulas it depends on
+        steps = {}  # {formula_key: (evaluate, ignore_zero_division, expressions_plan)}
+        dependencies = {}  # {formula_key: set of formula keys}
+        for formula_key, expressions in formulas_dict.items():
+            formula, forced_date_scope = formula_key
+            terms_value_keys = []
+            try:
+                formula_ast = ast.parse(expand_formula(formula, formula, forced_date_scope, terms_value_keys).strip(), mode='eval')
+            except SyntaxError:
+                raise UserError(_("Invalid aggregation formula: %s", formula))
+            evaluate = compile_node(formula_ast.body, terms_value_keys, formula)
+            dependencies[formula_key] = set().union(*(formula_keys_by_value_key.get(value_key, ()) for value_key in terms_value_keys))
 
-                        bound_subformula = other_expr_criterium_match['criterium'].replace('other_expr_', '') # e.g. 'if_other_expr_above' => 'if_above'
-                        bound_params = other_expr_criterium_match['bound_params']
-                        bound_value = self._aggregation_apply_bounds(column_group_options, f"{bound_subformula}({bound_params})", criterium_val)
-                        expression_result = formula_result * int(bool(bound_value))
+            expressions_plan = []
+            for expression in expressions:
+                criterium = None
+                if expression.subformula and expression.subformula.startswith('if_other_expr_'):
+                    other_expr_criterium_match = re.match(
+                        r"^(?P<criterium>\w+)\("
+                        r"(?P<line_code>\w+)[.](?P<expr_label>\w+),[ ]*"
+                        r"(?P<bound_params>.*)\)$",
+                        expression.subformula
+                    )
+                    if not other_expr_criterium_match:
+                        raise UserError(_("Wrong format for if_other_expr_above/if_other_expr_below formula: %s", expression.subformula))
+
+                    criterium_value_key = get_value_key(f"{other_expr_criterium_match['line_code']}.{other_expr_criterium_match['expr_label']}", forced_date_scope)
+                    if criterium_value_key not in known_value_keys:
+                        raise UserError(_("This subformula references an unknown expression: %s", expression.subformula))
+
+                    bound_subformula = other_expr_criterium_match['criterium'].replace('other_expr_', '')  # e.g. 'if_other_expr_above' => 'if_above'
+                    criterium = (criterium_value_key, f"{bound_subformula}({other_expr_criterium_match['bound_params']})")
+                    # The criterium can be computed by the same formula: its expressions are then evaluated first (see below)
+                    dependencies[formula_key] |= formula_keys_by_value_key.get(criterium_value_key, set()) - {formula_key}
+
+                is_current_report = expression.report_line_id.report_id == self
+                standardized_expression_scope = self._standardize_date_scope_for_date_range(expression.date_scope)
+                expressions_plan.append((
+                    expression.id,
+                    expression.subformula,
+                    criterium,
+                    (None if is_current_report else forced_date_scope, expression.id),
+                    # Don't return necessary subcomputations in the final result
+                    (forced_date_scope == standardized_expression_scope or not forced_date_scope) and is_current_report,
+                ))
 
-                    else:
-                        expression_result = self._aggregation_apply_bounds(column_group_options, expression.subformula, formula_result)
+            expressions_plan.sort(key=lambda expression_plan: expression_plan[2] is not None)
 
-                    if column_group_options.get('integer_rounding_enabled'):
-                        expression_result = float_round(expression_result, precision_digits=0, rounding_method=column_group_options['integer_rounding'])
+            ignore_zero_division = all(expr.subformula == "ignore_zero_division" for expr in expressions)
+            steps[formula_key] = (evaluate, ignore_zero_division, tuple(expressions_plan))
 
-                    # Store result
-                    standardized_expression_scope = self._standardize_date_scope_for_date_range(expression.date_scope)
-                    if (forced_date_scope == standardized_expression_scope or not forced_date_scope) and expression.report_line_id.report_id == self:
-                        # This condition ensures we don't return necessary subcomputations in the final result
-                        rslt[(unexpanded_formula, expression)] = {'result': expression_result}
+        # Sort the formulas so that each of them is evaluated after the ones it depends on
+        plan = []
+        dependents = defaultdict(list)
+        for formula_key, formula_dependencies in dependencies.items():
+            for dependency in formula_dependencies:
+                dependents[dependency].append(formula_key)
+        remaining_dependencies_count = {formula_key: len(formula_dependencies) for formula_key, formula_dependencies in dependencies.items()}
+        to_treat = [formula_key for formula_key in formulas_dict if not remaining_dependencies_count[formula_key]]
+        while to_treat:
+            formula_key = to_treat.pop(0)
+            plan.append((formula_key[0], *steps[formula_key]))
+            for dependent in dependents[formula_key]:
+                remaining_dependencies_count[dependent] -= 1
+                if not remaining_dependencies_count[dependent]:
+                    to_treat.append(dependent)
 
-                    # Handle recursive aggregations (explicit or through the sum_children shortcut).
-                    # We need to make the result of our computation available to other aggregations, as they are still waiting in to_treat to be evaluated.
-                    if expression.report_line_id.report_id == self:
-                        current_report_eval_dict[expression.id] = expression_result
-                    else:
-                        other_reports_eval_dict.setdefault(forced_date_scope, {})[expression.id] = expression_result
+        if len(plan) != len(formulas_dict):
+            circular_formulas = [formula for (formula, dummy), count in remaining_dependencies_count.items() if count]
+            raise UserError(_("The following aggregation formulas depend on each other: %s", ', '.join(circular_formulas)))
 
-        return rslt
+        return tuple(plan)
 
     def _aggregation_apply_bounds(self, column_group_options, subformula, unbound_value):
         """ Applies the bounds of the provided aggregation expression to an unbounded value that got computed for it and returns the result.
@@ -3536,6 +4034,30 @@ class AccountReport(models.Model):
             offset=offset, limit=limit, warnings=warnings,
         )
 
+    def _compute_formula_batch_for_column_groups(self, options_by_column_group, formula_engine, date_scope, formulas_dict, current_groupby, next_groupby, warnings=None):
+        """ Evaluates a batch of formulas for several column groups.
+
+        The engines of COLUMN_GROUPS_BATCH_ENGINES aggregate the move lines of all the column groups in the same queries, grouping them by
+        column group (see _get_report_queries_for_column_groups). The other engines are evaluated for each column group separately.
+
+        :param options_by_column_group: A dict(column_group_key, options), where options are the options for this column group, as obtained
+                                        from _split_options_per_column_group.
+
+        The other parameters are the same as _compute_formula_batch's.
+
+        :return: A dict(column_group_key, formula_results), formula_results being in the format returned by _compute_formula_batch.
+        """
+        if formula_engine in COLUMN_GROUPS_BATCH_ENGINES:
+            engine_function_name = f'_compute_formula_batch_for_column_groups_with_engine_{formula_engine}'
+            return getattr(self, engine_function_name)(
+                options_by_column_group, date_scope, formulas_dict, current_groupby, next_groupby, warnings=warnings,
+            )
+
+        return {
+            column_group_key: self._compute_formula_batch(options, formula_engine, date_scope, formulas_dict, current_groupby, next_groupby, warnings=warnings)
+            for column_group_key, options in options_by_column_group.items()
+        }
+
     def _compute_formula_batch_with_engine_tax_tags(self, options, date_scope, formulas_dict, current_groupby, next_groupby, offset=0, limit=None, warnings=None):
         """ Report engine.
 
@@ -3625,6 +4147,15 @@ class AccountReport(models.Model):
                       then it will be the number of matching amls. If there is a groupby, it will be the number of distinct grouping
                       keys at the first level of this groupby (so, if groupby is 'partner_id, account_id', the number of partners).
         """
+        column_group_key = options.get('owner_column_group')
+        return self._compute_formula_batch_for_column_groups_with_engine_domain(
+            {column_group_key: options}, date_scope, formulas_dict, current_groupby, next_groupby, offset=offset, limit=limit, warnings=warnings,
+        )[column_group_key]
+
+    def _compute_formula_batch_for_column_groups_with_engine_domain(self, options_by_column_group, date_scope, formulas_dict, current_groupby, next_groupby, offset=0, limit=None, warnings=None):
+        """ Evaluates a batch of formulas of the domain engine (see _compute_formula_batch_with_engine_domain) for several column groups,
+        running one query per formula for all of them.
+        """
         def _format_result_depending_on_groupby(formula_rslt):
             if not current_groupby:
                 if formula_rslt:
@@ -3646,7 +4177,7 @@ class AccountReport(models.Model):
 
         groupby_sql = SQL.identifier('account_move_line', current_groupby) if current_groupby else None
 
-        rslt = {}
+        rslt = {column_group_key: {} for column_group_key in options_by_column_group}
 
         for formula, expressions in formulas_dict.items():
             try:
@@ -3658,48 +4189,45 @@ class AccountReport(models.Model):
                     line=expressions.report_line_id.name,
                     formula=formula,
                 ))
-            query = self._get_report_query(options, date_scope, domain=line_domain)
+            queries = self.with_context(
+                account_report_balance_snapshot=self._is_balance_snapshot_domain_formula(expressions, current_groupby, next_groupby),
+            )._get_report_queries_for_column_groups(options_by_column_group, date_scope, domain=line_domain)
 
+            # Fetch the results.
+            formula_rslt_by_column_group = {column_group_key: [] for column_group_key in options_by_column_group}
             tail_query = self._get_engine_query_tail(offset, limit)
-            query = SQL(
-                """
-                SELECT
-                    COALESCE(SUM(%(balance_select)s), 0.0) AS sum,
-                    COUNT(DISTINCT account_move_line.%(select_count_field)s) AS count_rows
-                    %(select_groupby_sql)s
-                FROM %(table_references)s
-                %(currency_table_join)s
-                WHERE %(search_condition)s
-                %(group_by_groupby_sql)s
-                %(tail_query)s
-                """,
-                select_count_field=SQL.identifier(next_groupby.split(',')[0] if next_groupby else 'id'),
-                select_groupby_sql=SQL(', %s AS grouping_key', groupby_sql) if groupby_sql else SQL(),
-                table_references=query.from_clause,
-                balance_select=self._currency_table_apply_rate(SQL("account_move_line.balance")),
-                currency_table_join=self._currency_table_aml_join(options),
-                search_condition=query.where_clause,
-                group_by_groupby_sql=SQL('GROUP BY %s', groupby_sql) if groupby_sql else SQL(),
-                tail_query=tail_query,
-            )
+            for dummy, table_references, search_condition in queries:
+                query = SQL(
+                    """
+                    SELECT
+                        column_group.column_group_key AS column_group_key,
+                        COALESCE(SUM(%(balance_select)s), 0.0) AS sum,
+                        COUNT(DISTINCT account_move_line.%(select_count_field)s) AS count_rows
+                        %(select_groupby_sql)s
+                    FROM %(table_references)s
+                    WHERE %(search_condition)s
+                    GROUP BY column_group.column_group_key%(group_by_groupby_sql)s
+                    %(tail_query)s
+                    """,
+                    select_count_field=SQL.identifier(next_groupby.split(',')[0] if next_groupby else 'id'),
+                    select_groupby_sql=SQL(', %s AS grouping_key', groupby_sql) if groupby_sql else SQL(),
+                    table_references=table_references,
+                    balance_select=self._currency_table_apply_rate(SQL("account_move_line.balance")),
+                    search_condition=search_condition,
+                    group_by_groupby_sql=SQL(', %s', groupby_sql) if groupby_sql else SQL(),
+                    tail_query=tail_query,
+                )
 
-            # Fetch the results.
-            formula_rslt = []
-            self._cr.execute(query)
-            all_query_res = self._cr.dictfetchall()
-
-            total_sum = 0
-            for query_res in all_query_res:
-                res_sum = query_res['sum']
-                total_sum += res_sum
-                totals = {
-                    'sum': res_sum,
-                    'sum_if_pos': 0,
-                    'sum_if_neg': 0,
-                    'count_rows': query_res['count_rows'],
-                    'has_sublines': query_res['count_rows'] > 0,
-                }
-                formula_rslt.append((query_res.get('grouping_key', None), totals))
+                self._cr.execute(query)
+                for query_res in self._cr.dictfetchall():
+                    totals = {
+                        'sum': query_res['sum'],
+                        'sum_if_pos': 0,
+                        'sum_if_neg': 0,
+                        'count_rows': query_res['count_rows'],
+                        'has_sublines': query_res['count_rows'] > 0,
+                    }
+                    formula_rslt_by_column_group[query_res['column_group_key']].append((query_res.get('grouping_key', None), totals))
 
             # Handle sum_if_pos, -sum_if_pos, sum_if_neg and -sum_if_neg
             expressions_by_sign_policy = defaultdict(lambda: self.env['account.report.expression'])
@@ -3710,25 +4238,29 @@ class AccountReport(models.Model):
                 else:
                     expressions_by_sign_policy['no_sign_check'] += expression
 
-            # Then we have to check the total of the line and only give results if its sign matches the desired policy.
-            # This is important for groupby managements, for which we can't just check the sign query_res by query_res
-            if expressions_by_sign_policy['sum_if_pos'] or expressions_by_sign_policy['sum_if_neg']:
-                sign_policy_with_value = 'sum_if_pos' if self.env.company.currency_id.compare_amounts(total_sum, 0.0) >= 0 else 'sum_if_neg'
-                # >= instead of > is intended; usability decision: 0 is considered positive
+            for column_group_key, formula_rslt in formula_rslt_by_column_group.items():
+                column_group_rslt = rslt[column_group_key]
 
-                formula_rslt_with_sign = [(grouping_key, {**totals, sign_policy_with_value: totals['sum']}) for grouping_key, totals in formula_rslt]
+                # Then we have to check the total of the line and only give results if its sign matches the desired policy.
+                # This is important for groupby managements, for which we can't just check the sign query_res by query_res
+                if expressions_by_sign_policy['sum_if_pos'] or expressions_by_sign_policy['sum_if_neg']:
+                    total_sum = sum(totals['sum'] for dummy, totals in formula_rslt)
+                    sign_policy_with_value = 'sum_if_pos' if self.env.company.currency_id.compare_amounts(total_sum, 0.0) >= 0 else 'sum_if_neg'
+                    # >= instead of > is intended; usability decision: 0 is considered positive
 
-                for sign_policy in ('sum_if_pos', 'sum_if_neg'):
-                    policy_expressions = expressions_by_sign_policy[sign_policy]
+                    formula_rslt_with_sign = [(grouping_key, {**totals, sign_policy_with_value: totals['sum']}) for grouping_key, totals in formula_rslt]
 
-                    if policy_expressions:
-                        if sign_policy == sign_policy_with_value:
-                            rslt[(formula, policy_expressions)] = _format_result_depending_on_groupby(formula_rslt_with_sign)
-                        else:
-                            rslt[(formula, policy_expressions)] = _format_result_depending_on_groupby([])
+                    for sign_policy in ('sum_if_pos', 'sum_if_neg'):
+                        policy_expressions = expressions_by_sign_policy[sign_policy]
+
+                        if policy_expressions:
+                            if sign_policy == sign_policy_with_value:
+                                column_group_rslt[(formula, policy_expressions)] = _format_result_depending_on_groupby(formula_rslt_with_sign)
+                            else:
+                                column_group_rslt[(formula, policy_expressions)] = _format_result_depending_on_groupby([])
 
-            if expressions_by_sign_policy['no_sign_check']:
-                rslt[(formula, expressions_by_sign_policy['no_sign_check'])] = _format_result_depending_on_groupby(formula_rslt)
+                if expressions_by_sign_policy['no_sign_check']:
+                    column_group_rslt[(formula, expressions_by_sign_policy['no_sign_check'])] = _format_result_depending_on_groupby(formula_rslt)
 
         return rslt
 
@@ -3757,6 +4289,15 @@ class AccountReport(models.Model):
         Example 1: '123D\' will take the total balance of accounts starting with '123D'
         Example 2: '123D\C' will return the balance of accounts starting with '123D' if it's negative, 0 otherwise.
         """
+        column_group_key = options.get('owner_column_group')
+        return self._compute_formula_batch_for_column_groups_with_engine_account_codes(
+            {column_group_key: options}, date_scope, formulas_dict, current_groupby, next_groupby, offset=offset, limit=limit, warnings=warnings,
+        )[column_group_key]
+
+    def _compute_formula_batch_for_column_groups_with_engine_account_codes(self, options_by_column_group, date_scope, formulas_dict, current_groupby, next_groupby, offset=0, limit=None, warnings=None):
+        """ Evaluates a batch of formulas of the account_codes engine (see _compute_formula_batch_with_engine_account_codes) for several
+        column groups, running one query for all of them.
+        """
         self._check_groupby_fields((next_groupby.split(',') if next_groupby else []) + ([current_groupby] if current_groupby else []))
 
         # Gather the account code prefixes to compute the total from
@@ -3789,7 +4330,10 @@ class AccountReport(models.Model):
 
         # Create the subquery for the WITH linking our prefixes with account.account entries
         all_prefixes_queries: list[SQL] = []
-        prefilter = self.env['account.account']._check_company_domain(self.get_report_company_ids(options))
+        report_company_ids = set()
+        for options in options_by_column_group.values():
+            report_company_ids.update(self.get_report_company_ids(options))
+        prefilter = self.env['account.account']._check_company_domain(list(report_company_ids))
         for prefix, excluded_prefixes in prefixes_to_compute:
             account_domain = [
                 *prefilter,
@@ -3828,72 +4372,78 @@ class AccountReport(models.Model):
             accounts_prefix_map[account_id].append(tuple(prefix))
 
         # Run main query
-        query = self._get_report_query(options, date_scope)
+        queries = self.with_context(
+            account_report_balance_snapshot=not current_groupby or current_groupby in BALANCE_SNAPSHOT_DIMENSIONS,
+        )._get_report_queries_for_column_groups(options_by_column_group, date_scope)
 
         extra_groupby_sql = SQL(", %s", SQL.identifier('account_move_line', current_groupby)) if current_groupby else SQL()
         extra_select_sql = SQL(", %s AS grouping_key", SQL.identifier('account_move_line', current_groupby)) if current_groupby else SQL()
         tail_query = self._get_engine_query_tail(offset, limit)
 
-        query = SQL(
-            """
-            SELECT
-                account_move_line.account_id AS account_id,
-                SUM(%(balance_select)s) AS sum,
-                COUNT(account_move_line.id) AS aml_count
-                %(extra_select_sql)s
-            FROM %(table_references)s
-            %(currency_table_join)s
-            WHERE %(search_condition)s
-            GROUP BY account_move_line.account_id%(extra_groupby_sql)s
-            %(tail_query)s
-            """,
-            extra_select_sql=extra_select_sql,
-            table_references=query.from_clause,
-            balance_select=self._currency_table_apply_rate(SQL("account_move_line.balance")),
-            currency_table_join=self._currency_table_aml_join(options),
-            search_condition=query.where_clause,
-            extra_groupby_sql=extra_groupby_sql,
-            tail_query=tail_query,
-        )
-        self._cr.execute(query)
+        all_query_res = []
+        for dummy, table_references, search_condition in queries:
+            query = SQL(
+                """
+                SELECT
+                    column_group.column_group_key AS column_group_key,
+                    account_move_line.account_id AS account_id,
+                    SUM(%(balance_select)s) AS sum,
+                    COUNT(account_move_line.id) AS aml_count
+                    %(extra_select_sql)s
+                FROM %(table_references)s
+                WHERE %(search_condition)s
+                GROUP BY column_group.column_group_key, account_move_line.account_id%(extra_groupby_sql)s
+                %(tail_query)s
+                """,
+                extra_select_sql=extra_select_sql,
+                table_references=table_references,
+                balance_select=self._currency_table_apply_rate(SQL("account_move_line.balance")),
+                search_condition=search_condition,
+                extra_groupby_sql=extra_groupby_sql,
+                tail_query=tail_query,
+            )
+            self._cr.execute(query)
+            all_query_res += self._cr.dictfetchall()
 
         # Parse result
-        rslt = {}
+        rslt = {column_group_key: {} for column_group_key in options_by_column_group}
 
-        res_by_prefix_account_id = {}
-        for query_res in self._cr.dictfetchall():
+        res_by_column_group_prefix_account_id = {column_group_key: {} for column_group_key in options_by_column_group}
+        for query_res in all_query_res:
             # Done this way so that we can run similar code for groupby and non-groupby
             grouping_key = query_res['grouping_key'] if current_groupby else None
             account_id = query_res['account_id']
             for prefix_key in accounts_prefix_map[account_id]:
-                res_by_prefix_account_id.setdefault(prefix_key, {})\
+                res_by_column_group_prefix_account_id[query_res['column_group_key']]\
+                                        .setdefault(prefix_key, {})\
                                         .setdefault(account_id, [])\
                                         .append((grouping_key, {'result': query_res['sum'], 'has_sublines': query_res['aml_count'] > 0}))
 
-        for formula, prefix_details in prefix_details_by_formula.items():
-            rslt_key = (formula, formulas_dict[formula])
-            rslt_destination = rslt.setdefault(rslt_key, [] if current_groupby else {'result': 0, 'has_sublines': False})
-            for multiplicator, prefix_key, balance_character in prefix_details:
-                res_by_account_id = res_by_prefix_account_id.get(prefix_key, {})
+        for column_group_key, res_by_prefix_account_id in res_by_column_group_prefix_account_id.items():
+            for formula, prefix_details in prefix_details_by_formula.items():
+                rslt_key = (formula, formulas_dict[formula])
+                rslt_destination = rslt[column_group_key].setdefault(rslt_key, [] if current_groupby else {'result': 0, 'has_sublines': False})
+                for multiplicator, prefix_key, balance_character in prefix_details:
+                    res_by_account_id = res_by_prefix_account_id.get(prefix_key, {})
 
-                for account_results in res_by_account_id.values():
-                    account_total_value = sum(group_val['result'] for (group_key, group_val) in account_results)
-                    comparator = self.env.company.currency_id.compare_amounts(account_total_value, 0.0)
+                    for account_results in res_by_account_id.values():
+                        account_total_value = sum(group_val['result'] for (group_key, group_val) in account_results)
+                        comparator = self.env.company.currency_id.compare_amounts(account_total_value, 0.0)
 
-                    # Manage balance_character.
-                    if not balance_character or (balance_character == 'D' and comparator >= 0) or (balance_character == 'C' and comparator < 0):
+                        # Manage balance_character.
+                        if not balance_character or (balance_character == 'D' and comparator >= 0) or (balance_character == 'C' and comparator < 0):
 
-                        for group_key, group_val in account_results:
-                            rslt_group = {
-                                **group_val,
-                                'result': multiplicator * group_val['result'],
-                            }
+                            for group_key, group_val in account_results:
+                                rslt_group = {
+                                    **group_val,
+                                    'result': multiplicator * group_val['result'],
+                                }
 
-                            if current_groupby:
-                                rslt_destination.append((group_key, rslt_group))
-                            else:
-                                rslt_destination['result'] += rslt_group['result']
-                                rslt_destination['has_sublines'] = rslt_destination['has_sublines'] or rslt_group['has_sublines']
+                                if current_groupby:
+                                    rslt_destination.append((group_key, rslt_group))
+                                else:
+                                    rslt_destination['result'] += rslt_group['result']
+                                    rslt_destination['has_sublines'] = rslt_destination['has_sublines'] or rslt_group['has_sublines']
 
         return rslt
 
@@ -5304,7 +5854,10 @@ class AccountReport(models.Model):
 
         line = self.env['account.report.line'].browse(report_line_id)
 
-        if ',' not in groupby and options['export_mode'] is None:
+        if ',' not in groupby and options.get('export_page_size'):
+            # Streamed exports load all the sublines, by pages (see _get_streamed_export_lines)
+            limit_to_load = options['export_page_size']
+        elif ',' not in groupby and options['export_mode'] is None:
             # if ',' not in groupby, then its a terminal groupby (like 'id' in 'partner_id, id'), so we can use the 'load more' feature if necessary
             # When printing, we want to ignore the limit.
             limit_to_load = self.load_more_limit or None
@@ -5314,7 +5867,7 @@ class AccountReport(models.Model):
             offset = 0
 
         rslt_lines = line._expand_groupby(line_dict_id, groupby, options, offset=offset, limit=limit_to_load, load_one_more=bool(limit_to_load), unfold_all_batch_data=unfold_all_batch_data)
-        lines_to_load = rslt_lines[:self.load_more_limit] if limit_to_load else rslt_lines
+        lines_to_load = rslt_lines[:limit_to_load] if limit_to_load else rslt_lines
 
         if not limit_to_load and options['export_mode'] is None:
             lines_to_load = self._regroup_lines_by_name_prefix(options, rslt_lines, '_report_expand_unfoldable_line_groupby_prefix_group', line.hierarchy_level,
@@ -5742,6 +6295,192 @@ class AccountReport(models.Model):
             'file_type': 'xlsx',
         }
 
+    def action_export_file_in_background(self, options, file_type='xlsx'):
+        """ Queues the export of the report to an xlsx or csv file, for the reports too big to be exported within a request, such as
+        fully unfolded ledgers. The file is generated by a cron and stored as an attachment; the user is notified when it is ready.
+        """
+        self.ensure_one()
+        self.env['account.report.export'].sudo().create({
+            'report_id': self.id,
+            'options': options,
+            'file_type': file_type,
+        })
+        self.env.ref('account_reports.ir_cron_account_report_export')._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'info',
+                'title': _("Export in progress"),
+                'message': _("The report is being exported in the background. You will be notified when the file is ready."),
+            },
+        }
+
+    def _export_to_file_streamed(self, options, file_type):
+        """ Exports the report to an xlsx or csv file, like export_to_xlsx, but writing the lines as they are generated, page by page
+        (see _get_streamed_export_lines), into a temporary file. The xlsx workbook uses xlsxwriter's constant_memory mode, so that it
+        never holds more than the current row either.
+
+        The generated file itself is returned as bytes, since ir.attachment only stores whole contents: the memory of the worker
+        bounds the size of the file (not of the report), which is a fraction of what the lines take when computed at once.
+        """
+        self.ensure_one()
+        print_options = self.get_options(previous_options={**options, 'export_mode': 'print'})
+        if print_options['sections']:
+            reports_to_print = self.env['account.report'].browse([section['id'] for section in print_options['sections']])
+        else:
+            reports_to_print = self
+
+        with tempfile.TemporaryFile() as output:
+            if file_type == 'csv':
+                text_output = io.TextIOWrapper(output, encoding='utf-8', newline='')
+                writer = csv.writer(text_output)
+                for report in reports_to_print:
+                    report_options = report.get_options(previous_options={**print_options, 'selected_section_id': report.id})
+                    if len(reports_to_print) > 1:
+                        writer.writerow([report.name])
+                    report._inject_report_into_csv_writer({**report_options, 'export_page_size': EXPORT_PAGE_SIZE}, writer)
+                text_output.detach()
+            else:
+                workbook = xlsxwriter.Workbook(output, {
+                    'constant_memory': True,
+                    'strings_to_formulas': False,
+                })
+                reports_options = []
+                for report in reports_to_print:
+                    report_options = report.get_options(previous_options={**print_options, 'selected_section_id': report.id})
+                    reports_options.append(report_options)
+                    sheet = workbook.add_worksheet(report.name[:31])
+                    report._inject_report_into_xlsx_sheet({**report_options, 'export_page_size': EXPORT_PAGE_SIZE}, workbook, sheet, streamed=True)
+                self._add_options_xlsx_sheet(workbook, reports_options)
+                workbook.close()
+
+            output.seek(0)
+            generated_file = output.read()
+
+        return {
+            'file_name': self.get_default_report_filename(options, file_type),
+            'file_content': generated_file,
+            'file_type': file_type,
+        }
+
+    def _get_streamed_export_lines(self, options):
+        """ Generates the lines to export, like _get_lines followed by _filter_out_folded_children would for a print, but page by page.
+
+        The lines are first computed without unfolding any of them. The sublines of the lines to unfold are then loaded by pages of
+        options['export_page_size'] lines, the way the 'Load more' lines of the report load them, as the previous lines are consumed.
+        Only the current page of each level of the hierarchy is thus in memory at once. The lines are not sorted by
+        options['order_column'], which needs all of them.
+
+        :param options: The print options of the report, with an 'export_page_size' key.
+        :return: (top_lines, lines), where top_lines are the lines computed before unfolding any of them, and lines an iterator on
+                 all the lines to export.
+        """
+        lines_options = {**options, 'unfold_all': False, 'unfolded_lines': [], 'hide_0_lines': False}
+        lines_to_unfold = set()
+
+        def prepare_page(page):
+            for line_dict in page:
+                if (
+                    line_dict.get('unfoldable') and not line_dict.get('unfolded') and line_dict.get('expand_function')
+                    and (options['unfold_all'] or line_dict['id'] in options['unfolded_lines'])
+                ):
+                    # Expanded once its sublines are reached, as the lines following it in the page are written after them
+                    line_dict['unfolded'] = True
+                    lines_to_unfold.add(line_dict['id'])
+            page = self._filter_out_folded_children(page)
+            if options.get('hide_0_lines'):
+                # Zero lines to unfold may still have non-zero sublines, and 'Load more' lines stand for the next pages
+                load_more_line_ids = {line_dict['id'] for line_dict in page if self._get_markup(line_dict['id']) == 'load_more'}
+                page = self._filter_out_0_lines(page, visible_line_ids=lines_to_unfold | load_more_line_ids)
+            return page
+
+        def get_page(parent_line_id, expand_function, groupby, offset, progress, horizontal_split_side):
+            page = self._expand_unfoldable_line(expand_function, parent_line_id, groupby, lines_options, progress, offset, horizontal_split_side)
+            if horizontal_split_side:
+                for line_dict in page:
+                    line_dict.setdefault('horizontal_split_side', horizontal_split_side)
+            if self.custom_handler_model_id:
+                page = self.env[self.custom_handler_model_name]._custom_line_postprocessor(self, lines_options, page)
+            self._format_column_values(lines_options, page)
+            return prepare_page(page)
+
+        def iter_lines(top_lines):
+            # A stack of iterators on the pages being written, one per level of unfolded lines
+            pages = [iter(top_lines)]
+            while pages:
+                line_dict = next(pages[-1], None)
+                if line_dict is None:
+                    pages.pop()
+                elif self._get_markup(line_dict['id']) == 'load_more':
+                    # The page is over: continue with the next one, followed by the lines remaining after the 'Load more' line
+                    next_page = get_page(
+                        line_dict['parent_id'], line_dict['expand_function'], line_dict['groupby'], line_dict['offset'],
+                        line_dict['progress'], line_dict.get('horizontal_split_side'),
+                    )
+                    pages[-1] = iter(next_page + list(pages[-1]))
+                else:
+                    yield line_dict
+                    if line_dict['id'] in lines_to_unfold:
+                        lines_to_unfold.discard(line_dict['id'])
+                        pages.append(iter(get_page(
+                            line_dict['id'], line_dict['expand_function'], line_dict.get('groupby'), 0, line_dict.get('progress'),
+                            line_dict.get('horizontal_split_side'),
+                        )))
+
+        top_lines = prepare_page(self._get_lines(lines_options))
+        return top_lines, iter_lines(top_lines)
+
+    def _inject_report_into_csv_writer(self, options, writer):
+        """ Writes the report into a csv writer, as streamed lines (see _get_streamed_export_lines): the column headers, then a row per
+        line with its name, its account code when the report has account lines, and the raw values of its columns.
+        """
+        print_mode_self = self.with_context(no_format=True)
+        top_lines, lines = print_mode_self._get_streamed_export_lines(options)
+        split_account_codes = any(self._get_model_info_from_id(line['id'])[0] == 'account.account' for line in top_lines)
+        first_columns = ['', _("Account Code")] if split_account_codes else ['']
+
+        def get_cell_value(cell):
+            cell_type, cell_value = self._get_cell_type_value(cell)
+            return fields.Date.to_string(cell_value) if cell_type == 'date' else cell_value
+
+        column_headers_render_data = self._get_column_headers_render_data(options)
+        for header_level_index, header_level in enumerate(options['column_headers']):
+            row = [''] * len(first_columns)
+            for header_to_render in header_level * column_headers_render_data['level_repetitions'][header_level_index]:
+                colspan = header_to_render.get('colspan', column_headers_render_data['level_colspan'][header_level_index])
+                row += [header_to_render.get('name', '')] + [''] * (colspan - 1)
+            writer.writerow(row)
+
+        # Same columns as in _inject_report_into_xlsx_sheet
+        column_names = []
+        for column in options['columns']:
+            column_names.append(column.get('name', ''))
+            if column.get('column_group_key') and 'compute_budget' in column['column_group_key']:
+                column_names.append('')
+        if options.get('column_percent_comparison') == 'growth':
+            column_names.append('%')
+        if options['show_horizontal_group_total']:
+            column_names.append(options['columns'][0].get('name', ''))
+        writer.writerow(first_columns + column_names)
+
+        account_codes = {}
+        for line in lines:
+            if split_account_codes and self._get_model_info_from_id(line['id'])[0] == 'account.account':
+                account_codes[line['id']], name = self.env['account.account']._split_code_name(line['name'])
+                row = [name, account_codes[line['id']]]
+            elif split_account_codes:
+                row = [get_cell_value(line), account_codes.get(line.get('parent_id'), '')]
+            else:
+                row = [get_cell_value(line)]
+
+            columns = line['columns']
+            if options.get('column_percent_comparison') and 'column_percent_comparison_data' in line:
+                columns += [line['column_percent_comparison_data']]
+            if options['show_horizontal_group_total']:
+                columns += [line.get('horizontal_group_total_data', {'name': 0})]
+            writer.writerow(row + [get_cell_value(column) for column in columns])
+
     @api.model
     def _set_xlsx_cell_sizes(self, sheet, fonts, col, row, value, style, has_colspan):
         """ This small helper will resize the cells if needed, to allow to get a better output. """
@@ -5787,11 +6526,29 @@ class AccountReport(models.Model):
             if width > col_width:
                 sheet.set_column(col, col, min(width + 4, 75))  # We need to add a little extra padding to ensure our columns are not clipping the text
 
-    def _inject_report_into_xlsx_sheet(self, options, workbook, sheet):
-
+    @api.model
+    def _get_xlsx_cell_width(self, value, style, datetime=False):
+        """ Cheap estimation of the width of an xlsx cell, from its number of characters rather than from its rendering with the
+        report fonts (see _set_xlsx_cell_sizes).
+        """
+        if datetime:
+            return 12
+        if isinstance(value, float):
+            value = float_repr(value, self.env.company.currency_id.decimal_places)
+        longest_line = max(str(value if value is not None else '').split('\n'), key=len)
+        # Lato characters are 1.3 units wide on average, a bit more in bold
+        return (len(longest_line) + 2 * style.indent) * (1.5 if style.bold else 1.3)
+
+    def _inject_report_into_xlsx_sheet(self, options, workbook, sheet, streamed=False):
+        """ Writes the report into an xlsx sheet.
+
+        :param streamed: Whether to write the lines as they are generated, page by page (see _get_streamed_export_lines), for workbooks in
+                         constant_memory mode. The column widths are then estimated from the number of characters of the cells, as
+                         measuring them with the fonts is too slow for millions of cells.
+        """
         # We start by gathering the bold, italic and regular fonts to use later.
         fonts = {}
-        for font_type in ('Reg', 'Bol', 'RegIta', 'BolIta'):
+        for font_type in ('Reg', 'Bol', 'RegIta', 'BolIta') if not streamed else ():
             try:
                 lato_path = f'web/static/fonts/lato/Lato-{font_type}-webfont.ttf'
                 fonts[font_type] = ImageFont.truetype(file_path(lato_path), 12)
@@ -5799,8 +6556,16 @@ class AccountReport(models.Model):
                 # This won't give great result, but it will work.
                 fonts[font_type] = ImageFont.load_default()
 
+        column_widths = {}  # Estimated widths of the columns, when streamed
+
         def write_cell(sheet, x, y, value, style, colspan=1, datetime=False):
-            self._set_xlsx_cell_sizes(sheet, fonts, x, y, value, style, colspan > 1)
+            if streamed:
+                if y >= XLSX_MAX_ROWS:
+                    raise UserError(_("This report has more lines than an Excel sheet can hold. Please export it to CSV instead."))
+                if colspan == 1:
+                    column_widths[x] = max(column_widths.get(x, 0), self._get_xlsx_cell_width(value, style, datetime))
+            else:
+                self._set_xlsx_cell_sizes(sheet, fonts, x, y, value, style, colspan > 1)
             if colspan == 1:
                 if datetime:
                     sheet.write_datetime(y, x, value, style)
@@ -5828,13 +6593,17 @@ class AccountReport(models.Model):
         col1_styles = {}
 
         print_mode_self = self.with_context(no_format=True)
-        lines = self._filter_out_folded_children(print_mode_self._get_lines(options))
+        if streamed:
+            top_lines, lines = print_mode_self._get_streamed_export_lines(options)
+        else:
+            top_lines = lines = self._filter_out_folded_children(print_mode_self._get_lines(options))
         annotations = self.get_annotations(options)
 
         # For reports with lines generated for accounts, the account name and codes are shown in a single column.
         # To help user post-process the report if they need, we should in such a case split the account name and code in two columns.
+        # When streamed, only the lines before unfolding are known here: the account lines among the sublines are split as they come.
         account_lines_split_names = {}
-        for line in lines:
+        for line in top_lines:
             line_model = self._get_model_info_from_id(line['id'])[0]
             if line_model == 'account.account':
                 # Reuse the _split_code_name to split the name and code in two values.
@@ -5899,14 +6668,15 @@ class AccountReport(models.Model):
 
         y_offset += 1
 
-        if options.get('order_column'):
+        if options.get('order_column') and not streamed:
+            # Sorting needs all the lines: streamed lines keep the order of the report
             lines = self.sort_lines(lines, options)
 
         # Add lines.
         counter = 1
-        for y in range(0, len(lines)):
-            level = lines[y].get('level')
-            is_total_line = 'total' in lines[y].get('class', '').split(' ')
+        for y, line in enumerate(lines):
+            level = line.get('level')
+            is_total_line = 'total' in line.get('class', '').split(' ')
             if level == 0:
                 y_offset += 1
                 style = level_0_style
@@ -5945,47 +6715,55 @@ class AccountReport(models.Model):
                 col1_style = default_col1_style
                 col2_style = default_col2_style
 
+            if streamed and original_x_offset and line['id'] not in account_lines_split_names and self._get_model_info_from_id(line['id'])[0] == 'account.account':
+                account_lines_split_names[line['id']] = self.env['account.account']._split_code_name(line['name'])
+
             # write the first column, with a specific style to manage the indentation
             x_offset = original_x_offset + 1
-            if lines[y]['id'] in account_lines_split_names:
-                code, name = account_lines_split_names[lines[y]['id']]
+            if line['id'] in account_lines_split_names:
+                code, name = account_lines_split_names[line['id']]
                 write_cell(sheet, 0, y + y_offset, name, col1_style)
                 write_cell(sheet, 1, y + y_offset, code, col2_style)
             else:
-                cell_type, cell_value = self._get_cell_type_value(lines[y])
+                cell_type, cell_value = self._get_cell_type_value(line)
                 if cell_type == 'date':
                     write_cell(sheet, 0, y + y_offset, cell_value, date_default_col1_style, datetime=True)
                 else:
                     write_cell(sheet, 0, y + y_offset, cell_value, col1_style)
 
-                if lines[y].get('parent_id') and lines[y]['parent_id'] in account_lines_split_names:
-                    write_cell(sheet, 1, y + y_offset, account_lines_split_names[lines[y]['parent_id']][0], col2_style)
+                if line.get('parent_id') and line['parent_id'] in account_lines_split_names:
+                    write_cell(sheet, 1, y + y_offset, account_lines_split_names[line['parent_id']][0], col2_style)
                 elif account_lines_split_names:
                     write_cell(sheet, 1, y + y_offset, "", col2_style)
 
             #write all the remaining cells
-            columns = lines[y]['columns']
-            if options.get('column_percent_comparison') and 'column_percent_comparison_data' in lines[y]:
-                columns += [lines[y].get('column_percent_comparison_data')]
+            columns = line['columns']
+            if options.get('column_percent_comparison') and 'column_percent_comparison_data' in line:
+                columns += [line.get('column_percent_comparison_data')]
 
             if options['show_horizontal_group_total']:
-                columns += [lines[y].get('horizontal_group_total_data', {'name': 0})]
+                columns += [line.get('horizontal_group_total_data', {'name': 0})]
 
             for x, column in enumerate(columns, start=x_offset):
                 cell_type, cell_value = self._get_cell_type_value(column)
                 if cell_type == 'date':
-                    write_cell(sheet, x + lines[y].get('colspan', 1) - 1, y + y_offset, cell_value, date_default_style, datetime=True)
+                    write_cell(sheet, x + line.get('colspan', 1) - 1, y + y_offset, cell_value, date_default_style, datetime=True)
                 else:
-                    write_cell(sheet, x + lines[y].get('colspan', 1) - 1, y + y_offset, cell_value, style)
+                    write_cell(sheet, x + line.get('colspan', 1) - 1, y + y_offset, cell_value, style)
 
             # Write annotations.
-            if annotations and (line_annotations := annotations.get(lines[y]['id'])):
+            if annotations and (line_annotations := annotations.get(line['id'])):
                 line_annotation_text = []
                 for line_annotation in line_annotations:
                     line_annotation_text.append(f"{counter} - {line_annotation['text']}")
                     counter += 1
                 write_cell(sheet, annotations_x_offset, y + y_offset, "\n".join(line_annotation_text), annotation_style)
 
+        for x, width in column_widths.items():
+            # Like _set_xlsx_cell_sizes, widen the columns whose content exceeds Excel's default width, with some padding and a limit
+            if width > 8.43:
+                sheet.set_column(x, x, min(width + 4, 75))
+
     def _add_options_xlsx_sheet(self, workbook, options_list):
         """Adds a new sheet for xlsx report exports with a summary of all filters and options activated at the moment of the export."""
         filters_sheet = workbook.add_worksheet(_("Filters"))
@@ -6706,6 +7484,17 @@ class AccountReportLine(models.Model):
 
     display_custom_groupby_warning = fields.Boolean(compute='_compute_display_custom_groupby_warning')
 
+    def write(self, vals):
+        if 'code' in vals or 'report_id' in vals:
+            # The aggregation formulas refer to the expressions through the line codes (see account.report's _get_aggregation_plan)
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        # The expressions are deleted with their line (see account.report's _get_aggregation_plan)
+        self.env.registry.clear_cache()
+        return super().unlink()
+
     @api.depends('groupby', 'user_groupby')
     def _compute_display_custom_groupby_warning(self):
         for line in self:
@@ -6967,6 +7756,20 @@ class AccountReportLine(models.Model):
 class AccountReportExpression(models.Model):
     _inherit = 'account.report.expression'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Recompile the aggregation formulas (see account.report's _get_aggregation_plan)
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
+
     def action_view_carryover_lines(self, options, column_group_key=None):
         if column_group_key:
             options = self.report_line_id.report_id._get_column_group_options(options, column_group_key)
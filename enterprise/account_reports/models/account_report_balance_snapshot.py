@@ -0,0 +1,296 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL, create_index
+
+# Dimensions of the snapshot, i.e. the account.move.line fields the balances are aggregated by (together with the month)
+BALANCE_SNAPSHOT_DIMENSIONS = ('company_id', 'account_id', 'journal_id', 'partner_id', 'currency_id')
+
+# Aggregated amounts of the snapshot, summing the account.move.line fields with the same name
+BALANCE_SNAPSHOT_AMOUNTS = ('balance', 'debit', 'credit', 'amount_currency')
+
+# Fields of account.move.line whose change on a posted line changes the snapshot
+BALANCE_SNAPSHOT_LINE_FIELDS = {
+    *BALANCE_SNAPSHOT_DIMENSIONS, *BALANCE_SNAPSHOT_AMOUNTS, 'date', 'parent_state', 'display_type',
+}
+
+# Fields of account.move whose change changes the snapshot rows of its posted lines
+BALANCE_SNAPSHOT_MOVE_FIELDS = {'state', 'date', 'company_id', 'journal_id', 'partner_id', 'currency_id', 'line_ids'}
+
+# Leaves of the report domains that are true for every line of the snapshot
+BALANCE_SNAPSHOT_IMPLIED_LEAVES = {
+    ('parent_state', '=', 'posted'),
+    ('display_type', 'not in', ('line_section', 'line_note')),
+}
+
+
+class AccountReportBalanceSnapshotVersion(models.Model):
+    """ Changes of the balance snapshot of each company: every transaction changing it inserts one row per company.
+
+    The rows are inserted in the same transaction as the snapshot rows, and are never updated: transactions posting at the same
+    time never wait on each other. Each transaction sees the changes committed before it started, so the sum of the change counts
+    of a company grows with every commit changing its snapshot, and only then; merging the rows keeps it. The reports key their
+    cached results on these sums (see account.report's _get_expression_totals_cache_watermark).
+
+    Declared before account.report.balance.snapshot, whose init() may rebuild the snapshot and thus log changes.
+    """
+    _name = 'account.report.balance.snapshot.version'
+    _description = "Accounting Report Balance Snapshot Version"
+    _log_access = False
+
+    company_id = fields.Many2one(comodel_name='res.company', required=True, readonly=True, index=True, ondelete='cascade')
+    change_count = fields.Integer(required=True, readonly=True, default=1)
+
+    @api.model
+    def _log_change(self, company_ids):
+        """ Record a change of the snapshot of the companies. """
+        if not company_ids:
+            return
+        self.env.cr.execute(SQL(
+            """
+                INSERT INTO %(table)s (company_id, change_count)
+                     SELECT company_id, 1
+                       FROM UNNEST(%(company_ids)s) AS company_id
+            """,
+            table=SQL.identifier(self._table),
+            company_ids=sorted(set(company_ids)),
+        ))
+
+    @api.model
+    def _compact(self):
+        """ Merge the changes of each company into a single row. """
+        self.env.cr.execute(SQL(
+            """
+                WITH merged AS (
+                    DELETE FROM %(table)s
+                     RETURNING company_id, change_count
+                )
+                INSERT INTO %(table)s (company_id, change_count)
+                     SELECT company_id, SUM(change_count)
+                       FROM merged
+                   GROUP BY company_id
+            """,
+            table=SQL.identifier(self._table),
+        ))
+        self.invalidate_model()
+
+
+class AccountReportBalanceSnapshot(models.Model):
+    """ Balances of the posted journal items, aggregated per month and per dimension.
+
+    The rows are deltas: posting a move inserts the balances of its lines, resetting it to draft inserts the same balances
+    with the opposite sign. Several rows can thus exist for the same month and dimensions; they are summed when read, and merged
+    by a cron. Inserting only never locks rows that other transactions posting in the same month would also update.
+
+    The report engines read the full months of their period from this table instead of account_move_line (see
+    account.report's _get_report_query), and only aggregate the journal items of the partial months at the bounds of the period.
+    """
+    _name = 'account.report.balance.snapshot'
+    _description = "Accounting Report Balance Snapshot"
+    _log_access = False
+
+    company_id = fields.Many2one(comodel_name='res.company', required=True, readonly=True, ondelete='cascade')
+    account_id = fields.Many2one(comodel_name='account.account', readonly=True, ondelete='cascade')
+    journal_id = fields.Many2one(comodel_name='account.journal', readonly=True, ondelete='cascade')
+    partner_id = fields.Many2one(comodel_name='res.partner', readonly=True, ondelete='cascade')
+    currency_id = fields.Many2one(comodel_name='res.currency', readonly=True, ondelete='cascade')
+    date = fields.Date(string="Month", required=True, readonly=True, help="First day of the month of the journal items.")
+    balance = fields.Float(readonly=True)
+    debit = fields.Float(readonly=True)
+    credit = fields.Float(readonly=True)
+    amount_currency = fields.Float(readonly=True)
+    line_count = fields.Integer(readonly=True)
+
+    def init(self):
+        super().init()
+        create_index(
+            self.env.cr,
+            indexname='account_report_balance_snapshot_company_account_date_idx',
+            tablename=self._table,
+            expressions=['company_id', 'account_id', 'date'],
+        )
+        # Fill the snapshot when the module is installed (or upgraded to a version having it)
+        self.env.cr.execute(SQL("SELECT 1 FROM %s LIMIT 1", SQL.identifier(self._table)))
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    ####################################################
+    # MAINTENANCE
+    ####################################################
+
+    @api.model
+    def _get_lines_aggregate_query(self, line_condition, sign=1):
+        """ Query aggregating the posted journal items matching line_condition into snapshot rows, multiplied by sign. """
+        return SQL(
+            """
+                SELECT %(dimensions)s,
+                       DATE_TRUNC('month', account_move_line.date)::date,
+                       %(amounts)s,
+                       %(sign)s * COUNT(*)
+                  FROM account_move_line
+                 WHERE %(line_condition)s
+                   AND account_move_line.parent_state = 'posted'
+                   AND (account_move_line.display_type IS NULL OR account_move_line.display_type NOT IN ('line_section', 'line_note'))
+              GROUP BY %(dimensions)s, DATE_TRUNC('month', account_move_line.date)
+            """,
+            dimensions=SQL(', ').join(SQL.identifier('account_move_line', fname) for fname in BALANCE_SNAPSHOT_DIMENSIONS),
+            amounts=SQL(', ').join(
+                SQL("%s * COALESCE(SUM(%s), 0)", sign, SQL.identifier('account_move_line', fname))
+                for fname in BALANCE_SNAPSHOT_AMOUNTS
+            ),
+            sign=sign,
+            line_condition=line_condition,
+        )
+
+    @api.model
+    def _get_insert_columns(self):
+        return SQL(', ').join(
+            SQL.identifier(fname)
+            for fname in (*BALANCE_SNAPSHOT_DIMENSIONS, 'date', *BALANCE_SNAPSHOT_AMOUNTS, 'line_count')
+        )
+
+    @api.model
+    def _add_lines(self, lines, sign=1):
+        """ Add the balances of the posted lines among `lines` to the snapshot, or remove them if sign is -1.
+
+        The current values of the lines are the ones taken into account: to follow a change of posted lines, the lines are removed
+        before the change, and added back after it.
+        """
+        if not lines:
+            return
+        lines.flush_recordset(list(BALANCE_SNAPSHOT_LINE_FIELDS))
+        self.env.cr.execute(SQL(
+            "INSERT INTO %(table)s (%(columns)s) %(aggregate_query)s",
+            table=SQL.identifier(self._table),
+            columns=self._get_insert_columns(),
+            aggregate_query=self._get_lines_aggregate_query(SQL("account_move_line.id = ANY(%s)", lines.ids), sign=sign),
+        ))
+        self.env['account.report.balance.snapshot.version']._log_change(lines.company_id.ids)
+
+    @api.model
+    def _rebuild(self):
+        """ Recompute the whole snapshot from the journal items. """
+        self.env['account.move.line'].flush_model(list(BALANCE_SNAPSHOT_LINE_FIELDS))
+        self.env.cr.execute(SQL(
+            """
+                DELETE FROM %(table)s;
+                INSERT INTO %(table)s (%(columns)s) %(aggregate_query)s
+            """,
+            table=SQL.identifier(self._table),
+            columns=self._get_insert_columns(),
+            aggregate_query=self._get_lines_aggregate_query(SQL("TRUE")),
+        ))
+        self.invalidate_model()
+        self.env['account.report.balance.snapshot.version']._log_change(self.env['res.company'].sudo().search([]).ids)
+
+    @api.model
+    def _cron_compact(self):
+        """ Merge the rows of the same month and dimensions into a single one, dropping the ones whose lines all went back to draft.
+        The logged changes of the snapshot are merged as well.
+        """
+        dimensions = SQL(', ').join(SQL.identifier(fname) for fname in (*BALANCE_SNAPSHOT_DIMENSIONS, 'date'))
+        self.env.cr.execute(SQL(
+            """
+                WITH merged AS (
+                    DELETE FROM %(table)s
+                     RETURNING %(columns)s
+                )
+                INSERT INTO %(table)s (%(columns)s)
+                     SELECT %(dimensions)s, %(amounts)s, SUM(line_count)
+                       FROM merged
+                   GROUP BY %(dimensions)s
+                     HAVING SUM(line_count) != 0
+            """,
+            table=SQL.identifier(self._table),
+            columns=self._get_insert_columns(),
+            dimensions=dimensions,
+            amounts=SQL(', ').join(SQL("SUM(%s)", SQL.identifier(fname)) for fname in BALANCE_SNAPSHOT_AMOUNTS),
+        ))
+        self.invalidate_model()
+        self.env['account.report.balance.snapshot.version']._compact()
+
+    ####################################################
+    # REPORTS
+    ####################################################
+
+    @api.model
+    def _get_full_months(self, date_from, date_to):
+        """ Bounds of the full months between date_from (None for the beginning of times) and date_to.
+
+        :return: (first day of the first full month or None, first day of the month following the last full month), or None if
+                 there is no full month in the period.
+        """
+        months_end = (fields.Date.to_date(date_to) + relativedelta(days=1)).replace(day=1)
+        months_start = None
+        if date_from:
+            date_from = fields.Date.to_date(date_from)
+            months_start = date_from if date_from.day == 1 else date_from.replace(day=1) + relativedelta(months=1)
+            if months_start >= months_end:
+                return None
+        return months_start, months_end
+
+    @api.model
+    def _is_month_bound(self, operator, value):
+        """ Whether a ('date', operator, value) condition selects whole months, so that it can be evaluated on snapshot rows. """
+        if not isinstance(value, (str, datetime.date)):
+            return False
+        day = fields.Date.to_date(value)
+        if operator in ('>=', '<'):
+            return day.day == 1
+        if operator in ('<=', '>'):
+            return (day + relativedelta(days=1)).day == 1
+        return False
+
+    @api.model
+    def _get_aml_shadow_table(self, months_start, months_end):
+        """ Table to use in place of account_move_line in report queries: the snapshot rows of the months between months_start
+        (None for the beginning of times) and months_end (excluded), and the journal items of the other months.
+
+        It only has the columns of account_move_line that the snapshot knows about; the snapshot rows get negative ids, so that
+        counting distinct ids still tells whether there is something to show.
+        """
+        snapshot_months = SQL("snapshot.date < %s", months_end)
+        other_months = SQL("account_move_line.date >= %s", months_end)
+        if months_start:
+            snapshot_months = SQL("snapshot.date >= %s AND %s", months_start, snapshot_months)
+            other_months = SQL("(account_move_line.date < %s OR %s)", months_start, other_months)
+
+        dimensions = SQL(', ').join(SQL.identifier(fname) for fname in (*BALANCE_SNAPSHOT_DIMENSIONS, 'date'))
+        return SQL(
+            """
+            (
+                SELECT -MIN(snapshot.id) AS id,
+                       %(dimensions)s,
+                       'posted' AS parent_state,
+                       'product' AS display_type,
+                       %(snapshot_amounts)s
+                  FROM %(table)s snapshot
+                 WHERE %(snapshot_months)s
+              GROUP BY %(dimensions)s
+                HAVING SUM(snapshot.line_count) != 0
+
+             UNION ALL
+
+                SELECT account_move_line.id,
+                       %(dimensions)s,
+                       account_move_line.parent_state,
+                       account_move_line.display_type,
+                       %(line_amounts)s
+                  FROM account_move_line
+                 WHERE %(other_months)s
+            )
+            """,
+            dimensions=dimensions,
+            snapshot_amounts=SQL(', ').join(
+                SQL("SUM(snapshot.%s) AS %s", SQL.identifier(fname), SQL.identifier(fname))
+                for fname in BALANCE_SNAPSHOT_AMOUNTS
+            ),
+            table=SQL.identifier(self._table),
+            snapshot_months=snapshot_months,
+            line_amounts=SQL(', ').join(SQL.identifier('account_move_line', fname) for fname in BALANCE_SNAPSHOT_AMOUNTS),
+            other_months=other_months,
+        )
+
@@ -0,0 +1,99 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import logging
+import threading
+
+from markupsafe import Markup
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountReportExport(models.Model):
+    """ Export of an accounting report to a file, generated in the background.
+
+    Exporting a fully unfolded ledger can take longer than a request and more memory than a worker has. Such exports are queued
+    here by account.report's action_export_file_in_background, and generated by a cron streaming the lines of the report into the
+    file (see account.report's _export_to_file_streamed). The file is then stored as an attachment, and the user who asked for it
+    notified.
+    """
+    _name = 'account.report.export'
+    _description = "Accounting Report Export"
+    _order = 'id'
+
+    report_id = fields.Many2one(comodel_name='account.report', required=True, ondelete='cascade')
+    user_id = fields.Many2one(comodel_name='res.users', required=True, default=lambda self: self.env.user, ondelete='cascade')
+    company_id = fields.Many2one(comodel_name='res.company', required=True, default=lambda self: self.env.company, ondelete='cascade')
+    company_ids = fields.Many2many(comodel_name='res.company', default=lambda self: self.env.companies)
+    options = fields.Json(required=True)
+    file_type = fields.Selection(selection=[('xlsx', "XLSX"), ('csv', "CSV")], required=True, default='xlsx')
+    state = fields.Selection(
+        selection=[('pending', "Pending"), ('done', "Done"), ('error', "Error")],
+        required=True,
+        default='pending',
+    )
+    attachment_id = fields.Many2one(comodel_name='ir.attachment', readonly=True, ondelete='set null')
+
+    @api.model
+    def _cron_generate_exports(self, job_count=5):
+        """ Generate the pending exports.
+        :param job_count: maximum number of exports to generate; the cron is retriggered if more are pending.
+        """
+        exports = self.search([('state', '=', 'pending')])
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+
+        for done_count, export in enumerate(exports[:job_count], start=1):
+            try:
+                with self.env.cr.savepoint():
+                    export._generate()
+            except Exception as error:  # noqa: BLE001
+                _logger.exception("Export of the accounting report %s (id=%s) failed", export.report_id.name, export.id)
+                export.state = 'error'
+                export._notify_user(error.args[0] if isinstance(error, UserError) else _("An unexpected error occurred."))
+
+            if auto_commit:
+                self.env['ir.cron']._notify_progress(done=done_count, remaining=len(exports) - done_count)
+                self.env.cr.commit()
+
+    def _generate(self):
+        """ Generate the file of the export, as the user who asked for it, and store it as an attachment only that user can read. """
+        self.ensure_one()
+        report = self.report_id.with_user(self.user_id).with_context(
+            allowed_company_ids=(self.company_id | self.company_ids).ids,
+            lang=self.user_id.lang,
+        )
+        export_result = report._export_to_file_streamed(self.options, self.file_type)
+        self.attachment_id = self.env['ir.attachment'].with_user(self.user_id).create({
+            'name': export_result['file_name'],
+            'raw': export_result['file_content'],
+            'mimetype': report.get_export_mime_type(export_result['file_type']),
+        })
+        self.state = 'done'
+        self._notify_user()
+
+    def _notify_user(self, error_message=None):
+        """ Notify the user who asked for the export that the file is ready, or that it could not be generated. """
+        self.ensure_one()
+        report_name = self.report_id.with_context(lang=self.user_id.lang).name
+        if error_message:
+            subject = _("The export of %(report)s failed", report=report_name)
+            body = error_message
+            notification_type = 'danger'
+        else:
+            subject = _("The export of %(report)s is ready", report=report_name)
+            body = Markup("<a href='/web/content/%s?download=true'>%s</a>") % (self.attachment_id.id, self.attachment_id.name)
+            notification_type = 'success'
+
+        self.env['mail.thread'].message_notify(
+            partner_ids=self.user_id.partner_id.ids,
+            author_id=self.env.ref('base.partner_root').id,
+            subject=subject,
+            body=body,
+            email_layout_xmlid='mail.mail_notification_light',
+        )
+        self.user_id._bus_send('simple_notification', {
+            'type': notification_type,
+            'title': subject,
+            'message': _("The file is available in your inbox.") if not error_message else error_message,
+        })
@@ -33,3 +33,6 @@ from . import test_deferred_reports
 from . import test_report_sections
 from . import test_budget
 from . import test_currency_table
+from . import test_balance_snapshot
+from . import test_report_cache
+from . import test_report_streamed_export
@@ -0,0 +1,93 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo import Command
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import TestAccountReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBalanceSnapshot(TestAccountReportsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = cls.env.ref('account_reports.general_ledger_report')
+        cls.receivable = cls.company_data['default_account_receivable']
+        cls.revenue = cls.company_data['default_account_revenue']
+
+    def _create_move(self, date, amount, post=True):
+        move = self.env['account.move'].create({
+            'move_type': 'entry',
+            'date': date,
+            'journal_id': self.company_data['default_journal_misc'].id,
+            'line_ids': [
+                Command.create({'debit': amount, 'credit': 0.0, 'account_id': self.receivable.id}),
+                Command.create({'debit': 0.0, 'credit': amount, 'account_id': self.revenue.id}),
+            ],
+        })
+        if post:
+            move.action_post()
+        return move
+
+    def _get_snapshot_balances(self, month):
+        self.env.cr.execute(SQL(
+            """
+                SELECT account_id, SUM(balance), SUM(line_count)
+                  FROM account_report_balance_snapshot
+                 WHERE company_id = %s AND date = %s
+              GROUP BY account_id
+                HAVING SUM(line_count) != 0
+            """,
+            self.company_data['company'].id,
+            month,
+        ))
+        return {account_id: (balance, line_count) for account_id, balance, line_count in self.env.cr.fetchall()}
+
+    def _get_report_balances(self, options, use_balance_snapshot):
+        query = self.report.with_context(account_report_balance_snapshot=use_balance_snapshot)._get_report_query(options, 'strict_range')
+        self.env.cr.execute(SQL(
+            """
+                SELECT account_move_line.account_id, SUM(account_move_line.balance)
+                  FROM %s
+                 WHERE %s
+              GROUP BY account_move_line.account_id
+            """,
+            query.from_clause,
+            query.where_clause,
+        ))
+        return dict(self.env.cr.fetchall()), 'account_report_balance_snapshot' in query.from_clause.code
+
+    def test_snapshot_follows_moves(self):
+        move = self._create_move('2019-03-10', 100.0)
+        self._create_move('2019-03-20', 50.0, post=False)
+        expected = {self.receivable.id: (100.0, 1), self.revenue.id: (-100.0, 1)}
+        self.assertEqual(self._get_snapshot_balances('2019-03-01'), expected)
+
+        move.button_draft()
+        self.assertEqual(self._get_snapshot_balances('2019-03-01'), {})
+
+        move.action_post()
+        self.env['account.report.balance.snapshot']._cron_compact()
+        self.assertEqual(self._get_snapshot_balances('2019-03-01'), expected)
+        self.env.cr.execute(SQL(
+            "SELECT COUNT(*) FROM account_report_balance_snapshot WHERE company_id = %s AND date = '2019-03-01'",
+            self.company_data['company'].id,
+        ))
+        self.assertEqual(self.env.cr.fetchone()[0], 2, "The compaction leaves one row per account")
+
+        self.env['account.report.balance.snapshot']._rebuild()
+        self.assertEqual(self._get_snapshot_balances('2019-03-01'), expected)
+
+    def test_report_query_reads_full_months(self):
+        for date, amount in (('2019-01-15', 100.0), ('2019-02-10', 200.0), ('2019-03-05', 400.0), ('2019-03-25', 800.0)):
+            self._create_move(date, amount)
+
+        options = self._generate_options(self.report, '2019-01-01', '2019-03-10')
+        balances, used_snapshot = self._get_report_balances(options, True)
+        self.assertTrue(used_snapshot)
+        self.assertEqual(balances[self.receivable.id], 700.0, "January and February from the snapshot, March from the journal items")
+        self.assertEqual((balances, False), self._get_report_balances(options, False))
+
+        options['all_entries'] = True
+        self.assertFalse(self._get_report_balances(options, True)[1], "The snapshot only knows the posted journal items")
@@ -0,0 +1,103 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import tagged
+
+from odoo.addons.account_reports.models.account_report import AccountReport, EXPRESSION_TOTALS_CACHE
+
+from .common import TestAccountReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestReportCache(TestAccountReportsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = cls.env.ref('account_reports.balance_sheet')
+
+    def setUp(self):
+        super().setUp()
+        EXPRESSION_TOTALS_CACHE.clear()
+        # Everything done by the tests is uncommitted: consider it committed to exercise the cache
+        self.startPatcher(patch.object(AccountReport, '_has_uncommitted_expression_totals_changes', return_value=False))
+
+    def _post_receivable(self, amount):
+        move = self.env['account.move'].create({
+            'move_type': 'entry',
+            'date': '2019-03-10',
+            'journal_id': self.company_data['default_journal_misc'].id,
+            'line_ids': [
+                Command.create({'debit': amount, 'credit': 0.0, 'account_id': self.company_data['default_account_receivable'].id}),
+                Command.create({'debit': 0.0, 'credit': amount, 'account_id': self.company_data['default_account_revenue'].id}),
+            ],
+        })
+        move.action_post()
+
+    def _get_lines_and_computations(self, options):
+        with patch.object(
+            AccountReport, '_compute_expression_totals_for_single_column_group', autospec=True,
+            side_effect=AccountReport._compute_expression_totals_for_single_column_group,
+        ) as compute:
+            lines = self.report._get_lines(options)
+        return lines, compute.call_count
+
+    def test_totals_cached_until_ledger_changes(self):
+        self._post_receivable(100.0)
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31')
+
+        lines, computations = self._get_lines_and_computations(options)
+        self.assertTrue(computations)
+        self.assertEqual(self._get_lines_and_computations(options), (lines, 0), "Same options, same ledger: served from the cache")
+
+        self._post_receivable(50.0)
+        new_lines, computations = self._get_lines_and_computations(options)
+        self.assertTrue(computations, "Posting moves the ledger watermark")
+        self.assertNotEqual(new_lines, lines)
+
+        other_options = self._generate_options(self.report, '2019-01-01', '2019-06-30')
+        self.assertTrue(self._get_lines_and_computations(other_options)[1], "Other options, other results")
+
+    def test_no_cache_for_draft_entries(self):
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31', default_options={'all_entries': True})
+        self._get_lines_and_computations(options)
+        self.assertTrue(self._get_lines_and_computations(options)[1])
+
+    def test_posting_logs_snapshot_change(self):
+        company = self.company_data['company']
+        Version = self.env['account.report.balance.snapshot.version']
+
+        def change_count():
+            return sum(Version.search([('company_id', '=', company.id)]).mapped('change_count'))
+
+        count = change_count()
+        self._post_receivable(100.0)
+        count_after_posting = change_count()
+        self.assertGreater(count_after_posting, count)
+        self.env['account.report.balance.snapshot']._cron_compact()
+        self.assertEqual(Version.search_count([('company_id', '=', company.id)]), 1)
+        self.assertEqual(change_count(), count_after_posting, "Compacting keeps the number of changes")
+
+    def test_no_cache_for_tax_tags(self):
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31')
+        self.assertTrue(self.report._is_expression_totals_cache_enabled(options, {'domain': {}, 'aggregation': {}}))
+        self.assertFalse(
+            self.report._is_expression_totals_cache_enabled(options, {'domain': {}, 'tax_tags': {}}),
+            "The tax tags of the journal items are not followed by the snapshot version",
+        )
+
+    def test_no_cache_for_fields_out_of_snapshot(self):
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31')
+        expressions = self.env['account.report.expression']
+
+        def is_cached(formula, current_groupby=None):
+            grouped_formulas = {'domain': {('strict_range', current_groupby, None): {formula: expressions}}}
+            return self.report._is_expression_totals_cache_enabled(options, grouped_formulas)
+
+        self.assertTrue(is_cached("[('account_id.account_type', '=', 'asset_receivable'), ('partner_id', '!=', False)]"))
+        self.assertTrue(is_cached("[('journal_id', '=', 1)]", current_groupby='partner_id'))
+        self.assertFalse(is_cached("[('name', 'ilike', 'Rent')]"), "The labels are not followed by the snapshot")
+        self.assertFalse(is_cached("[('reconciled', '=', False)]"))
+        self.assertFalse(is_cached("[('partner_id.country_id.code', '=', 'BE')]"), "The partners are not followed by the watermark")
+        self.assertFalse(is_cached("[('journal_id', '=', 1)]", current_groupby='move_id'))
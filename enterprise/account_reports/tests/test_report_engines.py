@@ -1,6 +1,7 @@
 from .common import TestAccountReportsCommon
 
 from odoo import fields, Command
+from odoo.exceptions import UserError
 from odoo.tests import tagged
 from odoo.tools import frozendict
 
@@ -1783,3 +1784,137 @@ class TestReportEngines(TestAccountReportsCommon):
             expected_amls = move.line_ids.filtered(lambda x: x.partner_id == expected_partner)
             audit_result_amls = move.line_ids.filtered_domain(action_dict['domain'])
             self.assertEqual(audit_result_amls, expected_amls, f"Wrong audit result for partner {expected_partner.name}: {audit_result_amls}")
+
+    def test_engines_column_groups_single_pass(self):
+        domain = [('account_id.code', '=like', '1010%')]
+        report = self._create_report([
+            self._prepare_test_report_line(self._prepare_test_expression_domain(domain, 'sum_if_neg'), groupby='account_id'),
+            self._prepare_test_report_line(self._prepare_test_expression_domain(domain, 'count_rows')),
+            self._prepare_test_report_line(self._prepare_test_expression_account_codes('1010D'), groupby='account_id'),
+        ])
+
+        self._create_test_account_moves([
+            self._prepare_test_account_move_line(100.0, account_code='101001', date='2020-01-10'),
+            self._prepare_test_account_move_line(-300.0, account_code='101002', date='2020-01-20'),
+            self._prepare_test_account_move_line(-50.0, account_code='101001', date='2019-12-10'),
+            self._prepare_test_account_move_line(200.0, account_code='101002', date='2019-12-20'),
+            self._prepare_test_account_move_line(400.0, account_code='101001', date='2019-11-10'),
+        ])
+
+        options = self._generate_options(report, '2020-01-01', '2020-01-31')
+        options = self._update_comparison_filter(options, report, 'previous_period', 2)
+        self.assertEqual(len(options['column_groups']), 3)
+        expressions = report.line_ids.expression_ids
+
+        # All the column groups are computed together, without evaluating the formulas of each column group separately
+        AccountReport = type(report)
+        column_groups_queries = []
+
+        def get_report_queries_for_column_groups(*args, **kwargs):
+            queries = AccountReport._get_report_queries_for_column_groups(*args, **kwargs)
+            column_groups_queries.append(queries)
+            return queries
+
+        with (
+            patch.object(AccountReport, '_compute_formula_batch', autospec=True, side_effect=AccountReport._compute_formula_batch) as compute_formula_batch,
+            patch.object(AccountReport, '_get_report_queries_for_column_groups', autospec=True, side_effect=get_report_queries_for_column_groups),
+        ):
+            all_column_groups_totals = report._compute_expression_totals_for_each_column_group(expressions, options)
+        compute_formula_batch.assert_not_called()
+
+        # One query per formula batch for the three periods, the whole months being read from the balance snapshot
+        self.assertEqual(len(column_groups_queries), 3, "One batch for each of the 2 domain formulas and one for the account_codes formulas")
+        self.assertEqual([len(queries) for queries in column_groups_queries], [1, 1, 1])
+        self.assertEqual(
+            sorted('account_report_balance_snapshot' in queries[0][1].code for queries in column_groups_queries),
+            [False, True, True],
+            "Only the count_rows formula, whose journal items the snapshot cannot count, reads account_move_line",
+        )
+
+        expected_values_by_date_from = {
+            '2020-01-01': [-200.0, 2, 100.0],
+            '2019-12-01': [0.0, 2, 200.0],
+            '2019-11-01': [0.0, 1, 400.0],
+        }
+        for column_group_key, column_group in options['column_groups'].items():
+            date_from = column_group['forced_options']['date']['date_from']
+            column_group_totals = all_column_groups_totals[column_group_key]
+            with self.subTest(date_from=date_from):
+                self.assertEqual(
+                    [column_group_totals[expression]['value'] for expression in expressions],
+                    expected_values_by_date_from[date_from],
+                )
+                self.assertEqual(
+                    column_group_totals,
+                    report._compute_expression_totals_for_each_column_group(expressions, options, col_groups_restrict=[column_group_key])[column_group_key],
+                    "Computing a column group alone gives the same totals",
+                )
+
+        # Same when expanding a groupby
+        grouped_expressions = report.line_ids[0].expression_ids
+        all_column_groups_totals = report._compute_expression_totals_for_each_column_group(grouped_expressions, options, groupby_to_expand='account_id')
+        for column_group_key in options['column_groups']:
+            self.assertEqual(
+                all_column_groups_totals[column_group_key],
+                report._compute_expression_totals_for_each_column_group(
+                    grouped_expressions, options, groupby_to_expand='account_id', col_groups_restrict=[column_group_key],
+                )[column_group_key],
+            )
+
+    def test_engine_aggregation_plan(self):
+        report = self._create_report([
+            self._prepare_test_report_line(
+                self._prepare_test_expression_domain([('account_id.code', '=', '101001')], 'sum'),
+                code='plan_1',
+            ),
+            self._prepare_test_report_line(self._prepare_test_expression_aggregation('plan_1.balance * 2'), code='plan_2'),
+            self._prepare_test_report_line(self._prepare_test_expression_aggregation('plan_2.balance + plan_3_1.balance'), code='plan_3'),
+            self._prepare_test_report_line(self._prepare_test_expression_aggregation('plan_1.balance', subformula='if_above(USD(150))'), code='plan_3_1'),
+        ])
+        self._create_test_account_moves([
+            self._prepare_test_account_move_line(100.0, account_code='101001', date='2020-01-10'),
+            self._prepare_test_account_move_line(200.0, account_code='101001', date='2019-12-10'),
+        ])
+
+        options = self._generate_options(report, '2020-01-01', '2020-01-31')
+        options = self._update_comparison_filter(options, report, 'previous_period', 1)
+
+        AccountReport = type(report)
+        with patch.object(AccountReport, '_compile_aggregation_plan', autospec=True, side_effect=AccountReport._compile_aggregation_plan) as compile_plan:
+            compile_count = None
+            for dummy in range(2):
+                self.assertLinesValues(
+                    # pylint: disable=bad-whitespace
+                    report._get_lines(options),
+                    [   0,                    1,          2],
+                    [
+                        ('test_line_1',   100.0,      200.0),
+                        ('test_line_2',   200.0,      400.0),
+                        ('test_line_3',   200.0,      600.0),
+                        ('test_line_4',     0.0,      200.0),
+                    ],
+                    options,
+                )
+                if compile_count is None:
+                    compile_count = compile_plan.call_count
+            self.assertEqual(compile_plan.call_count, compile_count, "The plan is compiled once, and reused for all column groups")
+
+            report.line_ids[2].expression_ids.formula = 'plan_2.balance - plan_3_1.balance'
+            self.assertLinesValues(
+                # pylint: disable=bad-whitespace
+                report._get_lines(options),
+                [   0,                    1,          2],
+                [
+                    ('test_line_1',   100.0,      200.0),
+                    ('test_line_2',   200.0,      400.0),
+                    ('test_line_3',   200.0,      200.0),
+                    ('test_line_4',     0.0,      200.0),
+                ],
+                options,
+            )
+            self.assertGreater(compile_plan.call_count, compile_count, "Changing an expression recompiles the plan")
+
+        # Formulas depending on each other can't be evaluated
+        report.line_ids[3].expression_ids.formula = 'plan_3.balance'
+        with self.assertRaises(UserError):
+            report._get_lines(options)
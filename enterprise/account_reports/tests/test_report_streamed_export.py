@@ -0,0 +1,72 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import csv
+import io
+
+from odoo import Command
+from odoo.tests import tagged
+
+from .common import TestAccountReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestReportStreamedExport(TestAccountReportsCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = cls.env.ref('account_reports.general_ledger_report')
+        move = cls.env['account.move'].create({
+            'move_type': 'entry',
+            'date': '2019-03-10',
+            'journal_id': cls.company_data['default_journal_misc'].id,
+            'line_ids': [
+                *(
+                    Command.create({'debit': 10.0 * i, 'credit': 0.0, 'name': f'streamed_{i}', 'account_id': cls.company_data['default_account_receivable'].id})
+                    for i in range(1, 8)
+                ),
+                Command.create({'debit': 0.0, 'credit': 280.0, 'name': 'streamed_total', 'account_id': cls.company_data['default_account_revenue'].id}),
+            ],
+        })
+        move.action_post()
+
+    def _get_print_options(self):
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31')
+        return self.report.get_options(previous_options={**options, 'export_mode': 'print'})
+
+    def test_streamed_lines_match_print(self):
+        print_options = self._get_print_options()
+        expected_lines = self.report._filter_out_folded_children(self.report._get_lines(print_options))
+
+        # 2 move lines per page: the 7 receivable lines need 4 pages
+        dummy, streamed_lines = self.report._get_streamed_export_lines({**print_options, 'export_page_size': 2})
+        streamed_lines = list(streamed_lines)
+
+        self.assertEqual([line['id'] for line in streamed_lines], [line['id'] for line in expected_lines])
+        self.assertEqual(
+            [[column.get('no_format') for column in line['columns']] for line in streamed_lines],
+            [[column.get('no_format') for column in line['columns']] for line in expected_lines],
+            "Pages continue the cumulated balance of the previous ones",
+        )
+
+    def test_background_export(self):
+        options = self._generate_options(self.report, '2019-01-01', '2019-12-31')
+        action = self.report.action_export_file_in_background(options, 'csv')
+        self.assertEqual(action['tag'], 'display_notification')
+        self.report.action_export_file_in_background(options, 'xlsx')
+
+        exports = self.env['account.report.export'].search([('report_id', '=', self.report.id)])
+        self.assertEqual(exports.mapped('state'), ['pending', 'pending'])
+        self.assertEqual(exports.user_id, self.env.user)
+
+        self.env['account.report.export']._cron_generate_exports()
+        self.assertEqual(exports.mapped('state'), ['done', 'done'])
+
+        csv_export, xlsx_export = exports
+        self.assertEqual(csv_export.attachment_id.mimetype, 'text/csv')
+        rows = list(csv.reader(io.StringIO(csv_export.attachment_id.raw.decode())))
+        self.assertEqual(
+            [cell for row in rows for cell in row if cell.startswith('streamed_')],
+            [f'streamed_{i}' for i in range(1, 8)] + ['streamed_total'],
+        )
+        self.assertEqual(xlsx_export.attachment_id.mimetype, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertTrue(xlsx_export.attachment_id.raw.startswith(b'PK'))